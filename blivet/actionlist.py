@@ -21,22 +21,30 @@
 #
 
 import copy
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import ExitStack
 from functools import wraps
+from threading import Event, Lock
 
 from .deviceaction import ActionCreateDevice
 from .deviceaction import action_type_from_string, action_object_from_string
 from .devicelibs import lvm
+from .devicelibs import wipe
 from .devices import PartitionDevice
 from .errors import DiskLabelCommitError, StorageError
 from .events.changes import record_change
 from .events.changes import ActionCanceled
 from .flags import flags
 from . import tsort
-from .threads import blivet_lock, SynchronizedMeta
+from .threads import blivet_lock, SynchronizedMeta, allow_lock_release, lock_released
 
 import logging
 log = logging.getLogger("blivet")
 
+# protects rebuilding of ActionList indexes by concurrent readers
+_index_lock = Lock()
+
 
 def with_flag(flag_attr):
     """ Decorator to set a flag attribute while running a method. """
@@ -54,8 +62,57 @@ def with_flag(flag_attr):
     return run_func_with_flag_attr_set
 
 
+def _dependency_keys(action):
+    """ Return the ids of the devices an action's ordering depends on.
+
+        Two actions can only require one another (other than by action type)
+        if they have at least one of these in common.
+    """
+    keys = set(d.id for d in action.device.ancestors)
+    for container in (action.container, getattr(action.device, "container", None)):
+        if container is not None:
+            keys.add(container.id)
+
+    return keys
+
+
+class _WipeBatches(object):
+    """ Wait for udev once after each run of consecutive format destroy
+        actions instead of after every one of them.
+
+        Call :meth:`next` before executing each action. Format destroy
+        actions executed in a row share a :func:`.wipe.batch`; any other
+        action first waits for udev to process the wipes.
+    """
+
+    def __init__(self):
+        self._stack = ExitStack()
+        self._batched = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        with blivet_lock:
+            self.close()
+
+    def next(self, action):
+        if action.is_destroy and action.is_format:
+            if not self._batched:
+                self._stack.enter_context(wipe.batch())
+                self._batched = True
+        else:
+            self.close()
+
+    def close(self):
+        self._batched = False
+        self._stack.close()
+
+
 class ActionList(object, metaclass=SynchronizedMeta):
-    _unsynchronized_methods = ['process']
+    _unsynchronized_methods = ['process', '_process_parallel', '_run_group',
+                               '_sync_index', '_index_action', '_unindex_action']
+    _shared_methods = ['__iter__', 'find']
 
     def __init__(self, addfunc=None, removefunc=None):
         self._add_func = addfunc
@@ -64,16 +121,80 @@ class ActionList(object, metaclass=SynchronizedMeta):
         self._completed_actions = []
         self.processing = False
 
+        # index of the actions in self._actions, see _sync_index
+        self._indexed = None
+        self._positions = {}
+        self._by_device = {}
+        self._by_container = {}
+        self._seq = 0
+
     def __iter__(self):
         return iter(self._actions)
 
+    def _sync_index(self):
+        """ Make sure the action index reflects self._actions.
+
+            The index is rebuilt if the list has been replaced (eg: by
+            :meth:`sort`) or modified directly.
+        """
+        # find() only holds the global lock in shared mode
+        with _index_lock:
+            if self._indexed is self._actions and \
+               len(self._positions) == len(self._actions):
+                return
+
+            self._indexed = self._actions
+            self._positions = {}
+            self._by_device = {}
+            self._by_container = {}
+            self._seq = 0
+            for action in self._actions:
+                self._index_action(action)
+
+    def _index_action(self, action):
+        """ Add an action to the index.
+
+            Actions are indexed by the id of their device and then by their
+            type and object. Container member actions are also indexed by the
+            id of their container.
+        """
+        self._positions[action] = self._seq
+        self._seq += 1
+        by_type = self._by_device.setdefault(action.device.id, {})
+        by_type.setdefault((action.type, action.obj), []).append(action)
+        if action.is_container:
+            self._by_container.setdefault(action.container.id, []).append(action)
+
+    def _unindex_action(self, action):
+        """ Remove an action from the index. """
+        del self._positions[action]
+        by_type = self._by_device[action.device.id]
+        key = (action.type, action.obj)
+        by_type[key].remove(action)
+        if not by_type[key]:
+            del by_type[key]
+        if not by_type:
+            del self._by_device[action.device.id]
+
+        if action.is_container:
+            by_container = self._by_container[action.container.id]
+            by_container.remove(action)
+            if not by_container:
+                del self._by_container[action.container.id]
+
+    def _append(self, action):
+        """ Append an action to the list without applying it. """
+        self._sync_index()
+        self._actions.append(action)
+        self._index_action(action)
+
     def add(self, action):
         if self._add_func is not None:
             self._add_func(action)
 
         # apply the action before adding it in case apply raises an exception
         action.apply()
-        self._actions.append(action)
+        self._append(action)
         log.info("registered action: %s", action)
 
     def remove(self, action):
@@ -81,7 +202,9 @@ class ActionList(object, metaclass=SynchronizedMeta):
             self._remove_func(action)
 
         action.cancel()
+        self._sync_index()
         self._actions.remove(action)
+        self._unindex_action(action)
         record_change(ActionCanceled(action=action))
         log.info("canceled action %s", action)
 
@@ -114,8 +237,24 @@ class ActionList(object, metaclass=SynchronizedMeta):
         _type = action_type_from_string(action_type)
         _object = action_object_from_string(object_type)
 
+        self._sync_index()
+        if device is not None or devid is not None:
+            if devid is None:
+                devid = getattr(device, "id", None)
+
+            buckets = [bucket for ((a_type, a_obj), bucket)
+                       in self._by_device.get(devid, {}).items()
+                       if _type in (None, a_type) and _object in (None, a_obj)]
+            if len(buckets) == 1:
+                candidates = buckets[0]
+            else:
+                candidates = sorted((a for bucket in buckets for a in bucket),
+                                    key=self._positions.get)
+        else:
+            candidates = self._actions
+
         actions = []
-        for action in self._actions:
+        for action in candidates:
             if device is not None and action.device != device:
                 continue
 
@@ -128,65 +267,105 @@ class ActionList(object, metaclass=SynchronizedMeta):
             if path is not None and action.device.path != path:
                 continue
 
-            if devid is not None and action.device.id != devid:
-                continue
-
             actions.append(action)
 
         return actions
 
+    def _obsoletion_candidates(self, action):
+        """ Return the actions the given action could possibly obsolete.
+
+            An action can only obsolete actions on the same device or, for
+            device destroy actions, member actions on the device as a
+            container. The candidates are returned in list order.
+        """
+        devid = action.device.id
+        candidates = [a for bucket in self._by_device.get(devid, {}).values() for a in bucket]
+        candidates.extend(self._by_container.get(devid, []))
+        return sorted(set(candidates), key=self._positions.get)
+
     def prune(self):
         """ Remove redundant/obsolete actions from the action list. """
+        self._sync_index()
         for action in reversed(self._actions[:]):
-            if action not in self._actions:
+            if action not in self._positions:
                 log.debug("action %d already pruned", action.id)
                 continue
 
-            for obsolete in self._actions[:]:
+            for obsolete in self._obsoletion_candidates(action):
                 if action.obsoletes(obsolete):
                     log.info("removing obsolete action %d (%d)",
                              obsolete.id, action.id)
-                    self._actions.remove(obsolete)
+                    self._unindex_action(obsolete)
 
-                    if obsolete.obsoletes(action) and action in self._actions:
+                    if obsolete.obsoletes(action) and action in self._positions:
                         log.info("removing mutually-obsolete action %d (%d)",
                                  action.id, obsolete.id)
-                        self._actions.remove(action)
+                        self._unindex_action(action)
+
+        # drop the pruned actions from the list in one pass
+        self._actions[:] = [a for a in self._actions if a in self._positions]
 
     def sort(self):
         """ Sort actions based on dependencies. """
         if not self._actions:
             return
 
-        edges = []
+        actions = self._actions
+        edges = set()
+
+        # Apart from the ordering by action type handled below, an action can
+        # only require actions on the same device, on one of its ancestors or
+        # descendants, or on the same container. Group the actions by those
+        # and only compare actions within each group.
+        groups = {}
+        for (idx, action) in enumerate(actions):
+            for key in _dependency_keys(action):
+                groups.setdefault(key, []).append(idx)
+
+        compared = set()
+        for group in groups.values():
+            for (i, idx) in enumerate(group):
+                for other_idx in group[i + 1:]:
+                    if (idx, other_idx) in compared:
+                        continue
 
-        # collect all ordering requirements for the actions
-        for action in self._actions:
-            action_idx = self._actions.index(action)
-            children = []
-            for _action in self._actions:
-                if _action == action:
+                    compared.add((idx, other_idx))
+                    # create edges based on both action type and dependencies.
+                    if actions[other_idx].requires(actions[idx]):
+                        edges.add((idx, other_idx))
+                    if actions[idx].requires(actions[other_idx]):
+                        edges.add((other_idx, idx))
+
+        # Non-container actions of a given type require all non-container
+        # actions of a higher type (see DeviceAction.requires). Rather than
+        # adding an edge for each such pair, route them through one extra node
+        # for each boundary between two action types.
+        items = list(range(len(actions)))
+        types = sorted(set(a.type for a in actions if not a.is_container), reverse=True)
+        for (prev_type, next_type) in zip(types, types[1:]):
+            barrier = len(items)
+            if barrier > len(actions):
+                edges.add((barrier - 1, barrier))
+
+            items.append(barrier)
+            for (idx, action) in enumerate(actions):
+                if action.is_container:
                     continue
 
-                # create edges based on both action type and dependencies.
-                if _action.requires(action):
-                    children.append(_action)
-
-            for child in children:
-                child_idx = self._actions.index(child)
-                edges.append((action_idx, child_idx))
+                if action.type == prev_type:
+                    edges.add((idx, barrier))
+                elif action.type == next_type:
+                    edges.add((barrier, idx))
 
         # create a graph reflecting the ordering information we have
-        graph = tsort.create_graph(list(range(len(self._actions))), edges)
+        graph = tsort.create_graph(items, sorted(edges))
 
-        # perform a topological sort based on the graph's contents
-        order = tsort.tsort(graph)
+        # perform a topological sort based on the graph's contents, leaving
+        # out the barrier nodes
+        order = tsort.tsort(graph, hidden=items[len(actions):])
 
         # now replace self._actions with a sorted version of the same list
-        actions = []
-        for idx in order:
-            actions.append(self._actions[idx])
-        self._actions = actions
+        self._actions = [actions[idx] for idx in order]
 
     def _pre_process(self, devices=None):
         """ Prepare the action queue for execution. """
@@ -247,7 +426,7 @@ class ActionList(object, metaclass=SynchronizedMeta):
                 action = ActionCreateDevice(device)
                 # apply the action first in case the apply method fails
                 action.apply()
-                self._actions.append(action)
+                self._append(action)
 
         log.info("sorting actions...")
         self.sort()
@@ -299,51 +478,176 @@ class ActionList(object, metaclass=SynchronizedMeta):
         devices = [a.name for a in active if any(d in disks for d in a.disks)]
         return devices
 
+    def _independent_groups(self):
+        """ Split the (sorted) action list into independent groups of actions.
+
+            Two actions end up in the same group if they share a disk, a
+            container or any other ancestor device, which is also a
+            prerequisite for one of them requiring the other. Actions within
+            each group retain their relative order.
+
+            :returns: a list of groups, in order of their first action
+            :rtype: list of lists of :class:`~.deviceaction.DeviceAction`
+        """
+        # union-find over action indices, joined via shared dependency keys
+        parent = list(range(len(self._actions)))
+
+        def find_root(idx):
+            while parent[idx] != idx:
+                parent[idx] = parent[parent[idx]]
+                idx = parent[idx]
+            return idx
+
+        owners = {}
+        for (idx, action) in enumerate(self._actions):
+            for key in _dependency_keys(action):
+                other = owners.setdefault(key, idx)
+                (root, other_root) = (find_root(idx), find_root(other))
+                if root != other_root:
+                    parent[max(root, other_root)] = min(root, other_root)
+
+        groups = {}
+        for (idx, action) in enumerate(self._actions):
+            groups.setdefault(find_root(idx), []).append(action)
+
+        return [groups[root] for root in sorted(groups)]
+
+    def _execute_action(self, action, callbacks=None, devices=None):
+        """ Execute an action and update partition names afterward.
+
+            :param action: the action to execute
+            :param callbacks: callbacks to be invoked when actions are executed
+            :param devices: devices whose names should be updated (partitions)
+                            and that may have to be torn down if committing a
+                            disklabel fails
+        """
+        try:
+            action.execute(callbacks)
+        except DiskLabelCommitError:
+            # it's likely that a previous action
+            # triggered setup of an lvm or md device.
+            # include deps no longer in the tree due to pending removal
+            devs = devices + [a.device for a in self._actions]
+            for dep in set(devs):
+                if dep.exists and \
+                   any(dep.depends_on(disk) for disk in action.device.disks):
+                    dep.teardown(recursive=True)
+
+            action.execute(callbacks)
+
+        for device in devices:
+            # make sure we catch any renumbering parted does
+            if device.exists and isinstance(device, PartitionDevice):
+                # also update existence for partitions on unsupported disklabels
+                if not device.disklabel_supported and \
+                   action.is_destroy and action.is_format and action.device == device.disk:
+                    device.exists = False
+                    continue
+
+                device.update_name()
+                device.format.device = device.path
+
+    def _run_group(self, group, callbacks, devices, failed, busy):
+        """ Execute a group of actions in order, from a worker thread.
+
+            :param list group: the actions to execute
+            :param callbacks: callbacks to be invoked when actions are executed
+            :param list devices: devices the group's actions may affect
+            :param failed: event set as soon as any action fails
+            :type failed: :class:`threading.Event`
+            :param list busy: list to append per-action execution times to
+        """
+        with allow_lock_release(), _WipeBatches() as batches:
+            for action in group:
+                if failed.is_set():
+                    log.info("not executing action %s after failure", action)
+                    return
+
+                log.info("executing action: %s", action)
+                with blivet_lock:
+                    start = time.time()
+                    batches.next(action)
+                    try:
+                        self._execute_action(action, callbacks=callbacks, devices=devices)
+                    except BaseException:
+                        failed.set()
+                        raise
+
+                    self._actions.remove(action)
+                    self._completed_actions.append(action)
+                    busy.append(time.time() - start)
+
+    def _process_parallel(self, callbacks=None, devices=None, max_workers=2):
+        """ Execute independent groups of actions concurrently.
+
+            Each group is executed in order by a worker thread. Workers hold
+            the global lock except while waiting for external programs to
+            finish, so the time spent in eg: mkfs overlaps between groups.
+            Callbacks are invoked from the worker threads, with the global
+            lock held.
+
+            If an action fails no further actions are started and the first
+            error is raised once all workers have stopped. The actions that
+            were not executed remain in the action list.
+        """
+        groups = self._independent_groups()
+        failed = Event()
+        busy = []
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = []
+            for group in groups:
+                disks = set(d for a in group for d in a.device.disks)
+                group_devices = [d for d in devices if set(d.disks) & disks]
+                futures.append(executor.submit(self._run_group, group, callbacks,
+                                               group_devices, failed, busy))
+
+            # the caller, eg: Blivet.do_it, may hold the global lock
+            with allow_lock_release(), lock_released():
+                wait(futures)
+
+        elapsed = time.time() - start
+        log.info("executed %d actions in %d independent groups using up to %d "
+                 "threads in %.2fs (%.2fs sequential, %.2fx speedup)",
+                 len(busy), len(groups), max_workers, elapsed, sum(busy),
+                 sum(busy) / elapsed if elapsed else 1.0)
+
+        for future in futures:
+            # raises the exception from the first failed group, if any
+            future.result()
+
     @with_flag("processing")
-    def process(self, callbacks=None, devices=None, dry_run=None):
+    def process(self, callbacks=None, devices=None, dry_run=None, max_workers=None):
         """
         Execute all registered actions.
 
         :param callbacks: callbacks to be invoked when actions are executed
         :param devices: a list of all devices current in the devicetree
         :type callbacks: :class:`~.callbacks.DoItCallbacks`
+        :keyword max_workers: if greater than 1, actions that do not share any
+                              disks, containers or other devices are executed
+                              concurrently using up to this many threads
+        :type max_workers: int or None
 
         """
         devices = devices or []
         self._pre_process(devices=devices)
 
-        for action in self._actions[:]:
-            log.info("executing action: %s", action)
-            if dry_run:
-                continue
+        if max_workers is not None and max_workers > 1 and not dry_run:
+            self._process_parallel(callbacks=callbacks, devices=devices,
+                                   max_workers=max_workers)
+            self._post_process(devices=devices)
+            return
 
-            with blivet_lock:
-                try:
-                    action.execute(callbacks)
-                except DiskLabelCommitError:
-                    # it's likely that a previous action
-                    # triggered setup of an lvm or md device.
-                    # include deps no longer in the tree due to pending removal
-                    devs = devices + [a.device for a in self._actions]
-                    for dep in set(devs):
-                        if dep.exists and \
-                           any(dep.depends_on(disk) for disk in action.device.disks):
-                            dep.teardown(recursive=True)
-
-                    action.execute(callbacks)
+        with _WipeBatches() as batches:
+            for action in self._actions[:]:
+                log.info("executing action: %s", action)
+                if dry_run:
+                    continue
 
-                for device in devices:
-                    # make sure we catch any renumbering parted does
-                    if device.exists and isinstance(device, PartitionDevice):
-                        # also update existence for partitions on unsupported disklabels
-                        if not device.disklabel_supported and \
-                           action.is_destroy and action.is_format and action.device == device.disk:
-                            device.exists = False
-                            continue
-
-                        device.update_name()
-                        device.format.device = device.path
-
-                self._completed_actions.append(self._actions.pop(0))
+                with blivet_lock:
+                    batches.next(action)
+                    self._execute_action(action, callbacks=callbacks, devices=devices)
+                    self._completed_actions.append(self._actions.pop(0))
 
         self._post_process(devices=devices)
@@ -39,9 +39,11 @@ from .deviceaction import ActionDestroyFormat, ActionResizeDevice, ActionResizeF
 from .devicelibs.edd import get_edd_dict
 from .devicelibs.btrfs import MAIN_VOLUME_ID
 from .devicelibs.crypto import LUKS_METADATA_SIZE
+from .commands import command_stats
 from .errors import StorageError
 from .size import Size
 from .devicetree import DeviceTree
+from .snapshot import DeviceTreeSnapshot
 from .formats import get_default_filesystem_type
 from .flags import flags
 from .platform import platform as _platform
@@ -52,6 +54,7 @@ from .iscsi import iscsi
 from .fcoe import fcoe
 from .zfcp import zfcp
 from . import devicefactory
+from . import udev
 from . import get_bootloader, get_sysroot, short_product_name, __version__
 from .threads import SynchronizedMeta
 from .static_data import luks_data
@@ -90,6 +93,10 @@ class StorageDiscoveryConfig(object):
         self.disk_images = {}
         self.zero_mbr = False
 
+        # path of the on-disk cache of device probe results, see
+        # blivet.populator.cache
+        self.populate_cache = None
+
         # Whether clear_partitions removes scheduled/non-existent devices and
         # disklabels depends on this flag.
         self.clear_non_existent = False
@@ -112,6 +119,8 @@ class StorageDiscoveryConfig(object):
 class Blivet(object, metaclass=SynchronizedMeta):
 
     """ Top-level class for managing storage configuration. """
+    # property getters that modify the instance
+    _exclusive_methods = ["next_id", "bootloader", "free_space_snapshot"]
 
     def __init__(self, ksdata=None):
         """
@@ -151,16 +160,28 @@ class Blivet(object, metaclass=SynchronizedMeta):
         self.services = set()
         self._free_space_snapshot = None
 
-    def do_it(self, callbacks=None):
+    def do_it(self, callbacks=None, max_workers=None):
         """
         Commit queued changes to disk.
 
         :param callbacks: callbacks to be invoked when actions are executed
         :type callbacks: return value of the :func:`~.callbacks.create_new_callbacks_register`
+        :keyword max_workers: maximum number of threads used to execute
+                              independent actions concurrently (default: 1)
+        :type max_workers: int or None
 
         """
-
-        self.devicetree.actions.process(callbacks=callbacks, devices=self.devices)
+        udev.settle_stats.reset()
+        command_stats.reset()
+        try:
+            self._do_it(callbacks=callbacks, max_workers=max_workers)
+        finally:
+            log.info("udev: %s", udev.settle_stats)
+            log.info("external programs: %s", command_stats)
+
+    def _do_it(self, callbacks=None, max_workers=None):
+        self.devicetree.actions.process(callbacks=callbacks, devices=self.devices,
+                                        max_workers=max_workers)
         if not flags.installer_mode:
             return
 
@@ -287,6 +308,37 @@ class Blivet(object, metaclass=SynchronizedMeta):
 
         self.update_bootloader_disk_list()
 
+    def refresh(self, disks):
+        """ Scan some disks again without resetting the whole configuration.
+
+            :param disks: the disks to scan; names of disks that are not
+                          known yet (eg: hot-added ones) are accepted
+            :type disks: list of :class:`~.devices.StorageDevice` or str
+
+            Unlike :meth:`reset`, this does not start iscsi, fcoe or zfcp
+            and does not look for existing installations again. Pending
+            actions are kept, except for the ones on the scanned disks.
+
+            See :meth:`devicetree.DeviceTree.rescan` for more information.
+        """
+        log.info("refreshing %s", [getattr(d, "name", d) for d in disks])
+        self.devicetree.rescan(disks)
+
+        # the existing installations may refer to devices that were replaced
+        devices = set(self.devices)
+
+        def current(device):
+            if device in devices:
+                return device
+            return self.devicetree.get_device_by_name(device.name)
+
+        for root in self.roots:
+            mounts = ((mountpoint, current(d)) for (mountpoint, d) in root.mounts.items())
+            root.mounts = dict((mountpoint, d) for (mountpoint, d) in mounts if d)
+            root.swaps = [d for d in (current(s) for s in root.swaps) if d]
+
+        self.update_bootloader_disk_list()
+
     @property
     def unused_devices(self):
         used_devices = []
@@ -315,9 +367,7 @@ class Blivet(object, metaclass=SynchronizedMeta):
     @property
     def devices(self):
         """ A list of all the devices in the device tree. """
-        devices = self.devicetree.devices
-        devices.sort(key=lambda d: d.name)
-        return devices
+        return self.devicetree.get_devices(sort=True)
 
     @property
     def disks(self):
@@ -330,12 +380,11 @@ class Blivet(object, metaclass=SynchronizedMeta):
             system's disks.
         """
         disks = []
-        for device in self.devicetree.devices:
-            if device.is_disk:
-                if not device.media_present:
-                    log.info("Skipping disk: %s: No media present", device.name)
-                    continue
-                disks.append(device)
+        for device in self.devicetree.disks:
+            if not device.media_present:
+                log.info("Skipping disk: %s: No media present", device.name)
+                continue
+            disks.append(device)
         disks.sort(key=self.compare_disks_key)
         return disks
 
@@ -374,9 +423,7 @@ class Blivet(object, metaclass=SynchronizedMeta):
             does not necessarily reflect the actual on-disk state of the
             system's disks.
         """
-        partitions = [d for d in self.devices if isinstance(d, PartitionDevice)]
-        partitions.sort(key=lambda d: d.name)
-        return partitions
+        return self.devicetree.get_devices("partitions", sort=True)
 
     @property
     def vgs(self):
@@ -386,9 +433,7 @@ class Blivet(object, metaclass=SynchronizedMeta):
             does not necessarily reflect the actual on-disk state of the
             system's disks.
         """
-        vgs = [d for d in self.devices if d.type == "lvmvg"]
-        vgs.sort(key=lambda d: d.name)
-        return vgs
+        return self.devicetree.get_devices("vgs", sort=True)
 
     @property
     def lvs(self):
@@ -398,8 +443,7 @@ class Blivet(object, metaclass=SynchronizedMeta):
             does not necessarily reflect the actual on-disk state of the
             system's disks.
         """
-        lvs = (d for d in self.devices if d.type in ("lvmlv", "lvmthinpool", "lvmthinlv"))
-        return sorted(lvs, key=lambda d: d.name)
+        return self.devicetree.get_devices("lvs", sort=True)
 
     @property
     def thinlvs(self):
@@ -409,9 +453,7 @@ class Blivet(object, metaclass=SynchronizedMeta):
             does not necessarily reflect the actual on-disk state of the
             system's disks.
         """
-        thin = [d for d in self.devices if d.type == "lvmthinlv"]
-        thin.sort(key=lambda d: d.name)
-        return thin
+        return [d for d in self.lvs if d.type == "lvmthinlv"]
 
     @property
     def thinpools(self):
@@ -421,9 +463,7 @@ class Blivet(object, metaclass=SynchronizedMeta):
             does not necessarily reflect the actual on-disk state of the
             system's disks.
         """
-        pools = [d for d in self.devices if d.type == "lvmthinpool"]
-        pools.sort(key=lambda d: d.name)
-        return pools
+        return [d for d in self.lvs if d.type == "lvmthinpool"]
 
     @property
     def pvs(self):
@@ -1716,6 +1756,18 @@ class Blivet(object, metaclass=SynchronizedMeta):
         factory.configure()
         return factory.device
 
+    def snapshot(self):
+        """ Save the state of the device tree, action list and roots.
+
+            :returns: a snapshot whose :meth:`~.DeviceTreeSnapshot.restore`
+                      method rolls this instance back to its current state
+            :rtype: :class:`~.snapshot.DeviceTreeSnapshot`
+
+            This is much cheaper than :meth:`copy` but, unlike a copy, the
+            snapshot cannot be used as an independent model.
+        """
+        return DeviceTreeSnapshot(self.devicetree, roots=self.roots)
+
     def copy(self):
         log.debug("starting Blivet copy")
         new = copy.deepcopy(self)
@@ -0,0 +1,380 @@
+# commands.py
+# Execution of external programs.
+#
+# Copyright (C) 2016  Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU Lesser General Public License v.2, or (at your option) any later
+# version. This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY expressed or implied, including the implied
+# warranties of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See
+# the GNU Lesser General Public License for more details.  You should have
+# received a copy of the GNU Lesser General Public License along with this
+# program; if not, write to the Free Software Foundation, Inc., 51 Franklin
+# Street, Fifth Floor, Boston, MA 02110-1301, USA.  Any Red Hat trademarks
+# that are incorporated in the source code or documentation are not subject
+# to the GNU Lesser General Public License and may only be used or
+# replicated with the express permission of Red Hat, Inc.
+#
+
+""" Run external programs, one at a time or several at once.
+
+    :func:`run_command` runs a program and waits for it to finish.
+    :func:`run_commands` runs several programs concurrently from a pool of
+    threads and :func:`async_run_command` and :func:`async_run_commands` do
+    the same from an :mod:`asyncio` event loop.
+
+    The program log lock is only held while writing to the program log, never
+    while a program is running, so programs started from different threads
+    do not wait for each other. The number of runs and the time spent in
+    each program are recorded in :data:`command_stats`.
+"""
+
+import asyncio
+import itertools
+import os
+import selectors
+import subprocess
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+from . import util
+from .errors import CommandTimeoutError
+from .threads import lock_released
+
+import logging
+program_log = logging.getLogger("program")
+
+CommandResult = namedtuple("CommandResult", ["argv", "returncode", "out", "err", "elapsed"])
+""" Outcome of a program run.
+
+    ``out`` and ``err`` hold the program's standard output and error output,
+    as str unless binary output was requested. ``err`` is None if it was
+    merged into ``out``. ``elapsed`` is the wall time in seconds.
+"""
+
+_READ_SIZE = 65536
+
+# numbers identifying the runs in the program log, whose records for
+# concurrent runs are interleaved
+_run_ids = itertools.count(1)
+
+
+class CommandStats(object):
+    """ Count and wall time of program runs, by program. """
+    def __init__(self):
+        self._lock = Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.programs = {}
+            """ program name -> [count, seconds] """
+
+            self.timeouts = 0
+            """ number of programs killed because they ran too long """
+
+    def add(self, argv, elapsed, timed_out=False):
+        with self._lock:
+            entry = self.programs.setdefault(os.path.basename(argv[0]), [0, 0.0])
+            entry[0] += 1
+            entry[1] += elapsed
+            if timed_out:
+                self.timeouts += 1
+
+    @property
+    def count(self):
+        return sum(c for (c, _t) in self.programs.values())
+
+    @property
+    def time(self):
+        return sum(t for (_c, t) in self.programs.values())
+
+    def __str__(self):
+        programs = ", ".join("%s: %d in %.3fs" % (name, c, t)
+                             for (name, (c, t)) in sorted(self.programs.items(), key=lambda i: -i[1][1]))
+        return ("%d programs in %.3fs (%d timed out); by program: %s" %
+                (self.count, self.time, self.timeouts, programs))
+
+command_stats = CommandStats()
+""" statistics for all program runs, reset by :meth:`~.Blivet.do_it` """
+
+
+def _popen_kwargs(root, stdin, env_prune, stderr_to_stdout):
+    def chroot():
+        if root and root != '/':
+            os.chroot(root)
+
+    env = os.environ.copy()
+    env.update({"LC_ALL": "C",
+                "INSTALL_PATH": root})
+    for var in env_prune or []:
+        env.pop(var, None)
+
+    return dict(stdin=stdin,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT if stderr_to_stdout else subprocess.PIPE,
+                close_fds=True,
+                preexec_fn=chroot, cwd=root, env=env)
+
+
+def _log_start(argv):
+    """ Log the start of a program run.
+
+        :returns: the run's name in the program log, eg: "lvs (run 3)"
+        :rtype: str
+    """
+    run_id = next(_run_ids)
+    with util.program_log_lock:
+        program_log.info("Running... %s (run %d)", " ".join(argv), run_id)
+
+    return "%s (run %d)" % (argv[0], run_id)
+
+
+def _log_result(run, returncode, out, err, stderr_to_stdout, binary_output):
+    # format the output first so the lock is only held for a few calls
+    records = []
+    for (name, data) in (("stdout", out), ("stderr", err)):
+        if not data:
+            continue
+
+        text = data.decode("utf-8", "replace") if binary_output else data
+        lines = "\n".join(text.splitlines())
+        if stderr_to_stdout:
+            records.append("%s output:\n%s" % (run, lines))
+        else:
+            records.append("%s %s:\n%s" % (run, name, lines))
+
+    with util.program_log_lock:
+        for record in records:
+            program_log.info("%s", record)
+        program_log.debug("Return code of %s: %d", run, returncode)
+
+
+def _log_error(run, e):
+    with util.program_log_lock:
+        program_log.error("Error running %s: %s", run, e.strerror)
+
+
+def _decode(data, binary_output, errors="strict"):
+    if data is None or binary_output:
+        return data
+    return data.decode("utf-8", errors)
+
+
+class _LineSplitter(object):
+    """ Pass complete lines of a stream's output to a callback. """
+    def __init__(self, name, callback):
+        self.name = name
+        self.callback = callback
+        self._partial = b""
+
+    def feed(self, data):
+        lines = (self._partial + data).split(b"\n")
+        self._partial = lines.pop()
+        for line in lines:
+            self.callback(self.name, line.decode("utf-8", "replace"))
+
+    def close(self):
+        if self._partial:
+            self.callback(self.name, self._partial.decode("utf-8", "replace"))
+            self._partial = b""
+
+
+def _communicate(proc, timeout, line_callback):
+    """ Read a process' output until it exits.
+
+        :returns: (stdout, stderr), stderr is None if it was not captured
+        :raises: :class:`subprocess.TimeoutExpired` if the process did not
+                 exit within timeout seconds
+    """
+    if line_callback is None:
+        return proc.communicate(timeout=timeout)
+
+    deadline = None if timeout is None else time.monotonic() + timeout
+
+    def remaining():
+        if deadline is None:
+            return None
+
+        left = deadline - time.monotonic()
+        if left <= 0:
+            raise subprocess.TimeoutExpired(proc.args, timeout)
+        return left
+
+    streams = {proc.stdout: ("stdout", [])}
+    if proc.stderr is not None:
+        streams[proc.stderr] = ("stderr", [])
+
+    splitters = dict((stream, _LineSplitter(name, line_callback))
+                     for (stream, (name, _chunks)) in streams.items())
+
+    with selectors.DefaultSelector() as selector:
+        for stream in streams:
+            selector.register(stream, selectors.EVENT_READ)
+
+        while selector.get_map():
+            for (key, _events) in selector.select(remaining()):
+                data = os.read(key.fd, _READ_SIZE)
+                if not data:
+                    selector.unregister(key.fileobj)
+                    splitters[key.fileobj].close()
+                    continue
+
+                streams[key.fileobj][1].append(data)
+                splitters[key.fileobj].feed(data)
+
+    for stream in streams:
+        stream.close()
+
+    proc.wait(timeout=remaining())
+    out = b"".join(streams[proc.stdout][1])
+    err = b"".join(streams[proc.stderr][1]) if proc.stderr is not None else None
+    return (out, err)
+
+
+def run_command(argv, root='/', stdin=None, env_prune=None, stderr_to_stdout=False,
+                binary_output=False, timeout=None, line_callback=None):
+    """ Run a program and wait for it to finish.
+
+        :param argv: the program and its arguments
+        :type argv: list of str
+        :keyword str root: directory to chroot to before running the program
+        :keyword stdin: file to use as the program's standard input
+        :keyword env_prune: environment variables to remove for the program
+        :type env_prune: list of str
+        :keyword bool stderr_to_stdout: merge the error output into the output
+        :keyword bool binary_output: return the output as bytes
+        :keyword timeout: seconds after which the program is killed
+        :type timeout: float or None
+        :keyword line_callback: function called with the stream name
+                                ("stdout" or "stderr") and each line of
+                                output as soon as the program writes it
+        :returns: the outcome of the run
+        :rtype: :class:`CommandResult`
+        :raises: :class:`OSError` if the program cannot be started,
+                 :class:`~.errors.CommandTimeoutError` if it was killed
+
+        If the calling thread holds the global lock and allows it (see
+        :func:`~.threads.allow_lock_release`), the lock is released while
+        the program runs.
+    """
+    run = _log_start(argv)
+    kwargs = _popen_kwargs(root, stdin, env_prune, stderr_to_stdout)
+
+    start = time.time()
+    try:
+        with lock_released():
+            proc = subprocess.Popen(argv, **kwargs)
+            try:
+                (out, err) = _communicate(proc, timeout, line_callback)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.communicate()
+                elapsed = time.time() - start
+                command_stats.add(argv, elapsed, timed_out=True)
+                with util.program_log_lock:
+                    program_log.error("%s killed after %.1fs", run, elapsed)
+                raise CommandTimeoutError("%s did not finish within %s seconds" % (argv[0], timeout))
+    except OSError as e:
+        _log_error(run, e)
+        raise
+
+    elapsed = time.time() - start
+    command_stats.add(argv, elapsed)
+
+    out = _decode(out, binary_output)
+    # like before, bytes that are not valid UTF-8 on stderr are not an error
+    err = _decode(err, binary_output, errors="replace")
+    _log_result(run, proc.returncode, out, err, stderr_to_stdout, binary_output)
+    return CommandResult(argv, proc.returncode, out, err, elapsed)
+
+
+def run_commands(argvs, max_workers=None, **kwargs):
+    """ Run several programs concurrently.
+
+        :param argvs: programs to run, each with its arguments
+        :type argvs: list of list of str
+        :keyword max_workers: maximum number of programs running at a time
+                              (default: all of them)
+        :type max_workers: int or None
+        :returns: the outcomes, in the order of argvs
+        :rtype: list of :class:`CommandResult`
+
+        Other keyword arguments are passed to :func:`run_command`. If any
+        program fails to start or times out the first such error is raised
+        once all programs have finished.
+    """
+    if not argvs:
+        return []
+
+    with ThreadPoolExecutor(max_workers=max_workers or len(argvs)) as executor:
+        futures = [executor.submit(run_command, argv, **kwargs) for argv in argvs]
+
+    return [f.result() for f in futures]
+
+
+async def async_run_command(argv, root='/', stdin=None, env_prune=None, stderr_to_stdout=False,
+                            binary_output=False, timeout=None):
+    """ Run a program from an event loop.
+
+        This is the coroutine counterpart of :func:`run_command`, which see
+        for the arguments, return value and exceptions.
+    """
+    run = _log_start(argv)
+    kwargs = _popen_kwargs(root, stdin, env_prune, stderr_to_stdout)
+
+    start = time.time()
+    try:
+        proc = await asyncio.create_subprocess_exec(*argv, **kwargs)
+    except OSError as e:
+        _log_error(run, e)
+        raise
+
+    try:
+        (out, err) = await asyncio.wait_for(proc.communicate(), timeout)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        elapsed = time.time() - start
+        command_stats.add(argv, elapsed, timed_out=True)
+        with util.program_log_lock:
+            program_log.error("%s killed after %.1fs", run, elapsed)
+        raise CommandTimeoutError("%s did not finish within %s seconds" % (argv[0], timeout))
+
+    elapsed = time.time() - start
+    command_stats.add(argv, elapsed)
+
+    out = _decode(out, binary_output)
+    # like before, bytes that are not valid UTF-8 on stderr are not an error
+    err = _decode(err, binary_output, errors="replace")
+    _log_result(run, proc.returncode, out, err, stderr_to_stdout, binary_output)
+    return CommandResult(argv, proc.returncode, out, err, elapsed)
+
+
+async def async_run_commands(argvs, max_concurrent=None, **kwargs):
+    """ Run several programs concurrently from an event loop.
+
+        :param argvs: programs to run, each with its arguments
+        :type argvs: list of list of str
+        :keyword max_concurrent: maximum number of programs running at a
+                                 time (default: all of them)
+        :type max_concurrent: int or None
+        :returns: the outcomes, in the order of argvs
+        :rtype: list of :class:`CommandResult`
+
+        Other keyword arguments are passed to :func:`async_run_command`.
+    """
+    if not max_concurrent:
+        return await asyncio.gather(*(async_run_command(argv, **kwargs) for argv in argvs))
+
+    semaphore = asyncio.Semaphore(max_concurrent)
+
+    async def run(argv):
+        async with semaphore:
+            return await async_run_command(argv, **kwargs)
+
+    return await asyncio.gather(*(run(argv) for argv in argvs))
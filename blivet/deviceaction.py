@@ -25,6 +25,7 @@ from . import udev
 from .util import get_current_entropy
 from .devices import StorageDevice
 from .devices import PartitionDevice, LVMLogicalVolumeDevice
+from .devicelibs import wipe
 from .formats import get_format, luks
 from parted import partitionFlag, PARTITION_LBA
 from .i18n import _, N_
@@ -693,7 +694,8 @@ class ActionDestroyFormat(DeviceAction):
         status = self.device.status
         self.device.setup(orig=True)
         self.format.destroy()
-        udev.settle()
+        # deferred while the action list executes several of these in a row
+        wipe.settle()
         if not status:
             self.device.teardown()
 
@@ -390,7 +390,7 @@ class DeviceFactory(object):
 
     def _get_free_disk_space(self):
         free_info = self.storage.get_free_space(disks=self.disks)
-        return sum(d[0] for d in free_info.values())
+        return Size(sum(int(d[0]) for d in free_info.values()))
 
     def _normalize_size(self):
         if self.size is None:
@@ -880,6 +880,14 @@ class DeviceFactory(object):
     # methods for error recovery
     #
     def _save_devicetree(self):
+        try:
+            self.__snapshot = self.storage.snapshot()
+            return
+        except Exception as e:  # pylint: disable=broad-except
+            # fall back to saving a full copy of the model
+            log.info("failed to take a devicetree snapshot: %s", e)
+            self.__snapshot = None
+
         _blivet_copy = self.storage.copy()
         self.__devices = _blivet_copy.devicetree._devices
         self.__actions = _blivet_copy.devicetree._actions
@@ -887,6 +895,10 @@ class DeviceFactory(object):
         self.__roots = _blivet_copy.roots
 
     def _revert_devicetree(self):
+        if self.__snapshot is not None:
+            self.__snapshot.restore()
+            return
+
         self.storage.devicetree._devices = self.__devices
         self.storage.devicetree._actions = self.__actions
         self.storage.devicetree.names = self.__names
@@ -1248,7 +1260,7 @@ class LVMFactory(DeviceFactory):
         if self.container_size == SIZE_POLICY_AUTO:
             # automatic container size management
             if self.container:
-                space += sum([p.size for p in self.container.parents])
+                space += Size(sum(int(p.size) for p in self.container.parents))
                 space -= self.container.free_space
                 # we need to account for the LVM metadata being placed somewhere
                 space += self.container.lvm_metadata_space
@@ -1259,7 +1271,7 @@ class LVMFactory(DeviceFactory):
         elif self.container_size == SIZE_POLICY_MAX:
             # grow the container as large as possible
             if self.container:
-                space += sum(p.size for p in self.container.parents)
+                space += Size(sum(int(p.size) for p in self.container.parents))
                 log.debug("size bumped to %s to include container parents", space)
 
             space += self._get_free_disk_space()
@@ -1717,7 +1729,7 @@ class BTRFSFactory(DeviceFactory):
                     # For new subvols the size is in addition to the volume's size.
                     size += self.container.size
                 else:
-                    size += sum((s.req_size for s in self.container.subvolumes), Size(0))
+                    size += Size(sum(int(s.req_size) for s in self.container.subvolumes))
 
             size += self._get_device_space()
         elif self.container_size == SIZE_POLICY_MAX:
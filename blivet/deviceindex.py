@@ -0,0 +1,300 @@
+# deviceindex.py
+# Secondary indexes for device lookups in the device tree.
+#
+# Copyright (C) 2016  Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU Lesser General Public License v.2, or (at your option) any later
+# version. This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY expressed or implied, including the implied
+# warranties of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See
+# the GNU Lesser General Public License for more details.  You should have
+# received a copy of the GNU Lesser General Public License along with this
+# program; if not, write to the Free Software Foundation, Inc., 51 Franklin
+# Street, Fifth Floor, Boston, MA 02110-1301, USA.  Any Red Hat trademarks
+# that are incorporated in the source code or documentation are not subject
+# to the GNU Lesser General Public License and may only be used or
+# replicated with the express permission of Red Hat, Inc.
+#
+
+import itertools
+import weakref
+from threading import Lock
+
+import logging
+log = logging.getLogger("blivet")
+
+# All live indexes. Devices and formats do not know which tree(s) they belong
+# to, so change notifications are broadcast to every index and ignored by the
+# ones that do not contain the changed object.
+_indexes = weakref.WeakSet()
+
+
+def device_changed(device):
+    """ Notify all indexes that a device's indexed attributes have changed.
+
+        :param device: the device whose name, path, uuid, format or sysfs path
+                       may have changed
+        :type device: :class:`~.devices.Device`
+    """
+    for index in list(_indexes):
+        index.update(device)
+
+
+def format_changed(fmt):
+    """ Notify all indexes that a format's indexed attributes have changed.
+
+        :param fmt: the format whose uuid or label may have changed
+        :type fmt: :class:`~.formats.DeviceFormat`
+    """
+    for index in list(_indexes):
+        index.update_format(fmt)
+
+
+class IndexedAttribute(object):
+    """ Instance attribute whose assignment updates the device indexes.
+
+        The descriptor only implements __set__, so reading the attribute is a
+        plain instance dict lookup. The attribute must be assigned in the
+        owning class' constructor before it is read.
+    """
+    def __init__(self, name, notify):
+        """
+            :param str name: the attribute name
+            :param notify: callable taking the changed object
+        """
+        self._attr = name
+        self._notify = notify
+
+    def __set__(self, obj, value):
+        obj.__dict__[self._attr] = value
+        self._notify(obj)
+
+
+def _device_keys(device):
+    """ Return a list of (attribute, key) pairs to index a device under. """
+    keys = [("id", device.id), ("name", device.name), ("path", device.path)]
+    sysfs_path = getattr(device, "sysfs_path", None)
+    if sysfs_path:
+        keys.append(("sysfs_path", sysfs_path))
+
+    uuid = getattr(device, "uuid", None)
+    if uuid:
+        keys.append(("uuid", uuid))
+        keys.append(("device_uuid", uuid))
+
+    fmt = getattr(device, "format", None)
+    if fmt is not None:
+        fmt_uuid = getattr(fmt, "uuid", None)
+        if fmt_uuid:
+            keys.append(("uuid", fmt_uuid))
+
+        label = getattr(fmt, "label", None)
+        if label:
+            keys.append(("label", label))
+
+    return keys
+
+
+class _IndexEntry(object):
+    __slots__ = ["seq", "hidden", "keys", "fmt"]
+
+    def __init__(self, seq, hidden, keys, fmt):
+        self.seq = seq
+        self.hidden = hidden
+        self.keys = keys
+        self.fmt = fmt
+
+
+class DeviceIndex(object):
+    """ Hash maps from device attributes to the devices in a device tree.
+
+        The index mirrors the tree's device list and hidden device list. Each
+        device is indexed under its id, name, path, sysfs path, uuid, format
+        uuid and format label. Devices are also assigned a sequence number
+        reflecting their position in the tree's lists, which lets lookups
+        preserve the order-based semantics of the original linear searches.
+
+        :attr:`version` changes whenever the indexed devices or any of their
+        indexed attributes change, so it can be used to invalidate views of
+        the tree built by the caller. :attr:`duplicate_uuids` contains the
+        device (not format) uuids shared by more than one indexed device.
+
+        The tree is responsible for calling :meth:`add` and :meth:`remove` as
+        it changes its lists. Changes to the attributes of indexed devices are
+        picked up via :func:`device_changed` and :func:`format_changed`.
+    """
+    attrs = ("id", "name", "path", "sysfs_path", "uuid", "device_uuid", "label")
+
+    def __init__(self):
+        self._maps = dict((attr, {}) for attr in self.attrs)
+        self._entries = {}
+        self._formats = {}
+        self._seq = itertools.count()
+
+        self.version = 0
+        self.duplicate_uuids = set()
+
+        self._devices = None
+        self._hidden = None
+        self._n_hidden = 0
+
+        # lookups can run concurrently (see threads.SharedLock), so checking
+        # and rebuilding the index in sync() must be serialized
+        self._sync_lock = Lock()
+
+        _indexes.add(self)
+
+    def __deepcopy__(self, memo):
+        # The copy is rebuilt from the copied tree's lists on first use.
+        new = self.__class__()
+        memo[id(self)] = new
+        return new
+
+    def __contains__(self, device):
+        return device in self._entries
+
+    def sync(self, devices, hidden):
+        """ Make sure the index reflects the given device lists.
+
+            :param list devices: the tree's list of devices
+            :param list hidden: the tree's list of hidden devices
+
+            If the lists have been replaced or modified behind the index's back
+            the index is rebuilt from scratch.
+        """
+        with self._sync_lock:
+            if devices is self._devices and hidden is self._hidden and \
+               len(hidden) == self._n_hidden and \
+               len(devices) + len(hidden) == len(self._entries):
+                return
+
+            self.rebuild(devices, hidden)
+
+    def rebuild(self, devices, hidden):
+        """ Rebuild the index from the given device lists. """
+        for attr_map in self._maps.values():
+            attr_map.clear()
+        self._entries.clear()
+        self._formats.clear()
+        self.duplicate_uuids.clear()
+        self._n_hidden = 0
+        self.version += 1
+        self._devices = devices
+        self._hidden = hidden
+
+        for device in devices:
+            self._insert(device, False)
+
+        for device in hidden:
+            self._insert(device, True)
+
+    def add(self, device, hidden=False):
+        """ Add (or move) a device to the end of the visible or hidden list. """
+        if device in self._entries:
+            self._drop(device)
+
+        self._insert(device, hidden)
+
+    def remove(self, device):
+        """ Remove a device from the index. """
+        if device in self._entries:
+            self._drop(device)
+
+    def update(self, device):
+        """ Re-index a device and its descendants after attribute changes.
+
+            Descendants are included because some devices derive their names
+            from their parents' names (eg: LVs from their VG).
+        """
+        entry = self._entries.get(device)
+        if entry is None:
+            return
+
+        self._unmap(device, entry)
+        entry.keys = _device_keys(device)
+        entry.fmt = getattr(device, "format", None)
+        self._map(device, entry)
+        self.version += 1
+
+        for child in device.children:
+            self.update(child)
+
+    def update_format(self, fmt):
+        """ Re-index the device a format belongs to. """
+        device = self._formats.get(fmt)
+        if device is not None:
+            self.update(device)
+
+    def position(self, device):
+        """ Return a sort key reflecting a device's position in the tree.
+
+            Visible devices sort before hidden ones, and within each list
+            devices sort in the order they were appended.
+        """
+        entry = self._entries[device]
+        return (entry.hidden, entry.seq)
+
+    def lookup(self, attr, key):
+        """ Return the devices indexed under the given attribute value.
+
+            :param str attr: one of :attr:`attrs`
+            :param key: the attribute value
+            :returns: list of (device, hidden) pairs in tree order
+        """
+        devices = self._maps[attr].get(key)
+        if not devices:
+            return []
+
+        entries = self._entries
+        return [(d, entries[d].hidden) for d in sorted(devices, key=self.position)]
+
+    def _insert(self, device, hidden):
+        entry = _IndexEntry(next(self._seq), hidden, _device_keys(device),
+                            getattr(device, "format", None))
+        self._entries[device] = entry
+        if hidden:
+            self._n_hidden += 1
+        self._map(device, entry)
+        self.version += 1
+
+    def _drop(self, device):
+        entry = self._entries.pop(device)
+        if entry.hidden:
+            self._n_hidden -= 1
+        self._unmap(device, entry)
+        self.version += 1
+
+    def _map(self, device, entry):
+        for (attr, key) in entry.keys:
+            try:
+                devices = self._maps[attr].setdefault(key, set())
+            except TypeError:
+                # unhashable attribute value (eg: a mock in the test suite)
+                log.debug("cannot index %s by %s", device.name, attr)
+                continue
+
+            devices.add(device)
+            if attr == "device_uuid" and len(devices) > 1:
+                self.duplicate_uuids.add(key)
+
+        if entry.fmt is not None:
+            self._formats[entry.fmt] = device
+
+    def _unmap(self, device, entry):
+        for (attr, key) in entry.keys:
+            try:
+                devices = self._maps[attr].get(key)
+            except TypeError:
+                continue
+
+            if devices is not None:
+                devices.discard(device)
+                if not devices:
+                    del self._maps[attr][key]
+                if attr == "device_uuid" and len(devices) < 2:
+                    self.duplicate_uuids.discard(key)
+
+        if entry.fmt is not None and self._formats.get(entry.fmt) is device:
+            del self._formats[entry.fmt]
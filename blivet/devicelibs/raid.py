@@ -22,7 +22,12 @@
 #
 
 import abc
+from collections import OrderedDict, namedtuple
+from functools import partial
+from threading import Lock
+import types
 
+import six
 from six import add_metaclass
 
 from ..errors import RaidError
@@ -38,6 +43,153 @@ def div_up(a, b):
     return (a + (b - 1)) // b
 
 
+def superblock_key(func):
+    """ Return a key identifying the sizes a superblock size function returns.
+
+        :param func: a function that estimates the superblock size of an array
+        :returns: a hashable key that is the same for functions that always
+                  return the same superblock size for the same array size, or
+                  None if there is no such key for func
+        :rtype: object or NoneType
+
+        Functions without a closure are identified by their code and default
+        arguments, so a lambda gets the same key each time it is created.
+        Partial functions are identified by their function and arguments.
+        Bound methods are only identified if their object has a
+        ``superblock_size_key`` attribute describing the state the method
+        depends on. Other callables are identified by their identity.
+    """
+    try:
+        if isinstance(func, partial):
+            inner = superblock_key(func.func)
+            key = (inner, func.args, tuple(sorted(func.keywords.items())))
+            if inner is None:
+                return None
+        elif isinstance(func, types.MethodType):
+            inner = superblock_key(func.__func__)
+            state = getattr(func.__self__, "superblock_size_key", _no_key)
+            if inner is None or state is _no_key:
+                return None
+            key = (inner, state)
+        elif isinstance(func, types.FunctionType):
+            if func.__closure__:
+                return None
+            key = (func.__code__, func.__defaults__, func.__kwdefaults__ and
+                   tuple(sorted(func.__kwdefaults__.items())))
+        else:
+            key = func
+
+        hash(key)
+    except TypeError:
+        # unhashable arguments or state
+        return None
+
+    return key
+
+_no_key = object()
+
+
+def _cache_key(level, what, size, num_members, chunk_size, superblock_size_func):
+    """ Return the key of a size estimate in :data:`size_cache` or None. """
+    sizes = (size, chunk_size)
+    if not all(s is None or isinstance(s, six.integer_types + (Size,)) for s in sizes):
+        return None
+
+    func_key = superblock_key(superblock_size_func)
+    if func_key is None:
+        return None
+
+    return (level, what, int(size), num_members,
+            None if chunk_size is None else int(chunk_size), func_key)
+
+
+def _superblock_size(superblock_size_func, size, superblock_sizes=None):
+    """ Return a superblock size estimate in bytes.
+
+        :param superblock_sizes: earlier estimates by size in bytes, or None
+        :type superblock_sizes: dict
+    """
+    if superblock_sizes is None:
+        return int(superblock_size_func(size))
+
+    if int(size) not in superblock_sizes:
+        superblock_sizes[int(size)] = int(superblock_size_func(size))
+
+    return superblock_sizes[int(size)]
+
+
+SizeCacheInfo = namedtuple("SizeCacheInfo", ["hits", "misses", "bypassed", "maxsize", "currsize"])
+
+
+class SizeCache(object):
+    """ Class to be used as a singleton.
+        Keeps the most recently used size estimates of RAID levels.
+
+        :meth:`RAIDn.get_size` and :meth:`RAIDn.get_space` only depend on
+        their arguments, but are called over and over for the same arrays
+        and LVs, and the superblock size estimate may need a call into
+        libblockdev. Estimates whose superblock size function has no key
+        (see :func:`superblock_key`) bypass the cache.
+    """
+
+    def __init__(self, maxsize=1024):
+        """
+            :keyword int maxsize: the maximum number of estimates kept
+        """
+        self.maxsize = maxsize
+        self._lock = Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+    def get(self, key, estimate):
+        """ Return a cached estimate, computing it if needed.
+
+            :param key: the key of the estimate or None to bypass the cache
+            :param estimate: a function computing the estimate
+            :returns: the estimate
+        """
+        if key is None or self.maxsize <= 0:
+            with self._lock:
+                self.bypassed += 1
+            return estimate()
+
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+
+        value = estimate()
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = value
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+        return value
+
+    def info(self):
+        """ Return the statistics of this cache.
+
+            :rtype: :class:`SizeCacheInfo`
+        """
+        with self._lock:
+            return SizeCacheInfo(self.hits, self.misses, self.bypassed, self.maxsize,
+                                 len(self._entries))
+
+    def drop_cache(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self.bypassed = 0
+
+size_cache = SizeCache()
+
+
 @add_metaclass(abc.ABCMeta)
 class RAIDLevel(object):
 
@@ -190,7 +342,7 @@ class RAIDn(RAIDLevel):
         """
         if member_count < self.min_members:
             raise RaidError("%s requires at least %d disks" % (self.name, self.min_members))
-        if smallest_member_size < Size(0):
+        if smallest_member_size < 0:
             raise RaidError("size is a negative number")
         return self._get_net_array_size(member_count, smallest_member_size)
 
@@ -268,6 +420,8 @@ class RAIDn(RAIDLevel):
            Note that the number of members in the array may not be the same
            as the length of member_sizes if the array is still
            under construction.
+
+           The estimates are kept in :data:`size_cache`.
         """
         if not member_sizes:
             return Size(0)
@@ -275,16 +429,77 @@ class RAIDn(RAIDLevel):
         if num_members is None:
             num_members = len(member_sizes)
 
+        self._check_size_args(chunk_size, superblock_size_func)
+        # only the smallest member counts
+        return self._get_size(min(member_sizes), num_members, chunk_size, superblock_size_func)
+
+    def get_sizes(self, member_size_sets, num_members=None, chunk_size=None, superblock_size_func=None):
+        """Estimate the amount of data that can be stored on this array for
+           each of several candidate sets of members.
+
+           :param member_size_sets: the member sizes of each candidate set
+           :type member_size_sets: list of lists of :class:`~.size.Size`
+           :param int num_members: the number of members in the array, or
+              None for the number of members in each set
+           :param chunk_size: the smallest unit of size read or written
+           :type chunk_size: :class:`~.size.Size`
+           :param superblock_size_func: a function that estimates the
+              superblock size for this array
+           :type superblock_size_func: a function from :class:`~.size.Size` to
+              :class:`~.size.Size`
+           :returns: the estimate for each set, see :meth:`get_size`, or None
+              for sets this level can not be built from
+           :rtype: list of :class:`~.size.Size` or NoneType
+
+           The superblock size is only estimated once for each distinct
+           smallest member size that is not in :data:`size_cache`.
+        """
+        self._check_size_args(chunk_size, superblock_size_func)
+        superblock_sizes = {}
+        sizes = []
+        for member_sizes in member_size_sets:
+            if not member_sizes:
+                sizes.append(Size(0))
+                continue
+
+            try:
+                sizes.append(self._get_size(min(member_sizes),
+                                            len(member_sizes) if num_members is None else num_members,
+                                            chunk_size, superblock_size_func, superblock_sizes))
+            except RaidError:
+                sizes.append(None)
+
+        return sizes
+
+    def _check_size_args(self, chunk_size, superblock_size_func):
+        """Helper function; not to be called directly."""
         if chunk_size is None or chunk_size == Size(0):
             raise RaidError("chunk_size parameter value %s is not acceptable")
 
         if superblock_size_func is None:
             raise RaidError("superblock_size_func value of None is not acceptable")
 
-        min_size = min(member_sizes)
-        superblock_size = superblock_size_func(min_size)
+    def _get_size(self, min_size, num_members, chunk_size, superblock_size_func, superblock_sizes=None):
+        """Helper function; not to be called directly.
+
+           Estimates the size of an array from the size of its smallest
+           member, through :data:`size_cache`. Superblock size estimates are
+           kept in superblock_sizes, if given.
+        """
+        def estimate():
+            superblock_size = _superblock_size(superblock_size_func, min_size, superblock_sizes)
+            return self._get_array_size(int(min_size), num_members, int(chunk_size), superblock_size)
+
+        key = _cache_key(self, "size", min_size, num_members, chunk_size, superblock_size_func)
+        return size_cache.get(key, estimate)
+
+    def _get_array_size(self, min_size, num_members, chunk_size, superblock_size):
+        """Helper function; not to be called directly.
+
+           All sizes are byte counts.
+        """
         min_data_size = self._trim(min_size - superblock_size, chunk_size)
-        return self.get_net_array_size(num_members, min_data_size)
+        return Size(self.get_net_array_size(num_members, min_data_size))
 
     def get_space(self, size, num_members, chunk_size=None, superblock_size_func=None):
         """Estimate the amount of memory required by this array, including
@@ -301,15 +516,77 @@ class RAIDn(RAIDLevel):
               :class:`~.size.Size`
            :returns: an estimate of the memory required, including metadata
            :rtype: :class:`~.size.Size`
+
+           The estimates are kept in :data:`size_cache`.
         """
         if superblock_size_func is None:
             raise RaidError("superblock_size_func value of None is not acceptable")
 
-        size_per_member = self.get_base_member_size(size, num_members)
-        size_per_member += superblock_size_func(size)
+        return self._get_space(size, num_members, chunk_size, superblock_size_func)
+
+    def get_spaces(self, size, member_counts, chunk_size=None, superblock_size_func=None):
+        """Estimate the amount of memory required by this array, including
+           memory allocated for metadata, for each of several member counts.
+
+           :param size: the amount of data on this array
+           :type size: :class:`~.size.Size`
+           :param member_counts: the candidate numbers of members
+           :type member_counts: list of int
+           :param chunk_size: the smallest unit of size read or written
+           :type chunk_size: :class:`~.size.Size`
+           :param superblock_size_func: a function that estimates the
+              superblock size for this array
+           :type superblock_size_func: a function from :class:`~.size.Size` to
+              :class:`~.size.Size`
+           :returns: the estimate for each member count, see
+              :meth:`get_space`, or None for member counts this level can
+              not be built with
+           :rtype: list of :class:`~.size.Size` or NoneType
+
+           The superblock size is estimated at most once.
+        """
+        if superblock_size_func is None:
+            raise RaidError("superblock_size_func value of None is not acceptable")
+
+        if size < 0:
+            raise RaidError("size is a negative number")
+
+        superblock_sizes = {}
+        spaces = []
+        for num_members in member_counts:
+            try:
+                spaces.append(self._get_space(size, num_members, chunk_size, superblock_size_func,
+                                              superblock_sizes))
+            except RaidError:
+                spaces.append(None)
+
+        return spaces
+
+    def _get_space(self, size, num_members, chunk_size, superblock_size_func, superblock_sizes=None):
+        """Helper function; not to be called directly.
+
+           Estimates the space needed by an array through :data:`size_cache`.
+           Superblock size estimates are kept in superblock_sizes, if given.
+        """
+        def estimate():
+            # check the member count and the size before estimating the superblock
+            self.get_base_member_size(int(size), num_members)
+            return self._get_array_space(int(size), num_members,
+                                         None if chunk_size is None else int(chunk_size),
+                                         _superblock_size(superblock_size_func, size, superblock_sizes))
+
+        key = _cache_key(self, "space", size, num_members, chunk_size, superblock_size_func)
+        return size_cache.get(key, estimate)
+
+    def _get_array_space(self, size, num_members, chunk_size, superblock_size):
+        """Helper function; not to be called directly.
+
+           All sizes are byte counts, chunk_size may be None.
+        """
+        size_per_member = self.get_base_member_size(size, num_members) + superblock_size
         if chunk_size is not None:
             size_per_member = self._pad(size_per_member, chunk_size)
-        return size_per_member * num_members
+        return Size(size_per_member * num_members)
 
 
 class RAIDLevels(object):
@@ -607,7 +884,7 @@ class Container(RAIDLevel):
 
     def get_size(self, member_sizes, num_members=None, chunk_size=None, superblock_size_func=None):
         # pylint: disable=unused-argument
-        return sum(member_sizes, Size(0))
+        return Size(sum(int(s) for s in member_sizes))
 
 Container = Container()
 ALL_LEVELS.add_raid_level(Container)
@@ -649,9 +926,9 @@ class ErsatzRAID(RAIDLevel):
         if superblock_size_func is None:
             raise RaidError("superblock_size_func value of None is not acceptable")
 
-        total_space = sum(member_sizes, Size(0))
+        total_space = Size(sum(int(s) for s in member_sizes))
         superblock_size = superblock_size_func(total_space)
-        return total_space - len(member_sizes) * superblock_size
+        return Size(int(total_space) - len(member_sizes) * int(superblock_size))
 
 
 class Linear(ErsatzRAID):
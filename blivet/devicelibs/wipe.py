@@ -0,0 +1,313 @@
+#
+# wipe.py
+# Removal of metadata signatures from block devices
+#
+# Copyright (C) 2016  Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU Lesser General Public License v.2, or (at your option) any later
+# version. This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY expressed or implied, including the implied
+# warranties of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See
+# the GNU Lesser General Public License for more details.  You should have
+# received a copy of the GNU Lesser General Public License along with this
+# program; if not, write to the Free Software Foundation, Inc., 51 Franklin
+# Street, Fifth Floor, Boston, MA 02110-1301, USA.  Any Red Hat trademarks
+# that are incorporated in the source code or documentation are not subject
+# to the GNU Lesser General Public License and may only be used or
+# replicated with the express permission of Red Hat, Inc.
+#
+
+""" Wipe metadata from block devices without running external programs.
+
+    The signatures of the most common disklabels, containers and filesystems
+    are found at their fixed offsets and overwritten in place using direct
+    I/O, the same way ``wipefs -a`` erases them. Devices that udev reports
+    to contain anything else, or nothing at all, are passed to ``wipefs``.
+
+    Closing a block device that was written to makes udev re-examine it. Use
+    :func:`batch` to wait for udev only once after wiping several devices;
+    :func:`settle` waits for udev unless called from within such a block.
+"""
+
+import errno
+import fcntl
+import mmap
+import os
+import stat
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+
+from .. import udev
+from .. import util
+from ..errors import WipeError
+
+import logging
+log = logging.getLogger("blivet")
+
+BLOCK_SIZE = 4096
+""" unit of direct I/O; a multiple of the logical block size of any device """
+
+Signature = namedtuple("Signature", ["types", "magic", "offsets"])
+""" Magic bytes of a signature, the blkid type names it belongs to, and a
+    function returning the possible offsets of the magic on a device of a
+    given size in bytes.
+"""
+
+
+def _at(*offsets):
+    return lambda size: offsets
+
+
+def _md_offsets(size):
+    # superblock 1.1, 1.2, 1.0 and 0.90
+    offsets = [0, 4096]
+    if size >= 8192:
+        offsets.append((size - 8192) & ~4095)
+    if size >= 131072:
+        offsets.append((size & ~65535) - 65536)
+    return offsets
+
+
+def _gpt_offsets(size):
+    # primary and backup header, for 512 and 4096 byte sectors
+    return [512, 4096, size - 512, size - 4096]
+
+SIGNATURES = [
+    Signature(("dos", "gpt", "vfat"), b"\x55\xaa", _at(510)),
+    Signature(("gpt",), b"EFI PART", _gpt_offsets),
+    Signature(("LVM2_member",), b"LABELONE", _at(0, 512, 1024, 1536)),
+    Signature(("LVM2_member",), b"LVM2 001", _at(24, 536, 1048, 1560)),
+    Signature(("linux_raid_member",), b"\xfc\x4e\x2b\xa9", _md_offsets),
+    Signature(("linux_raid_member",), b"\xa9\x2b\x4e\xfc", _md_offsets),
+    Signature(("crypto_LUKS",), b"LUKS\xba\xbe", _at(0)),
+    Signature(("crypto_LUKS",), b"SKUL\xba\xbe",
+              _at(*(0x4000 << i for i in range(9)))),
+    Signature(("swap",), b"SWAPSPACE2", _at(*(p - 10 for p in (4096, 8192, 16384, 32768, 65536)))),
+    Signature(("swap",), b"SWAP-SPACE", _at(*(p - 10 for p in (4096, 8192, 16384, 32768, 65536)))),
+    Signature(("ext2", "ext3", "ext4", "ext4dev", "jbd"), b"\x53\xef", _at(1080)),
+    Signature(("xfs",), b"XFSB", _at(0)),
+    Signature(("btrfs",), b"_BHRfS_M", _at(65600)),
+    Signature(("vfat",), b"FAT12   ", _at(54)),
+    Signature(("vfat",), b"FAT16   ", _at(54)),
+    Signature(("vfat",), b"FAT32   ", _at(82)),
+    Signature(("iso9660",), b"CD001", _at(32769))
+]
+
+KNOWN_TYPES = frozenset(t for sig in SIGNATURES for t in sig.types)
+""" blkid type names of the signatures that can be wiped natively """
+
+PARTITION_TABLE_TYPES = frozenset(("dos", "gpt"))
+""" blkid type names of the partition tables among :data:`KNOWN_TYPES` """
+
+_BLKRRPART = 0x125f
+
+_state = threading.local()
+
+
+@contextmanager
+def batch():
+    """ Wait for udev once, after all the wiping done in this block.
+
+        Wiping functions called from the same thread within the block do
+        not settle udev themselves. Nested blocks settle at the outermost
+        one.
+    """
+    if getattr(_state, "seqnum", None) is not None:
+        yield
+        return
+
+    _state.seqnum = udev.uevent_seqnum() or 0
+    try:
+        yield
+    finally:
+        seqnum = _state.seqnum
+        _state.seqnum = None
+        udev.settle(seqnum=seqnum or None)
+
+
+def settle(seqnum=None):
+    """ Wait for udev to process the uevents caused by wiping a device.
+
+        :keyword int seqnum: uevent sequence number from before the wipe
+
+        Nothing is done within a :func:`batch` block, which settles once at
+        its end.
+    """
+    if getattr(_state, "seqnum", None) is None:
+        udev.settle(seqnum=seqnum)
+
+
+def _open(path):
+    """ Open a device for direct I/O, or for buffered I/O if it does not
+        support direct I/O (eg: an image file on tmpfs).
+    """
+    try:
+        return os.open(path, os.O_RDWR | os.O_DIRECT)
+    except OSError as e:
+        if e.errno != errno.EINVAL:
+            raise
+        return os.open(path, os.O_RDWR)
+
+
+def find_signatures(fd, size):
+    """ Find the known signatures on an open device.
+
+        :param int fd: file descriptor of the device
+        :param int size: size of the device in bytes
+        :returns: offsets of the magic bytes found, by block offset
+        :rtype: dict of int -> list of (offset, length)
+    """
+    found = {}
+    blocks = {}
+    buf = mmap.mmap(-1, BLOCK_SIZE)
+    for sig in SIGNATURES:
+        for offset in sig.offsets(size):
+            if offset < 0 or offset + len(sig.magic) > size:
+                continue
+
+            block = offset - offset % BLOCK_SIZE
+            if block not in blocks:
+                length = min(BLOCK_SIZE, size - block)
+                n = os.preadv(fd, [buf], block)
+                blocks[block] = buf[:min(n, length)]
+
+            data = blocks[block]
+            start = offset - block
+            if data[start:start + len(sig.magic)] == sig.magic:
+                found.setdefault(block, []).append((start, len(sig.magic)))
+
+    buf.close()
+    return found
+
+
+def _erase(fd, size, found):
+    buf = mmap.mmap(-1, BLOCK_SIZE)
+    try:
+        for (block, magics) in sorted(found.items()):
+            length = min(BLOCK_SIZE, size - block)
+            os.preadv(fd, [buf], block)
+            for (start, magic_len) in magics:
+                buf[start:start + magic_len] = bytes(magic_len)
+            if os.pwritev(fd, [memoryview(buf)[:length]], block) != length:
+                raise WipeError("short write at offset %d" % block)
+        os.fsync(fd)
+    finally:
+        buf.close()
+
+
+def _udev_types(path):
+    """ Return the signature types udev reports for a device, or None. """
+    try:
+        info = udev.get_device(util.get_sysfs_path_by_name(os.path.realpath(path)))
+    except RuntimeError:
+        return None
+
+    if info is None:
+        return None
+
+    return set(t for t in (udev.device_get_format(info), udev.device_get_disklabel_type(info)) if t)
+
+
+def _is_whole_disk(fd):
+    st = os.fstat(fd)
+    if not stat.S_ISBLK(st.st_mode):
+        return False
+
+    return not os.path.exists("/sys/dev/block/%d:%d/partition" % (os.major(st.st_rdev),
+                                                                  os.minor(st.st_rdev)))
+
+
+def _reread_partitions(fd, path):
+    """ Make the kernel drop the partitions of a disk whose partition table
+        was erased, like wipefs does.
+    """
+    try:
+        fcntl.ioctl(fd, _BLKRRPART)
+    except OSError as e:
+        log.warning("failed to re-read the partition table of %s: %s", path, e.strerror)
+
+
+def _wipefs(path):
+    try:
+        rc = util.run_program(["wipefs", "-f", "-a", path])
+    except OSError as e:
+        raise WipeError("error running wipefs on %s: %s" % (path, e))
+
+    if rc:
+        raise WipeError("wipefs failed on %s: %d" % (path, rc))
+
+
+def wipe_signatures(path):
+    """ Remove all metadata signatures from a device.
+
+        :param str path: the device node
+        :returns: whether the signatures were wiped without running wipefs
+        :rtype: bool
+        :raises: :class:`~.errors.WipeError` on failure
+
+        The native wipe is only used for devices udev knows about and
+        reports at least one signature on, all of them of types in
+        :data:`KNOWN_TYPES`. Everything else is wiped with ``wipefs``.
+    """
+    types = _udev_types(path)
+    if not types or not types <= KNOWN_TYPES:
+        log.debug("wiping %s using wipefs (signatures: %s)", path, types)
+        _wipefs(path)
+        return False
+
+    try:
+        fd = _open(path)
+    except OSError as e:
+        raise WipeError("cannot open %s: %s" % (path, e.strerror))
+
+    try:
+        size = os.lseek(fd, 0, os.SEEK_END)
+        found = find_signatures(fd, size)
+        _erase(fd, size, found)
+        if found and types & PARTITION_TABLE_TYPES and _is_whole_disk(fd):
+            _reread_partitions(fd, path)
+    except OSError as e:
+        raise WipeError("error wiping %s: %s" % (path, e.strerror))
+    finally:
+        os.close(fd)
+
+    log.debug("wiped %d signatures from %s", sum(len(m) for m in found.values()), path)
+    return True
+
+
+def zero_range(path, offset, length):
+    """ Overwrite a range of a device with zeros.
+
+        :param str path: the device node
+        :param int offset: start of the range in bytes, a multiple of
+                           :data:`BLOCK_SIZE` or of the device's sector size
+        :param int length: length of the range in bytes, a multiple of the
+                           device's sector size
+        :raises: :class:`~.errors.WipeError` on failure
+    """
+    seqnum = udev.uevent_seqnum()
+    try:
+        fd = _open(path)
+    except OSError as e:
+        raise WipeError("cannot open %s: %s" % (path, e.strerror))
+
+    buf = mmap.mmap(-1, min(length, 1024 * 1024) or BLOCK_SIZE)
+    try:
+        end = offset + length
+        while offset < end:
+            n = min(len(buf), end - offset)
+            os.pwritev(fd, [memoryview(buf)[:n]], offset)
+            offset += n
+        os.fsync(fd)
+    except OSError as e:
+        raise WipeError("error zeroing %s: %s" % (path, e.strerror))
+    finally:
+        buf.close()
+        os.close(fd)
+        # If a udev device is created with the watch option, then
+        # a change uevent is synthesized and we need to wait for
+        # things to settle.
+        settle(seqnum)
@@ -161,6 +161,7 @@ class BTRFSVolumeDevice(BTRFSDevice, ContainerDevice, RaidDevice):
     vol_id = btrfs.MAIN_VOLUME_ID
     _format_class_name = property(lambda s: "btrfs")
     _format_uuid_attr = property(lambda s: "vol_uuid")
+    _exclusive_methods = ["_get_default_subvolume_id"]
 
     def __init__(self, *args, **kwargs):
         """
@@ -23,6 +23,7 @@
 import pprint
 
 from .. import util
+from ..deviceindex import device_changed
 from ..storage_log import log_method_call
 from ..threads import SynchronizedMeta
 
@@ -69,6 +70,8 @@ class Device(util.ObjectID, metaclass=SynchronizedMeta):
 
     _type = "device"
     _packages = []
+    # packages extends the class's package list in place
+    _exclusive_methods = ["packages"]
 
     def __init__(self, name, parents=None):
         """
@@ -260,8 +263,12 @@ class Device(util.ObjectID, metaclass=SynchronizedMeta):
             raise ValueError("%s is not a valid name for this device" % value)
         self._name = value
 
+    def _set_name_and_notify(self, value):
+        self._set_name(value)
+        device_changed(self)
+
     name = property(lambda s: s._get_name(),
-                    lambda s, v: s._set_name(v),
+                    lambda s, v: s._set_name_and_notify(v),
                     doc="This device's name")
 
     @property
@@ -115,10 +115,9 @@ def device_name_to_disk_by_path(device_name=None):
         return ""
 
     ret = None
-    for dev in udev.get_devices():
-        if udev.device_get_name(dev) == device_name:
-            ret = udev.device_get_by_path(dev)
-            break
+    dev = udev.get_snapshot().get("name", device_name)
+    if dev is not None:
+        ret = udev.device_get_by_path(dev)
 
     if ret:
         return ret
@@ -25,8 +25,9 @@ import pprint
 import re
 import os
 import time
-from collections import namedtuple
+from collections import Counter, namedtuple
 from functools import wraps
+from itertools import chain
 from enum import Enum
 
 import gi
@@ -39,9 +40,11 @@ from ..devicelibs import lvm
 
 from .. import errors
 from .. import util
+from ..flags import flags
+from ..deviceindex import device_changed
 from ..storage_log import log_method_call
 from .. import udev
-from ..size import Size, KiB, MiB, ROUND_UP, ROUND_DOWN
+from ..size import Size, KiB, MiB, ROUND_UP, ROUND_DOWN, round_bytes
 from ..tasks import availability
 
 import logging
@@ -72,6 +75,136 @@ class NotTypeSpecific(Exception):
     pass
 
 
+class VGSpaceLedger(object):
+    """ Cached space accounting of a volume group.
+
+        The usable space of the VG's PVs and the space used by each of its
+        LVs are kept as integer numbers of bytes together with their totals,
+        so that the VG's size and free space can be read without going over
+        all of its LVs. The VG tells the ledger about added and removed LVs
+        and the LVs tell it when their space usage may have changed (see
+        :meth:`LVMLogicalVolumeBase._vg_space_changed`). Changed LVs are
+        recomputed the next time the totals are read.
+
+        PV sizes are changed from too many places (partition allocation,
+        population, ...) to be tracked, so the PV part is revalidated on
+        every read by comparing the PVs' sizes and PE starts, which is cheap
+        compared to going over the LVs.
+
+        The space used by existing cached LVs is never cached because the
+        size of their cache is read from the active device.
+    """
+
+    def __init__(self):
+        self._pv_key = None
+        self._pv_usable = {}
+        self._pv_size = 0
+        self._usable = 0
+
+        self._pe_size = None
+        self._lvs = {}
+        self._pending = {}
+        self._volatile = {}
+        self._entries = {}
+        self._used = 0
+        self._md_sizes = Counter()
+
+    def add(self, lv):
+        """ Start accounting for an LV added to the VG. """
+        self._lvs[lv.id] = lv
+        self._pending[lv.id] = lv
+        lv._space_ledger = self   # pylint: disable=protected-access
+
+    def remove(self, lv):
+        """ Stop accounting for an LV removed from the VG. """
+        self._lvs.pop(lv.id, None)
+        self._pending.pop(lv.id, None)
+        self._volatile.pop(lv.id, None)
+        self._forget(lv.id)
+        lv._space_ledger = None   # pylint: disable=protected-access
+
+    def changed(self, lv):
+        """ Recompute the space used by an LV on the next read. """
+        if lv.id in self._lvs:
+            self._pending[lv.id] = lv
+
+    def _forget(self, lv_id):
+        entry = self._entries.pop(lv_id, None)
+        if entry is None:
+            return
+
+        (used, md_size) = entry
+        self._used -= used
+        self._md_sizes[md_size] -= 1
+        if not self._md_sizes[md_size]:
+            del self._md_sizes[md_size]
+
+    @staticmethod
+    def _md_size(lv):
+        md_size = lv.metadata_size
+        if lv.cached:
+            md_size = max(md_size, lv.cache.md_size)
+        return int(md_size)
+
+    def _update_lvs(self, vg):
+        if self._pe_size is None or vg.pe_size != self._pe_size:
+            # everything is aligned to the extent size
+            self._pe_size = vg.pe_size
+            self._pending.update(self._lvs)
+
+        while self._pending:
+            (lv_id, lv) = next(iter(self._pending.items()))
+            volatile = lv.exists and lv.cached
+            if not volatile:
+                entry = (int(lv.vg_space_used), self._md_size(lv))
+
+            del self._pending[lv_id]
+            self._forget(lv_id)
+            self._volatile.pop(lv_id, None)
+            if volatile:
+                self._volatile[lv_id] = lv
+            else:
+                self._entries[lv_id] = entry
+                self._used += entry[0]
+                self._md_sizes[entry[1]] += 1
+
+    def _update_pvs(self, vg):
+        key = (vg.pe_size, [(pv.id, pv.size, pv.format.pe_start) for pv in vg.parents])
+        if key == self._pv_key:
+            return
+
+        # pylint: disable=protected-access
+        self._pv_usable = dict((pv.id, int(vg._get_pv_usable_space(pv))) for pv in vg.parents)
+        self._pv_size = sum(int(pv.size) for pv in vg.parents)
+        self._usable = sum(self._pv_usable.values())
+        self._pv_key = key
+
+    def pv_size(self, vg):
+        """ Total size of the VG's PVs in bytes """
+        self._update_pvs(vg)
+        return self._pv_size
+
+    def usable_space(self, vg):
+        """ Usable space of the VG's PVs in bytes """
+        self._update_pvs(vg)
+        return self._usable
+
+    def pv_usable_space(self, vg):
+        """ Usable space of each of the VG's PVs in bytes, by PV id """
+        self._update_pvs(vg)
+        return self._pv_usable
+
+    def used_space(self, vg):
+        """ Space used by the VG's LVs in bytes """
+        self._update_lvs(vg)
+        return self._used + sum(int(lv.vg_space_used) for lv in self._volatile.values())
+
+    def md_size(self, vg):
+        """ Size of the biggest metadata LV of the VG's LVs in bytes """
+        self._update_lvs(vg)
+        return max(chain(self._md_sizes, (self._md_size(lv) for lv in self._volatile.values()), [0]))
+
+
 class LVMVolumeGroupDevice(ContainerDevice):
 
     """ An LVM Volume Group """
@@ -81,6 +214,11 @@ class LVMVolumeGroupDevice(ContainerDevice):
     _format_uuid_attr = property(lambda s: "vg_uuid")
     _format_immutable = True
 
+    # these read through the space ledger, which updates itself
+    _exclusive_methods = ["lvm_metadata_space", "size", "extents", "free_space",
+                          "free_extents", "pv_free_info", "reserved_space",
+                          "pmspare_size"]
+
     @staticmethod
     def get_supported_pe_sizes():
         return [Size(pe_size) for pe_size in blockdev.lvm.get_supported_pe_sizes()]
@@ -118,6 +256,7 @@ class LVMVolumeGroupDevice(ContainerDevice):
         # These attributes are used by _add_parent, so they must be initialized
         # prior to instantiating the superclass.
         self._lvs = []
+        self._space = VGSpaceLedger()
         self.has_duplicate = False
         self._complete = False  # have we found all of this VG's PVs?
         self.pv_count = util.numeric_type(pv_count)
@@ -294,6 +433,7 @@ class LVMVolumeGroupDevice(ContainerDevice):
 
         log.debug("Adding %s/%s to %s", lv.name, lv.size, self.name)
         self._lvs.append(lv)
+        self._space.add(lv)
 
         # snapshot accounting
         origin = getattr(lv, "origin", None)
@@ -321,6 +461,7 @@ class LVMVolumeGroupDevice(ContainerDevice):
             raise ValueError("specified lv is not part of this vg")
 
         self._lvs.remove(lv)
+        self._space.remove(lv)
 
         # snapshot accounting
         origin = getattr(lv, "origin", None)
@@ -393,6 +534,13 @@ class LVMVolumeGroupDevice(ContainerDevice):
     @property
     def lvm_metadata_space(self):
         """ The amount of the space LVM metadata cost us in this VG's PVs """
+        diff = Size(self._space.pv_size(self) - self._space.usable_space(self))
+        if flags.debug_lvm_space:
+            self._check_space("metadata space", diff, self._compute_lvm_metadata_space())
+
+        return diff
+
+    def _compute_lvm_metadata_space(self):
         # NOTE: we either specify data alignment in a PV or the default is used
         #       which is both handled by pv.format.pe_start, but LVM takes into
         #       account also the underlying block device which means that e.g.
@@ -412,19 +560,31 @@ class LVMVolumeGroupDevice(ContainerDevice):
     def size(self):
         """ The size of this VG """
         # TODO: just ask lvm if isModified returns False
+        size = Size(self._space.usable_space(self))
+        if flags.debug_lvm_space:
+            self._check_space("size", size, self._compute_size())
+
+        return size
 
+    def _compute_size(self):
         # sum up the sizes of the PVs, subtract the unusable (meta data) space
         size = sum(pv.size for pv in self.pvs)
-        size -= self.lvm_metadata_space
+        size -= self._compute_lvm_metadata_space()
 
         return size
 
+    def _check_space(self, what, value, expected):
+        """ Compare a value from the space ledger with its full recomputation. """
+        if value != expected:
+            raise errors.DeviceError("space accounting out of date: %s is %s instead of %s" %
+                                     (what, value, expected), self.name)
+
     @property
     def extents(self):
         """ Number of extents in this VG """
         # TODO: just ask lvm if is_modified returns False
 
-        return int(self.size / self.pe_size)
+        return int(self.size) // int(self.pe_size)
 
     @property
     def free_space(self):
@@ -433,9 +593,11 @@ class LVMVolumeGroupDevice(ContainerDevice):
 
         # total the sizes of any LVs
         log.debug("%s size is %s", self.name, self.size)
-        used = sum((lv.vg_space_used for lv in self.lvs), Size(0))
-        used += self.reserved_space
-        free = self.size - used
+        used = self._space.used_space(self)
+        if flags.debug_lvm_space:
+            self._check_space("used space", Size(used), sum((lv.vg_space_used for lv in self.lvs), Size(0)))
+
+        free = Size(int(self.size) - used - int(self.reserved_space))
         log.debug("vg %s has %s free", self.name, free)
         return free
 
@@ -443,7 +605,9 @@ class LVMVolumeGroupDevice(ContainerDevice):
     def free_extents(self):
         """ The number of free extents in this VG. """
         # TODO: just ask lvm if is_modified returns False
-        return int(self.free_space / self.pe_size)
+        free = int(self.free_space)
+        pe_size = int(self.pe_size)
+        return free // pe_size if free >= 0 else -(-free // pe_size)
 
     @property
     def pv_free_info(self):
@@ -452,13 +616,18 @@ class LVMVolumeGroupDevice(ContainerDevice):
         :rtype: list of PVFreeInfo
 
         """
-        return [PVFreeInfo(pv, self._get_pv_usable_space(pv), pv.format.free)
-                for pv in self.pvs]
+        usable = self._space.pv_usable_space(self)
+        info = [PVFreeInfo(pv, Size(usable[pv.id]), pv.format.free) for pv in self.pvs]
+        if flags.debug_lvm_space:
+            for (pv, size, _free) in info:
+                self._check_space("usable space of %s" % pv.name, size, self._get_pv_usable_space(pv))
+
+        return info
 
     def align(self, size, roundup=False):
         """ Align a size to a multiple of physical extent size. """
         size = util.numeric_type(size)
-        return size.round_to_nearest(self.pe_size, rounding=ROUND_UP if roundup else ROUND_DOWN)
+        return Size(round_bytes(size, self.pe_size, rounding=ROUND_UP if roundup else ROUND_DOWN))
 
     @property
     def pvs(self):
@@ -490,6 +659,13 @@ class LVMVolumeGroupDevice(ContainerDevice):
 
         """
         # TODO: report correctly/better for existing VGs
+        md_size = Size(self._space.md_size(self))
+        if flags.debug_lvm_space:
+            self._check_space("pmspare size", md_size, self._compute_pmspare_size())
+
+        return md_size
+
+    def _compute_pmspare_size(self):
         # gather metadata sizes for all LVs including their potential caches
         md_sizes = set((Size(0),))
         for lv in self.lvs:
@@ -570,6 +746,10 @@ class LVMLogicalVolumeBase(DMDevice, RaidDevice):
     _type = "lvmlv"
     _packages = ["lvm2"]
     _external_dependencies = [availability.BLOCKDEV_LVM_PLUGIN]
+    _exclusive_methods = ["cache"]
+
+    # set by the VG's space ledger when this LV is added to the VG
+    _space_ledger = None
 
     def __init__(self, name, parents=None, size=None, uuid=None, seg_type=None,
                  fmt=None, exists=False, sysfs_path='', grow=None, maxsize=None,
@@ -657,6 +837,34 @@ class LVMLogicalVolumeBase(DMDevice, RaidDevice):
         for spec in self._pv_specs:
             spec.size = self._raid_level.get_base_member_size(self.size + self._metadata_size, len(self._pv_specs))
 
+    def _vg_space_changed(self):
+        """ Tell the VG that the space used by this LV may have changed. """
+        # pylint: disable=protected-access
+        lv = self
+        while getattr(lv, "_parent_lv", None) is not None:
+            lv = lv._parent_lv
+
+        if lv._space_ledger is not None:
+            lv._space_ledger.changed(lv)
+
+    def _get_exists(self):
+        return self._exists
+
+    def _set_exists(self, exists):
+        self._exists = exists
+        self._vg_space_changed()
+
+    exists = property(_get_exists, _set_exists,
+                      doc="Whether this LV exists (affects its space accounting)")
+
+    def _set_size(self, newsize):
+        super(LVMLogicalVolumeBase, self)._set_size(newsize)
+        self._vg_space_changed()
+
+    def update_size(self, newsize=None):
+        super(LVMLogicalVolumeBase, self).update_size(newsize=newsize)
+        self._vg_space_changed()
+
     @property
     def members(self):
         return self.vg.pvs
@@ -919,10 +1127,12 @@ class LVMLogicalVolumeBase(DMDevice, RaidDevice):
     def add_internal_lv(self, int_lv):
         if int_lv not in self._internal_lvs:
             self._internal_lvs.append(int_lv)
+            self._vg_space_changed()
 
     def remove_internal_lv(self, int_lv):
         if int_lv in self._internal_lvs:
             self._internal_lvs.remove(int_lv)
+            self._vg_space_changed()
         else:
             msg = "the specified internal LV '%s' doesn't belong to this LV ('%s')" % (int_lv.lv_name,
                                                                                        self.name)
@@ -1124,6 +1334,7 @@ class LVMInternalLogicalVolumeMixin(object):
         if not self.takes_extra_space:
             if size <= self.parent_lv.size:  # pylint: disable=no-member
                 self._size = size  # pylint: disable=attribute-defined-outside-init
+                self._vg_space_changed()  # pylint: disable=no-member
             else:
                 raise ValueError("Internal LV cannot be bigger than its parent LV")
         else:
@@ -1285,6 +1496,7 @@ class LVMSnapshotMixin(object):
             fmt.device = self.path
 
         self._format = fmt  # pylint: disable=attribute-defined-outside-init
+        device_changed(self)
 
     def _set_format(self, fmt):  # pylint: disable=unused-argument
         # If a snapshot exists it can have a format that is distinct from its
@@ -2025,6 +2237,7 @@ class LVMLogicalVolumeDevice(LVMLogicalVolumeBase, LVMInternalLogicalVolumeMixin
             raise errors.DeviceError("Cannot attach a cache pool to the '%s' LV" % self.name)
         blockdev.lvm.cache_attach(self.vg.name, self.lvname, cache_pool_lv.lvname)
         self._cache = LVMCache(self, size=cache_pool_lv.size, exists=True)
+        self._vg_space_changed()
 
 
 class LVMCache(Cache):
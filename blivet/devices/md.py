@@ -50,6 +50,7 @@ MD_MAJORS = get_majors_by_device_type("md")
 class MDRaidArrayDevice(ContainerDevice, RaidDevice):
 
     """ An mdraid (Linux RAID) device. """
+    _exclusive_methods = ["status", "_get_spares"]
     _type = "mdarray"
     _packages = ["mdadm"]
     _dev_dir = "/dev/md"
@@ -216,6 +217,14 @@ class MDRaidArrayDevice(ContainerDevice, RaidDevice):
         return blockdev.md.get_superblock_size(raw_array_size,
                                                version=self.metadata_version)
 
+    @property
+    def superblock_size_key(self):
+        """ The state :meth:`get_superblock_size` depends on.
+
+            See :func:`~.devicelibs.raid.superblock_key`.
+        """
+        return self.metadata_version
+
     @property
     def size(self):
         """Returns the actual or estimated size depending on whether or
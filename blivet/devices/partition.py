@@ -35,6 +35,7 @@ from ..flags import flags
 from ..storage_log import log_method_call
 from .. import udev
 from ..formats import DeviceFormat, get_format
+from ..devicelibs import wipe
 from ..size import Size, MiB
 
 import logging
@@ -572,17 +573,10 @@ class PartitionDevice(StorageDevice):
         count = min(count, part_len)
 
         device = self.parted_partition.geometry.device.path
-        cmd = ["dd", "if=/dev/zero", "of=%s" % device, "bs=%d" % bs,
-               "seek=%d" % start, "count=%d" % count]
         try:
-            util.run_program(cmd)
-        except OSError as e:
+            wipe.zero_range(device, int(start * bs), int(count * bs))
+        except errors.WipeError as e:
             log.error(str(e))
-        finally:
-            # If a udev device is created with the watch option, then
-            # a change uevent is synthesized and we need to wait for
-            # things to settle.
-            udev.settle()
 
     def _create(self):
         """ Create the device. """
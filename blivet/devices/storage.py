@@ -26,6 +26,7 @@ import pyudev
 
 from .. import errors
 from .. import util
+from ..deviceindex import IndexedAttribute, device_changed
 from ..flags import flags
 from ..storage_log import log_method_call
 from .. import udev
@@ -61,6 +62,12 @@ class StorageDevice(Device):
     _encrypted = False
     _external_dependencies = []
 
+    # assignments to these update the devicetree's lookup indexes
+    uuid = IndexedAttribute("uuid", device_changed)
+    sysfs_path = IndexedAttribute("sysfs_path", device_changed)
+
+    _exclusive_methods = ["current_size", "packages"]
+
     def __init__(self, name, fmt=None, uuid=None,
                  size=None, major=None, minor=None,
                  sysfs_path='', parents=None, exists=False, serial=None,
@@ -141,6 +148,9 @@ class StorageDevice(Device):
 
         self.device_links = []
 
+        # uevent sequence number before the last setup, see udev.settle
+        self._setup_seqnum = None
+
         if self.exists:
             self.update_sysfs_path()
             if self.status:
@@ -369,12 +379,13 @@ class StorageDevice(Device):
         if not self._pre_setup(orig=orig):
             return
 
+        self._setup_seqnum = udev.uevent_seqnum()
         self._setup(orig=orig)
         self._post_setup()
 
     def _post_setup(self):
         """ Perform post-setup operations. """
-        udev.settle()
+        udev.settle(seqnum=self._setup_seqnum)
         self.update_sysfs_path()
         # the device may not be set up when we want information about it
         if self._size == Size(0):
@@ -747,8 +758,12 @@ class StorageDevice(Device):
         """
         return self._format
 
+    def _set_format_and_notify(self, fmt):
+        self._set_format(fmt)
+        device_changed(self)
+
     format = property(lambda d: d._get_format(),
-                      lambda d, f: d._set_format(f),
+                      lambda d, f: d._set_format_and_notify(f),
                       doc="The device's formatting.")
 
     def pre_commit_fixup(self):
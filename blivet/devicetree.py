@@ -23,6 +23,7 @@
 import os
 import pprint
 import re
+from threading import Lock
 
 import gi
 gi.require_version("BlockDev", "1.0")
@@ -32,6 +33,7 @@ from gi.repository import BlockDev as blockdev
 from .actionlist import ActionList
 from .errors import DeviceError, DeviceTreeError, StorageError
 from .deviceaction import ActionDestroyDevice, ActionDestroyFormat
+from .deviceindex import DeviceIndex
 from .devices import BTRFSDevice, NoDevice, PartitionDevice
 from .devices import LVMLogicalVolumeDevice, LVMVolumeGroupDevice
 from . import formats
@@ -49,6 +51,15 @@ log = logging.getLogger("blivet")
 
 _LVM_DEVICE_CLASSES = (LVMLogicalVolumeDevice, LVMVolumeGroupDevice)
 
+# typed views of the device list maintained by the tree
+_DEVICE_VIEWS = {"disks": lambda d: d.is_disk,
+                 "partitions": lambda d: isinstance(d, PartitionDevice),
+                 "vgs": lambda d: d.type == "lvmvg",
+                 "lvs": lambda d: d.type in ("lvmlv", "lvmthinpool", "lvmthinlv")}
+
+# protects the trees' cached views, which are built by concurrent readers
+_views_lock = Lock()
+
 
 class DeviceTreeBase(object, metaclass=SynchronizedMeta):
     """ A quasi-tree that represents the devices in the system.
@@ -69,6 +80,10 @@ class DeviceTreeBase(object, metaclass=SynchronizedMeta):
         :class:`~.deviceaction.DeviceAction` instances can only be registered
         for leaf devices, except for resize actions.
     """
+    # read-only methods, in addition to get_* (see SynchronizedMeta)
+    _shared_methods = ["__str__", "_check_duplicate_uuids", "_in_tree", "_lookup_devices",
+                       "_in_tree_order", "_filter_devices", "resolve_device"]
+
     def __init__(self, conf=None):
         """
             :keyword conf: storage discovery configuration
@@ -88,6 +103,13 @@ class DeviceTreeBase(object, metaclass=SynchronizedMeta):
 
         self._hidden = []
 
+        # secondary indexes used by the get_device_by_* methods
+        self._index = DeviceIndex()
+
+        # cached device lists, valid as long as the index version is unchanged
+        self._views = {}
+        self._views_version = None
+
         lvm.lvm_cc_resetFilter()
 
         self.exclusive_disks = getattr(conf, "exclusive_disks", [])
@@ -118,21 +140,88 @@ class DeviceTreeBase(object, metaclass=SynchronizedMeta):
     #
     # Device list
     #
+    def _get_view(self, view=None, sort=False):
+        """ Return a cached list of devices in the tree.
+
+            :keyword str view: name of a typed view (see :data:`_DEVICE_VIEWS`)
+                               or None for all devices
+            :keyword bool sort: whether the list should be sorted by name
+            :returns: the cached list, including incomplete devices
+            :rtype: list of :class:`~.devices.Device`
+
+            The cached lists are thrown away whenever a device is added to or
+            removed from the tree or an indexed attribute of a device changes.
+            The returned list must not be modified.
+        """
+        self._index.sync(self._devices, self._hidden)
+        # readers only hold the global lock in shared mode
+        with _views_lock:
+            if self._views_version != self._index.version:
+                self._views = {}
+                self._views_version = self._index.version
+
+            devices = self._views.get((view, sort))
+            if devices is None:
+                devices = self._views.get((view, False))
+                if devices is None:
+                    if view is None:
+                        devices = self._devices[:]
+                    else:
+                        devices = [d for d in self._devices if _DEVICE_VIEWS[view](d)]
+
+                    self._views[(view, False)] = devices
+
+                if sort:
+                    devices = sorted(devices, key=lambda d: d.name)
+                    self._views[(view, sort)] = devices
+
+        return devices
+
+    def _check_duplicate_uuids(self):
+        """ Raise DeviceTreeError if two complete devices share a UUID. """
+        for uuid in self._index.duplicate_uuids:
+            devices = [d for (d, hidden) in self._index.lookup("device_uuid", uuid)
+                       if not hidden and getattr(d, "complete", True)]
+            if any(not isinstance(d, NoDevice) for d in devices[1:]):
+                raise DeviceTreeError("duplicate uuids in device tree")
+
+    def get_devices(self, view=None, sort=False):
+        """ Return a list of the complete devices currently in the tree.
+
+            :keyword str view: "disks", "partitions", "vgs", "lvs" or None
+                               for all devices
+            :keyword bool sort: sort the list by device name
+            :returns: a new list of devices
+            :rtype: list of :class:`~.devices.Device`
+        """
+        devices = self._get_view(view, sort=sort)
+        self._check_duplicate_uuids()
+        return [d for d in devices if getattr(d, "complete", True)]
+
     @property
     def devices(self):
         """ List of devices currently in the tree """
-        devices = []
-        for device in self._devices:
-            if not getattr(device, "complete", True):
-                continue
+        return self.get_devices()
 
-            if device.uuid and device.uuid in [d.uuid for d in devices] and \
-               not isinstance(device, NoDevice):
-                raise DeviceTreeError("duplicate uuids in device tree")
+    @property
+    def disks(self):
+        """ List of disks currently in the tree """
+        return self.get_devices("disks")
 
-            devices.append(device)
+    @property
+    def partitions(self):
+        """ List of partitions currently in the tree """
+        return self.get_devices("partitions")
 
-        return devices
+    @property
+    def vgs(self):
+        """ List of LVM volume groups currently in the tree """
+        return self.get_devices("vgs")
+
+    @property
+    def lvs(self):
+        """ List of LVM logical volumes currently in the tree """
+        return self.get_devices("lvs")
 
     def _add_device(self, newdev, new=True):
         """ Add a device to the tree.
@@ -143,17 +232,19 @@ class DeviceTreeBase(object, metaclass=SynchronizedMeta):
             Raise ValueError if the device's identifier is already
             in the list.
         """
-        if newdev.uuid and newdev.uuid in [d.uuid for d in self._devices] and \
-           not isinstance(newdev, NoDevice):
+        self._index.sync(self._devices, self._hidden)
+        if newdev.uuid and not isinstance(newdev, NoDevice) and \
+           any(not hidden for (_d, hidden) in self._index.lookup("device_uuid", newdev.uuid)):
             raise ValueError("device is already in tree")
 
         # make sure this device's parent devices are in the tree already
         for parent in newdev.parents:
-            if parent not in self._devices:
+            if not self._in_tree(parent):
                 raise DeviceTreeError("parent device not in tree")
 
         newdev.add_hook(new=new)
         self._devices.append(newdev)
+        self._index.add(newdev)
 
         # don't include "req%d" partition names
         if ((newdev.type != "partition" or
@@ -180,7 +271,7 @@ class DeviceTreeBase(object, metaclass=SynchronizedMeta):
 
                 Only leaves may be removed.
         """
-        if dev not in self._devices:
+        if not self._in_tree(dev):
             raise ValueError("Device '%s' not in tree" % dev.name)
 
         if not dev.isleaf and not force:
@@ -204,6 +295,7 @@ class DeviceTreeBase(object, metaclass=SynchronizedMeta):
                         device.update_name()
 
         self._devices.remove(dev)
+        self._index.remove(dev)
         record_change(DeviceRemoved(device=dev))
         log.info("removed %s %s (id %d) from device tree", dev.type,
                  dev.name,
@@ -321,12 +413,19 @@ class DeviceTreeBase(object, metaclass=SynchronizedMeta):
     #
     # Device control
     #
-    def teardown_all(self):
-        """ Run teardown methods on all devices. """
+    def teardown_all(self, disks=None):
+        """ Run teardown methods on all devices.
+
+            :keyword disks: only tear down the devices on these disks
+            :type disks: list of :class:`~.devices.StorageDevice`
+        """
         for device in self.leaves:
             if device.protected:
                 continue
 
+            if disks is not None and not any(d in disks for d in device.ancestors):
+                continue
+
             try:
                 device.teardown(recursive=True)
             except (StorageError, blockdev.BlockDevError) as e:
@@ -429,6 +528,31 @@ class DeviceTreeBase(object, metaclass=SynchronizedMeta):
     #
     # Device search by property
     #
+    def _in_tree(self, device):
+        """ Return True if device is in the (non-hidden) device list. """
+        self._index.sync(self._devices, self._hidden)
+        return any(d is device and not hidden
+                   for (d, hidden) in self._index.lookup("id", device.id))
+
+    def _lookup_devices(self, attr, key, incomplete=False, hidden=False):
+        """ Return devices indexed under key in tree order.
+
+            :param str attr: indexed attribute (see :class:`~.deviceindex.DeviceIndex`)
+            :param key: the attribute value to look for
+            :param bool incomplete: include incomplete devices in result
+            :param bool hidden: include hidden devices in result
+            :returns: list of matching devices, hidden devices last
+            :rtype: list of :class:`~.devices.Device`
+        """
+        self._index.sync(self._devices, self._hidden)
+        return [d for (d, is_hidden) in self._index.lookup(attr, key)
+                if (hidden or not is_hidden) and
+                (incomplete or getattr(d, "complete", True))]
+
+    def _in_tree_order(self, devices):
+        """ Return the given indexed devices, without duplicates, in tree order. """
+        return sorted(set(devices), key=self._index.position)
+
     def _filter_devices(self, incomplete=False, hidden=False):
         """ Return list of devices modified according to parameters.
 
@@ -459,7 +583,7 @@ class DeviceTreeBase(object, metaclass=SynchronizedMeta):
         log_method_call(self, path=path, incomplete=incomplete, hidden=hidden)
         result = None
         if path:
-            devices = self._filter_devices(incomplete=incomplete, hidden=hidden)
+            devices = self._lookup_devices("sysfs_path", path, incomplete=incomplete, hidden=hidden)
             result = next((d for d in devices if d.sysfs_path == path), None)
         log_method_return(self, result)
         return result
@@ -476,7 +600,7 @@ class DeviceTreeBase(object, metaclass=SynchronizedMeta):
         log_method_call(self, uuid=uuid, incomplete=incomplete, hidden=hidden)
         result = None
         if uuid:
-            devices = self._filter_devices(incomplete=incomplete, hidden=hidden)
+            devices = self._lookup_devices("uuid", uuid, incomplete=incomplete, hidden=hidden)
             result = next((d for d in devices if d.uuid == uuid or d.format.uuid == uuid), None)
         log_method_return(self, result)
         return result
@@ -493,7 +617,7 @@ class DeviceTreeBase(object, metaclass=SynchronizedMeta):
         log_method_call(self, label=label, incomplete=incomplete, hidden=hidden)
         result = None
         if label:
-            devices = self._filter_devices(incomplete=incomplete, hidden=hidden)
+            devices = self._lookup_devices("label", label, incomplete=incomplete, hidden=hidden)
             result = next((d for d in devices if getattr(d.format, "label", None) == label), None)
         log_method_return(self, result)
         return result
@@ -510,9 +634,14 @@ class DeviceTreeBase(object, metaclass=SynchronizedMeta):
         log_method_call(self, name=name, incomplete=incomplete, hidden=hidden)
         result = None
         if name:
-            devices = self._filter_devices(incomplete=incomplete, hidden=hidden)
+            devices = self._lookup_devices("name", name, incomplete=incomplete, hidden=hidden)
+            lvm_name = name.replace("--", "-")
+            if lvm_name != name:
+                lvm_devices = self._lookup_devices("name", lvm_name, incomplete=incomplete, hidden=hidden)
+                devices = self._in_tree_order(devices + [d for d in lvm_devices
+                                                         if isinstance(d, _LVM_DEVICE_CLASSES)])
             result = next((d for d in devices if d.name == name or
-                           (isinstance(d, _LVM_DEVICE_CLASSES) and d.name == name.replace("--", "-"))),
+                           (isinstance(d, _LVM_DEVICE_CLASSES) and d.name == lvm_name)),
                           None)
         log_method_return(self, result)
         return result
@@ -532,13 +661,18 @@ class DeviceTreeBase(object, metaclass=SynchronizedMeta):
         log_method_call(self, path=path, incomplete=incomplete, hidden=hidden)
         result = None
         if path:
-            devices = self._filter_devices(incomplete=incomplete, hidden=hidden)
+            devices = self._lookup_devices("path", path, incomplete=incomplete, hidden=hidden)
+            lvm_path = path.replace("--", "-")
+            if lvm_path != path:
+                lvm_devices = self._lookup_devices("path", lvm_path, incomplete=incomplete, hidden=hidden)
+                devices = self._in_tree_order(devices + [d for d in lvm_devices
+                                                         if isinstance(d, _LVM_DEVICE_CLASSES)])
 
             # The usual order of the devices list is one where leaves are at
             # the end. So that the search can prefer leaves to interior nodes
             # the list that is searched is the reverse of the devices list.
-            result = next((d for d in reversed(list(devices)) if d.path == path or
-                           (isinstance(d, _LVM_DEVICE_CLASSES) and d.path == path.replace("--", "-"))),
+            result = next((d for d in reversed(devices) if d.path == path or
+                           (isinstance(d, _LVM_DEVICE_CLASSES) and d.path == lvm_path)),
                           None)
 
         log_method_return(self, result)
@@ -554,7 +688,7 @@ class DeviceTreeBase(object, metaclass=SynchronizedMeta):
             :rtype: :class:`~.devices.Device`
         """
         log_method_call(self, id_num=id_num, incomplete=incomplete, hidden=hidden)
-        devices = self._filter_devices(incomplete=incomplete, hidden=hidden)
+        devices = self._lookup_devices("id", id_num, incomplete=incomplete, hidden=hidden)
         result = next((d for d in devices if d.id == id_num), None)
         log_method_return(self, result)
         return result
@@ -829,6 +963,7 @@ class DeviceTreeBase(object, metaclass=SynchronizedMeta):
         self._remove_device(device, force=True, modparent=False)
 
         self._hidden.append(device)
+        self._index.add(device, hidden=True)
         lvm.lvm_cc_addFilterRejectRegexp(device.name)
 
         if device.name not in self.names:
@@ -857,6 +992,7 @@ class DeviceTreeBase(object, metaclass=SynchronizedMeta):
                          hidden.id)
                 self._hidden.remove(hidden)
                 self._devices.append(hidden)
+                self._index.add(hidden)
                 hidden.add_hook(new=False)
                 lvm.lvm_cc_removeFilterRejectRegexp(hidden.name)
 
@@ -240,6 +240,18 @@ class NotEnoughFreeSpaceError(StorageError):
 class UdevError(StorageError):
     pass
 
+# external programs
+
+
+class CommandTimeoutError(StorageError):
+    pass
+
+# signature wiping
+
+
+class WipeError(StorageError):
+    pass
+
 # fstab
 
 
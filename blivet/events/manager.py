@@ -21,8 +21,9 @@
 #
 
 import abc
+from collections import deque
 import inspect
-from threading import current_thread, RLock, Thread
+from threading import Condition, current_thread, RLock, Thread
 import pyudev
 import sys
 import time
@@ -37,6 +38,9 @@ from ..flags import flags
 import logging
 event_log = logging.getLogger("blivet.event")
 
+# seconds an idle event worker thread waits for new events before exiting
+_WORKER_IDLE_TIMEOUT = 10
+
 
 def validate_cb(cb, kwargs=None, arg_count=None):
     """ Validate signature of callback function, returning True on success. """
@@ -127,8 +131,44 @@ class EventMask(util.ObjectID):
 #
 # EventManager
 #
+class EventQueueStats(object):
+    """ Statistics about the event queue of an :class:`EventManager`. """
+    def __init__(self):
+        self.queued = 0
+        """ number of events queued for handling """
+
+        self.coalesced = 0
+        """ number of change events replaced by a later change event """
+
+        self.cancelled = 0
+        """ number of events dropped because an add was followed by a remove """
+
+        self.handled = 0
+        """ number of events the handler has been run for """
+
+        self.max_depth = 0
+        """ largest number of events pending at the same time """
+
+        self.total_latency = 0.0
+        """ sum of the times between the creation and handling of events """
+
+        self.max_latency = 0.0
+        """ longest time between the creation and handling of an event """
+
+    @property
+    def mean_latency(self):
+        """ average time between the creation and handling of an event """
+        return self.total_latency / self.handled if self.handled else 0.0
+
+    def __str__(self):
+        return ("queued: %d, coalesced: %d, cancelled: %d, handled: %d, max depth: %d, "
+                "mean latency: %.3fs, max latency: %.3fs" %
+                (self.queued, self.coalesced, self.cancelled, self.handled,
+                 self.max_depth, self.mean_latency, self.max_latency))
+
+
 class EventManager(object, metaclass=abc.ABCMeta):
-    def __init__(self, handler_cb=None, notify_cb=None, error_cb=None):
+    def __init__(self, handler_cb=None, notify_cb=None, error_cb=None, max_workers=4):
         self._handler_cb = None
         """ event handler (must accept 'event', 'notify_cb' kwargs """
 
@@ -153,6 +193,25 @@ class EventManager(object, metaclass=abc.ABCMeta):
         self._lock = RLock()
         """Re-entrant lock to serialize access to mask list."""
 
+        self.max_workers = max_workers
+        """Maximum number of threads running the event handler."""
+
+        self._queue_cond = Condition()
+        """Condition protecting the event queues and worker bookkeeping."""
+
+        self._queues = {}
+        """Pending events for each device, in order of arrival."""
+
+        self._ready = deque()
+        """Devices with pending events and no event currently being handled."""
+
+        self._active = set()
+        """Devices whose events are currently being handled."""
+
+        self._workers = 0
+        self._idle_workers = 0
+        self._stats = EventQueueStats()
+
     @property
     def handler_cb(self):
         """ the main event handler """
@@ -240,12 +299,28 @@ class EventManager(object, metaclass=abc.ABCMeta):
     def _create_event(self, *args, **kwargs):
         pass
 
+    @property
+    def queue_depth(self):
+        """ Number of events waiting to be handled. """
+        with self._queue_cond:
+            return sum(len(q) for q in self._queues.values())
+
+    @property
+    def stats(self):
+        """ Event queue statistics (:class:`EventQueueStats`). """
+        return self._stats
+
     def handle_event(self, *args, **kwargs):
         """ Handle an event by running the registered handler.
 
-            Currently the handler is run in a separate thread. This removes any
-            threading-related expectations about the behavior of whatever is
-            telling us about the events.
+            Events are queued per device and handled by a pool of at most
+            :attr:`max_workers` threads. This removes any threading-related
+            expectations about the behavior of whatever is telling us about
+            the events. Events on a given device are handled one at a time,
+            in the order they arrived. While they are waiting, a change event
+            replaces an earlier pending change event on the same device, and
+            a remove event cancels an earlier pending add event on the same
+            device (and any change events that followed the add).
 
             Unhandled exceptions in event handler threads present a bit of a
             challenge. Generally, an unhandled exception in an event handler
@@ -266,12 +341,97 @@ class EventManager(object, metaclass=abc.ABCMeta):
             event_log.debug("ignoring masked event %s", event)
             return
 
-        t = Thread(target=self._run_event_handler,
-                   name="event%d" % event.id,
-                   kwargs={"event": event},
+        self._queue_event(event)
+
+    def _queue_event(self, event):
+        """ Add an event to its device's queue and make sure it gets handled. """
+        with self._queue_cond:
+            queue = self._queues.setdefault(event.device, deque())
+            self._stats.queued += 1
+            if event.action == "change" and queue and queue[-1].action == "change":
+                event_log.debug("coalescing event %s into %s", queue[-1], event)
+                queue[-1] = event
+                self._stats.coalesced += 1
+                return
+
+            if event.action == "remove":
+                pending = [e.action for e in queue]
+                while pending and pending[-1] == "change":
+                    pending.pop()
+
+                if pending and pending[-1] == "add":
+                    # the device came and went before we handled the add
+                    dropped = [queue.pop() for _i in range(len(queue) - len(pending) + 1)]
+                    event_log.debug("event %s cancels %s", event,
+                                    ", ".join(str(e) for e in dropped))
+                    self._stats.cancelled += len(dropped) + 1
+                    if not queue and event.device not in self._active:
+                        del self._queues[event.device]
+                        self._ready.remove(event.device)
+                    return
+
+            queue.append(event)
+            depth = sum(len(q) for q in self._queues.values())
+            self._stats.max_depth = max(self._stats.max_depth, depth)
+            if len(queue) == 1 and event.device not in self._active:
+                self._ready.append(event.device)
+                self._queue_cond.notify()
+                if len(self._ready) > self._idle_workers and \
+                   self._workers < self.max_workers:
+                    self._start_worker()
+
+    def _start_worker(self):
+        self._workers += 1
+        t = Thread(target=self._event_worker,
+                   name="event-worker-%d" % self._workers,
                    daemon=True)
         t.start()
 
+    def _event_worker(self):
+        """ Handle queued events until there are none for a while. """
+        while True:
+            with self._queue_cond:
+                self._idle_workers += 1
+                while not self._ready:
+                    if not self._queue_cond.wait(timeout=_WORKER_IDLE_TIMEOUT) and \
+                       not self._ready:
+                        self._idle_workers -= 1
+                        self._workers -= 1
+                        return
+
+                self._idle_workers -= 1
+                device = self._ready.popleft()
+                event = self._queues[device].popleft()
+                self._active.add(device)
+
+            latency = time.time() - event.initialized
+            try:
+                self._run_event_handler(event)
+            finally:
+                with self._queue_cond:
+                    self._active.discard(device)
+                    if self._queues[device]:
+                        self._ready.append(device)
+                        self._queue_cond.notify()
+                    else:
+                        del self._queues[device]
+
+                    self._stats.handled += 1
+                    self._stats.total_latency += latency
+                    self._stats.max_latency = max(self._stats.max_latency, latency)
+                    self._queue_cond.notify_all()
+
+    def wait_for_events(self, timeout=None):
+        """ Wait until all queued events have been handled.
+
+            :keyword timeout: maximum number of seconds to wait (default: no limit)
+            :type timeout: float or None
+            :returns: True if there are no more events to handle
+            :rtype: bool
+        """
+        with self._queue_cond:
+            return self._queue_cond.wait_for(lambda: not self._queues, timeout=timeout)
+
     def _run_event_handler(self, event):
         """ Run the event handler and account for unhandled exceptions. """
         if self.handler_cb is None:
@@ -291,8 +451,8 @@ class EventManager(object, metaclass=abc.ABCMeta):
 
 
 class UdevEventManager(EventManager):
-    def __init__(self, handler_cb=None, notify_cb=None):
-        super().__init__(handler_cb=handler_cb, notify_cb=notify_cb)
+    def __init__(self, handler_cb=None, notify_cb=None, max_workers=4):
+        super().__init__(handler_cb=handler_cb, notify_cb=notify_cb, max_workers=max_workers)
         self._pyudev_observer = None
 
     @property
@@ -324,6 +484,11 @@ class UdevEventManager(EventManager):
     def __call__(self, *args, **kwargs):
         return self
 
+    def handle_event(self, *args, **kwargs):
+        # any block device uevent can change the udev database
+        udev.invalidate_snapshot()
+        super().handle_event(*args, **kwargs)
+
     def _create_event(self, *args, **kwargs):
         return Event(args[0].action, udev.device_get_name(args[0]), args[0])
 
@@ -79,6 +79,15 @@ class Flags(object):
         self.allow_imperfect_devices = True
         self.debug_threads = False
 
+        # set to True to check the cached space accounting of LVM VGs against
+        # a full recomputation whenever their size or free space is read
+        self.debug_lvm_space = False
+
+        # set to False to disable logging of method calls and return values
+        # (see storage_log.log_method_call), which is otherwise done whenever
+        # the blivet logger is enabled for debug messages
+        self.trace_method_calls = True
+
     def get_boot_cmdline(self):
         buf = open("/proc/cmdline").read().strip()
         args = shlex.split(buf)
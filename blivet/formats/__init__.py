@@ -30,10 +30,12 @@ import os
 import importlib
 
 from ..util import get_sysfs_path_by_name
-from ..util import run_program
+from ..devicelibs import wipe
 from ..util import ObjectID
+from ..deviceindex import IndexedAttribute, format_changed
+from ..static_data import fs_info
 from ..storage_log import log_method_call
-from ..errors import DeviceFormatError, FormatCreateError, FormatDestroyError, FormatSetupError
+from ..errors import DeviceFormatError, FormatCreateError, FormatDestroyError, FormatSetupError, WipeError
 from ..i18n import N_
 from ..size import Size, ROUND_DOWN, unit_str
 from ..threads import SynchronizedMeta
@@ -162,6 +164,10 @@ class DeviceFormat(ObjectID, metaclass=SynchronizedMeta):
     _info_class = fsinfo.UnimplementedFSInfo
     _minsize_class = fsminsize.UnimplementedFSMinSize
 
+    # assignments to these update the devicetree's lookup indexes
+    uuid = IndexedAttribute("uuid", format_changed)
+    _label = IndexedAttribute("_label", format_changed)
+
     def __init__(self, **kwargs):
         """
             :keyword device: The path to the device node.
@@ -431,6 +437,7 @@ class DeviceFormat(ObjectID, metaclass=SynchronizedMeta):
         # properly unmounted. After do_check the minimum size will be correct
         # so run the check one last time and bump up the size if it was too
         # small.
+        fs_info.drop(self.device)
         self.update_size_info()
 
         # Check again if resizable is True, as update_size_info() can change that
@@ -558,18 +565,10 @@ class DeviceFormat(ObjectID, metaclass=SynchronizedMeta):
             raise DeviceFormatError("device path does not exist or is not writable")
 
     def _destroy(self, **kwargs):
-        rc = 0
-        err = ""
         try:
-            rc = run_program(["wipefs", "-f", "-a", self.device])
-        except OSError as e:
-            err = str(e)
-        else:
-            if rc:
-                err = str(rc)
-
-        if err:
-            msg = "error wiping old signatures from %s: %s" % (self.device, err)
+            wipe.wipe_signatures(self.device)
+        except WipeError as e:
+            msg = "error wiping old signatures from %s: %s" % (self.device, e)
             raise FormatDestroyError(msg)
 
     def _post_destroy(self, **kwargs):
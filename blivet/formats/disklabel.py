@@ -34,6 +34,7 @@ from ..flags import flags
 from ..i18n import _, N_
 from . import DeviceFormat, register_device_format
 from ..size import Size
+from ..static_data import probe_data
 
 import logging
 log = logging.getLogger("blivet")
@@ -42,6 +43,10 @@ log = logging.getLogger("blivet")
 class DiskLabel(DeviceFormat):
 
     """ Disklabel """
+    # these getters cache the parted objects they return
+    _exclusive_methods = ["parted_disk", "parted_device", "_get_disk_label_alignment",
+                          "_get_minimal_alignment", "_get_optimal_alignment"]
+
     _type = "disklabel"
     _name = N_("partition table")
     _formattable = True                # can be formatted
@@ -136,8 +141,9 @@ class DiskLabel(DeviceFormat):
         """ re-read the disklabel from the device """
         self._parted_disk = None
         mask = event_manager.add_mask(device=os.path.basename(self.device), partitions=True)
+        seqnum = udev.uevent_seqnum()
         self.update_orig_parted_disk()
-        udev.settle()
+        udev.settle(seqnum=seqnum)
         event_manager.remove_mask(mask)
 
     def update_orig_parted_disk(self):
@@ -159,9 +165,12 @@ class DiskLabel(DeviceFormat):
             return None
 
         if not self._parted_disk and self.supported:
+            seqnum = udev.uevent_seqnum()
             if self.exists:
                 try:
-                    self._parted_disk = parted.Disk(device=self.parted_device)
+                    # the populator may have read the disklabel already
+                    self._parted_disk = probe_data.get("parted_disk", self.device,
+                                                       parted.Disk, self.parted_device)
                 except (_ped.DiskLabelException, _ped.IOException, NotImplementedError):
                     self._supported = False
                     return None
@@ -195,7 +204,7 @@ class DiskLabel(DeviceFormat):
             else:
                 log.debug("Did not change pmbr_boot on %s", self._parted_disk)
 
-            udev.settle(quiet=True)
+            udev.settle(quiet=True, seqnum=seqnum)
         return self._parted_disk
 
     @property
@@ -51,6 +51,7 @@ from ..size import Size, ROUND_UP
 from ..i18n import N_
 from .. import udev
 from ..mounts import mounts_cache
+from ..static_data import fs_info, probe_data
 
 from .fslib import kernel_filesystems, update_kernel_filesystems
 
@@ -58,6 +59,80 @@ import logging
 log = logging.getLogger("blivet")
 
 
+def _probe_size_info(fs, resizable):
+    """ Run the tools reporting a filesystem's size and state.
+
+        :param fs: the filesystem
+        :type fs: :class:`FS` or :class:`FSProbe`
+        :param bool resizable: whether the filesystem type can be resized
+        :returns: whether the filesystem is resizable, its current and
+                  minimum size in bytes, the output of the info tool
+                  and the filesystem check error (or None)
+        :rtype: tuple
+    """
+    #   This function ensures:
+    #   * If there are fsck errors, fs._resizable is False.
+    #       Note that if there is no fsck program, no errors are possible.
+    #   * If it is not possible to obtain the current size of the
+    #       filesystem by interrogating the filesystem, fs._resizable
+    #       is False (and fs._size is 0).
+    #   * _min_instance_size is obtained or it is set to _size. Effectively
+    #     this means that it is the actual minimum size, or if that
+    #     cannot be obtained the actual current size of the device.
+    #     If it was not possible to obtain the current size of the device
+    #     then _min_instance_size is 0, but since _resizable is False
+    #     that information can not be used to shrink the filesystem below
+    #     its unknown actual minimum size.
+    #   * fs._get_min_size() is only run if fsck succeeds and a current
+    #     existing size can be obtained.
+    fs._current_info = None
+    fs._min_instance_size = Size(0)
+    fs._resizable = resizable
+
+    # We can't allow resize if the filesystem has errors.
+    error = None
+    try:
+        fs.do_check()
+    except FSError as e:
+        fs._resizable = False
+        error = str(e)
+
+    # try to gather current size info anyway
+    fs._size = Size(0)
+    try:
+        if fs._info.available:
+            fs._current_info = fs._info.do_task()
+    except FSError as e:
+        log.info("Failed to obtain info for device %s: %s", fs.device, e)
+    try:
+        fs._size = fs._size_info.do_task()
+        fs._min_instance_size = fs._size
+    except (FSError, NotImplementedError) as e:
+        log.warning("Failed to obtain current size for device %s: %s", fs.device, e)
+
+    # We absolutely need a current size to enable resize. To shrink the
+    # filesystem we need a real minimum size provided by the resize
+    # tool. Failing that, we can default to the current size,
+    # effectively disabling shrink.
+    if fs._size == Size(0):
+        fs._resizable = False
+
+    if error is None:
+        try:
+            result = fs._minsize.do_task()
+            size = fs._pad_size(result)
+            if result < size:
+                log.debug("padding min size from %s up to %s", result, size)
+            else:
+                log.debug("using current size %s as min size", size)
+            fs._min_instance_size = size
+        except (FSError, NotImplementedError) as e:
+            log.warning("Failed to obtain minimum size for device %s: %s", fs.device, e)
+
+    return (fs._resizable, int(fs._size), int(fs._min_instance_size),
+            fs._current_info, error)
+
+
 class FS(DeviceFormat):
 
     """ Filesystem base class. """
@@ -251,66 +326,27 @@ class FS(DeviceFormat):
 
     def update_size_info(self):
         """ Update this filesystem's current and minimum size (for resize). """
-
-        #   This method ensures:
-        #   * If there are fsck errors, self._resizable is False.
-        #       Note that if there is no fsck program, no errors are possible.
-        #   * If it is not possible to obtain the current size of the
-        #       filesystem by interrogating the filesystem, self._resizable
-        #       is False (and self._size is 0).
-        #   * _min_instance_size is obtained or it is set to _size. Effectively
-        #     this means that it is the actual minimum size, or if that
-        #     cannot be obtained the actual current size of the device.
-        #     If it was not possible to obtain the current size of the device
-        #     then _min_instance_size is 0, but since _resizable is False
-        #     that information can not be used to shrink the filesystem below
-        #     its unknown actual minimum size.
-        #   * self._get_min_size() is only run if fsck succeeds and a current
-        #     existing size can be obtained.
         if not self.exists:
             return
 
-        self._current_info = None
-        self._min_instance_size = Size(0)
-        self._resizable = self.__class__._resizable
-
-        # We can't allow resize if the filesystem has errors.
-        try:
-            self.do_check()
-        except FSError:
-            self._resizable = False
-            raise
-        finally:
-            # try to gather current size info anyway
-            self._size = Size(0)
-            try:
-                if self._info.available:
-                    self._current_info = self._info.do_task()
-            except FSError as e:
-                log.info("Failed to obtain info for device %s: %s", self.device, e)
-            try:
-                self._size = self._size_info.do_task()
-                self._min_instance_size = self._size
-            except (FSError, NotImplementedError) as e:
-                log.warning("Failed to obtain current size for device %s: %s", self.device, e)
-
-            # We absolutely need a current size to enable resize. To shrink the
-            # filesystem we need a real minimum size provided by the resize
-            # tool. Failing that, we can default to the current size,
-            # effectively disabling shrink.
-            if self._size == Size(0):
-                self._resizable = False
-
-        try:
-            result = self._minsize.do_task()
-            size = self._pad_size(result)
-            if result < size:
-                log.debug("padding min size from %s up to %s", result, size)
-            else:
-                log.debug("using current size %s as min size", size)
-            self._min_instance_size = size
-        except (FSError, NotImplementedError) as e:
-            log.warning("Failed to obtain minimum size for device %s: %s", self.device, e)
+        # the results may have been saved by an earlier populate, see
+        # blivet.populator.cache, or be known from an earlier probe of the
+        # unchanged filesystem, see blivet.static_data.fs_info
+        info = probe_data.get("fs_size_info", self.device, fs_info.get, self.device,
+                              self.type, self._probe_size_info)
+        (self._resizable, size, min_size, self._current_info, error) = info
+        self._size = Size(size)
+        self._min_instance_size = Size(min_size)
+        if error is not None:
+            raise FSError(error)
+
+    def _probe_size_info(self):
+        """ Run the tools reporting this filesystem's size and state.
+
+            :returns: see :func:`_probe_size_info`
+            :rtype: tuple
+        """
+        return _probe_size_info(self, self.__class__._resizable)
 
     def _pad_size(self, size):
         """ Return a size padded according to some inflating rules.
@@ -714,6 +750,68 @@ class FS(DeviceFormat):
         data.fsprofile = self.fsprofile or ""
 
 
+class FSProbe(object):
+
+    """ An existing filesystem known only by its device node and type.
+
+        It has the tasks of the filesystem type's format class, so the
+        filesystem's size tools can be run without creating a format, which
+        would take an object id.
+    """
+    exists = True
+
+    def __init__(self, fs_class, device):
+        """
+            :param fs_class: the format class of the filesystem type
+            :type fs_class: subclass of :class:`FS`
+            :param str device: path to the block device node
+        """
+        self._fs_class = fs_class
+        self.device = device
+        self.type = fs_class._type
+        self._current_info = None
+        self._size = Size(0)
+        self._min_instance_size = Size(0)
+        self._resizable = False
+
+        self._fsck = fs_class._fsck_class(self)
+        self._mount = fs_class._mount_class(self)
+        self._info = fs_class._info_class(self)
+        self._resize = fs_class._resize_class(self)
+        self._minsize = fs_class._minsize_class(self)
+        self._size_info = fs_class._size_info_class(self)
+
+    # only use the attributes set above; the probes run in worker threads
+    # while the populating thread holds the global lock, so FS's locking
+    # wrappers are left out
+    do_check = FS.do_check.__wrapped__
+    _pad_size = FS._pad_size.__wrapped__
+
+    @property
+    def mount_type(self):
+        return self._mount.mount_type
+
+    @property
+    def current_size(self):
+        return self._size
+
+    @property
+    def size_info_probed(self):
+        """ Whether a format would probe the size info when created.
+
+            See :meth:`FS.__init__`.
+        """
+        return flags.installer_mode and self._resize.available
+
+    def probe_size_info(self):
+        """ Run the tools reporting the filesystem's size and state.
+
+            :returns: see :func:`_probe_size_info`
+            :rtype: tuple
+        """
+        return _probe_size_info(self, self._fs_class._resizable)
+
+
 class Ext2FS(FS):
 
     """ ext2 filesystem. """
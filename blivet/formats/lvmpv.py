@@ -56,6 +56,7 @@ class LVMPhysicalVolume(DeviceFormat):
     _plugin = availability.BLOCKDEV_LVM_PLUGIN
 
     _size_info_class = pvtask.PVSize
+    _exclusive_methods = ["free"]
 
     def __init__(self, **kwargs):
         """
@@ -19,78 +19,166 @@
 #
 # Red Hat Author(s): Vojtech Trefny <vtrefny@redhat.com>
 #
+import os
+import select
+import stat
 from collections import defaultdict
+from threading import Lock
+
 from .udev import resolve_devspec
-from . import util
 from .devicelibs import btrfs
 
 import logging
 log = logging.getLogger("blivet")
 
+MOUNTINFO = "/proc/self/mountinfo"
+
 
-class _MountinfoCache(object):
+class _DeviceNames(object):
 
-    """ Cache for info from /proc/self/mountinfo. Looks up the root of the
-        mount within the filesystem using a pair of mountpoint, mount
-        source as keys.
+    """ Map of block device numbers to canonical (sysfs) device names.
 
-        This is a very simple helper class for MountsCache, and would
-        have to be altered for general purpose use.
+        Device specifications are resolved by looking up the device number
+        of the device node, so resolving a mount source does not require
+        enumerating the udev database. Only specifications that cannot be
+        resolved that way (eg: LABEL=, UUID=) fall back to
+        :func:`~.udev.resolve_devspec`.
 
-        Note that only info for fstype btrfs is stored within the cache,
-        as MountsCache methods only require information for btrfs.
+        Results are valid as long as the mount table does not change, the
+        owner is responsible for calling :meth:`clear` when it does.
     """
 
     def __init__(self):
-        self._cache = None
+        self._names = {}
+        self._specs = {}
+
+    def clear(self):
+        self._names.clear()
+        self._specs.clear()
+
+    def lookup(self, devno):
+        """ Return the canonical name of a block device number or None. """
+        try:
+            return self._names[devno]
+        except KeyError:
+            pass
+
+        try:
+            link = os.readlink("/sys/dev/block/%d:%d" % (os.major(devno), os.minor(devno)))
+        except OSError:
+            name = None
+        else:
+            name = os.path.basename(link)
+
+        self._names[devno] = name
+        return name
+
+    def resolve(self, devspec):
+        """ Return the canonical name of a device specification or None.
+
+            :param str devspec: device specification, eg. "/dev/vda1"
+        """
+        try:
+            return self._specs[devspec]
+        except KeyError:
+            pass
+
+        name = None
+        if not devspec.startswith(("LABEL=", "UUID=")):
+            path = devspec
+            if not path.startswith("/"):
+                path = os.path.normpath("/dev/" + path)
+
+            try:
+                st = os.stat(path)
+            except OSError:
+                pass
+            else:
+                if stat.S_ISBLK(st.st_mode):
+                    name = self.lookup(st.st_rdev)
 
-    def _get_cache(self):
-        """ Reads lines in /proc/self/mountinfo and builds a table. """
-        cache = {}
+        if name is None:
+            name = resolve_devspec(devspec, sysname=True)
 
-        with open("/proc/self/mountinfo") as mountinfos:
-            for line in mountinfos:
-                fields = line.split()
-                separator_index = fields.index("-")
-                fstype = fields[separator_index + 1]
-                if not fstype.startswith("btrfs"):
-                    continue
+        self._specs[devspec] = name
+        return name
 
-                root = fields[3]
-                mountpoint = fields[4]
-                # store the canonical device path
-                devspec = resolve_devspec(fields[separator_index + 2],
-                                          sysname=True)
-                cache[(devspec, mountpoint)] = root
 
-        return cache
+class _MountTableWatcher(object):
 
-    def get_root(self, devspec, mountpoint):
-        """ Retrieves the root of the mount within the filesystem
-            that corresponds to devspec and mountpoint.
+    """ Change notification for the mount table.
 
-            :param str devspec: device specification
-            :param str mountpoint: mountpoint
-            :rtype: str or NoneType
-            :returns: the root of the mount within the filesystem, if available
-        """
-        if self._cache is None:
-            self._cache = self._get_cache()
+        The kernel reports changes to the mount namespace as POLLPRI (and
+        POLLERR) on open /proc/self/mountinfo files, so checking for changes
+        is a single non-blocking poll() instead of reading and hashing the
+        whole table. If the file cannot be watched every check reports a
+        possible change.
+    """
+
+    def __init__(self, path=MOUNTINFO):
+        self._path = path
+        self._file = None
+        self._poll = None
 
-        # get the canonical device path
-        devspec = resolve_devspec(devspec, sysname=True)
-        return self._cache.get((devspec, mountpoint))
+    def _open(self):
+        try:
+            mountinfo = open(self._path)
+        except OSError as e:
+            log.error("failed to open %s: %s", self._path, e)
+            return
+
+        try:
+            poll = select.poll()
+            poll.register(mountinfo, select.POLLPRI | select.POLLERR)
+        except (AttributeError, OSError, ValueError) as e:
+            log.debug("cannot watch %s for changes: %s", self._path, e)
+            mountinfo.close()
+            return
+
+        self._file = mountinfo
+        self._poll = poll
+
+    def changed(self):
+        """ Return False if the mount table has not changed since the last check. """
+        if self._poll is None:
+            return True
+
+        return bool(self._poll.poll(0))
+
+    def read(self):
+        """ Return the current contents of the mount table. """
+        if self._file is None:
+            self._open()
+
+        if self._file is None:
+            with open(self._path) as mountinfo:
+                return mountinfo.read()
+
+        self._file.seek(0)
+        return self._file.read()
 
 
 class MountsCache(object):
 
-    """ Cache object for system mountpoints; checks /proc/mounts and
-        /proc/self/mountinfo for up-to-date information.
+    """ Cache object for system mountpoints.
+
+        The mount table is read from /proc/self/mountinfo, and only re-read
+        when the kernel reports that it has changed.
     """
 
-    def __init__(self):
-        self.mounts_hash = 0
+    def __init__(self, mountinfo=MOUNTINFO):
+        """
+            :keyword str mountinfo: path of the mountinfo file to read
+        """
+        # (devspec, subvolspec) -> mountpoints
         self.mountpoints = defaultdict(list)
+        # mountpoint -> mount sources, in mount order
+        self.mount_devices = defaultdict(list)
+
+        self._mountinfo = None
+        self._watcher = _MountTableWatcher(mountinfo)
+        self._names = _DeviceNames()
+        self._lock = Lock()
 
     def get_mountpoints(self, devspec, subvolspec=None):
         """ Get mountpoints for selected device
@@ -106,72 +194,109 @@ class MountsCache(object):
                 Devices can be mounted on multiple paths, and paths can have multiple
                 devices mounted to them (hiding previous mounts). Callers should take this into account.
         """
-        self._cache_check()
-
         if subvolspec is not None:
             subvolspec = str(subvolspec)
 
-        # devspec == None means "get 'nodev' mount points"
-        if devspec is not None:
-            # use the canonical device path (if available)
-            canon_devspec = resolve_devspec(devspec, sysname=True)
-            if canon_devspec is not None:
-                devspec = canon_devspec
-            else:
-                # udev doesn't know about the given device, it can hardly be
-                # mounted
-                return []
+        with self._lock:
+            self._cache_check()
+
+            # devspec == None means "get 'nodev' mount points"
+            if devspec is not None:
+                # use the canonical device path (if available)
+                canon_devspec = self._names.resolve(devspec)
+                if canon_devspec is not None:
+                    devspec = canon_devspec
+                else:
+                    # udev doesn't know about the given device, it can hardly be
+                    # mounted
+                    return []
 
-        return self.mountpoints[(devspec, subvolspec)]
+            return list(self.mountpoints.get((devspec, subvolspec), []))
 
     def is_mountpoint(self, path):
         """ Check to see if a path is already mounted
 
             :param str path: Path to check
         """
-        self._cache_check()
+        with self._lock:
+            self._cache_check()
+            return path in self.mount_devices
 
-        return any(path in p for p in self.mountpoints.values())
+    def is_mounted(self, devspec):
+        """ Check to see if a device is mounted anywhere
 
-    def _get_active_mounts(self):
-        """ Get information about mounted devices from /proc/mounts and
-            /proc/self/mountinfo
-
-            Refreshes self.mountpoints with current mountpoint information
+            :param str devspec: device specification, eg. "/dev/vda1"
         """
-        self.mountpoints = defaultdict(list)
-        mountinfo = _MountinfoCache()
+        with self._lock:
+            self._cache_check()
+            devspec = self._names.resolve(devspec)
+            return devspec is not None and any(d == devspec for (d, _subvol) in self.mountpoints)
 
-        with open("/proc/mounts") as mounts:
-            for line in mounts:
-                try:
-                    (devspec, mountpoint, fstype, _rest) = line.split(None, 3)
-                except ValueError:
-                    log.error("failed to parse /proc/mounts line: %s", line)
-                    continue
+    def get_mount_device(self, mountpoint):
+        """ Get the mount source of the first filesystem mounted on a path
 
-                # use the canonical device path (if available)
-                if devspec.startswith("/dev"):
-                    devspec = resolve_devspec(devspec, sysname=True) or devspec
-
-                if fstype == "btrfs":
-                    root = mountinfo.get_root(devspec, mountpoint)
-                    if root is not None:
-                        subvolspec = root[1:] or str(btrfs.MAIN_VOLUME_ID)
-                        self.mountpoints[(devspec, subvolspec)].append(mountpoint)
-                    else:
-                        log.error("failed to obtain subvolspec for btrfs device %s at mountpoint %s", devspec, mountpoint)
-                else:
-                    self.mountpoints[(devspec, None)].append(mountpoint)
+            :param str mountpoint: mountpoint (path)
+            :returns: the mount source as listed in the mount table, or None
+            :rtype: str or NoneType
+        """
+        with self._lock:
+            self._cache_check()
+            devices = self.mount_devices.get(mountpoint)
+            return devices[0] if devices else None
 
-    def _cache_check(self):
-        """ Computes the MD5 hash on /proc/mounts and updates the cache on change
+    def _get_active_mounts(self):
+        """ Get information about mounted devices from /proc/self/mountinfo
+
+            Refreshes self.mountpoints and self.mount_devices with current
+            mountpoint information
         """
+        mountinfo = self._watcher.read()
+        if mountinfo == self._mountinfo:
+            return
 
-        md5hash = util.md5_file("/proc/mounts")
+        self._mountinfo = mountinfo
+        self._names.clear()
+        self.mountpoints = defaultdict(list)
+        self.mount_devices = defaultdict(list)
+
+        for line in mountinfo.splitlines():
+            # mount ID, parent ID, major:minor, root, mountpoint, options,
+            # optional fields, "-", fstype, mount source, super options
+            fields = line.split()
+            try:
+                separator_index = fields.index("-", 6)
+                (major, minor) = (int(n) for n in fields[2].split(":"))
+                root = fields[3]
+                mountpoint = fields[4]
+                fstype = fields[separator_index + 1]
+                devspec = fields[separator_index + 2]
+            except (ValueError, IndexError):
+                log.error("failed to parse mountinfo line: %s", line)
+                continue
+
+            self.mount_devices[mountpoint].append(devspec)
+
+            # use the canonical device path (if available); the device number
+            # of a mount is that of its block device except for filesystems
+            # like btrfs that use anonymous device numbers
+            if devspec.startswith("/dev"):
+                name = None
+                if major != 0:
+                    name = self._names.lookup(os.makedev(major, minor))
+                if name is None:
+                    name = self._names.resolve(devspec)
+
+                devspec = name or devspec
+
+            if fstype == "btrfs":
+                subvolspec = root[1:] or str(btrfs.MAIN_VOLUME_ID)
+                self.mountpoints[(devspec, subvolspec)].append(mountpoint)
+            else:
+                self.mountpoints[(devspec, None)].append(mountpoint)
 
-        if md5hash != self.mounts_hash:
-            self.mounts_hash = md5hash
+    def _cache_check(self):
+        """ Updates the cache if the mount table has changed """
+        if self._mountinfo is None or self._watcher.changed():
             self._get_active_mounts()
 
 mounts_cache = MountsCache()
@@ -20,10 +20,16 @@
 # Red Hat Author(s): Dave Lehman <dlehman@redhat.com>
 #
 
+from collections import namedtuple
 from operator import gt, lt
-from decimal import Decimal
+from decimal import Decimal, getcontext
 import functools
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 import gi
 gi.require_version("BlockDev", "1.0")
 
@@ -31,10 +37,10 @@ from gi.repository import BlockDev as blockdev
 
 import parted
 
-from .errors import DeviceError, PartitioningError, AlignmentError
+from .errors import DeviceError, PartitioningError, AlignmentError, StorageError
 from .flags import flags
 from .devices import Device, PartitionDevice, LUKSDevice, device_path_to_name
-from .size import Size
+from .size import Size, ROUND_UP, round_bytes
 from .i18n import _
 from .util import stringize, unicodeize, compare
 
@@ -135,15 +141,25 @@ def get_next_partition_type(disk, no_primary=None):
         :returns: the chosen partition type
         :rtype: a parted PARTITION_* constant
     """
-    part_type = None
-    extended = disk.getExtendedPartition()
-    supports_extended = disk.supportsFeature(parted.DISK_TYPE_EXTENDED)
-    logical_count = len(disk.getLogicalPartitions())
-    max_logicals = disk.getMaxLogicalPartitions()
-    primary_count = disk.primaryPartitionCount
+    return _next_partition_type(disk.primaryPartitionCount,
+                                disk.maxPrimaryPartitionCount,
+                                disk.getExtendedPartition(),
+                                disk.supportsFeature(parted.DISK_TYPE_EXTENDED),
+                                len(disk.getLogicalPartitions()),
+                                disk.getMaxLogicalPartitions(),
+                                no_primary=no_primary)
+
 
-    if primary_count < disk.maxPrimaryPartitionCount:
-        if primary_count == disk.maxPrimaryPartitionCount - 1:
+def _next_partition_type(primary_count, max_primary_count, extended,
+                         supports_extended, logical_count, max_logicals,
+                         no_primary=None):
+    """ Return the type of partition to create next given a disk's slots.
+
+        See :func:`get_next_partition_type`.
+    """
+    part_type = None
+    if primary_count < max_primary_count:
+        if primary_count == max_primary_count - 1:
             # can we make an extended partition? now's our chance.
             if not extended and supports_extended:
                 part_type = parted.PARTITION_EXTENDED
@@ -299,7 +315,7 @@ def sectors_to_size(sectors, sector_size):
         :returns: the size
         :rtype: :class:`~.size.Size`
     """
-    return Size(sectors * sector_size)
+    return Size(sectors * int(sector_size))
 
 
 def size_to_sectors(size, sector_size):
@@ -621,12 +637,12 @@ def do_partitioning(storage):
 
 def align_size_for_disklabel(size, disklabel):
     # Align the base size to the disk's grain size.
-    grain_size = Size(disklabel.alignment.grainSize)
-    grains, rem = divmod(size, grain_size)
-    return (grains * grain_size) + (grain_size if rem else Size(0))
+    grain_size = int(disklabel.alignment.grainSize)
+    grains, rem = divmod(int(size), grain_size)
+    return Size((grains + (1 if rem else 0)) * grain_size)
 
 
-def allocate_partitions(storage, disks, partitions, freespace):
+def allocate_partitions(storage, disks, partitions, freespace, plan=True):
     """ Allocate partitions based on requested features.
 
         :param storage: a Blivet instance
@@ -637,6 +653,8 @@ def allocate_partitions(storage, disks, partitions, freespace):
         :type partitions: list of :class:`~.devices.PartitionDevice`
         :param freespace: list of free regions on disks
         :type freespace: list of :class:`parted.Geometry`
+        :keyword plan: plan the allocation with :func:`plan_partitions`
+        :type plan: bool
         :raises: :class:`~.errors.PartitioningError`
         :returns: :const:`None`
 
@@ -647,6 +665,11 @@ def allocate_partitions(storage, disks, partitions, freespace):
         defined a request is, the earlier it will be allocated. See
         :func:`partitionCompare` for details of the sorting criteria.
 
+        The allocation is planned on integer models of the disks and added
+        to the parted disks once it is complete. Requests the model does not
+        support are allocated directly on the parted disks, trying each
+        candidate layout in turn.
+
         The :class:`~.devices.PartitionDevice` instances will have their name
         and parents attributes set once they have been allocated.
     """
@@ -657,6 +680,45 @@ def allocate_partitions(storage, disks, partitions, freespace):
     new_partitions = [p for p in partitions if not p.exists]
     new_partitions.sort(key=_partition_compare_key)
 
+    remove_new_partitions(disks, new_partitions, partitions)
+
+    if plan:
+        try:
+            planned = plan_partitions(storage, disks, new_partitions, freespace)
+        except (ArithmeticError, StorageError) as e:
+            log.debug("failed to plan partition allocation: %s", e)
+            planned = None
+
+        if planned is not None and apply_partition_plan(planned):
+            return
+
+    _allocate_partitions(storage, disks, new_partitions, freespace)
+
+
+def _get_request_disks(storage, part, disks):
+    """ Return the disks to try for a partition, the boot disk first. """
+    if part.req_disks:
+        # use the requested disk set
+        req_disks = part.req_disks
+    else:
+        # no disks specified means any disk will do
+        req_disks = disks
+
+    # sort the disks, making sure the boot disk is first
+    req_disks.sort(key=storage.compare_disks_key)
+    for disk in req_disks:
+        if storage.boot_disk and disk == storage.boot_disk:
+            boot_index = req_disks.index(disk)
+            req_disks.insert(0, req_disks.pop(boot_index))
+
+    return req_disks
+
+
+def _allocate_partitions(storage, disks, new_partitions, freespace):
+    """ Allocate new partitions directly on the parted disks.
+
+        See :func:`allocate_partitions`.
+    """
     # the following dicts all use device path strings as keys
     disklabels = {}     # DiskLabel instances for each disk
     all_disks = {}      # StorageDevice for each disk
@@ -665,28 +727,13 @@ def allocate_partitions(storage, disks, partitions, freespace):
             disklabels[disk.path] = disk.format
             all_disks[disk.path] = disk
 
-    remove_new_partitions(disks, new_partitions, partitions)
-
     for _part in new_partitions:
         if _part.parted_partition and _part.is_extended:
             # ignore new extendeds as they are implicit requests
             continue
 
         # obtain the set of candidate disks
-        req_disks = []
-        if _part.req_disks:
-            # use the requested disk set
-            req_disks = _part.req_disks
-        else:
-            # no disks specified means any disk will do
-            req_disks = disks
-
-        # sort the disks, making sure the boot disk is first
-        req_disks.sort(key=storage.compare_disks_key)
-        for disk in req_disks:
-            if storage.boot_disk and disk == storage.boot_disk:
-                boot_index = req_disks.index(disk)
-                req_disks.insert(0, req_disks.pop(boot_index))
+        req_disks = _get_request_disks(storage, _part, disks)
 
         boot = _part.req_base_weight > 1000
 
@@ -1017,15 +1064,22 @@ class PartitionRequest(Request):
             :type partition: :class:`~.devices.PartitionDevice`
         """
         super(PartitionRequest, self).__init__(partition)
-        self.base = partition.parted_partition.geometry.length   # base sectors
-
-        sector_size = Size(partition.parted_partition.disk.device.sectorSize)
-
+        geometry = partition.parted_partition.geometry
+        parted_disk = partition.parted_partition.disk
+        self.start = geometry.start         # start sector
+        self.end = geometry.end             # end sector
+        self.base = geometry.length         # base sectors
+        self.max_start_sector = parted_disk.maxPartitionStartSector
+        self._set_max_growth(Size(parted_disk.device.sectorSize),
+                             parted_disk.maxPartitionLength)
+
+    def _set_max_growth(self, sector_size, max_length):
+        partition = self.device
         if partition.req_grow:
             req_format_max_size = min((size for size in (partition.req_max_size, partition.format.max_size)
                                        if size > 0), default=Size(0))
             limits = [l for l in (size_to_sectors(req_format_max_size, sector_size),
-                                  partition.parted_partition.disk.maxPartitionLength) if l > 0]
+                                  max_length) if l > 0]
 
             if limits:
                 max_sectors = min(limits)
@@ -1046,12 +1100,12 @@ class LVRequest(Request):
 
         # Round up to nearest pe. For growable requests this will mean that
         # first growth is to fill the remainder of any unused extent.
-        self.base = int(lv.vg.align(lv.size, roundup=True) // lv.vg.pe_size)
+        pe_size = int(lv.vg.pe_size)
+        self.base = round_bytes(lv.size, pe_size, ROUND_UP) // pe_size
 
         if lv.req_grow:
-            limits = [int(l // lv.vg.pe_size) for l in
-                      (lv.vg.align(lv.req_max_size),
-                       lv.vg.align(lv.format.max_size)) if l > Size(0)]
+            limits = [l // pe_size for l in
+                      (int(lv.req_max_size), int(lv.format.max_size)) if l >= pe_size]
 
             if limits:
                 max_units = min(limits)
@@ -1063,13 +1117,137 @@ class LVRequest(Request):
     @property
     def reserve_request(self):
         lv = self.device
+        pe_size = int(lv.vg.pe_size)
         reserve = super(LVRequest, self).reserve_request
         if lv.cached:
-            reserve += int(lv.vg.align(lv.cache.size, roundup=True) / lv.vg.pe_size)
-        reserve += int(lv.vg.align(lv.metadata_vg_space_used, roundup=True) / lv.vg.pe_size)
+            reserve += round_bytes(lv.cache.size, pe_size, ROUND_UP) // pe_size
+        reserve += round_bytes(lv.metadata_vg_space_used, pe_size, ROUND_UP) // pe_size
         return reserve
 
 
+def _proportional_growth(bases, base, pool):
+    """ Return int(Decimal(b) / Decimal(base) * pool) for each base.
+
+        The quotient is computed exactly with integers. Only where it is so
+        close to an integer that rounding to the decimal context's precision
+        could change the truncated result is the decimal computation done.
+    """
+    margin = 10 ** (getcontext().prec - 2)
+    if numpy is not None and len(bases) >= 64 and max(bases) * pool < 2 ** 62:
+        b = numpy.array(bases, dtype=numpy.int64)
+        products = b * pool
+        growths = products // base
+        rems = products - growths * base
+        quotients = products / base
+        close = (rems / base * margin <= quotients) | ((base - rems) / base * margin <= quotients)
+        growths = growths.tolist()
+        suspects = numpy.flatnonzero(close).tolist()
+    else:
+        growths = []
+        suspects = []
+        for (i, b) in enumerate(bases):
+            (growth, rem) = divmod(b * pool, base)
+            growths.append(growth)
+            if rem * margin <= b * pool or (base - rem) * margin <= b * pool:
+                suspects.append(i)
+
+    exact = {}
+    for i in suspects:
+        b = bases[i]
+        if b not in exact:
+            exact[b] = int(Decimal(b) / Decimal(base) * pool)
+        growths[i] = exact[b]
+
+    return growths
+
+
+def grow_units(bases, growths, max_growths, done, pool, base, skip=None,
+               uniform=False):
+    """ Distribute a pool of free units among growable requests.
+
+        :param bases: base unit count of each request, in growth order
+        :type bases: list of int
+        :param growths: current growth of each request
+        :type growths: list of int
+        :param max_growths: maximum growth of each request, 0 for no limit
+        :type max_growths: list of int
+        :param done: whether each request is done growing
+        :type done: list of bool
+        :param int pool: free units
+        :param int base: combined base of the requests still growing
+        :keyword skip: whether each request is to be skipped this time
+        :type skip: list of bool
+        :keyword bool uniform: grow requests uniformly instead of proportionally
+        :returns: the new growths and done flags, the remaining pool and the
+                  base used for the last round of growth
+        :rtype: tuple of (list of int, list of bool, int, int)
+        :raises: ValueError if the pool or a base is negative
+
+        This computes the same allocations as :meth:`Chunk.grow_requests`,
+        to the unit, without going through the requests one at a time:
+        each round of growth gives every remaining request its share of the
+        pool at once, then returns what the requests that reached their
+        maximum got in excess.
+    """
+    if pool < 0 or base < 0 or any(b < 0 for b in bases):
+        raise ValueError("negative pool or base")
+
+    growths = list(growths)
+    done = list(done)
+    if skip is None:
+        skip = [False] * len(bases)
+
+    new_base = base
+    last_pool = 0
+    remaining = done.count(False)
+    while remaining and pool and last_pool != pool:
+        last_pool = pool
+        base = new_base
+        active = [i for i in range(len(bases)) if not done[i] and not skip[i]]
+        if not active:
+            break
+
+        if uniform:
+            shares = [int(last_pool / remaining)] * len(active)
+        elif not base:
+            raise ValueError("no base to compute shares from")
+        else:
+            shares = _proportional_growth([bases[i] for i in active], base, last_pool)
+
+        pool -= sum(shares)
+        for (i, share) in zip(active, shares):
+            growth = growths[i] + share
+            max_growth = max_growths[i]
+            if max_growth and growth >= max_growth:
+                pool += growth - max_growth
+                growth = max_growth
+                new_base -= bases[i]
+                done[i] = True
+                remaining -= 1
+
+            growths[i] = growth
+
+    if pool:
+        # allocate any leftovers in pool to the first request that can
+        # still grow
+        for i in range(len(bases)):
+            if done[i] or skip[i]:
+                continue
+
+            growths[i] += pool
+            pool = 0
+            max_growth = max_growths[i]
+            if max_growth and growths[i] >= max_growth:
+                pool += growths[i] - max_growth
+                growths[i] = max_growth
+                done[i] = True
+
+            if pool == 0:
+                break
+
+    return (growths, done, pool, base)
+
+
 class Chunk(object):
 
     """ A free region from which devices will be allocated """
@@ -1232,6 +1410,10 @@ class Chunk(object):
 
             Under uniform growth, all requests receive an equal portion of the
             free units.
+
+            Unless the growth limit of a request depends on the growth of the
+            others (see :meth:`static_max_growths`), the growth is computed by
+            :func:`grow_units`.
         """
         log.debug("Chunk.grow_requests: %r", self)
 
@@ -1239,6 +1421,49 @@ class Chunk(object):
         for req in self.requests:
             log.debug("req: %r", req)
 
+        max_growths = self.static_max_growths()
+        values = [self.pool, self.base] + [r.base for r in self.requests] + \
+                 [r.growth for r in self.requests]
+        if max_growths is None or \
+           not all(isinstance(v, int) for v in values + max_growths):
+            self._grow_requests_iteratively(uniform=uniform)
+            return
+
+        skip = [r in self.skip_list for r in self.requests]
+        try:
+            (growths, done, self.pool, self.base) = grow_units([r.base for r in self.requests],
+                                                               [r.growth for r in self.requests],
+                                                               max_growths,
+                                                               [r.done for r in self.requests],
+                                                               self.pool, self.base,
+                                                               skip=skip, uniform=uniform)
+        except ValueError as e:
+            log.debug("cannot compute growth in closed form: %s", e)
+            self._grow_requests_iteratively(uniform=uniform)
+            return
+
+        for (req, growth, req_done) in zip(self.requests, growths, done):
+            req.growth = growth
+            req.done = req_done
+
+        log.debug("grew %d requests, %s (%s) left in chunk", len(self.requests),
+                  self.pool, self.length_to_size(self.pool))
+        self.skip_list = []
+
+    def static_max_growths(self):
+        """ Return the maximum growth of each request in this chunk.
+
+            :returns: the maximum growth of each request, or None if it
+                      depends on the growth of other requests
+            :rtype: list of int or NoneType
+        """
+        return [self.max_growth(req) for req in self.requests]
+
+    def _grow_requests_iteratively(self, uniform=False):
+        """ Calculate growth amounts one request at a time.
+
+            See :meth:`grow_requests`.
+        """
         # we use this to hold the base for the next loop through the
         # chunk's requests since we want the base to be the same for
         # all requests in any given growth iteration
@@ -1327,6 +1552,8 @@ class DiskChunk(Chunk):
 
         """
         self.geometry = geometry            # parted.Geometry
+        self.start = geometry.start
+        self.end = geometry.end
         self.sector_size = Size(self.geometry.device.sectorSize)
         self.path = self.geometry.device.path
         super(DiskChunk, self).__init__(self.geometry.length, requests=requests)
@@ -1335,14 +1562,14 @@ class DiskChunk(Chunk):
         s = super(DiskChunk, self).__str__()
         s += (" start = %(start)d  end = %(end)d\n"
               "sector_size = %(sector_size)s\n" %
-              {"start": self.geometry.start, "end": self.geometry.end,
+              {"start": self.start, "end": self.end,
                "sector_size": self.sector_size})
         return s
 
     # Force str and unicode types in case path is unicode
     def _to_string(self):
-        s = "%d (%d-%d) on %s" % (self.length, self.geometry.start,
-                                  self.geometry.end, self.path)
+        s = "%d (%d-%d) on %s" % (self.length, self.start, self.end,
+                                  self.path)
         return s
 
     def __str__(self):
@@ -1364,9 +1591,8 @@ class DiskChunk(Chunk):
         if not self.requests:
             # when adding the first request to the chunk, adjust the pool
             # size to reflect any disklabel-specific limits on end sector
-            max_sector = req.device.parted_partition.disk.maxPartitionStartSector
-            chunk_end = min(max_sector, self.geometry.end)
-            if chunk_end <= self.geometry.start:
+            chunk_end = min(req.max_start_sector, self.end)
+            if chunk_end <= self.start:
                 # this should clearly never be possible, but if the chunk's
                 # start sector is beyond the maximum allowed end sector, we
                 # cannot continue
@@ -1374,7 +1600,7 @@ class DiskChunk(Chunk):
                 raise PartitioningError(_("partitions allocated outside "
                                           "disklabel limits"))
 
-            new_pool = chunk_end - self.geometry.start + 1
+            new_pool = chunk_end - self.start + 1
             if new_pool != self.pool:
                 log.debug("adjusting pool to %d based on disklabel limits", new_pool)
                 self.pool = new_pool
@@ -1387,8 +1613,8 @@ class DiskChunk(Chunk):
             :param req: the request
             :type req: :class:`PartitionRequest`
         """
-        req_end = req.device.parted_partition.geometry.end
-        req_start = req.device.parted_partition.geometry.start
+        req_end = req.end
+        req_start = req.start
 
         # Establish the current total number of sectors of growth for requests
         # that lie before this one within this chunk. We add the total count
@@ -1398,7 +1624,7 @@ class DiskChunk(Chunk):
         # this end sector and various values for maximum end sector.
         growth = 0
         for request in self.requests:
-            if request.device.parted_partition.geometry.start < req_start:
+            if request.start < req_start:
                 growth += request.growth
         req_end += growth
 
@@ -1407,8 +1633,7 @@ class DiskChunk(Chunk):
         limits = []
 
         # disklabel-specific maximum sector
-        max_sector = req.device.parted_partition.disk.maxPartitionStartSector
-        limits.append(max_sector - req_end)
+        limits.append(req.max_start_sector - req_end)
 
         # 2TB limit on bootable partitions, regardless of disklabel
         if req.device.req_bootable:
@@ -1422,6 +1647,18 @@ class DiskChunk(Chunk):
         max_growth = min(limits)
         return max_growth
 
+    def static_max_growths(self):
+        # The disklabel and boot limits depend on the growth of the requests
+        # placed before each one, but only matter if they can be reached.
+        total = self.pool + sum(r.growth for r in self.requests)
+        max_boot = size_to_sectors(Size("2 TiB"), self.sector_size)
+        for req in self.requests:
+            if req.max_start_sector - req.end <= total or \
+               (req.device.req_bootable and max_boot - req.end <= total):
+                return None
+
+        return [req.max_growth for req in self.requests]
+
     def length_to_size(self, length):
         return sectors_to_size(length, self.sector_size)
 
@@ -1430,7 +1667,7 @@ class DiskChunk(Chunk):
 
     def sort_requests(self):
         # sort the partitions by start sector
-        self.requests.sort(key=lambda r: r.device.parted_partition.geometry.start)
+        self.requests.sort(key=lambda r: r.start)
 
 
 class VGChunk(Chunk):
@@ -1446,7 +1683,8 @@ class VGChunk(Chunk):
         """
         self.vg = vg
         self.path = vg.path
-        usable_extents = vg.extents - int(vg.align(vg.reserved_space, roundup=True) / vg.pe_size)
+        pe_size = int(vg.pe_size)
+        usable_extents = vg.extents - round_bytes(vg.reserved_space, pe_size, ROUND_UP) // pe_size
         super(VGChunk, self).__init__(usable_extents, requests=requests)
 
     def add_request(self, req):
@@ -1462,10 +1700,15 @@ class VGChunk(Chunk):
         super(VGChunk, self).add_request(req)
 
     def length_to_size(self, length):
+        if isinstance(length, int):
+            return Size(int(self.vg.pe_size) * length)
         return self.vg.pe_size * length
 
     def size_to_length(self, size):
-        return int(size / self.vg.pe_size)
+        # truncate towards zero, size may be negative
+        size = int(size)
+        pe_size = int(self.vg.pe_size)
+        return size // pe_size if size >= 0 else -(-size // pe_size)
 
     def sort_requests(self):
         # sort the partitions by start sector
@@ -1485,7 +1728,9 @@ class ThinPoolChunk(VGChunk):
         """
         self.vg = pool.vg   # only used for align, &c
         self.path = pool.path
-        usable_extents = (pool.size / pool.vg.pe_size)
+        (usable_extents, rem) = divmod(int(pool.size), int(pool.vg.pe_size))
+        if rem:
+            usable_extents = pool.size / pool.vg.pe_size
         super(VGChunk, self).__init__(usable_extents, requests=requests)  # pylint: disable=bad-super-call
 
 
@@ -1553,6 +1798,508 @@ def get_disk_chunks(disk, partitions, free):
     return chunks
 
 
+#
+# Integer model of the disks used to plan partition allocation
+#
+
+MAX_BOOT_BYTES = 2 * 1024 ** 4
+""" bootable partitions must end within the first 2 TiB of a disk """
+
+PLANNED_LABEL_TYPES = ("msdos", "gpt")
+""" disklabel types whose allocation can be planned on a :class:`DiskSpace` """
+
+
+def _c_mod(a, b):
+    # remainder of C's integer division, which truncates toward zero
+    return -(-a % b) if a < 0 else a % b
+
+
+def _round_down_to(sector, grain_size):
+    mod = _c_mod(sector, grain_size)
+    if sector < 0:
+        mod += grain_size
+    return sector - mod
+
+
+def _round_up_to(sector, grain_size):
+    if _c_mod(sector, grain_size):
+        return _round_down_to(sector, grain_size) + grain_size
+    return sector
+
+
+class SectorAlignment(object):
+
+    """ Integer version of :class:`parted.Alignment`.
+
+        Aligned sectors are ``offset + n * grain_size``. The methods take
+        the region to align within as a start and end sector and round
+        exactly like libparted does.
+    """
+
+    def __init__(self, offset, grain_size):
+        self.offset = offset
+        self.grain_size = grain_size
+
+    @classmethod
+    def from_parted(cls, alignment):
+        return cls(alignment.offset, alignment.grainSize)
+
+    def is_aligned(self, start, end, sector):
+        if not start <= sector <= end:
+            return False
+
+        if self.grain_size:
+            return (sector - self.offset) % self.grain_size == 0
+
+        return sector == self.offset
+
+    def _closest_inside(self, start, end, sector):
+        if not self.grain_size:
+            return sector if self.is_aligned(start, end, sector) else None
+
+        if sector < start:
+            sector += _round_up_to(start - sector, self.grain_size)
+        if sector > end:
+            sector -= _round_up_to(sector - end, self.grain_size)
+
+        return sector if start <= sector <= end else None
+
+    def _align_up(self, start, end, sector):
+        if self.grain_size:
+            sector = _round_up_to(sector - self.offset, self.grain_size) + self.offset
+        else:
+            sector = self.offset
+        return self._closest_inside(start, end, sector)
+
+    def _align_down(self, start, end, sector):
+        if self.grain_size:
+            sector = _round_down_to(sector - self.offset, self.grain_size) + self.offset
+        else:
+            sector = self.offset
+        return self._closest_inside(start, end, sector)
+
+    def align_up(self, start, end, sector):
+        aligned = self._align_up(start, end, sector)
+        if aligned is None:
+            raise ArithmeticError("Could not align up to sector %d" % sector)
+        return aligned
+
+    def align_down(self, start, end, sector):
+        aligned = self._align_down(start, end, sector)
+        if aligned is None:
+            raise ArithmeticError("Could not align down to sector %d" % sector)
+        return aligned
+
+    def align_nearest(self, start, end, sector):
+        up = self._align_up(start, end, sector)
+        down = self._align_down(start, end, sector)
+        if up is None and down is None:
+            raise ArithmeticError("Could not align to closest sector to %d" % sector)
+        elif up is None:
+            return down
+        elif down is None:
+            return up
+
+        return up if abs(sector - up) < abs(sector - down) else down
+
+
+class FreeRegion(namedtuple("FreeRegion", ["path", "start", "end"])):
+
+    """ A free region of a disk, in sectors. """
+
+    __slots__ = ()
+
+    @property
+    def length(self):
+        return self.end - self.start + 1
+
+
+class PlannedPartition(object):
+
+    """ A new partition placed on a :class:`DiskSpace`. """
+
+    def __init__(self, device, disk, start, end):
+        self.device = device
+        self.disk = disk
+        self.start = start
+        self.end = end
+
+
+class PlannedPartitionRequest(PartitionRequest):
+
+    """ A :class:`PartitionRequest` for a :class:`PlannedPartition`. """
+
+    def __init__(self, planned, space):
+        # pylint: disable=bad-super-call
+        super(PartitionRequest, self).__init__(planned.device)
+        self.start = planned.start
+        self.end = planned.end
+        self.base = planned.end - planned.start + 1
+        self.max_start_sector = space.max_start_sector
+        self._set_max_growth(Size(space.sector_size), space.max_length)
+
+
+class PlannedDiskChunk(DiskChunk):
+
+    """ A :class:`DiskChunk` for an aligned free region of a :class:`DiskSpace`. """
+
+    def __init__(self, space, start, end, requests=None):
+        # pylint: disable=bad-super-call
+        self.geometry = None
+        self.start = start
+        self.end = end
+        self.sector_size = Size(space.sector_size)
+        self.path = space.path
+        super(DiskChunk, self).__init__(end - start + 1, requests=requests)
+
+
+class DiskSpace(object):
+
+    """ Free space and partition slots of a disklabel as plain integers.
+
+        A snapshot of the disklabel's parted disk is taken when the instance
+        is created. Partitions placed with :meth:`add_partition` only update
+        the model, which is what allows :func:`allocate_partitions` to try
+        every candidate layout without touching parted. Only primary
+        partitions can be placed.
+    """
+
+    def __init__(self, disk, freespace):
+        """
+            :param disk: the disk
+            :type disk: :class:`~.devices.StorageDevice`
+            :param freespace: the free regions chunks are created from
+            :type freespace: list of :class:`parted.Geometry`
+        """
+        self.disk = disk
+        self.path = disk.path
+        self.disklabel = disk.format
+
+        parted_disk = self.disklabel.parted_disk
+        self.sector_size = parted_disk.device.sectorSize
+        self.max_start_sector = parted_disk.maxPartitionStartSector
+        self.max_length = parted_disk.maxPartitionLength
+        self.max_primary_count = parted_disk.maxPrimaryPartitionCount
+        self.primary_count = parted_disk.primaryPartitionCount
+        self.supports_extended = parted_disk.supportsFeature(parted.DISK_TYPE_EXTENDED)
+        self.max_logicals = parted_disk.getMaxLogicalPartitions()
+        self.logical_count = len(parted_disk.getLogicalPartitions())
+
+        extended = parted_disk.getExtendedPartition()
+        if extended:
+            self.extended = (extended.geometry.start, extended.geometry.end)
+        else:
+            self.extended = None
+
+        self.free = [FreeRegion(self.path, f.start, f.end)
+                     for f in parted_disk.getFreeSpaceRegions()]
+        self.partitions = []    # list of PlannedPartition
+
+        # (region, aligned start, aligned end) for each chunk, as in get_disk_chunks
+        self._chunk_regions = []
+        for f in (f for f in freespace if f.device.path == self.path):
+            try:
+                size = sectors_to_size(f.length, self.disklabel.sector_size)
+                alignment = self.disklabel.get_alignment(size=size)
+            except AlignmentError:
+                continue
+
+            alignment = SectorAlignment.from_parted(alignment)
+            end_alignment = SectorAlignment(alignment.offset - 1, alignment.grain_size)
+            al_start = alignment.align_up(f.start, f.end, f.start)
+            al_end = end_alignment.align_down(f.start, f.end, f.end)
+            if al_start >= al_end or al_end - al_start + 1 < alignment.grain_size:
+                continue
+
+            self._chunk_regions.append((f.start, f.end, al_start, al_end))
+
+    def next_partition_type(self, no_primary=None):
+        """ See :func:`get_next_partition_type`. """
+        return _next_partition_type(self.primary_count, self.max_primary_count,
+                                    self.extended, self.supports_extended,
+                                    self.logical_count, self.max_logicals,
+                                    no_primary=no_primary)
+
+    def best_free_region(self, part_type, req_size, boot=None, best_free=None,
+                         grow=None):
+        """ See :func:`get_best_free_space_region`.
+
+            :returns: the best region
+            :rtype: :class:`FreeRegion` or NoneType
+        """
+        req_bytes = int(req_size)
+        op = gt if grow or part_type == parted.PARTITION_EXTENDED else lt
+        for free in self.free:
+            if self.extended:
+                in_extended = self.extended[0] <= free.start and free.end <= self.extended[1]
+                if ((in_extended and part_type == parted.PARTITION_NORMAL) or
+                        (not in_extended and part_type == parted.PARTITION_LOGICAL)):
+                    continue
+
+            if free.start > self.max_start_sector:
+                continue
+
+            if boot and free.start * self.sector_size + req_bytes > MAX_BOOT_BYTES:
+                continue
+
+            if req_bytes <= free.length * self.sector_size:
+                if not best_free or op(free.length, best_free.length):
+                    best_free = free
+                    if boot:
+                        break
+
+        return best_free
+
+    def place_partition(self, free, size):
+        """ Return where a new primary partition would be placed.
+
+            :param free: the free region to place the partition in
+            :type free: :class:`FreeRegion`
+            :param size: size of the partition
+            :type size: :class:`~.size.Size`
+            :returns: start and end sector
+            :rtype: tuple of int
+            :raises: ArithmeticError or :class:`~.errors.PartitioningError`
+                     where :func:`add_partition` would
+        """
+        alignment = SectorAlignment.from_parted(self.disklabel.get_alignment(size=size))
+        end_alignment = SectorAlignment(alignment.offset - 1, alignment.grain_size)
+
+        start = free.start
+        if not alignment.is_aligned(free.start, free.end, start):
+            start = alignment.align_nearest(free.start, free.end, start)
+
+        end = start + size_to_sectors(size, Size(self.sector_size)) - 1
+        if not end_alignment.is_aligned(free.start, free.end, end):
+            end = end_alignment.align_up(free.start, free.end, end)
+            if start > end:
+                raise PartitioningError(_("unable to allocate aligned partition"))
+
+        if self.max_length and end - start + 1 > self.max_length:
+            raise PartitioningError(_("requested size exceeds maximum allowed"))
+
+        return (start, end)
+
+    def add_partition(self, device, free, start, end):
+        """ Place a new primary partition in a free region.
+
+            :returns: the new partition
+            :rtype: :class:`PlannedPartition`
+        """
+        idx = self.free.index(free)
+        remaining = [FreeRegion(self.path, s, e) for (s, e) in ((free.start, start - 1),
+                                                                (end + 1, free.end))
+                     if s <= e]
+        self.free[idx:idx + 1] = remaining
+        self.primary_count += 1
+
+        planned = PlannedPartition(device, self.disk, start, end)
+        self.partitions.append(planned)
+        return planned
+
+    def growth(self, extra=None):
+        """ Return the growth the disk's growable partitions would get.
+
+            :keyword extra: a partition to consider in addition to the placed ones
+            :type extra: :class:`PlannedPartition`
+            :returns: total growth in sectors
+            :rtype: int
+        """
+        partitions = self.partitions + [extra] if extra else self.partitions
+        chunks = [PlannedDiskChunk(self, al_start, al_end)
+                  for (_start, _end, al_start, al_end) in self._chunk_regions]
+        for p in partitions:
+            for i, (start, end, _al_start, _al_end) in enumerate(self._chunk_regions):
+                if start <= p.start and p.end <= end:
+                    chunks[i].add_request(PlannedPartitionRequest(p, self))
+                    break
+
+        growth = 0
+        for chunk in chunks:
+            chunk.grow_requests()
+            growth += chunk.growth
+
+        log.debug("disk %s growth: %d (%s)", self.path, growth,
+                  sectors_to_size(growth, Size(self.sector_size)))
+        return growth
+
+
+def plan_partitions(storage, disks, partitions, freespace):
+    """ Plan the allocation of new partitions on integer models of the disks.
+
+        :param storage: a Blivet instance
+        :type storage: :class:`~.Blivet`
+        :param disks: list of usable disks
+        :type disks: list of :class:`~.devices.StorageDevice`
+        :param partitions: new partitions, in allocation order
+        :type partitions: list of :class:`~.devices.PartitionDevice`
+        :param freespace: list of free regions on disks
+        :type freespace: list of :class:`parted.Geometry`
+        :returns: the planned partitions, or None if the requests cannot be
+                  planned on the model
+        :rtype: list of :class:`PlannedPartition` or NoneType
+        :raises: ArithmeticError or :class:`~.errors.StorageError` where the
+                 allocation on the parted disks would fail
+
+        The choices :func:`allocate_partitions` makes on the parted disks
+        are made here on :class:`DiskSpace` instances instead, with the
+        growth of the disks that do not change between candidates computed
+        only once. Requests for specific start sectors, for extended or
+        logical partitions and for disks with labels other than those in
+        :const:`PLANNED_LABEL_TYPES` cannot be planned.
+    """
+    if any(p.is_extended or p.req_start_sector is not None for p in partitions):
+        log.debug("partition requests cannot be planned")
+        return None
+
+    spaces = {}
+    for disk in disks:
+        if disk.format.label_type not in PLANNED_LABEL_TYPES:
+            log.debug("disklabel on %s cannot be planned", disk.name)
+            return None
+
+        if disk.path not in spaces:
+            spaces[disk.path] = DiskSpace(disk, freespace)
+
+    disk_growth = {}    # growth of each disk with the partitions placed so far
+    total_growth = 0
+    plan = []
+    for idx, _part in enumerate(partitions):
+        req_disks = _get_request_disks(storage, _part, disks)
+        boot = _part.req_base_weight > 1000
+        grow = any(p.req_grow for p in partitions[:idx + 1])
+        if grow and not disk_growth:
+            disk_growth = dict((path, space.growth()) for (path, space) in spaces.items())
+            total_growth = sum(disk_growth.values())
+
+        free = None
+        use_space = None
+        growth = 0  # in sectors
+        for _disk in req_disks:
+            space = spaces[_disk.path]
+            disklabel = space.disklabel
+            current_free = None if _part.req_grow else free
+            disklabel.get_alignment(size=_part.req_size)
+            req_size = align_size_for_disklabel(_part.req_size, disklabel)
+
+            new_part_type = space.next_partition_type()
+            if new_part_type is None:
+                continue
+
+            if _part.req_primary and new_part_type != parted.PARTITION_NORMAL:
+                if space.primary_count < space.max_primary_count:
+                    new_part_type = parted.PARTITION_NORMAL
+                else:
+                    continue
+            elif _part.req_part_type is not None and \
+                    new_part_type != _part.req_part_type:
+                new_part_type = _part.req_part_type
+
+            best = space.best_free_region(new_part_type, req_size,
+                                          boot=boot, best_free=current_free,
+                                          grow=_part.req_grow)
+            if best == free and not _part.req_primary and \
+               new_part_type == parted.PARTITION_NORMAL:
+                new_part_type = space.next_partition_type(no_primary=True)
+                if new_part_type:
+                    best = space.best_free_region(new_part_type, req_size,
+                                                  boot=boot, best_free=current_free,
+                                                  grow=_part.req_grow)
+
+            if best and free != best:
+                if new_part_type != parted.PARTITION_NORMAL:
+                    log.debug("%s would need an extended or logical partition",
+                              _part.name)
+                    return None
+
+                update = True
+                if grow:
+                    new_growth = total_growth - disk_growth[space.path]
+                    try:
+                        (start, end) = space.place_partition(best, req_size)
+                    except ArithmeticError:
+                        log.debug("failed to place aligned partition for growth test")
+                    else:
+                        candidate = PlannedPartition(_part, _disk, start, end)
+                        new_growth += space.growth(extra=candidate)
+
+                    if free is not None and new_growth <= growth:
+                        update = False
+                    else:
+                        growth = new_growth
+
+                if update:
+                    use_space = space
+                    free = best
+
+            if free and boot:
+                break
+
+        if free is None:
+            log.debug("no free region for %s", _part.name)
+            return None
+
+        aligned_size = align_size_for_disklabel(_part.req_size, use_space.disklabel)
+        try:
+            (start, end) = use_space.place_partition(free, aligned_size)
+        except ArithmeticError:
+            return None
+
+        plan.append(use_space.add_partition(_part, free, start, end))
+        if disk_growth:
+            total_growth -= disk_growth[use_space.path]
+            disk_growth[use_space.path] = use_space.growth()
+            total_growth += disk_growth[use_space.path]
+
+        log.debug("planned %s at %d-%d on %s", _part.name, start, end,
+                  use_space.disk.name)
+
+    return plan
+
+
+def apply_partition_plan(plan):
+    """ Add planned partitions to their disks' parted disks.
+
+        :param plan: the planned partitions
+        :type plan: list of :class:`PlannedPartition`
+        :returns: whether all partitions were added; if not, none was
+        :rtype: bool
+    """
+    added = []
+    try:
+        for planned in plan:
+            _part = planned.device
+            disklabel = planned.disk.format
+            geometry = parted.Geometry(device=disklabel.parted_device,
+                                       start=planned.start,
+                                       end=planned.end)
+            partition = parted.Partition(disk=disklabel.parted_disk,
+                                         type=parted.PARTITION_NORMAL,
+                                         geometry=geometry)
+            constraint = parted.Constraint(exactGeom=geometry)
+            disklabel.parted_disk.addPartition(partition=partition,
+                                               constraint=constraint)
+            added.append(_part)
+
+            # this one sets the name
+            _part.parted_partition = partition
+            _part.disk = planned.disk
+            _part.parted_partition = disklabel.parted_disk.getPartitionByPath(_part.path)
+            log.debug("created partition %s of %s and added it to %s",
+                      partition.getDeviceNodeName(),
+                      Size(partition.getLength(unit="B")),
+                      disklabel.device)
+    except Exception as e:  # pylint: disable=broad-except
+        log.warning("failed to apply the partition plan: %s", e)
+        for _part in reversed(added):
+            _part.disk.format.parted_disk.removePartition(_part.parted_partition)
+            _part.parted_partition = None
+            _part.disk = None
+        return False
+
+    return True
+
+
 class TotalSizeSet(object):
 
     """ Set of device requests with a target combined size.
@@ -1992,13 +2739,13 @@ def grow_lvm(storage):
         if sum(lv.req_percent for lv in percentage_based_lvs) > 100:
             raise ValueError("sum of percentages within a vg cannot exceed 100")
 
-        percent_base = sum(vg.align(lv.req_size, roundup=False) / vg.pe_size
-                           for lv in percentage_based_lvs)
+        pe_size = int(vg.pe_size)
+        percent_base = sum(int(lv.req_size) // pe_size for lv in percentage_based_lvs)
         percentage_basis = vg.free_extents + percent_base
         for lv in percentage_based_lvs:
             new_extents = int(lv.req_percent * Decimal('0.01') * percentage_basis)
             # set req_size also so the request can also be growable if desired
-            lv.size = lv.req_size = vg.pe_size * new_extents
+            lv.size = lv.req_size = Size(pe_size * new_extents)
 
         # grow regular lvs
         chunk = VGChunk(vg, requests=[LVRequest(l) for l in fatlvs])
@@ -0,0 +1,225 @@
+# cache.py
+# On-disk cache of device probe results for populating a DeviceTree.
+#
+# Copyright (C) 2016  Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU Lesser General Public License v.2, or (at your option) any later
+# version. This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY expressed or implied, including the implied
+# warranties of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See
+# the GNU Lesser General Public License for more details.  You should have
+# received a copy of the GNU Lesser General Public License along with this
+# program; if not, write to the Free Software Foundation, Inc., 51 Franklin
+# Street, Fifth Floor, Boston, MA 02110-1301, USA.  Any Red Hat trademarks
+# that are incorporated in the source code or documentation are not subject
+# to the GNU Lesser General Public License and may only be used or
+# replicated with the express permission of Red Hat, Inc.
+#
+
+import hashlib
+import json
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from .. import udev
+from ..mounts import mounts_cache
+from ..static_data import probe_data
+
+import logging
+log = logging.getLogger("blivet")
+
+CACHE_VERSION = 2
+""" version of the cache file format, files with other versions are ignored """
+
+# Only results that depend on nothing but the device's own contents can be
+# saved. Whether a disk is a multipath member also depends on the other
+# paths to the LUN and on the multipath configuration.
+CACHED_PROBES = frozenset(["fs_size_info"])
+""" names of the device queries whose results are saved """
+
+HEAD_BYTES = 1024 * 1024
+TAIL_BYTES = 64 * 1024
+""" areas at the start and end of a device covered by the metadata checksum """
+
+
+def _metadata_checksum(path, size):
+    """ Return a checksum of the areas of a device holding its metadata.
+
+        :param str path: the device node
+        :param int size: the size of the device in bytes
+
+        Partition tables, superblocks and volume metadata live in the first
+        MiB of a device, with backups and some md superblocks at its end.
+    """
+    digest = hashlib.sha1()
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        digest.update(os.pread(fd, HEAD_BYTES, 0))
+        if size > HEAD_BYTES:
+            offset = max(HEAD_BYTES, size - TAIL_BYTES)
+            digest.update(os.pread(fd, size - offset, offset))
+    finally:
+        os.close(fd)
+
+    return digest.hexdigest()
+
+
+def device_fingerprint(info):
+    """ Return a fingerprint identifying the current state of a device.
+
+        :param info: udev info for the device
+        :type info: :class:`pyudev.Device`
+        :returns: major:minor, udev initialization time, size in sectors and
+                  metadata checksum, or None if the device can't be cached
+        :rtype: list or NoneType
+
+        Mounted devices are never cached since their contents (eg: the
+        minimum size of the filesystem) change without notice.
+    """
+    devname = udev.device_get_devname(info)
+    initialized = info.get("USEC_INITIALIZED")
+    if not devname or not initialized:
+        return None
+
+    if mounts_cache.is_mounted(devname):
+        return None
+
+    try:
+        with open(os.path.join(udev.device_get_sysfs_path(info), "size")) as size_file:
+            sectors = int(size_file.read())
+        checksum = _metadata_checksum(devname, sectors * 512)
+    except (OSError, ValueError) as e:
+        log.debug("cannot fingerprint %s: %s", devname, e)
+        return None
+
+    return ["%d:%d" % (udev.device_get_major(info), udev.device_get_minor(info)),
+            initialized, sectors, checksum]
+
+
+class PopulateCache(object):
+    """ On-disk cache of the results of device queries run while populating.
+
+        Devices are identified by name and fingerprinted with
+        :func:`device_fingerprint`. The saved results of a device are only
+        used if its fingerprint has not changed since they were saved.
+
+        The device objects themselves are always rebuilt: they hold parted
+        and libblockdev state that can't be saved, and restoring them would
+        make the device ids depend on the contents of the cache.
+    """
+
+    def __init__(self, path):
+        """
+            :param str path: the cache file
+        """
+        self.path = path
+        self._entries = None
+        self._fingerprints = {}
+        self._paths = {}
+
+    def _load(self):
+        if self._entries is not None:
+            return
+
+        self._entries = {}
+        try:
+            with open(self.path) as cache_file:
+                data = json.load(cache_file)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            log.info("ignoring unreadable populate cache %s: %s", self.path, e)
+            return
+
+        if not isinstance(data, dict) or data.get("version") != CACHE_VERSION:
+            log.info("ignoring populate cache %s with another version", self.path)
+            return
+
+        self._entries = data.get("devices", {})
+
+    def restore(self, devices, max_workers=1):
+        """ Make the saved results of unchanged devices available to the populator.
+
+            :param devices: udev info for the devices about to be handled
+            :type devices: list of :class:`pyudev.Device`
+            :keyword int max_workers: number of threads computing fingerprints
+            :returns: the names of the devices whose results were restored
+            :rtype: set of str
+        """
+        self._load()
+        if max_workers > 1:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                fingerprints = list(executor.map(device_fingerprint, devices))
+        else:
+            fingerprints = [device_fingerprint(d) for d in devices]
+
+        restored = set()
+        for (info, fingerprint) in zip(devices, fingerprints):
+            name = udev.device_get_name(info)
+            self._fingerprints[name] = fingerprint
+            self._paths[name] = set([udev.device_get_devname(info)] + udev.device_get_symlinks(info))
+
+            entry = self._entries.get(name)
+            if fingerprint is None or entry is None or entry["fingerprint"] != fingerprint:
+                continue
+
+            for (probe, key, value) in entry["probes"]:
+                probe_data.put(probe, key, value)
+
+            restored.add(name)
+
+        log.debug("restored cached probe results for %s", sorted(restored))
+        return restored
+
+    def save(self, merge=False):
+        """ Save the results of the queries run for the devices seen since the last save.
+
+            :keyword bool merge: keep the entries of devices that were not
+                                 seen (eg: after a rescan of some disks)
+        """
+        self._load()
+        recorded = probe_data.recorded()
+        entries = dict(self._entries) if merge else {}
+        for (name, fingerprint) in self._fingerprints.items():
+            old = self._entries.get(name)
+            if fingerprint is None:
+                entries.pop(name, None)
+                continue
+
+            results = {}
+            if old is not None and old["fingerprint"] == fingerprint:
+                results = dict(((probe, key), value) for (probe, key, value) in old["probes"])
+
+            results.update(((probe, key), value) for ((probe, key), value) in recorded.items()
+                           if key in self._paths[name])
+            entries[name] = {"fingerprint": fingerprint,
+                             "probes": [[probe, key, value] for ((probe, key), value) in sorted(results.items())]}
+
+        self._entries = entries
+        self._fingerprints = {}
+        self._paths = {}
+
+        tmp = None
+        try:
+            (fd, tmp) = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)),
+                                         prefix=".populate-cache")
+            with os.fdopen(fd, "w") as cache_file:
+                json.dump({"version": CACHE_VERSION, "devices": entries}, cache_file)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            log.error("failed to save populate cache %s: %s", self.path, e)
+            if tmp is not None and os.path.exists(tmp):
+                os.unlink(tmp)
+
+    def invalidate(self):
+        """ Remove all saved results. """
+        self._entries = {}
+        self._fingerprints = {}
+        self._paths = {}
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
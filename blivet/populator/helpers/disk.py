@@ -43,11 +43,12 @@ class DiskDevicePopulator(DevicePopulator):
 
     @classmethod
     def match(cls, data):
-        return (udev.device_is_disk(data) and
-                not udev.device_is_cdrom(data) and
-                not udev.device_is_partition(data) and
-                not udev.device_is_dm(data) and
-                not (udev.device_is_md(data) and not udev.device_get_md_container(data)))
+        classification = udev.device_class(data)
+        return (classification.is_disk and
+                not classification.is_cdrom and
+                not classification.is_partition and
+                not classification.is_dm and
+                not classification.is_md_array)
 
     def _get_kwargs(self):
         sysfs_path = udev.device_get_sysfs_path(self.data)
@@ -84,7 +85,7 @@ class iScsiDevicePopulator(DiskDevicePopulator):
     def match(cls, data):
         from ...iscsi import iscsi
         return (super().match(data) and
-                udev.device_is_iscsi(data) and iscsi.initiator and
+                udev.device_class(data).is_iscsi and iscsi.initiator and
                 iscsi.initiator == udev.device_get_iscsi_initiator(data))
 
     def _get_kwargs(self):
@@ -123,7 +124,7 @@ class FCoEDevicePopulator(DiskDevicePopulator):
     @classmethod
     def match(cls, data):
         return (super().match(data) and
-                udev.device_is_fcoe(data))
+                udev.device_class(data).is_fcoe)
 
     def _get_kwargs(self):
         kwargs = super()._get_kwargs()
@@ -141,11 +142,11 @@ class MDBiosRaidDevicePopulator(DiskDevicePopulator):
     @classmethod
     def match(cls, data):
         return (super().match(data) and
-                udev.device_get_md_container(data))
+                udev.device_class(data).md_container)
 
     def _get_kwargs(self):
         kwargs = super()._get_kwargs()
-        parent_path = udev.device_get_md_container(self.data)
+        parent_path = udev.device_class(self.data).md_container
         parent_name = device_path_to_name(parent_path)
         container = self._devicetree.get_device_by_name(parent_name)
 
@@ -166,7 +167,7 @@ class MDBiosRaidDevicePopulator(DiskDevicePopulator):
                 return
 
         kwargs["parents"] = [container]
-        kwargs["level"] = udev.device_get_md_level(self.data)
+        kwargs["level"] = udev.device_class(self.data).md_level
         kwargs["member_devices"] = udev.device_get_md_devices(self.data)
         kwargs["uuid"] = udev.device_get_md_uuid(self.data)
         kwargs["exists"] = True
@@ -186,7 +187,7 @@ class DASDDevicePopulator(DiskDevicePopulator):
     @classmethod
     def match(cls, data):
         return (super().match(data) and
-                udev.device_is_dasd(data))
+                udev.device_class(data).is_dasd)
 
     def _get_kwargs(self):
         kwargs = super()._get_kwargs()
@@ -207,7 +208,7 @@ class ZFCPDevicePopulator(DiskDevicePopulator):
     @classmethod
     def match(cls, data):
         return (super().match(data) and
-                udev.device_is_zfcp(data))
+                udev.device_class(data).is_zfcp)
 
     def _get_kwargs(self):
         kwargs = super()._get_kwargs()
@@ -29,6 +29,7 @@ from gi.repository import BlockDev as blockdev
 from ... import formats
 from ... import udev
 from ...errors import InvalidDiskLabelError
+from ...static_data import probe_data
 from ...storage_log import log_exception_info, log_method_call
 from .formatpopulator import FormatPopulator
 
@@ -44,9 +45,11 @@ class DiskLabelFormatPopulator(FormatPopulator):
     def match(cls, data, device):
         # XXX ignore disklabels on multipath or biosraid member disks
         return (bool(udev.device_get_disklabel_type(data)) and
-                not udev.device_is_biosraid_member(data) and
+                not udev.device_class(data).is_biosraid_member and
                 udev.device_get_format(data) != "iso9660" and
-                not (device.is_disk and blockdev.mpath_is_mpath_member(device.path)))
+                not (device.is_disk and
+                     probe_data.get("mpath_member", device.path,
+                                    blockdev.mpath_is_mpath_member, device.path)))
 
     def _get_kwargs(self):
         kwargs = super()._get_kwargs()
@@ -59,7 +62,7 @@ class DiskLabelFormatPopulator(FormatPopulator):
         # if there is no disklabel on the device
         # blkid doesn't understand dasd disklabels, so bypass for dasd
         if disklabel_type is None and not \
-           (self.device.is_disk and udev.device_is_dasd(self.data)):
+           (self.device.is_disk and udev.device_class(self.data).is_dasd):
             log.debug("device %s does not contain a disklabel", self.device.name)
             return
 
@@ -119,7 +122,7 @@ class DiskLabelFormatPopulator(FormatPopulator):
                                    None)
             else:
                 udev_device = next((ud for ud in udev_devices
-                                    if udev.device_get_partition_disk(ud) == self.device.name and
+                                    if udev.device_class(ud).partition_disk == self.device.name and
                                     int(ud.get("ID_PART_ENTRY_OFFSET")) == start_sector),
                                    None)
 
@@ -35,12 +35,13 @@ class DMDevicePopulator(DevicePopulator):
 
     @classmethod
     def match(cls, data):
-        return (udev.device_is_dm(data) and
-                not udev.device_is_dm_partition(data) and
-                not udev.device_is_dm_luks(data) and
-                not udev.device_is_dm_lvm(data) and
-                not udev.device_is_dm_mpath(data) and
-                not udev.device_is_dm_raid(data))
+        classification = udev.device_class(data)
+        return (classification.is_dm and
+                not classification.is_dm_partition and
+                not classification.is_dm_luks and
+                not classification.is_dm_lvm and
+                not classification.is_dm_mpath and
+                not classification.is_dm_raid)
 
     def run(self):
         name = udev.device_get_name(self.data)
@@ -33,7 +33,7 @@ from .devicepopulator import DevicePopulator
 class LoopDevicePopulator(DevicePopulator):
     @classmethod
     def match(cls, data):
-        return (udev.device_is_loop(data) and
+        return (udev.device_class(data).is_loop and
                 bool(blockdev.loop.get_backing_file(udev.device_get_name(data))))
 
     def run(self):
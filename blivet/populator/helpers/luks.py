@@ -40,7 +40,7 @@ log = logging.getLogger("blivet")
 class LUKSDevicePopulator(DevicePopulator):
     @classmethod
     def match(cls, data):
-        return udev.device_is_dm_luks(data)
+        return udev.device_class(data).is_dm_luks
 
     def run(self):
         parents = self._devicetree._add_slave_devices(self.data)
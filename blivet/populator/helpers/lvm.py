@@ -37,7 +37,7 @@ from ...storage_log import log_method_call
 from .devicepopulator import DevicePopulator
 from .formatpopulator import FormatPopulator
 
-from ...static_data import lvs_info, pvs_info
+from ...static_data import lvm_info
 
 import logging
 log = logging.getLogger("blivet")
@@ -46,7 +46,7 @@ log = logging.getLogger("blivet")
 class LVMDevicePopulator(DevicePopulator):
     @classmethod
     def match(cls, data):
-        return udev.device_is_dm_lvm(data)
+        return udev.device_class(data).is_dm_lvm
 
     def run(self):
         name = udev.device_get_name(self.data)
@@ -88,7 +88,7 @@ class LVMFormatPopulator(FormatPopulator):
     def _get_kwargs(self):
         kwargs = super()._get_kwargs()
 
-        pv_info = pvs_info.cache.get(self.device.path, None)
+        pv_info = lvm_info.pvs.get(self.device.path, None)
 
         name = udev.device_get_name(self.data)
         if pv_info:
@@ -121,11 +121,11 @@ class LVMFormatPopulator(FormatPopulator):
             return
 
         vg_name = vg_device.name
-        lv_info = dict((k, v) for (k, v) in iter(lvs_info.cache.items())
-                       if v.vg_name == vg_name)
+        lv_info = lvm_info.vg_lvs(vg_name)
 
         # FIXME: This should account for added/removed LVs.
-        self._devicetree.names.extend(n for n in lv_info.keys() if n not in self._devicetree.names)
+        names = set(self._devicetree.names)
+        self._devicetree.names.extend(n for n in lv_info.keys() if n not in names)
 
         for lv_device in vg_device.lvs[:]:
             if lv_device.name not in lv_info:
@@ -346,7 +346,7 @@ class LVMFormatPopulator(FormatPopulator):
                 log.warning("Failed to determine parent LV for an internal LV '%s'", lv.name)
 
     def _add_vg_device(self):
-        pv_info = pvs_info.cache.get(self.device.path, None)
+        pv_info = lvm_info.pvs.get(self.device.path, None)
         if pv_info:
             vg_name = pv_info.vg_name
             vg_uuid = pv_info.vg_uuid
@@ -401,7 +401,7 @@ class LVMFormatPopulator(FormatPopulator):
         if vg_device is None:
             return
 
-        pv_info = pvs_info.cache.get(self.device.path, None)
+        pv_info = lvm_info.pvs.get(self.device.path, None)
         if not pv_info or not pv_info.vg_name:
             return
 
@@ -411,7 +411,7 @@ class LVMFormatPopulator(FormatPopulator):
         # TODO: update name registry
 
     def _update_pv_format(self):
-        pv_info = pvs_info.cache.get(self.device.path, None)
+        pv_info = lvm_info.pvs.get(self.device.path, None)
         if not pv_info:
             return
 
@@ -421,9 +421,18 @@ class LVMFormatPopulator(FormatPopulator):
         self.device.format.pe_free = Size(pv_info.pv_free)
 
     def update(self):
-        self._devicetree.drop_lvm_cache()
+        # only this PV and the VGs it belongs or belonged to can have changed
+        vg_names = set([self.device.format.vg_name])
+        lvm_info.drop_pvs()
         self._update_pv_format()
-        pv_info = pvs_info.cache.get(self.device.path, None)
+        pv_info = lvm_info.pvs.get(self.device.path, None)
+        if pv_info:
+            vg_names.add(pv_info.vg_name)
+
+        for vg_name in vg_names:
+            if vg_name:
+                lvm_info.drop_vg(vg_name)
+
         vg_device = self._get_vg_device()
         if vg_device is None:
             # The VG device isn't in the tree. The PV might have just been
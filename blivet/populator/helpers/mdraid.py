@@ -33,6 +33,7 @@ from ...devices import MDRaidArrayDevice, MDContainerDevice
 from ...devices import device_path_to_name
 from ...errors import DeviceError, NoSlavesError
 from ...flags import flags
+from ...static_data import probe_data
 from ...storage_log import log_method_call
 from .devicepopulator import DevicePopulator
 from .formatpopulator import FormatPopulator
@@ -44,8 +45,7 @@ log = logging.getLogger("blivet")
 class MDDevicePopulator(DevicePopulator):
     @classmethod
     def match(cls, data):
-        return (udev.device_is_md(data) and
-                not udev.device_get_md_container(data))
+        return udev.device_class(data).is_md_array
 
     def run(self):
         name = udev.device_get_md_name(self.data)
@@ -108,13 +108,14 @@ class MDFormatPopulator(FormatPopulator):
         # this will be None for members of v0 metadata arrays
         kwargs["uuid"] = udev.device_get_md_device_uuid(self.data)
 
-        kwargs["biosraid"] = udev.device_is_biosraid_member(self.data)
+        kwargs["biosraid"] = udev.device_class(self.data).is_biosraid_member
         return kwargs
 
     def run(self):
         super().run()
         try:
-            md_info = blockdev.md.examine(self.device.path)
+            md_info = probe_data.get("md_examine", self.device.path,
+                                     blockdev.md.examine, self.device.path)
         except blockdev.MDRaidError as e:
             # This could just mean the member is not part of any array.
             log.debug("blockdev.md.examine error: %s", str(e))
@@ -147,12 +148,13 @@ class MDFormatPopulator(FormatPopulator):
             # XXX This is mainly for containers now since their name/device is
             #     not given by mdadm examine as we run it.
             for dev in udev.get_devices():
-                if not udev.device_is_md(dev):
+                classification = udev.device_class(dev)
+                if not classification.is_md:
                     continue
 
                 try:
                     dev_uuid = udev.device_get_md_uuid(dev)
-                    dev_level = udev.device_get_md_level(dev)
+                    dev_level = classification.md_level
                 except KeyError:
                     continue
 
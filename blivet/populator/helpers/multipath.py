@@ -34,8 +34,9 @@ log = logging.getLogger("blivet")
 class MultipathDevicePopulator(DevicePopulator):
     @classmethod
     def match(cls, data):
-        return (udev.device_is_dm_mpath(data) and
-                not udev.device_is_dm_partition(data))
+        classification = udev.device_class(data)
+        return (classification.is_dm_mpath and
+                not classification.is_dm_partition)
 
     def run(self):
         name = udev.device_get_name(self.data)
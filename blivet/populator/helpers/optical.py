@@ -29,7 +29,7 @@ from .devicepopulator import DevicePopulator
 class OpticalDevicePopulator(DevicePopulator):
     @classmethod
     def match(cls, data):
-        return udev.device_is_cdrom(data)
+        return udev.device_class(data).is_cdrom
 
     def run(self):
         log_method_call(self)
@@ -43,7 +43,7 @@ class PartitionDevicePopulator(DevicePopulator):
 
     @classmethod
     def match(cls, data):
-        return (udev.device_is_partition(data) or udev.device_is_dm_partition(data))
+        return udev.device_class(data).is_any_partition
 
     def run(self):
         name = udev.device_get_name(self.data)
@@ -57,7 +57,7 @@ class PartitionDevicePopulator(DevicePopulator):
                 return device
 
         disk = None
-        sys_name = udev.device_get_partition_disk(self.data)
+        sys_name = udev.device_class(self.data).partition_disk
         if sys_name:
             disk_name = udev.resolve_devspec(sys_name)
             disk = self._devicetree.get_device_by_name(disk_name)
@@ -23,6 +23,10 @@
 import os
 import pprint
 import copy
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from threading import Lock
+
 import parted
 
 import gi
@@ -38,17 +42,26 @@ from ..devices import MultipathDevice
 from ..devices import NoDevice
 from ..devicelibs import lvm
 from .. import formats
+from ..formats.fs import FSProbe
 from .. import udev
 from .. import util
 from ..flags import flags
 from ..storage_log import log_method_call
 from ..threads import SynchronizedMeta
+from .cache import CACHED_PROBES, PopulateCache
 from .helpers import get_device_helper, get_format_helper
-from ..static_data import lvs_info, pvs_info, luks_data
+from ..static_data import fs_info, lvm_info, luks_data, probe_data
+from ..static_data.fs_info import SUPERBLOCKS
 
 import logging
 log = logging.getLogger("blivet")
 
+PROBE_WORKERS = 4
+""" default number of threads running device probes during populate """
+
+# libparted keeps a global list of the devices it has opened
+_parted_lock = Lock()
+
 
 def parted_exn_handler(exn_type, exn_options, exn_msg):
     """ Answer any of parted's yes/no questions in the affirmative.
@@ -63,6 +76,151 @@ def parted_exn_handler(exn_type, exn_options, exn_msg):
     return ret
 
 
+def _device_parents(info):
+    """ Return the sysfs names of a device's slaves and, for partitions, disk. """
+    sysfs_path = udev.device_get_sysfs_path(info)
+    try:
+        parents = os.listdir("%s/slaves" % sysfs_path)
+    except OSError:
+        parents = []
+
+    if info.get("DEVTYPE") == "partition":
+        parents.append(os.path.basename(os.path.dirname(sysfs_path)))
+
+    return parents
+
+
+def device_levels(devices):
+    """ Group udev devices into levels of the holder/slave graph.
+
+        :param devices: udev info for the devices to group
+        :type devices: list of :class:`pyudev.Device`
+        :returns: lists of devices, each only holding devices from earlier
+                  lists (eg: disks, then partitions, then LVs on them)
+        :rtype: list of lists of :class:`pyudev.Device`
+
+        The graph is read from sysfs in one pass. Parents that are not
+        among the given devices are ignored.
+    """
+    by_name = dict((d.sys_name, d) for d in devices)
+    parents = dict((name, [p for p in _device_parents(d) if p in by_name])
+                   for (name, d) in by_name.items())
+
+    depths = {}
+    for name in by_name:
+        # iterative depth-first walk, cycles are cut at the device in progress
+        stack = [name]
+        while stack:
+            current = stack[-1]
+            pending = [p for p in parents[current] if p not in depths and p not in stack]
+            if pending:
+                stack.extend(pending)
+                continue
+
+            stack.pop()
+            depths[current] = 1 + max([depths.get(p, -1) for p in parents[current]] or [-1])
+
+    levels = [[] for _i in range(1 + max(depths.values(), default=-1))]
+    for device in devices:
+        levels[depths[device.sys_name]].append(device)
+
+    return levels
+
+
+def stacked_devices(devices, names):
+    """ Return the named udev devices and every device stacked on them.
+
+        :param devices: udev info for the devices to choose from
+        :type devices: list of :class:`pyudev.Device`
+        :param names: names of the devices at the bottom of the stacks
+        :type names: set of str
+        :returns: the chosen devices, in their original order
+        :rtype: list of :class:`pyudev.Device`
+    """
+    by_name = dict((d.sys_name, d) for d in devices)
+    parents = dict((name, _device_parents(d)) for (name, d) in by_name.items())
+    chosen = set(name for (name, d) in by_name.items()
+                 if name in names or udev.device_get_name(d) in names)
+
+    added = True
+    while added:
+        added = set(name for name in by_name
+                    if name not in chosen and any(p in chosen for p in parents[name]))
+        chosen.update(added)
+
+    return [d for d in devices if d.sys_name in chosen]
+
+
+def _read_disklabel(path):
+    """ Read the disklabel of a device, see :attr:`.DiskLabel.parted_disk`. """
+    with _parted_lock:
+        return parted.Disk(device=parted.Device(path=path))
+
+
+def _device_probes(info):
+    """ Return the read-only queries the format helpers will run for a device.
+
+        :returns: list of (probe name, key, function, args) tuples
+
+        The queries only read from the device itself, so they can run
+        before the devices it is stacked on have been handled.
+    """
+    probes = []
+    devname = udev.device_get_devname(info)
+    if not devname:
+        return probes
+
+    if udev.device_get_disklabel_type(info) and udev.device_class(info).is_disk:
+        probes.append(("mpath_member", devname, blockdev.mpath.is_mpath_member, (devname,)))
+
+    # see DiskLabelFormatPopulator.match
+    if udev.device_get_disklabel_type(info) and udev.device_get_format(info) != "iso9660" and \
+       not udev.device_class(info).is_biosraid_member:
+        probes.append(("parted_disk", devname, _read_disklabel, (devname,)))
+
+    if udev.device_get_format(info) == "linux_raid_member":
+        probes.append(("md_examine", devname, blockdev.md.examine, (devname,)))
+
+    return probes
+
+
+def _fs_probe(info):
+    """ Return the filesystem on a device if its size info should be probed.
+
+        :param info: udev info for the device
+        :type info: :class:`pyudev.Device`
+        :returns: the filesystem, if the format created for it while
+                  populating will ask :data:`~.static_data.fs_info` for its
+                  size info and the answer can be cached there
+        :rtype: :class:`~.formats.fs.FSProbe` or NoneType
+    """
+    fs_type = udev.device_get_format(info)
+    device = udev.device_get_devname(info)
+    if fs_type not in SUPERBLOCKS or not device:
+        return None
+
+    fs_class = formats.get_device_format_class(fs_type)
+    if fs_class is None:
+        return None
+
+    probe = FSProbe(fs_class, device)
+    return probe if probe.size_info_probed else None
+
+
+def _probe_fs_info(probe):
+    """ Gather the size information of a filesystem.
+
+        :param probe: the filesystem
+        :type probe: :class:`~.formats.fs.FSProbe`
+
+        This runs in a worker thread while the populating thread waits,
+        holding the global lock. The result is kept in
+        :data:`~.static_data.fs_info` for the format the populator creates
+        for the device later on.
+    """
+    fs_info.get(probe.device, probe.type, probe.probe_size_info)
+
+
 class PopulatorMixin(object, metaclass=SynchronizedMeta):
     def __init__(self, conf=None, passphrase=None, luks_dict=None):
         """
@@ -101,6 +259,10 @@ class PopulatorMixin(object, metaclass=SynchronizedMeta):
         # initialize attributes that may later hold cached lvm info
         self.drop_lvm_cache()
 
+        cache_path = getattr(conf, "populate_cache", None)
+        self.populate_cache = PopulateCache(cache_path) if cache_path else None
+        self._probe_workers = PROBE_WORKERS
+
         self._cleanup = False
 
     def _udev_device_is_disk(self, info):
@@ -118,7 +280,7 @@ class PopulatorMixin(object, metaclass=SynchronizedMeta):
             udev/sysfs, we have to define what is a disk in terms of what is
             not a disk.
         """
-        return udev.device_is_realdisk(info)
+        return udev.device_class(info).is_realdisk
 
     def _add_slave_devices(self, info):
         """ Add all slaves of a device, raising DeviceTreeError on failure.
@@ -154,8 +316,8 @@ class PopulatorMixin(object, metaclass=SynchronizedMeta):
                 self.handle_device(slave_info)
                 slave_dev = self.get_device_by_name(slave_name)
                 if slave_dev is None:
-                    if udev.device_is_dm_lvm(info):
-                        if slave_name not in lvs_info.cache:
+                    if udev.device_class(info).is_dm_lvm:
+                        if slave_name not in lvm_info.lvs:
                             # we do not expect hidden lvs to be in the tree
                             continue
 
@@ -193,7 +355,7 @@ class PopulatorMixin(object, metaclass=SynchronizedMeta):
                 return reason
 
     def _handle_degraded_md(self, info, device):
-        if device is not None or not udev.device_is_md(info):
+        if device is not None or not udev.device_class(info).is_md:
             return device
 
         # If the md name is None, then some udev info is missing. Likely,
@@ -225,7 +387,10 @@ class PopulatorMixin(object, metaclass=SynchronizedMeta):
         return device
 
     def _clear_new_multipath_member(self, device):
-        if device is None or not device.is_disk or not blockdev.mpath.is_mpath_member(device.path):
+        if device is None or not device.is_disk:
+            return
+
+        if not probe_data.get("mpath_member", device.path, blockdev.mpath.is_mpath_member, device.path):
             return
 
         # newly added device (eg iSCSI) could make this one a multipath member
@@ -433,9 +598,13 @@ class PopulatorMixin(object, metaclass=SynchronizedMeta):
         # Method is here for compatibility with blivet 1.x
         luks_data.save_passphrase(device)
 
-    def populate(self, cleanup_only=False):
+    def populate(self, cleanup_only=False, max_workers=PROBE_WORKERS):
         """ Locate all storage devices.
 
+            :keyword bool cleanup_only: only build the tree to tear it down
+            :keyword int max_workers: maximum number of threads used to probe
+                                      devices ahead of adding them to the tree
+
             Everything should already be active. We just go through and gather
             details as needed and set up the relations between various devices.
 
@@ -446,18 +615,101 @@ class PopulatorMixin(object, metaclass=SynchronizedMeta):
         if cleanup_only:
             self._cleanup = True
 
+        self._probe_workers = max_workers
+        start = time.time()
         parted.register_exn_handler(parted_exn_handler)
         try:
+            if self.populate_cache:
+                probe_data.record(CACHED_PROBES)
+
             self._populate()
+
+            if self.populate_cache:
+                self.populate_cache.save()
         except Exception:
             raise
         finally:
             parted.clear_exn_handler()
+            probe_data.drop_cache()
             self._hide_ignored_disks()
 
+        log.info("populated %d devices in %.2fs", len(self._devices), time.time() - start)
+
         if flags.installer_mode:
             self.teardown_all()
 
+    def rescan(self, disks, max_workers=PROBE_WORKERS):
+        """ Scan some disks again, leaving the rest of the tree alone.
+
+            :param disks: the disks to scan; names of disks that are not in
+                          the tree yet (eg: hot-added ones) are accepted
+            :type disks: list of :class:`~.devices.StorageDevice` or str
+            :keyword int max_workers: see :meth:`populate`
+
+            The disks, any disk sharing a container device (eg: a volume
+            group) with them and all devices on those disks are removed from
+            the tree and scanned again. Pending actions on those disks are
+            canceled. Other devices and the actions on them are kept.
+        """
+        names = set()
+        pending = []
+        for disk in disks:
+            if isinstance(disk, str):
+                names.add(disk)
+                disk = self.get_device_by_name(disk, hidden=True)
+
+            if disk is not None:
+                pending.extend(a for a in disk.ancestors if not a.parents)
+
+        roots = []
+        while pending:
+            disk = pending.pop()
+            if disk in roots:
+                continue
+
+            roots.append(disk)
+            for dep in self.get_dependent_devices(disk, hidden=True):
+                pending.extend(a for a in dep.ancestors if not a.parents)
+
+        names.update(d.name for d in roots)
+        log.info("rescanning %s", sorted(names))
+
+        self.cancel_disk_actions(roots)
+        for device in [d for d in self._hidden if any(r in d.ancestors for r in roots)]:
+            # hidden devices have already been removed from the tree
+            self._hidden.remove(device)
+            self._index.remove(device)
+            lvm.lvm_cc_removeFilterRejectRegexp(device.name)
+            if device.name in self.names:
+                self.names.remove(device.name)
+
+        for disk in [d for d in roots if d in self._devices]:
+            self.recursive_remove(disk, actions=False, modparent=False)
+            self._remove_device(disk, modparent=False)
+
+        self._probe_workers = max_workers
+        start = time.time()
+        self.drop_lvm_cache()
+        parted.register_exn_handler(parted_exn_handler)
+        try:
+            if self.populate_cache:
+                probe_data.record(CACHED_PROBES)
+
+            self._scan_new_devices(names)
+            self._handle_inconsistencies()
+
+            if self.populate_cache:
+                self.populate_cache.save(merge=True)
+        finally:
+            parted.clear_exn_handler()
+            probe_data.drop_cache()
+            self._hide_ignored_disks()
+
+        log.info("rescanned %d disks in %.2fs", len(names), time.time() - start)
+
+        if flags.installer_mode:
+            self.teardown_all(disks=[d for d in self.devices if d.name in names])
+
     def _resolve_protected_device_specs(self):
         # resolve the protected device specs to device names
         for spec in self.protected_dev_specs:
@@ -495,6 +747,18 @@ class PopulatorMixin(object, metaclass=SynchronizedMeta):
         self._resolve_protected_device_specs()
         self._find_live_backing_device()
 
+        self._scan_new_devices()
+
+        # After having the complete tree we make sure that the system
+        # inconsistencies are ignored or resolved.
+        self._handle_inconsistencies()
+
+    def _scan_new_devices(self, names=None):
+        """ Add the devices udev knows about to the tree.
+
+            :keyword names: only add these devices and the ones stacked on them
+            :type names: set of str
+        """
         old_devices = {}
 
         # Now, loop and scan for devices that have appeared since the two above
@@ -502,6 +766,8 @@ class PopulatorMixin(object, metaclass=SynchronizedMeta):
         while True:
             devices = []
             new_devices = udev.get_devices()
+            if names is not None:
+                new_devices = stacked_devices(new_devices, names)
 
             for new_device in new_devices:
                 new_name = udev.device_get_name(new_device)
@@ -514,17 +780,72 @@ class PopulatorMixin(object, metaclass=SynchronizedMeta):
                 break
 
             log.info("devices to scan: %s", [udev.device_get_name(d) for d in devices])
+            cached = set()
+            if self.populate_cache:
+                cached = self.populate_cache.restore(devices, max_workers=self._probe_workers or 1)
+
+            self._probe_devices(devices, cached=cached)
             for dev in devices:
                 self.handle_device(dev)
 
-        # After having the complete tree we make sure that the system
-        # inconsistencies are ignored or resolved.
-        self._handle_inconsistencies()
+    def _probe_devices(self, devices, cached=None):
+        """ Run the read-only queries for a batch of new devices in parallel.
+
+            :param devices: udev info for the devices about to be handled
+            :type devices: list of :class:`pyudev.Device`
+            :keyword cached: names of the devices whose saved results
+                             were restored from the populate cache
+            :type cached: set of str
+
+            None of the queries depends on the results for other devices, so
+            they are all submitted at once, lower levels of the holder/slave
+            graph first. Their results are saved in
+            :data:`~.static_data.probe_data` (and :data:`~.static_data.fs_info`)
+            for the format helpers. The devices themselves are added to the
+            tree afterwards, one at a time and in the usual order, so the
+            resulting tree does not depend on the number of threads. The
+            calling thread keeps holding the global lock while it waits for
+            the queries, which must not take it.
+        """
+        max_workers = self._probe_workers
+        if not max_workers or max_workers < 2:
+            return
+
+        start = time.time()
+        levels = device_levels(devices)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # the lvm caches are filled by a single query each
+            futures = []
+            if any(udev.device_get_format(d) == "LVM2_member" for d in devices):
+                futures.append(executor.submit(lambda: lvm_info.pvs))
+                futures.append(executor.submit(lambda: lvm_info.lvs))
+
+            for level in levels:
+                futures.extend(executor.submit(probe_data.add, name, key, func, *args)
+                               for device in level
+                               for (name, key, func, args) in _device_probes(device)
+                               if not (cached and name in CACHED_PROBES and
+                                       udev.device_get_name(device) in cached))
+
+                # filesystems are only probed in installer mode, see FS.__init__
+                probes = [_fs_probe(device) for device in level
+                          if not (cached and udev.device_get_name(device) in cached)]
+                futures.extend(executor.submit(_probe_fs_info, probe) for probe in probes if probe)
+
+            # the global lock stays held, so nothing can change the tree
+            # while it is being populated; the probes must not take it
+            wait(futures)
+
+            for future in futures:
+                if future.exception() is not None:
+                    log.debug("failed to probe device: %s", future.exception())
+
+        log.debug("probed %d devices in %d levels in %.2fs", len(devices), len(levels),
+                  time.time() - start)
 
     def drop_lvm_cache(self):
         """ Drop cached lvm information. """
-        lvs_info.drop_cache()
-        pvs_info.drop_cache()
+        lvm_info.drop_cache()
 
     def handle_nodev_filesystems(self):
         for line in open("/proc/mounts").readlines():
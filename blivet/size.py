@@ -161,3 +161,40 @@ class Size(bytesize.Size):
                 raise ValueError("invalid rounding size: %s" % size)
 
         return Size(bytesize.Size.round_to_nearest(self, size, rounding))
+
+
+def round_bytes(value, unit, rounding=ROUND_DEFAULT):
+    """ Round a byte count to a multiple of unit.
+
+        :param value: the number of bytes
+        :type value: int or :class:`Size`
+        :param unit: the unit to round to, in bytes (not a named unit)
+        :type unit: int or :class:`Size`
+        :keyword rounding: which direction to round
+        :type rounding: one of ROUND_UP, ROUND_DOWN, or ROUND_DEFAULT
+        :returns: the rounded number of bytes
+        :rtype: int
+
+        This is :meth:`Size.round_to_nearest` for code that does its size
+        arithmetic on plain byte counts. Sizes convert to and from byte
+        counts exactly with ``int(size)`` and ``Size(value)``, and integer
+        arithmetic doesn't create a new :class:`Size` for every step.
+    """
+    if rounding not in (ROUND_UP, ROUND_DOWN, ROUND_DEFAULT):
+        raise ValueError("invalid rounding specifier")
+
+    value = int(value)
+    unit = int(unit)
+    if unit == 0:
+        return 0
+    elif unit < 0:
+        raise ValueError("invalid rounding size: %s" % unit)
+
+    if value < 0:
+        # leave the rounding of negative values to libbytesize
+        return int(Size(value).round_to_nearest(Size(unit), rounding))
+
+    (quotient, remainder) = divmod(value, unit)
+    if remainder and (rounding == ROUND_UP or (rounding == ROUND_DEFAULT and 2 * remainder >= unit)):
+        quotient += 1
+    return quotient * unit
@@ -0,0 +1,160 @@
+# snapshot.py
+# Cheap snapshots of a device tree for rolling back failed changes.
+#
+# Copyright (C) 2016  Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU Lesser General Public License v.2, or (at your option) any later
+# version. This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY expressed or implied, including the implied
+# warranties of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See
+# the GNU Lesser General Public License for more details.  You should have
+# received a copy of the GNU Lesser General Public License along with this
+# program; if not, write to the Free Software Foundation, Inc., 51 Franklin
+# Street, Fifth Floor, Boston, MA 02110-1301, USA.  Any Red Hat trademarks
+# that are incorporated in the source code or documentation are not subject
+# to the GNU Lesser General Public License and may only be used or
+# replicated with the express permission of Red Hat, Inc.
+#
+
+from collections import Counter
+
+from .deviceaction import DeviceAction
+from .devices import Device, PartitionDevice
+from .devices.lib import ParentList
+from .devices.lvm import LVPVSpec, VGSpaceLedger
+from .formats import DeviceFormat
+from .formats.disklabel import DiskLabel
+
+import logging
+log = logging.getLogger("blivet")
+
+# objects whose attributes are saved when reachable from the tree
+_TRACKED_TYPES = (Device, DeviceFormat, DeviceAction, ParentList, LVPVSpec, VGSpaceLedger)
+
+# attribute values that are copied (one level deep) instead of shared
+_CONTAINER_TYPES = (list, dict, set, Counter)
+
+
+def _copy_state(state):
+    """ Return a copy of a saved attribute dict with fresh container values. """
+    new = dict(state)
+    for (name, value) in state.items():
+        if type(value) in _CONTAINER_TYPES:
+            new[name] = type(value)(value)
+
+    return new
+
+
+def _duplicate(parted_disk):
+    return parted_disk.duplicate() if parted_disk is not None else None
+
+
+class DeviceTreeSnapshot(object):
+    """ The state of a device tree and its action list at a point in time.
+
+        Instead of copying the whole tree like :meth:`~.Blivet.copy` does, the
+        snapshot saves a shallow copy of the attributes of every device,
+        format, action, parent list and VG space ledger reachable from the
+        tree, with any list, dict or set attribute values copied one level
+        deep. :meth:`restore`
+        puts the saved attributes back into the same objects, so references
+        to devices held by the caller remain valid after a rollback.
+
+        Parted disks are the one piece of state that is modified in place by
+        partitioning, so each disklabel's parted disks are duplicated and the
+        partitions' parted partitions are looked up again on restore.
+
+        Other objects held in the saved attributes are shared with the live
+        tree and must not be modified in place between taking and restoring
+        the snapshot.
+    """
+
+    def __init__(self, devicetree, roots=None):
+        """
+            :param devicetree: the device tree to save
+            :type devicetree: :class:`~.devicetree.DeviceTree`
+            :keyword roots: list of existing OS installations to save
+            :type roots: list of :class:`~.osinstall.Root`
+        """
+        self._devicetree = devicetree
+        self._devices = list(devicetree._devices)
+        self._hidden = list(devicetree._hidden)
+        self._names = list(devicetree.names)
+        self._actions = list(devicetree._actions._actions)
+        self._completed_actions = list(devicetree._actions._completed_actions)
+
+        self._roots = roots
+        self._root_list = list(roots) if roots is not None else []
+
+        # id(obj) -> (obj, saved attributes)
+        self._states = {}
+        # disklabel -> (parted disk, original parted disk)
+        self._parted_disks = {}
+
+        pending = self._devices + self._hidden + self._actions + self._completed_actions
+        for root in self._root_list:
+            self._save(root, pending)
+
+        while pending:
+            obj = pending.pop()
+            if id(obj) not in self._states:
+                self._save(obj, pending)
+
+        log.debug("saved the state of %d objects", len(self._states))
+
+    def _save(self, obj, pending):
+        """ Save an object's attributes, queueing the tracked objects they reference. """
+        state = _copy_state(obj.__dict__)
+        for value in state.values():
+            if type(value) in _CONTAINER_TYPES:
+                members = value.values() if isinstance(value, dict) else value
+                pending.extend(m for m in members if isinstance(m, _TRACKED_TYPES))
+            elif isinstance(value, _TRACKED_TYPES):
+                pending.append(value)
+
+        self._states[id(obj)] = (obj, state)
+
+        if isinstance(obj, DiskLabel):
+            parted_disk = _duplicate(obj._parted_disk)
+            if obj._orig_parted_disk is obj._parted_disk:
+                orig_parted_disk = parted_disk
+            else:
+                orig_parted_disk = _duplicate(obj._orig_parted_disk)
+
+            self._parted_disks[obj] = (parted_disk, orig_parted_disk)
+
+    def restore(self):
+        """ Return the device tree to the state it was in when it was saved.
+
+            A snapshot can be restored more than once.
+        """
+        log.debug("restoring the state of %d objects", len(self._states))
+        for (obj, state) in self._states.values():
+            obj.__dict__.clear()
+            obj.__dict__.update(_copy_state(state))
+
+        for (disklabel, (parted_disk, orig_parted_disk)) in self._parted_disks.items():
+            disklabel._parted_disk = _duplicate(parted_disk)
+            if orig_parted_disk is parted_disk:
+                disklabel._orig_parted_disk = disklabel._parted_disk
+            else:
+                disklabel._orig_parted_disk = _duplicate(orig_parted_disk)
+
+        # the parted partitions belonged to the parted disks replaced above
+        for (obj, _state) in self._states.values():
+            if isinstance(obj, PartitionDevice) and obj._parted_partition:
+                disklabel = obj.disk.format
+                obj.parted_partition = disklabel.parted_disk.getPartitionByPath(obj.path)
+
+        # new list objects make the device index and the action index rebuild
+        tree = self._devicetree
+        tree._devices = list(self._devices)
+        tree._hidden = list(self._hidden)
+        tree.names = list(self._names)
+        tree._actions._actions = list(self._actions)
+        tree._actions._completed_actions = list(self._completed_actions)
+
+        if self._roots is not None:
+            self._roots[:] = self._root_list
@@ -0,0 +1,133 @@
+# fs_info.py
+# Cache of the size information of existing filesystems.
+#
+# Copyright (C) 2016  Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU Lesser General Public License v.2, or (at your option) any later
+# version. This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY expressed or implied, including the implied
+# warranties of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See
+# the GNU Lesser General Public License for more details.  You should have
+# received a copy of the GNU Lesser General Public License along with this
+# program; if not, write to the Free Software Foundation, Inc., 51 Franklin
+# Street, Fifth Floor, Boston, MA 02110-1301, USA.  Any Red Hat trademarks
+# that are incorporated in the source code or documentation are not subject
+# to the GNU Lesser General Public License and may only be used or
+# replicated with the express permission of Red Hat, Inc.
+#
+
+import hashlib
+import os
+from threading import Lock
+
+from ..mounts import mounts_cache
+
+import logging
+log = logging.getLogger("blivet")
+
+SUPERBLOCKS = {"ext2": (1024, 1024),
+               "ext3": (1024, 1024),
+               "ext4": (1024, 1024),
+               "xfs": (0, 512)}
+""" offset and length of the primary superblock, by filesystem type
+
+    Only filesystems whose superblock changes whenever the filesystem is
+    modified (write time, free block count, ...) are listed.
+"""
+
+
+def superblock_fingerprint(device, fs_type):
+    """ Return a fingerprint identifying the current state of a filesystem.
+
+        :param str device: the device node
+        :param str fs_type: the filesystem type
+        :returns: device number, device size and superblock checksum, or None
+                  if the filesystem's state can't be fingerprinted
+        :rtype: str or NoneType
+
+        Mounted filesystems are never fingerprinted since their size and
+        minimum size change without their superblock being written.
+    """
+    if fs_type not in SUPERBLOCKS or not device or mounts_cache.is_mounted(device):
+        return None
+
+    (offset, length) = SUPERBLOCKS[fs_type]
+    try:
+        fd = os.open(device, os.O_RDONLY)
+        try:
+            rdev = os.fstat(fd).st_rdev
+            size = os.lseek(fd, 0, os.SEEK_END)
+            superblock = os.pread(fd, length, offset)
+        finally:
+            os.close(fd)
+    except OSError as e:
+        log.debug("cannot fingerprint %s on %s: %s", fs_type, device, e)
+        return None
+
+    return "%d:%d:%d:%s" % (os.major(rdev), os.minor(rdev), size,
+                            hashlib.sha1(superblock).hexdigest())
+
+
+class FSInfo(object):
+    """ Class to be used as a singleton.
+        Maintains the size information of existing filesystems.
+
+        The information gathered by :func:`~.formats.fs._probe_size_info`
+        (fsck, info, size and minimum size tools) is kept per device together
+        with the fingerprint of the filesystem's superblock, and reused for
+        as long as the fingerprint stays the same. It is not dropped when the
+        device tree is reset.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, device, fs_type, probe):
+        """ Return the size information of a filesystem.
+
+            :param str device: the device node
+            :param str fs_type: the filesystem type
+            :param probe: function running the tools if nothing is cached
+            :returns: see :func:`~.formats.fs._probe_size_info`
+            :rtype: tuple
+        """
+        # the populator knows dm devices by their dm-N nodes
+        key = os.path.realpath(device)
+        fingerprint = superblock_fingerprint(device, fs_type)
+        if fingerprint is not None:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] == fingerprint:
+                    self.hits += 1
+                    return entry[1]
+
+        info = probe()
+
+        # fsck may have modified the filesystem
+        fingerprint = superblock_fingerprint(device, fs_type)
+        with self._lock:
+            self.misses += 1
+            if fingerprint is None:
+                self._entries.pop(key, None)
+            else:
+                self._entries[key] = (fingerprint, info)
+
+        return info
+
+    def drop(self, device):
+        """ Forget the size information of the filesystem on a device. """
+        with self._lock:
+            self._entries.pop(os.path.realpath(device), None)
+
+    def drop_cache(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+fs_info = FSInfo()
@@ -20,6 +20,9 @@
 # Red Hat Author(s): Jan Pokorny <japokorn@redhat.com>
 #
 
+from collections import defaultdict
+from threading import Lock
+
 import gi
 gi.require_version("BlockDev", "1.0")
 
@@ -29,39 +32,160 @@ import logging
 log = logging.getLogger("blivet")
 
 
+class LVMInfo(object):
+    """ Class to be used as a singleton.
+        Maintains a cache of the LVM metadata, indexed by VG.
+
+        All PVs are listed by a single ``pvs`` report. All LVs are listed by
+        a single ``lvs`` report the first time the LVs of any VG are needed,
+        after that the LVs of a VG are listed again only once :meth:`drop_vg`
+        is called for that VG.
+    """
+
+    def __init__(self):
+        self._pv_lock = Lock()
+        self._lv_lock = Lock()
+        self.drop_cache()
+
+    @property
+    def pvs(self):
+        """ PV info keyed by PV path (eg: "/dev/sda1"). """
+        with self._pv_lock:
+            if self._pvs is None:
+                self._load_pvs()
+
+            return self._pvs
+
+    def vg_pvs(self, vg_name):
+        """ Return the info for the PVs of a VG.
+
+            :param str vg_name: the name of the VG
+            :rtype: list
+        """
+        with self._pv_lock:
+            if self._pvs is None:
+                self._load_pvs()
+
+            return self._vg_pvs.get(vg_name, [])
+
+    @property
+    def lvs(self):
+        """ LV info keyed by full LV name (eg: "vg-lv"). """
+        with self._lv_lock:
+            if not self._lvs_complete:
+                self._load_lvs()
+
+            for vg_name in list(self._stale_vgs):
+                self._load_vg_lvs(vg_name)
+
+            return self._lvs
+
+    def vg_lvs(self, vg_name):
+        """ Return the info for the LVs of a VG.
+
+            :param str vg_name: the name of the VG
+            :returns: LV info keyed by full LV name (eg: "vg-lv")
+            :rtype: dict
+        """
+        with self._lv_lock:
+            if not self._lvs_complete:
+                self._load_lvs()
+            elif vg_name in self._stale_vgs:
+                self._load_vg_lvs(vg_name)
+
+            return self._vg_lvs.get(vg_name, {})
+
+    def _load_pvs(self):
+        pvs = blockdev.lvm.pvs()
+        self._pvs = dict((pv.pv_name, pv) for pv in pvs)
+        self._vg_pvs = defaultdict(list)
+        for pv in pvs:
+            self._vg_pvs[pv.vg_name].append(pv)
+
+    def _load_lvs(self):
+        vgs = defaultdict(list)
+        for lv in blockdev.lvm.lvs():
+            vgs[lv.vg_name].append(lv)
+
+        self._lvs = {}
+        self._vg_lvs = {}
+        for (vg_name, lvs) in vgs.items():
+            self._set_vg_lvs(vg_name, lvs)
+
+        self._lvs_complete = True
+        self._stale_vgs = set()
+
+    def _load_vg_lvs(self, vg_name):
+        try:
+            lvs = blockdev.lvm.lvs(vg_name)
+        except blockdev.LVMError as e:
+            # the VG may be gone, which the full report reflects, or the
+            # report may have failed; errors from the full report propagate
+            # and leave the VG marked as stale
+            log.debug("failed to list LVs of VG %s: %s", vg_name, e)
+            self._load_lvs()
+            return
+
+        self._set_vg_lvs(vg_name, lvs)
+        self._stale_vgs.discard(vg_name)
+
+    def _set_vg_lvs(self, vg_name, lvs):
+        for name in self._vg_lvs.pop(vg_name, {}):
+            self._lvs.pop(name, None)
+
+        vg_lvs = dict(("%s-%s" % (lv.vg_name, lv.lv_name), lv) for lv in lvs)
+        self._vg_lvs[vg_name] = vg_lvs
+        self._lvs.update(vg_lvs)
+
+    def drop_vg(self, vg_name):
+        """ Drop the cached LVs of a VG, eg: after an action changed the VG. """
+        with self._lv_lock:
+            self._stale_vgs.add(vg_name)
+
+    def drop_pvs(self):
+        with self._pv_lock:
+            self._pvs = None
+            self._vg_pvs = {}
+
+    def drop_lvs(self):
+        with self._lv_lock:
+            self._lvs = {}
+            self._vg_lvs = {}
+            self._lvs_complete = False
+            self._stale_vgs = set()
+
+    def drop_cache(self):
+        self.drop_pvs()
+        self.drop_lvs()
+
+lvm_info = LVMInfo()
+
+
 class LVsInfo(object):
     """ Class to be used as a singleton.
-        Maintains the LVs cache.
+        Maintains the LVs cache, see :class:`LVMInfo`.
     """
 
     @property
     def cache(self):
-        if self._lvs_cache is None:
-            lvs = blockdev.lvm.lvs()
-            self._lvs_cache = dict(("%s-%s" % (lv.vg_name, lv.lv_name), lv) for lv in lvs)  # pylint: disable=attribute-defined-outside-init
-
-        return self._lvs_cache
+        return lvm_info.lvs
 
     def drop_cache(self):
-        self._lvs_cache = None  # pylint: disable=attribute-defined-outside-init
+        lvm_info.drop_lvs()
 
 lvs_info = LVsInfo()
 
 
 class PVsInfo(object):
     """ Class to be used as a singleton.
-        Maintains the PVs cache.
+        Maintains the PVs cache, see :class:`LVMInfo`.
     """
 
     @property
     def cache(self):
-        if self._pvs_cache is None:
-            pvs = blockdev.lvm.pvs()
-            self._pvs_cache = dict((pv.pv_name, pv) for pv in pvs)  # pylint: disable=attribute-defined-outside-init
-
-        return self._pvs_cache
+        return lvm_info.pvs
 
     def drop_cache(self):
-        self._pvs_cache = None  # pylint: disable=attribute-defined-outside-init
+        lvm_info.drop_pvs()
 
 pvs_info = PVsInfo()
@@ -0,0 +1,114 @@
+# probe_data.py
+# Results of device queries run ahead of populating a DeviceTree.
+#
+# Copyright (C) 2016  Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU Lesser General Public License v.2, or (at your option) any later
+# version. This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY expressed or implied, including the implied
+# warranties of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See
+# the GNU Lesser General Public License for more details.  You should have
+# received a copy of the GNU Lesser General Public License along with this
+# program; if not, write to the Free Software Foundation, Inc., 51 Franklin
+# Street, Fifth Floor, Boston, MA 02110-1301, USA.  Any Red Hat trademarks
+# that are incorporated in the source code or documentation are not subject
+# to the GNU Lesser General Public License and may only be used or
+# replicated with the express permission of Red Hat, Inc.
+#
+
+from threading import Lock
+
+
+class ProbeData(object):
+    """ Class to be used as a singleton.
+        Maintains the results of read-only device queries run concurrently
+        ahead of populating the device tree.
+
+        Each result is used at most once, by the first caller asking for
+        it. Later callers run the query again, so they never see anything
+        older than the populate pass that prefetched it.
+    """
+
+    def __init__(self):
+        self._results = {}
+        self._recorded = {}
+        self._record_probes = set()
+        self._lock = Lock()
+
+    def add(self, probe, key, func, *args):
+        """ Run a query and save its result (or exception) for :meth:`get`.
+
+            :param str probe: the name of the query
+            :param key: the device the query is about (eg: its path)
+            :param func: the function running the query
+        """
+        try:
+            result = (func(*args), None)
+        except Exception as e:  # pylint: disable=broad-except
+            result = (None, e)
+
+        with self._lock:
+            self._results[(probe, key)] = result
+
+    def put(self, probe, key, value):
+        """ Save a known result of a query for :meth:`get`.
+
+            :param str probe: the name of the query
+            :param key: the device the query is about (eg: its path)
+            :param value: the result
+        """
+        with self._lock:
+            self._results[(probe, key)] = (value, None)
+
+    def get(self, probe, key, func, *args):
+        """ Return the saved result of a query, or run the query now.
+
+            :param str probe: the name of the query
+            :param key: the device the query is about (eg: its path)
+            :param func: the function running the query
+            :raises: whatever the query raised
+        """
+        with self._lock:
+            result = self._results.pop((probe, key), None)
+
+        if result is None:
+            value = func(*args)
+        else:
+            (value, exc) = result
+            if exc is not None:
+                raise exc
+
+        if probe in self._record_probes:
+            with self._lock:
+                self._recorded[(probe, key)] = value
+
+        return value
+
+    def record(self, probes):
+        """ Start keeping the results :meth:`get` returns for some queries.
+
+            :param probes: names of the queries to keep the results of
+            :type probes: set of str
+        """
+        with self._lock:
+            self._record_probes = set(probes)
+            self._recorded = {}
+
+    def recorded(self):
+        """ Return the results kept since :meth:`record` was called.
+
+            :returns: results keyed by (query name, key) tuples
+            :rtype: dict
+        """
+        with self._lock:
+            return dict(self._recorded)
+
+    def drop_cache(self):
+        with self._lock:
+            self._results.clear()
+            self._recorded.clear()
+            self._record_probes = set()
+
+probe_data = ProbeData()
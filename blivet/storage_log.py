@@ -1,27 +1,43 @@
-import inspect
 import logging
 import sys
 import traceback
 
+from .flags import flags
+
 log = logging.getLogger("blivet")
 log.addHandler(logging.NullHandler())
 
+_IGNORED_FUNCS = frozenset(["function_name_and_depth",
+                            "log_method_call",
+                            "log_method_return"])
+
 
 def function_name_and_depth():
-    IGNORED_FUNCS = ["function_name_and_depth",
-                     "log_method_call",
-                     "log_method_return"]
-    stack = inspect.stack()
+    """ Return the name and stack depth of the function being logged.
+
+        This walks the frames directly instead of using inspect.stack, which
+        collects source context for every frame on the stack.
+    """
+    frame = sys._getframe(1)    # pylint: disable=protected-access
+    while frame is not None and frame.f_code.co_name in _IGNORED_FUNCS:
+        frame = frame.f_back
 
-    for i, frame in enumerate(stack):
-        methodname = frame[3]
-        if methodname not in IGNORED_FUNCS:
-            return (methodname, len(stack) - i)
+    if frame is None:
+        return ("unknown function?", 0)
 
-    return ("unknown function?", 0)
+    methodname = frame.f_code.co_name
+    depth = 0
+    while frame is not None:
+        depth += 1
+        frame = frame.f_back
+
+    return (methodname, depth)
 
 
 def log_method_call(d, *args, **kwargs):
+    if not flags.trace_method_calls or not log.isEnabledFor(logging.DEBUG):
+        return
+
     classname = d.__class__.__name__
     (methodname, depth) = function_name_and_depth()
     spaces = depth * ' '
@@ -42,6 +58,9 @@ def log_method_call(d, *args, **kwargs):
 
 
 def log_method_return(d, retval):
+    if not flags.trace_method_calls or not log.isEnabledFor(logging.DEBUG):
+        return
+
     classname = d.__class__.__name__
     (methodname, depth) = function_name_and_depth()
     spaces = depth * ' '
@@ -20,7 +20,8 @@
 # Red Hat Author(s): David Lehman <dlehman@redhat.com>
 #
 
-from threading import RLock, current_thread, main_thread
+from threading import Condition, Lock, RLock, current_thread, main_thread, local
+from contextlib import contextmanager
 from functools import wraps
 from types import FunctionType
 from abc import ABCMeta
@@ -28,7 +29,193 @@ from abc import ABCMeta
 from .errors import ThreadError
 from .flags import flags
 
-blivet_lock = RLock(verbose=flags.debug_threads)
+
+class SharedLock(object):
+    """ A reentrant lock that can also be acquired in shared mode.
+
+        Used as a context manager, or via :meth:`acquire` and :meth:`release`,
+        this behaves like :class:`threading.RLock`. :meth:`acquire_shared` and
+        :meth:`release_shared` acquire the lock for read-only access.
+
+        By default shared acquisition is the same as exclusive acquisition.
+        Once shared mode is enabled (see :meth:`set_shared_mode`) any number
+        of threads can hold the lock in shared mode at the same time, but
+        never at the same time as a thread holding it exclusively. Threads
+        waiting for exclusive access take precedence over new readers.
+
+        Acquiring the lock in any mode while already holding it exclusively
+        nests. A thread that holds the lock in shared mode and requests
+        exclusive access gives up its shared hold while it waits, so two
+        threads doing this cannot deadlock. It gets the shared hold back when
+        it releases the exclusive hold.
+    """
+    def __init__(self, verbose=False):
+        self._lock = RLock(verbose=verbose)
+        self._cond = Condition(Lock())
+        self._shared_mode = False
+        self._readers = 0
+        self._writing = False
+        self._writers_waiting = 0
+        self._local = local()
+
+    @property
+    def shared_mode(self):
+        """ Whether the lock can be held by several readers at once. """
+        return self._shared_mode
+
+    def set_shared_mode(self, enabled):
+        """ Enable or disable shared mode.
+
+            This can only be done while no thread holds the lock, typically
+            before starting any threads that use blivet.
+
+            :raises: RuntimeError if the lock is held
+        """
+        # pylint: disable=protected-access
+        if self._lock._is_owned() or self._readers or \
+           not self._lock.acquire(blocking=False):
+            raise RuntimeError("cannot change the lock mode while the lock is held")
+
+        try:
+            self._shared_mode = enabled
+        finally:
+            self._lock.release()
+
+    def _state(self):
+        state = self._local
+        if not hasattr(state, "holds"):
+            # per-thread state: shared hold count, exclusive hold count and,
+            # for each outermost exclusive hold, the shared count it suspended
+            state.shared = 0
+            state.exclusive = 0
+            state.holds = []
+        return state
+
+    def _wait_exclusive(self):
+        with self._cond:
+            self._writers_waiting += 1
+            while self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writing = True
+
+    def acquire(self):
+        """ Acquire the lock exclusively. """
+        if not self._shared_mode:
+            return self._lock.acquire()
+
+        state = self._state()
+        if state.exclusive:
+            self._lock.acquire()
+            state.exclusive += 1
+            return True
+
+        suspended = state.shared
+        if suspended:
+            with self._cond:
+                self._readers -= 1
+                self._cond.notify_all()
+            state.shared = 0
+
+        self._lock.acquire()
+        self._wait_exclusive()
+        state.exclusive = 1
+        state.holds.append(suspended)
+        return True
+
+    def release(self):
+        """ Release an exclusive hold on the lock. """
+        if not self._shared_mode:
+            return self._lock.release()
+
+        state = self._state()
+        state.exclusive -= 1
+        if state.exclusive:
+            return self._lock.release()
+
+        suspended = state.holds.pop()
+        with self._cond:
+            self._writing = False
+            if suspended:
+                # get the shared hold back before another writer can get in
+                self._readers += 1
+            self._cond.notify_all()
+        state.shared = suspended
+        return self._lock.release()
+
+    __enter__ = acquire
+
+    def __exit__(self, *args):
+        self.release()
+
+    def acquire_shared(self):
+        """ Acquire the lock for read-only access. """
+        if not self._shared_mode:
+            return self._lock.acquire()
+
+        state = self._state()
+        if state.exclusive:
+            return self.acquire()
+
+        if not state.shared:
+            with self._cond:
+                while self._writing or self._writers_waiting:
+                    self._cond.wait()
+                self._readers += 1
+
+        state.shared += 1
+        return True
+
+    def release_shared(self):
+        """ Release a shared hold on the lock. """
+        if not self._shared_mode:
+            return self._lock.release()
+
+        state = self._state()
+        if state.exclusive:
+            return self.release()
+
+        state.shared -= 1
+        if not state.shared:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    def _is_owned(self):
+        """ Return True if the current thread holds the lock exclusively. """
+        return self._lock._is_owned()     # pylint: disable=protected-access
+
+    def _release_save(self):
+        """ Fully release an exclusive hold; see :func:`lock_released`. """
+        # pylint: disable=protected-access
+        if not self._shared_mode:
+            return self._lock._release_save()
+
+        state = self._state()
+        saved = (state.exclusive, self._lock._release_save())
+        state.exclusive = 0
+        with self._cond:
+            self._writing = False
+            self._cond.notify_all()
+        return saved
+
+    def _acquire_restore(self, saved):
+        """ Restore an exclusive hold released by :meth:`_release_save`. """
+        # pylint: disable=protected-access
+        if not self._shared_mode:
+            return self._lock._acquire_restore(saved)
+
+        (exclusive_count, lock_state) = saved
+        self._lock._acquire_restore(lock_state)
+        self._wait_exclusive()
+        self._state().exclusive = exclusive_count
+
+
+blivet_lock = SharedLock(verbose=flags.debug_threads)
+
+# per-thread state for lock_released/allow_lock_release
+_lock_state = local()
 
 
 def exclusive(m):
@@ -47,15 +234,105 @@ def exclusive(m):
     return run_with_lock
 
 
+def shared(m):
+    """ Run a callable while holding the global lock for read-only access. """
+    @wraps(m)
+    def run_with_shared_lock(*args, **kwargs):
+        blivet_lock.acquire_shared()
+        try:
+            if current_thread() == main_thread():
+                exn_info = get_thread_exception()
+                if exn_info[1]:
+                    clear_thread_exception()
+                    raise ThreadError("raising queued exception") from exn_info[1]
+
+            return m(*args, **kwargs)
+        finally:
+            blivet_lock.release_shared()
+
+    return run_with_shared_lock
+
+
+def enable_shared_locking(enabled=True):
+    """ Allow read-only methods to run concurrently with one another.
+
+        With shared locking enabled, methods and property getters classified
+        as queries by :class:`SynchronizedMeta` hold the global lock in shared
+        mode. All other methods, and property setters, hold it exclusively.
+    """
+    blivet_lock.set_shared_mode(enabled)
+
+
+@contextmanager
+def allow_lock_release():
+    """ Allow the current thread to drop the global lock around blocking calls.
+
+        This is used by threads that operate on a set of devices no other
+        thread is modifying, such as the workers used to execute independent
+        groups of actions in parallel. See :func:`lock_released`.
+    """
+    previous = getattr(_lock_state, "allow_release", False)
+    _lock_state.allow_release = True
+    try:
+        yield
+    finally:
+        _lock_state.allow_release = previous
+
+
+@contextmanager
+def lock_released():
+    """ Release the global lock for the duration of a blocking call.
+
+        The lock is only released if the current thread holds it and has
+        opted in via :func:`allow_lock_release`. Otherwise this does nothing.
+        The lock is re-acquired, with its original recursion level, on exit.
+    """
+    if not getattr(_lock_state, "allow_release", False) or \
+       not blivet_lock._is_owned():     # pylint: disable=protected-access
+        yield
+        return
+
+    state = blivet_lock._release_save()     # pylint: disable=protected-access
+    try:
+        yield
+    finally:
+        blivet_lock._acquire_restore(state)     # pylint: disable=protected-access
+
+
+def _is_query(name):
+    return name.startswith("get_") or name.startswith("_get_")
+
+
+def _method_names(bases, dct, attr):
+    """ Return the names listed in attr by a class and all of its bases. """
+    names = set(dct.get(attr, []))
+    for base in bases:
+        for klass in base.__mro__:
+            names.update(klass.__dict__.get(attr, []))
+
+    return names
+
+
 class SynchronizedMeta(type):
     """ Metaclass that wraps all methods with the exclusive decorator.
 
         To prevent specific methods from being wrapped, add the method name(s)
         to a class attribute called _unsynchronized_methods (list of str).
+
+        Property getters, methods named get_* or _get_*, and methods listed
+        in a class attribute called _shared_methods (list of str) are wrapped
+        with the shared decorator instead. They must not modify the instance.
+        Getters and methods that follow the naming convention but do modify
+        the instance, eg: to cache a value, must be listed in a class attribute
+        called _exclusive_methods (list of str). Both lists apply to the
+        subclasses of the class they are defined in, including methods the
+        subclasses override.
     """
     def __new__(cls, name, bases, dct):
         new_dct = {}
         blacklist = dct.get('_unsynchronized_methods', [])
+        shared_names = _method_names(bases, dct, '_shared_methods')
+        exclusive_names = _method_names(bases, dct, '_exclusive_methods')
 
         for n in dct:
             obj = dct[n]
@@ -63,9 +340,13 @@ class SynchronizedMeta(type):
             if n in blacklist:
                 pass
             elif isinstance(obj, FunctionType):
-                obj = exclusive(obj)
+                if n not in exclusive_names and (n in shared_names or _is_query(n)):
+                    obj = shared(obj)
+                else:
+                    obj = exclusive(obj)
             elif isinstance(obj, property):
-                obj = property(fget=exclusive(obj.__get__),
+                fget = exclusive if n in exclusive_names else shared
+                obj = property(fget=fget(obj.__get__),
                                fset=exclusive(obj.__set__),
                                fdel=exclusive(obj.__delattr__),
                                doc=obj.__doc__)
@@ -25,35 +25,81 @@ class CyclicGraphError(Exception):
     pass
 
 
-def tsort(graph):
+def tsort(graph, hidden=None):
+    """ Return a topologically sorted list of the graph's items.
+
+        Items with no remaining incoming edges are kept on a stack and the
+        one pushed last is emitted next. Whenever emitting an item leaves
+        other items with no incoming edges, those are pushed in the order
+        they appear in the graph's item list, so among independent items the
+        one listed last comes first. The graph is not modified.
+
+        Items in hidden are left out of the result. As soon as one of them
+        has no incoming edges it is removed from the graph, and any items
+        this frees are pushed together with the others freed at that point.
+
+        Arguments:
+
+            graph   -   a graph as returned by :func:`create_graph`
+
+        Keyword Arguments:
+
+            hidden  -   an iterable of items to leave out of the result
+
+        Return Value:
+
+            A list containing the graph's items in sorted order.
+    """
     order = []  # sorted list of items
 
     if not graph or not graph['items']:
         return order
 
+    items = graph['items']
+    hidden = set(hidden or [])
+    position = dict((item, idx) for (idx, item) in enumerate(items))
+    incoming = dict(graph['incoming'])
+    children = dict((item, []) for item in items)
+    for (parent, child) in graph['edges']:
+        children[parent].append(child)
+
+    removed = []
+
+    def remove(item, freed):
+        """ Remove the edges from item, collecting the items they free. """
+        removed.append(item)
+        for child in children[item]:
+            incoming[child] -= 1
+            # if destination node is now a root, add it to roots
+            if incoming[child] == 0:
+                if child in hidden:
+                    remove(child, freed)
+                else:
+                    freed.append(child)
+
     # determine which nodes have no incoming edges
-    roots = [n for n in graph['items'] if graph['incoming'][n] == 0]
+    roots = []
+    for item in items:
+        if incoming[item] == 0:
+            if item in hidden:
+                remove(item, roots)
+            else:
+                roots.append(item)
+
     if not roots:
         raise CyclicGraphError("no root nodes")
 
-    visited = []    # list of nodes visited, for cycle detection
+    roots.sort(key=position.get)
     while roots:
         # remove a root, add it to the order
         root = roots.pop()
-        if root in visited:
-            raise CyclicGraphError("graph contains cycles")
-
-        visited.append(root)
         order.append(root)
         # remove each edge from the root to another node
-        for (parent, child) in [e for e in graph['edges'] if e[0] == root]:
-            graph['incoming'][child] -= 1
-            graph['edges'].remove((parent, child))
-            # if destination node is now a root, add it to roots
-            if graph['incoming'][child] == 0:
-                roots.append(child)
+        freed = []
+        remove(root, freed)
+        roots.extend(sorted(freed, key=position.get))
 
-    if len(graph['items']) != len(visited):
+    if len(items) != len(removed):
         raise CyclicGraphError("graph contains cycles")
 
     return order
@@ -21,9 +21,17 @@
 #                    Chris Lumens <clumens@redhat.com>
 #
 
+import ctypes
+import ctypes.util
 import os
 import re
+import select
+import socket
+import struct
 import subprocess
+import sys
+import time
+from threading import Lock
 
 from . import util
 from .size import Size
@@ -49,26 +57,235 @@ def get_device(sysfs_path):
     return dev
 
 
+def _list_devices(subsystem="block"):
+    return [d for d in global_udev.list_devices(subsystem=subsystem)
+            if not device_class(d).blacklisted]
+
+
 def get_devices(subsystem="block"):
     if not flags.uevents:
         settle()
-    return [d for d in global_udev.list_devices(subsystem=subsystem)
-            if not __is_blacklisted_blockdev(d.sys_name)]
+    return _list_devices(subsystem=subsystem)
+
+
+UEVENT_SEQNUM = "/sys/kernel/uevent_seqnum"
+""" the sequence number of the last uevent sent by the kernel """
+
+UDEV_QUEUE = "/run/udev/queue"
+""" file that exists while udevd has unprocessed events """
+
+UDEV_CONTROL = "/run/udev/control"
+""" udevd's control socket """
+
+SETTLE_TIMEOUT = 300
+""" maximum number of seconds to wait for the udev queue """
+
+_IN_DELETE = 0x00000200
+_IN_MOVED_FROM = 0x00000040
+
+# struct udev_ctrl_msg_wire: version, magic, message type and value
+_CTRL_MSG = "16sIi256s"
+_CTRL_MAGIC = 0xdead1dea
+_CTRL_PING = 7
+
+
+class SettleStats(object):
+    """ Count and wall time of udev settles, by outcome and by caller. """
+    def __init__(self):
+        self._lock = Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.outcomes = {}
+            """ outcome ("skipped", "waited" or "spawned") -> [count, seconds] """
+
+            self.callers = {}
+            """ calling function -> [count, seconds] """
+
+    def add(self, outcome, caller, elapsed):
+        with self._lock:
+            for (key, totals) in ((outcome, self.outcomes), (caller, self.callers)):
+                entry = totals.setdefault(key, [0, 0.0])
+                entry[0] += 1
+                entry[1] += elapsed
+
+    @property
+    def count(self):
+        return sum(c for (c, _t) in self.outcomes.values())
+
+    @property
+    def time(self):
+        return sum(t for (_c, t) in self.outcomes.values())
+
+    def __str__(self):
+        def fmt(totals):
+            return ", ".join("%s: %d in %.3fs" % (key, c, t)
+                             for (key, (c, t)) in sorted(totals.items(), key=lambda i: -i[1][1]))
+
+        return ("%d settles in %.3fs (%s); by caller: %s" %
+                (self.count, self.time, fmt(self.outcomes), fmt(self.callers)))
+
+settle_stats = SettleStats()
+""" statistics for all calls to :func:`settle`, reset by :meth:`~.Blivet.do_it` """
+
+# the kernel uevent sequence number as of the last completed settle
+_settled_seqnum = None
+
+_libc = None
+
+
+def uevent_seqnum():
+    """ Return the sequence number of the last uevent sent by the kernel.
+
+        :returns: the sequence number, or None if it is not available
+        :rtype: int or NoneType
+
+        Record this before an operation and pass it to :func:`settle` to
+        skip waiting for udev if the operation did not generate any uevents.
+    """
+    try:
+        with open(UEVENT_SEQNUM) as f:
+            return int(f.read())
+    except (OSError, ValueError):
+        return None
+
+
+def _ping_udevd(timeout):
+    """ Wait for udevd to handle a ping sent to its control socket.
+
+        :param float timeout: maximum number of seconds to wait
+        :returns: whether udevd answered the ping
+        :rtype: bool
+
+        udevd handles control messages in the same loop it reads uevents
+        in, so once it has answered, the uevents the kernel sent before the
+        ping are in its queue. This is what ``udevadm settle`` does before
+        looking at the queue.
+    """
+    msg = struct.pack(_CTRL_MSG, b"udev-blivet", _CTRL_MAGIC, _CTRL_PING, b"")
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET | socket.SOCK_CLOEXEC) as sock:
+            sock.settimeout(timeout)
+            sock.connect(UDEV_CONTROL)
+            sock.send(msg)
+            # udevd closes the connection once it has handled the message
+            while sock.recv(1):
+                pass
+    except ConnectionResetError:
+        pass
+    except OSError as e:
+        log.debug("failed to ping udevd: %s", e)
+        return False
+
+    return True
+
+
+def _wait_for_queue(timeout):
+    """ Wait for udevd to process all of the events it has received.
 
+        :param float timeout: maximum number of seconds to wait
+        :returns: False if udevd cannot be pinged, the queue cannot be
+                  watched or the wait timed out
+        :rtype: bool
+
+        udevd deletes :const:`UDEV_QUEUE` when its queue becomes empty, so
+        this waits for an inotify event for the file's removal. The file
+        does not exist either before udevd has read the uevents from the
+        kernel, so udevd is pinged first (see :func:`_ping_udevd`).
+    """
+    global _libc
+    queue_dir = os.path.dirname(UDEV_QUEUE)
+    if not os.path.isdir(queue_dir):
+        return False
+
+    if _libc is None:
+        _libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+
+    try:
+        fd = _libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    except AttributeError:
+        return False
 
-def settle(quiet=False):
+    if fd < 0:
+        log.debug("inotify_init1 failed: %s", os.strerror(ctypes.get_errno()))
+        return False
+
+    try:
+        # watch before checking for the file so its removal cannot be missed
+        if _libc.inotify_add_watch(fd, os.fsencode(queue_dir), _IN_DELETE | _IN_MOVED_FROM) < 0:
+            log.debug("inotify_add_watch failed: %s", os.strerror(ctypes.get_errno()))
+            return False
+
+        deadline = time.monotonic() + timeout
+        if not _ping_udevd(timeout):
+            return False
+
+        while os.path.exists(UDEV_QUEUE):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                log.warning("timed out waiting for the udev queue")
+                return False
+
+            select.select([fd], [], [], remaining)
+            try:
+                os.read(fd, 4096)
+            except BlockingIOError:
+                pass
+    finally:
+        os.close(fd)
+
+    return True
+
+
+def settle(quiet=False, seqnum=None):
     """ Wait for the udev queue to settle.
 
         :keyword bool quiet: bypass :meth:`blivet.util.run_program`
+        :keyword seqnum: uevent sequence number recorded (using
+                         :func:`uevent_seqnum`) before the operation
+                         whose uevents should be waited for
+        :type seqnum: int or NoneType
+
+        udevd is pinged first. It handles its inotify watches in the same
+        loop as control messages, so once it has answered, the change
+        uevents it synthesizes for devices closed after being written to
+        have been sent. Nothing more is done if the kernel has not sent any
+        uevents since the given sequence number or since the last settle.
+        Otherwise this waits until udevd has emptied its queue, falling
+        back to running ``udevadm settle`` if udevd cannot be pinged or the
+        queue cannot be watched. The sequence number is only recorded as
+        settled once udev is known to have processed its events.
     """
-    # wait maximal 300 seconds for udev to be done running blkid, lvm,
-    # mdadm etc. This large timeout is needed when running on machines with
-    # lots of disks, or with slow disks
-    argv = ["udevadm", "settle", "--timeout=300"]
-    if quiet:
-        subprocess.call(argv, close_fds=True)
+    global _settled_seqnum
+    start = time.time()
+    pinged = _ping_udevd(SETTLE_TIMEOUT)
+    current = uevent_seqnum()
+    if pinged and current is not None and current in (seqnum, _settled_seqnum):
+        outcome = "skipped"
+    elif current is not None and _wait_for_queue(SETTLE_TIMEOUT):
+        outcome = "waited"
+        _settled_seqnum = current
     else:
-        util.run_program(argv)
+        outcome = "spawned"
+        # wait maximal 300 seconds for udev to be done running blkid, lvm,
+        # mdadm etc. This large timeout is needed when running on machines with
+        # lots of disks, or with slow disks
+        argv = ["udevadm", "settle", "--timeout=%d" % SETTLE_TIMEOUT]
+        if quiet:
+            rc = subprocess.call(argv, close_fds=True)
+        else:
+            rc = util.run_program(argv)
+
+        _settled_seqnum = current if rc == 0 else None
+
+    if outcome != "skipped":
+        # events processed while settling may have changed the udev database
+        invalidate_snapshot()
+
+    caller = sys._getframe(1).f_code
+    settle_stats.add(outcome, "%s:%s" % (os.path.basename(caller.co_filename), caller.co_name),
+                     time.time() - start)
 
 
 def trigger(subsystem=None, action="add", name=None):
@@ -82,38 +299,163 @@ def trigger(subsystem=None, action="add", name=None):
     settle()
 
 
-def resolve_devspec(devspec, sysname=False):
-    if not devspec:
-        return None
+class UdevSnapshot(object):
 
-    # import devices locally to avoid cyclic import (devices <-> udev)
-    from . import devices
+    """ Indexed view of the block devices in the udev database.
 
-    devname = devices.device_path_to_name(devspec)
+        The devices are enumerated once, when the snapshot is taken, and
+        indexed by name, sys_name, device node path, UUID, PARTUUID, label,
+        symlink and (major, minor). When several devices share a key the
+        index returns the first of them in enumeration order.
+
+        Use :func:`get_snapshot` to get the current snapshot. It is replaced
+        after udev has settled, when a block device uevent is received and
+        after an explicit call to :func:`invalidate_snapshot`.
+    """
+
+    attrs = ("name", "sys_name", "devname", "uuid", "partuuid", "label",
+             "symlink", "devno")
+
+    def __init__(self, devices, generation=0):
+        """
+            :param devices: the devices to index
+            :type devices: list of :class:`pyudev.Device`
+            :keyword int generation: the snapshot generation the devices
+                                     were enumerated in
+        """
+        self.devices = devices
+        self.generation = generation
+        self._positions = {}
+        self._maps = dict((attr, {}) for attr in self.attrs)
+
+        for (position, dev) in enumerate(devices):
+            self._positions[dev.sys_name] = position
+            self._map("name", device_get_name(dev), dev)
+            self._map("sys_name", dev.sys_name, dev)
+            self._map("devname", device_get_devname(dev), dev)
+            self._map("uuid", device_get_uuid(dev), dev)
+            self._map("partuuid", device_get_partition_uuid(dev), dev)
+            self._map("label", device_get_label(dev), dev)
+            for link in device_get_symlinks(dev):
+                self._map("symlink", link, dev)
+
+            if "MAJOR" in dev and "MINOR" in dev:
+                self._map("devno", (device_get_major(dev), device_get_minor(dev)), dev)
+
+    def _map(self, attr, key, dev):
+        if key:
+            self._maps[attr].setdefault(key, dev)
+
+    def get(self, attr, key):
+        """ Return the first device indexed under the given attribute value.
+
+            :param str attr: one of :attr:`attrs`
+            :param key: the attribute value
+            :rtype: :class:`pyudev.Device` or NoneType
+        """
+        return self._maps[attr].get(key)
+
+    def _first(self, devices):
+        devices = [d for d in devices if d is not None]
+        if not devices:
+            return None
+
+        return min(devices, key=lambda d: self._positions[d.sys_name])
+
+    def resolve(self, devspec):
+        """ Return the device matching a device specification.
+
+            :param str devspec: a device name, node path or symlink path, or a
+                                LABEL=, UUID= or PARTUUID= specification
+            :rtype: :class:`pyudev.Device` or NoneType
+        """
+        if not devspec:
+            return None
 
-    ret = None
-    for dev in get_devices():
         if devspec.startswith("LABEL="):
-            if device_get_label(dev) == devspec[6:]:
-                ret = dev
-                break
+            return self.get("label", devspec[6:])
         elif devspec.startswith("UUID="):
-            if device_get_uuid(dev) == devspec[5:]:
-                ret = dev
-                break
-        elif device_get_name(dev) == devname or dev.sys_name == devname:
-            ret = dev
-            break
-        else:
-            spec = devspec
-            if not spec.startswith("/dev/"):
-                spec = os.path.normpath("/dev/" + spec)
+            return self.get("uuid", devspec[5:])
+        elif devspec.startswith("PARTUUID="):
+            return self.get("partuuid", devspec[9:])
+
+        # import devices locally to avoid cyclic import (devices <-> udev)
+        from . import devices
+
+        devname = devices.device_path_to_name(devspec)
+        spec = devspec
+        if not spec.startswith("/dev/"):
+            spec = os.path.normpath("/dev/" + spec)
+
+        return self._first([self.get("name", devname), self.get("sys_name", devname),
+                            self.get("symlink", spec)])
+
+    def glob(self, glob):
+        """ Return the names of the devices matching a glob.
+
+            :param str glob: glob to match device names, node paths and
+                             symlinks against
+            :rtype: list of str
+        """
+        import fnmatch
+        ret = []
+
+        if not any(c in glob for c in "*?["):
+            # no wildcards, the glob only matches a name, path or symlink
+            dev = self._first([self.get("name", glob), self.get("devname", glob),
+                               self.get("symlink", glob)])
+            if dev is not None:
+                ret.append(device_get_name(dev))
+
+            return ret
+
+        for dev in self.devices:
+            name = device_get_name(dev)
+            path = device_get_devname(dev)
+
+            if fnmatch.fnmatch(name, glob) or fnmatch.fnmatch(path, glob):
+                ret.append(name)
+            else:
+                for link in device_get_symlinks(dev):
+                    if fnmatch.fnmatch(link, glob):
+                        ret.append(name)
+
+        return ret
 
-            for link in device_get_symlinks(dev):
-                if spec == link:
-                    ret = dev
-                    break
 
+_snapshot = None
+_snapshot_generation = 0
+_snapshot_lock = Lock()
+
+
+def get_snapshot():
+    """ Return the current :class:`UdevSnapshot`, taking a new one if needed. """
+    global _snapshot
+
+    with _snapshot_lock:
+        snapshot = _snapshot
+        if snapshot is None or snapshot.generation != _snapshot_generation:
+            if not flags.uevents:
+                settle()
+
+            generation = _snapshot_generation
+            snapshot = UdevSnapshot(_list_devices(), generation=generation)
+            _snapshot = snapshot
+
+    return snapshot
+
+
+def invalidate_snapshot():
+    """ Make the next :func:`get_snapshot` call enumerate the devices again. """
+    global _snapshot_generation
+    _snapshot_generation += 1
+
+
+def resolve_devspec(devspec, sysname=False):
+    if not devspec:
+        return None
+
+    ret = get_snapshot().resolve(devspec)
     if ret:
         return ret.sys_name if sysname else device_get_name(ret)
 
@@ -126,24 +468,10 @@ def resolve_glob(glob):
     .. note:: This function matches device **names** ("sda"), not paths ("/dev/sda").
 
     """
-    import fnmatch
-    ret = []
-
     if not glob:
-        return ret
-
-    for dev in get_devices():
-        name = device_get_name(dev)
-        path = device_get_devname(dev)
+        return []
 
-        if fnmatch.fnmatch(name, glob) or fnmatch.fnmatch(path, glob):
-            ret.append(name)
-        else:
-            for link in device_get_symlinks(dev):
-                if fnmatch.fnmatch(link, glob):
-                    ret.append(name)
-
-    return ret
+    return get_snapshot().glob(glob)
 
 
 def __is_blacklisted_blockdev(dev_name):
@@ -164,6 +492,11 @@ def __is_blacklisted_blockdev(dev_name):
 
     return False
 
+
+def device_is_blacklisted(info):
+    """ Return True if the device should never be used. """
+    return __is_blacklisted_blockdev(info.sys_name)
+
 # These are functions for retrieving specific pieces of information from
 # udev database entries.
 
@@ -571,8 +904,8 @@ def device_get_lv_type(info):
     return info['LVM2_SEGTYPE']
 
 
-def device_dm_subsystem_match(info, subsystem):
-    """ Return True if the device matches a given device-mapper subsystem. """
+def device_get_dm_subsystem(info):
+    """ Return the (lowercase) device-mapper subsystem of the device or None. """
     uuid = info.get("DM_UUID", "")
     uuid_fields = uuid.split("-")
     _subsystem = uuid_fields[0]
@@ -582,9 +915,14 @@ def device_dm_subsystem_match(info, subsystem):
         _subsystem = uuid_fields[1]
 
     if _subsystem == uuid or not _subsystem:
-        return False
+        return None
 
-    return _subsystem.lower() == subsystem.lower()
+    return _subsystem.lower()
+
+
+def device_dm_subsystem_match(info, subsystem):
+    """ Return True if the device matches a given device-mapper subsystem. """
+    return device_get_dm_subsystem(info) == subsystem.lower()
 
 
 def device_is_dm_lvm(info):
@@ -659,10 +997,9 @@ def device_get_partition_disk(info):
     slaves_dir = "%s/slaves" % sysfs_path
     if majorminor:
         major, minor = majorminor.split(":")
-        for device in get_devices():
-            if device.get("MAJOR") == major and device.get("MINOR") == minor:
-                disk = device_get_name(device)
-                break
+        device = get_snapshot().get("devno", (int(major), int(minor)))
+        if device is not None:
+            disk = device_get_name(device)
     elif device_is_dm_partition(info):
         if os.path.isdir(slaves_dir):
             parents = os.listdir(slaves_dir)
@@ -909,3 +1246,196 @@ def device_get_fcoe_identifier(info):
     if device_is_fcoe(info) and len(path_components) >= 4 and \
        path_components[2] == 'fc':
         return path_components[3]
+
+
+class DeviceClass(object):
+
+    """ Classification of a block device from its udev info.
+
+        Each attribute is determined by the corresponding ``device_is_*`` or
+        ``device_get_*`` function the first time it is used and remembered
+        afterwards, so the sysfs lookups behind it are done at most once.
+
+        Use :func:`device_class` to get the classification of a device. It
+        is kept until the udev snapshot is replaced.
+    """
+
+    def __init__(self, info):
+        """
+            :param info: udev info for the device
+            :type info: :class:`pyudev.Device`
+        """
+        self.info = info
+        self._values = {}
+
+    def _get(self, attr, func):
+        try:
+            return self._values[attr]
+        except KeyError:
+            value = self._values[attr] = func(self.info)
+            return value
+
+    @property
+    def is_cdrom(self):
+        return self._get("is_cdrom", device_is_cdrom)
+
+    @property
+    def is_disk(self):
+        return self._get("is_disk", device_is_disk)
+
+    @property
+    def is_partition(self):
+        return self._get("is_partition", device_is_partition)
+
+    @property
+    def is_dm(self):
+        return self._get("is_dm", device_is_dm)
+
+    @property
+    def is_dm_partition(self):
+        return self._get("is_dm_partition", device_is_dm_partition)
+
+    @property
+    def is_any_partition(self):
+        """ Whether the device is a partition or a dm (kpartx) partition. """
+        return self.is_partition or self.is_dm_partition
+
+    @property
+    def is_md(self):
+        return self._get("is_md", device_is_md)
+
+    @property
+    def is_md_array(self):
+        """ Whether the device is an md array other than a BIOS RAID set. """
+        return self.is_md and not self.md_container
+
+    @property
+    def is_loop(self):
+        return self._get("is_loop", device_is_loop)
+
+    @property
+    def is_dasd(self):
+        return self._get("is_dasd", device_is_dasd)
+
+    @property
+    def is_zfcp(self):
+        return self._get("is_zfcp", device_is_zfcp)
+
+    @property
+    def is_iscsi(self):
+        return self._get("is_iscsi", device_is_iscsi)
+
+    @property
+    def is_fcoe(self):
+        return self._get("is_fcoe", device_is_fcoe)
+
+    @property
+    def is_biosraid_member(self):
+        return self._get("is_biosraid_member", device_is_biosraid_member)
+
+    @property
+    def is_dm_lvm(self):
+        return self._get("is_dm_lvm", device_is_dm_lvm)
+
+    @property
+    def is_dm_luks(self):
+        return self._get("is_dm_luks", device_is_dm_luks)
+
+    @property
+    def is_dm_mpath(self):
+        return self._get("is_dm_mpath", device_is_dm_mpath)
+
+    @property
+    def is_dm_raid(self):
+        return self._get("is_dm_raid", device_is_dm_raid)
+
+    @property
+    def is_dm_crypt(self):
+        return self._get("is_dm_crypt", device_is_dm_crypt)
+
+    @property
+    def is_realdisk(self):
+        """ Whether the device looks like a directly usable disk.
+
+            See :func:`device_is_realdisk`.
+        """
+        return (self.is_disk and
+                not (self.is_cdrom or
+                     self.is_any_partition or
+                     self.is_dm_lvm or
+                     self.is_dm_crypt or
+                     self.is_md_array))
+
+    @property
+    def dm_subsystem(self):
+        return self._get("dm_subsystem", device_get_dm_subsystem)
+
+    @property
+    def md_level(self):
+        return self._get("md_level", device_get_md_level)
+
+    @property
+    def md_container(self):
+        return self._get("md_container", device_get_md_container)
+
+    @property
+    def partition_disk(self):
+        """ The name of the disk of a partition, None for other devices. """
+        return self._get("partition_disk", device_get_partition_disk)
+
+    @property
+    def blacklisted(self):
+        return self._get("blacklisted", device_is_blacklisted)
+
+    @property
+    def kind(self):
+        """ One of "cdrom", "partition", "dm", "md", "loop", "disk" or None. """
+        if self.is_cdrom:
+            return "cdrom"
+        elif self.is_any_partition:
+            return "partition"
+        elif self.is_dm:
+            return "dm"
+        elif self.is_md:
+            return "md"
+        elif self.is_loop:
+            return "loop"
+        elif self.is_disk:
+            return "disk"
+
+        return None
+
+
+_classes = {}
+_classes_generation = None
+_classes_lock = Lock()
+
+
+def device_class(info):
+    """ Return the :class:`DeviceClass` of a device.
+
+        :param info: udev info for the device
+        :type info: :class:`pyudev.Device`
+        :rtype: :class:`DeviceClass`
+
+        Devices are looked up by sysfs path. The classifications are
+        dropped whenever the udev snapshot is invalidated (see
+        :func:`invalidate_snapshot`).
+    """
+    global _classes_generation
+
+    sys_path = getattr(info, "sys_path", None)
+    if not isinstance(sys_path, str):
+        # not a udev device, nothing to look it up by
+        return DeviceClass(info)
+
+    with _classes_lock:
+        if _classes_generation != _snapshot_generation:
+            _classes.clear()
+            _classes_generation = _snapshot_generation
+
+        record = _classes.get(sys_path)
+        if record is None:
+            record = _classes[sys_path] = DeviceClass(info)
+
+        return record
@@ -5,7 +5,6 @@ import itertools
 import os
 import shutil
 import selinux
-import subprocess
 import re
 import sys
 import tempfile
@@ -160,55 +159,10 @@ class Path(str):
 
 
 def _run_program(argv, root='/', stdin=None, env_prune=None, stderr_to_stdout=False, binary_output=False):
-    if env_prune is None:
-        env_prune = []
-
-    def chroot():
-        if root and root != '/':
-            os.chroot(root)
-
-    with program_log_lock:
-        program_log.info("Running... %s", " ".join(argv))
-
-        env = os.environ.copy()
-        env.update({"LC_ALL": "C",
-                    "INSTALL_PATH": root})
-        for var in env_prune:
-            env.pop(var, None)
-
-        if stderr_to_stdout:
-            stderr_dir = subprocess.STDOUT
-        else:
-            stderr_dir = subprocess.PIPE
-        try:
-            proc = subprocess.Popen(argv,
-                                    stdin=stdin,
-                                    stdout=subprocess.PIPE,
-                                    stderr=stderr_dir,
-                                    close_fds=True,
-                                    preexec_fn=chroot, cwd=root, env=env)
-
-            out, err = proc.communicate()
-            if not binary_output and six.PY3:
-                out = out.decode("utf-8")
-            if out:
-                if not stderr_to_stdout:
-                    program_log.info("stdout:")
-                for line in out.splitlines():
-                    program_log.info("%s", line)
-
-            if not stderr_to_stdout and err:
-                program_log.info("stderr:")
-                for line in err.splitlines():
-                    program_log.info("%s", line)
-
-        except OSError as e:
-            program_log.error("Error running %s: %s", argv[0], e.strerror)
-            raise
-
-        program_log.debug("Return code: %d", proc.returncode)
-
-    return (proc.returncode, out)
+    from .commands import run_command
+    result = run_command(argv, root=root, stdin=stdin, env_prune=env_prune,
+                         stderr_to_stdout=stderr_to_stdout, binary_output=binary_output)
+    return (result.returncode, result.out)
 
 
 def run_program(*args, **kwargs):
@@ -276,18 +230,10 @@ def get_mount_paths(dev):
 
 def get_mount_device(mountpoint):
     """ Given a mountpoint, return the device node path mounted there. """
-    mountpoint = os.path.realpath(mountpoint)  # eliminate symlinks
-    mounts = open("/proc/mounts").readlines()
-    mount_device = None
-    for mnt in mounts:
-        try:
-            (device, path, _rest) = mnt.split(None, 2)
-        except ValueError:
-            continue
+    from .mounts import mounts_cache
 
-        if path == mountpoint:
-            mount_device = device
-            break
+    mountpoint = os.path.realpath(mountpoint)  # eliminate symlinks
+    mount_device = mounts_cache.get_mount_device(mountpoint)
 
     if mount_device and re.match(r'/dev/loop\d+$', mount_device):
         loop_name = os.path.basename(mount_device)
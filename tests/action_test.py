@@ -540,6 +540,19 @@ class DeviceActionTestCase(StorageTestCase):
         sda3_actions = self.storage.devicetree.actions.find(devid=sda3.id)
         self.assertNotEqual(len(sda3_actions), 0)
 
+        # lookups by device, type and object match a scan of the action list
+        for device in (md0, sdb1, sda3, sda1):
+            for (action_type, object_type) in [(None, None), ("create", None),
+                                               ("destroy", "device"), (None, "format")]:
+                expected = [a for a in self.storage.devicetree.actions
+                            if a.device == device and
+                            (action_type is None or a.type_string.lower() == action_type) and
+                            (object_type is None or a.object_string.lower() == object_type)]
+                self.assertEqual(self.storage.devicetree.actions.find(device=device,
+                                                                      action_type=action_type,
+                                                                      object_type=object_type),
+                                 expected)
+
         self.storage.devicetree.actions.prune()
 
         # verify the md actions are gone after pruning
@@ -0,0 +1,145 @@
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from blivet import Blivet
+from blivet.actionlist import ActionList
+from blivet.deviceaction import ActionCreateDevice, ActionDestroyFormat
+from blivet.devices import DiskDevice
+from blivet.devices import StorageDevice
+from blivet.formats import DeviceFormat, get_format
+from blivet.size import Size
+from blivet.threads import lock_released
+
+
+class ParallelProcessTestCase(unittest.TestCase):
+    def setUp(self):
+        self.disks = [DiskDevice("disk%d" % i, size=Size("10 GiB"), exists=True)
+                      for i in range(4)]
+        self.devices = [StorageDevice("dev%d" % i, size=Size("1 GiB"), parents=[disk])
+                        for (i, disk) in enumerate(self.disks)]
+        self.actions = ActionList()
+        for device in self.devices:
+            self.actions.add(ActionCreateDevice(device))
+
+        self.running = 0
+        self.max_running = 0
+        self.counter_lock = threading.Lock()
+        self.fail_device = None
+
+    def _create(self, device):
+        with self.counter_lock:
+            self.running += 1
+            self.max_running = max(self.running, self.max_running)
+
+        # simulate an external program; this releases the global lock in
+        # action worker threads
+        with lock_released():
+            time.sleep(0.1)
+
+        with self.counter_lock:
+            self.running -= 1
+
+        if device is self.fail_device:
+            raise RuntimeError("create failed")
+
+    def _process(self, process=None, **kwargs):
+        if process is None:
+            process = lambda **kwargs: self.actions.process(devices=self.disks + self.devices, **kwargs)
+
+        create = lambda device: self._create(device)
+        with patch.object(StorageDevice, "create", autospec=True, side_effect=create):
+            with patch.object(self.actions, "_pre_process"):
+                with patch.object(self.actions, "_post_process"):
+                    process(**kwargs)
+
+    def test_independent_groups(self):
+        # a second device on the first disk joins the first disk's group
+        extra = StorageDevice("extra", size=Size("1 GiB"), parents=[self.disks[0]])
+        self.actions.add(ActionCreateDevice(extra))
+
+        groups = self.actions._independent_groups()
+        self.assertEqual([[a.device for a in g] for g in groups],
+                         [[self.devices[0], extra]] + [[d] for d in self.devices[1:]])
+
+    def test_sequential(self):
+        self._process()
+        self.assertEqual(self.max_running, 1)
+        self.assertEqual(list(self.actions), [])
+        self.assertEqual([a.device for a in self.actions._completed_actions], self.devices)
+
+    def test_parallel(self):
+        self._process(max_workers=2)
+        self.assertEqual(self.max_running, 2)
+        self.assertEqual(list(self.actions), [])
+        self.assertEqual(set(a.device for a in self.actions._completed_actions), set(self.devices))
+
+    def test_parallel_failure(self):
+        self.fail_device = self.devices[0]
+        with self.assertRaisesRegex(RuntimeError, "create failed"):
+            self._process(max_workers=2)
+
+        # the failed action and at least the actions not yet started remain
+        remaining = [a.device for a in self.actions]
+        self.assertIn(self.devices[0], remaining)
+        self.assertNotIn(self.devices[0], [a.device for a in self.actions._completed_actions])
+        self.assertEqual(len(remaining) + len(self.actions._completed_actions), len(self.devices))
+
+    def test_parallel_do_it(self):
+        # Blivet.do_it holds the global lock while the workers run
+        storage = Blivet()
+        storage.devicetree._actions = self.actions
+        thread = threading.Thread(target=self._process, args=(storage.do_it,),
+                                  kwargs={"max_workers": 2}, daemon=True)
+        thread.start()
+        thread.join(10)
+        self.assertFalse(thread.is_alive(), "do_it did not return")
+        self.assertEqual(list(self.actions), [])
+        self.assertEqual(self.max_running, 2)
+
+
+class SortTestCase(unittest.TestCase):
+    def test_independent_order(self):
+        disks = [DiskDevice("disk%d" % i, size=Size("10 GiB"), exists=True) for i in range(4)]
+        existing = [StorageDevice("old%d" % i, size=Size("1 GiB"), parents=[disks[i]], exists=True,
+                                  fmt=get_format(None, device="/dev/old%d" % i, exists=True))
+                    for i in range(2)]
+        new = [StorageDevice("new%d" % i, size=Size("1 GiB"), parents=[disk])
+               for (i, disk) in enumerate(disks)]
+        actions = ActionList()
+        for action in [ActionCreateDevice(new[0]), ActionDestroyFormat(existing[0]),
+                       ActionCreateDevice(new[1]), ActionCreateDevice(new[2]),
+                       ActionDestroyFormat(existing[1]), ActionCreateDevice(new[3])]:
+            actions.add(action)
+
+        actions.sort()
+
+        # destroy actions come before create actions; among independent
+        # actions of the same type the one registered last comes first
+        self.assertEqual([a.device for a in actions],
+                         [existing[1], existing[0], new[3], new[2], new[1], new[0]])
+
+
+class WipeBatchTestCase(unittest.TestCase):
+    def test_wipe_batches(self):
+        disk = DiskDevice("disk", size=Size("10 GiB"), exists=True)
+        devices = [StorageDevice("dev%d" % i, size=Size("1 GiB"), parents=[disk], exists=True,
+                                 fmt=get_format(None, device="/dev/dev%d" % i, exists=True))
+                   for i in range(4)]
+        new = StorageDevice("new", size=Size("1 GiB"), parents=[disk])
+        actions = ActionList()
+        for action in [ActionDestroyFormat(devices[0]), ActionDestroyFormat(devices[1]),
+                       ActionCreateDevice(new),
+                       ActionDestroyFormat(devices[2]), ActionDestroyFormat(devices[3])]:
+            actions.add(action)
+
+        with patch.object(StorageDevice, "setup"), patch.object(StorageDevice, "teardown"), \
+                patch.object(StorageDevice, "create"), patch.object(DeviceFormat, "destroy"), \
+                patch.object(actions, "_pre_process"), patch.object(actions, "_post_process"), \
+                patch("blivet.devicelibs.wipe.udev") as udev:
+            actions.process(devices=[disk] + devices + [new])
+
+        # once before creating the new device and once at the end
+        self.assertEqual(udev.settle.call_count, 2)
+        self.assertEqual(len(actions._completed_actions), 5)
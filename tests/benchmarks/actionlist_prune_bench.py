@@ -0,0 +1,51 @@
+#!/usr/bin/python3
+""" ActionList.prune and ActionList.find cost vs. number of scheduled actions. """
+
+import sys
+
+from blivet.actionlist import ActionList
+from blivet.deviceaction import ActionCreateDevice, ActionDestroyDevice
+from blivet.devices import StorageDevice
+from blivet.size import Size
+
+from tests.benchmarks.lib import best_of, print_table
+
+DEVICES = [10, 50, 100, 250, 500]
+
+
+def build_actions(n):
+    """ Schedule a create..destroy cycle plus an unrelated create for n devices. """
+    actions = ActionList()
+    devices = []
+    for i in range(n):
+        doomed = StorageDevice("doomed%d" % i, size=Size("1 GiB"), exists=False)
+        actions._append(ActionCreateDevice(doomed))
+        actions._append(ActionDestroyDevice(doomed))
+
+        device = StorageDevice("dev%d" % i, size=Size("1 GiB"), exists=False)
+        actions._append(ActionCreateDevice(device))
+        devices.append(device)
+
+    return (actions, devices)
+
+
+def main():
+    rows = []
+    for n in DEVICES:
+        def prune():
+            (actions, _devices) = build_actions(n)
+            actions.prune()
+
+        (actions, devices) = build_actions(n)
+
+        def find():
+            for device in devices:
+                actions.find(device=device, action_type="create")
+
+        rows.append((3 * n, best_of(prune, repeat=3), best_of(find, repeat=3) / n))
+
+    print_table(["actions", "build+prune (s)", "find (s)"], rows)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
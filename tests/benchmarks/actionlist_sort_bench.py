@@ -0,0 +1,40 @@
+#!/usr/bin/python3
+""" ActionList.sort cost vs. number of scheduled actions. """
+
+import sys
+
+from blivet.actionlist import ActionList
+from blivet.deviceaction import ActionCreateDevice, ActionDestroyDevice
+from blivet.devices import StorageDevice
+from blivet.size import Size
+
+from tests.benchmarks.lib import best_of, print_table
+
+GROUPS = [10, 50, 100, 250, 500]
+
+
+def build_actions(n):
+    actions = ActionList()
+    for i in range(n):
+        old = StorageDevice("old%d" % i, size=Size("1 GiB"), exists=True)
+        parent = StorageDevice("parent%d" % i, size=Size("1 GiB"), exists=False)
+        child = StorageDevice("child%d" % i, size=Size("1 GiB"), exists=False,
+                              parents=[parent])
+        actions.add(ActionDestroyDevice(old))
+        actions.add(ActionCreateDevice(parent))
+        actions.add(ActionCreateDevice(child))
+
+    return actions
+
+
+def main():
+    rows = []
+    for n in GROUPS:
+        actions = build_actions(n)
+        rows.append((len(actions._actions), best_of(actions.sort, repeat=3)))
+
+    print_table(["actions", "sort (s)"], rows)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,57 @@
+#!/usr/bin/python3
+""" Cost of method call tracing (storage_log.log_method_call).
+
+    Times device lookups, which trace their calls and return values, with
+    tracing inactive and active. When run as root this also times a full
+    populate of the system's storage.
+"""
+
+import logging
+import os
+import sys
+
+from blivet import Blivet
+from blivet.flags import flags
+
+from tests.benchmarks.devicetree_lookup_bench import build_tree
+from tests.benchmarks.lib import best_of, print_table
+
+DEVICES = 500
+LOOKUPS = 2000
+
+log = logging.getLogger("blivet")
+
+
+def set_tracing(level, trace):
+    log.setLevel(level)
+    flags.trace_method_calls = trace
+
+
+def main():
+    # debug messages go nowhere, we only want to measure the cost of tracing
+    log.propagate = False
+    log.addHandler(logging.NullHandler())
+
+    tree = build_tree(DEVICES)
+    names = ["dev%d" % (i % DEVICES) for i in range(LOOKUPS)]
+
+    def lookups():
+        for name in names:
+            tree.get_device_by_name(name)
+
+    storage = Blivet() if os.geteuid() == 0 else None
+
+    modes = [("logger at INFO", logging.INFO, True),
+             ("DEBUG, tracing disabled", logging.DEBUG, False),
+             ("DEBUG, tracing enabled", logging.DEBUG, True)]
+    rows = []
+    for (desc, level, trace) in modes:
+        set_tracing(level, trace)
+        populate = best_of(storage.reset, repeat=3) if storage else "n/a (not root)"
+        rows.append((desc, best_of(lookups) / LOOKUPS, populate))
+
+    print_table(["mode", "lookup (s)", "populate (s)"], rows)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,62 @@
+#!/usr/bin/python3
+""" Cost of growing thousands of LVs in one VG.
+
+    Compares growing the requests of a chunk one at a time, the way
+    Chunk.grow_requests used to, against grow_units. A quarter of the
+    requests have a maximum size, which makes the growth take several
+    rounds. The requests are simulated, so this only measures the growth
+    calculation.
+"""
+
+import random
+import sys
+from types import SimpleNamespace
+
+from blivet import partitioning
+from blivet.partitioning import Chunk, Request
+
+from tests.benchmarks.lib import best_of, print_table
+
+SIZES = [100, 1000, 5000]
+
+
+def build_chunk(n):
+    rand = random.Random(n)
+    requests = []
+    for i in range(n):
+        request = Request(SimpleNamespace(req_grow=True, id=i, name="lv%d" % i))
+        request.base = rand.choice([256, 1024, 2560, rand.randint(100, 10000)])
+        if i % 4 == 0:
+            request.max_growth = rand.randint(1, 4 * request.base)
+        requests.append(request)
+
+    # the VG has room for each LV to triple in size on average
+    return Chunk(3 * sum(r.base for r in requests), requests=requests)
+
+
+def time_growth(n, grow):
+    chunks = [build_chunk(n) for _i in range(3)]
+    return best_of(lambda: grow(chunks.pop()), repeat=3)
+
+
+def main():
+    rows = []
+    for n in SIZES:
+        iterative = build_chunk(n)
+        iterative._grow_requests_iteratively()   # pylint: disable=protected-access
+        closed = build_chunk(n)
+        closed.grow_requests()
+        if [r.growth for r in iterative.requests] != [r.growth for r in closed.requests]:
+            print("growth differs for %d requests" % n)
+            return 1
+
+        rows.append((n,
+                     time_growth(n, lambda c: c._grow_requests_iteratively()),  # pylint: disable=protected-access
+                     time_growth(n, lambda c: c.grow_requests()),
+                     "yes" if partitioning.numpy is not None else "no"))
+
+    print_table(["LVs", "iterative (s)", "grow_units (s)", "numpy"], rows)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,73 @@
+#!/usr/bin/python3
+""" Device lookup cost vs. device tree size.
+
+    Compares the indexed DeviceTree.get_device_by_* methods against the
+    linear scan they replaced.
+"""
+
+import sys
+
+from blivet.devices import StorageDevice
+from blivet.devicetree import DeviceTree
+from blivet.formats import get_format
+
+from tests.benchmarks.lib import best_of, print_table
+
+SIZES = [100, 500, 1000, 2000, 5000]
+LOOKUPS = 200
+
+
+def build_tree(n):
+    tree = DeviceTree()
+    for i in range(n):
+        fmt = get_format("ext4", uuid="fs-uuid-%d" % i, label="label%d" % i, exists=True)
+        device = StorageDevice("dev%d" % i, fmt=fmt, uuid="dev-uuid-%d" % i,
+                               exists=False, sysfs_path="/devices/virtual/block/dev%d" % i)
+        tree._add_device(device)
+
+    return tree
+
+
+def linear_by_name(tree, name):
+    return next((d for d in tree._filter_devices() if d.name == name), None)
+
+
+def main():
+    rows = []
+    for n in SIZES:
+        tree = build_tree(n)
+        names = ["dev%d" % (i * n // LOOKUPS) for i in range(LOOKUPS)]
+
+        def by_name():
+            for name in names:
+                tree.get_device_by_name(name)
+
+        def by_uuid():
+            for (i, _name) in enumerate(names):
+                tree.get_device_by_uuid("fs-uuid-%d" % (i * n // LOOKUPS))
+
+        def by_path():
+            for name in names:
+                tree.get_device_by_path("/dev/" + name)
+
+        def miss():
+            for name in names:
+                tree.get_device_by_name(name + "x")
+
+        def linear():
+            for name in names:
+                linear_by_name(tree, name)
+
+        rows.append((n,
+                     best_of(by_name) / LOOKUPS,
+                     best_of(by_uuid) / LOOKUPS,
+                     best_of(by_path) / LOOKUPS,
+                     best_of(miss) / LOOKUPS,
+                     best_of(linear) / LOOKUPS))
+
+    print("seconds per lookup")
+    print_table(["devices", "name", "uuid", "path", "name (miss)", "linear scan"], rows)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
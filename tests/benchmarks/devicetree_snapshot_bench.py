@@ -0,0 +1,50 @@
+#!/usr/bin/python3
+""" Cost of saving and restoring a device tree vs. tree size.
+
+    Compares DeviceTreeSnapshot, used by the device factories for error
+    recovery, against the full deep copy done by Blivet.copy.
+"""
+
+import copy
+import sys
+
+from blivet.deviceaction import ActionCreateDevice
+from blivet.devices import DiskDevice, StorageDevice
+from blivet.devicetree import DeviceTree
+from blivet.formats import get_format
+from blivet.size import Size
+from blivet.snapshot import DeviceTreeSnapshot
+
+from tests.benchmarks.lib import best_of, print_table
+
+SIZES = [10, 50, 100, 250, 500]
+
+
+def build_tree(n):
+    """ Build a tree with one disk and n new devices on it. """
+    tree = DeviceTree()
+    disk = DiskDevice("disk", size=Size("10 TiB"), exists=True)
+    tree._add_device(disk)
+    for i in range(n):
+        device = StorageDevice("dev%d" % i, size=Size("1 GiB"), parents=[disk],
+                               fmt=get_format("ext4", mountpoint="/mnt/%d" % i))
+        tree.actions.add(ActionCreateDevice(device))
+
+    return tree
+
+
+def main():
+    rows = []
+    for n in SIZES:
+        tree = build_tree(n)
+        snapshot = DeviceTreeSnapshot(tree)
+        rows.append((n,
+                     best_of(lambda: copy.deepcopy(tree), repeat=3),
+                     best_of(lambda: DeviceTreeSnapshot(tree), repeat=3),
+                     best_of(snapshot.restore, repeat=3)))
+
+    print_table(["devices", "deepcopy (s)", "snapshot (s)", "restore (s)"], rows)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
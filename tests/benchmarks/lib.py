@@ -0,0 +1,49 @@
+""" Helpers shared by the benchmark scripts in this directory.
+
+    The benchmarks are not part of the test suite. Run them from the top of
+    the source tree, eg::
+
+        PYTHONPATH=. python3 tests/benchmarks/devicetree_lookup_bench.py
+"""
+
+import time
+
+
+def best_of(func, repeat=5, number=1):
+    """ Return the best wall-clock time of running func number times.
+
+        :param func: callable taking no arguments
+        :param int repeat: how many times to repeat the measurement
+        :param int number: how many calls make up one measurement
+        :returns: the shortest measurement, in seconds
+        :rtype: float
+    """
+    best = None
+    for _i in range(repeat):
+        start = time.perf_counter()
+        for _j in range(number):
+            func()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+
+    return best
+
+
+def print_table(headers, rows):
+    """ Print a simple fixed-width table.
+
+        :param headers: column headings
+        :type headers: list of str
+        :param rows: table rows
+        :type rows: list of tuple
+    """
+    cells = [[str(h) for h in headers]]
+    for row in rows:
+        cells.append([("%.6f" % c) if isinstance(c, float) else str(c) for c in row])
+
+    widths = [max(len(r[i]) for r in cells) for i in range(len(headers))]
+    for (i, row) in enumerate(cells):
+        print("  ".join(c.rjust(w) for (c, w) in zip(row, widths)))
+        if i == 0:
+            print("  ".join("-" * w for w in widths))
@@ -0,0 +1,77 @@
+#!/usr/bin/python3
+""" Reader throughput and latency with a concurrent writer.
+
+    N reader threads look up devices while one writer thread repeatedly
+    holds the global lock for a while, as populate() or process() would.
+    This is run with exclusive locking only and with shared locking enabled.
+"""
+
+import sys
+import threading
+import time
+
+from blivet import threads
+from blivet.devices import StorageDevice
+
+from tests.benchmarks.devicetree_lookup_bench import build_tree
+from tests.benchmarks.lib import print_table
+
+DEVICES = 500
+READERS = [1, 2, 4, 8]
+DURATION = 2.0
+WRITE_HOLD = 0.01       # seconds the writer holds the lock at a time
+WRITE_PAUSE = 0.01      # seconds between writes
+
+
+def run(n_readers):
+    tree = build_tree(DEVICES)
+    stop = threading.Event()
+    counts = [0] * n_readers
+    worst = [0.0] * n_readers
+
+    def reader(idx):
+        i = 0
+        while not stop.is_set():
+            start = time.perf_counter()
+            tree.get_device_by_name("dev%d" % (i % DEVICES))
+            worst[idx] = max(worst[idx], time.perf_counter() - start)
+            counts[idx] += 1
+            i += 1
+
+    def writer():
+        i = 0
+        while not stop.is_set():
+            with threads.blivet_lock:
+                device = StorageDevice("new%d" % i, exists=False)
+                tree._add_device(device)
+                time.sleep(WRITE_HOLD)
+                tree._remove_device(device)
+            time.sleep(WRITE_PAUSE)
+            i += 1
+
+    workers = [threading.Thread(target=reader, args=(i,)) for i in range(n_readers)]
+    workers.append(threading.Thread(target=writer))
+    for worker in workers:
+        worker.start()
+    time.sleep(DURATION)
+    stop.set()
+    for worker in workers:
+        worker.join()
+
+    return (sum(counts) / DURATION, max(worst))
+
+
+def main():
+    rows = []
+    for n in READERS:
+        for shared in (False, True):
+            threads.enable_shared_locking(shared)
+            (rate, worst) = run(n)
+            rows.append((n, "shared" if shared else "exclusive", "%.0f" % rate, worst))
+
+    threads.enable_shared_locking(False)
+    print_table(["readers", "locking", "lookups/s", "worst latency (s)"], rows)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
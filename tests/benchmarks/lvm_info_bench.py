@@ -0,0 +1,47 @@
+#!/usr/bin/python3
+""" Cost of looking up the LVs of a VG once per PV while populating.
+
+    Compares filtering the whole LV report for every PV, the way the LVM
+    format populator used to, against the per-VG index of LVMInfo. The
+    lvm reports are simulated, so this only measures the lookups.
+"""
+
+import sys
+from unittest.mock import Mock, patch
+
+from blivet.static_data.lvm_info import LVMInfo
+
+from tests.benchmarks.lib import best_of, print_table
+
+SIZES = [(10, 100), (50, 1000), (50, 5000)]
+VGS = 10
+
+
+def build_lvs(n):
+    return [Mock(vg_name="vg%d" % (i % VGS), lv_name="lv%d" % i) for i in range(n)]
+
+
+def main():
+    rows = []
+    for (pvs, n) in SIZES:
+        lvs = build_lvs(n)
+        lv_dict = dict(("%s-%s" % (lv.vg_name, lv.lv_name), lv) for lv in lvs)
+
+        def filtered():
+            for _i in range(pvs):
+                dict((k, v) for (k, v) in lv_dict.items() if v.vg_name == "vg0")
+
+        def indexed():
+            info = LVMInfo()
+            for _i in range(pvs):
+                info.vg_lvs("vg0")
+
+        with patch("blivet.static_data.lvm_info.blockdev.lvm") as lvm:
+            lvm.lvs.side_effect = lambda vg_name=None: [lv for lv in lvs if vg_name in (None, lv.vg_name)]
+            rows.append((pvs, n, best_of(filtered, repeat=3), best_of(indexed, repeat=3)))
+
+    print_table(["PVs", "LVs", "filter per PV (s)", "LVMInfo.vg_lvs (s)"], rows)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,43 @@
+#!/usr/bin/python3
+""" Cost of mount table lookups.
+
+    Compares MountsCache lookups, which only re-read the mount table when
+    the kernel reports a change, against hashing /proc/mounts the way every
+    lookup used to.
+"""
+
+import sys
+
+from blivet import util
+from blivet.mounts import MountsCache
+
+from tests.benchmarks.lib import best_of, print_table
+
+LOOKUPS = 1000
+
+
+def main():
+    cache = MountsCache()
+    cache.is_mountpoint("/")
+
+    def md5():
+        for _i in range(LOOKUPS):
+            util.md5_file("/proc/mounts")
+
+    def is_mountpoint():
+        for _i in range(LOOKUPS):
+            cache.is_mountpoint("/")
+
+    def get_mountpoints():
+        for _i in range(LOOKUPS):
+            cache.get_mountpoints("/dev/root")
+
+    rows = [("md5 of /proc/mounts", best_of(md5, repeat=3) / LOOKUPS),
+            ("is_mountpoint", best_of(is_mountpoint, repeat=3) / LOOKUPS),
+            ("get_mountpoints", best_of(get_mountpoints, repeat=3) / LOOKUPS)]
+
+    print_table(["operation", "per lookup (s)"], rows)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,56 @@
+#!/usr/bin/python3
+""" Device tree population time vs. number of block devices.
+
+    Sets up loop devices and compares populating the tree with the device
+    probes run sequentially against running them on a thread pool. Needs
+    root privileges.
+"""
+
+import os
+import sys
+import tempfile
+
+from blivet import Blivet
+
+from tests.benchmarks.lib import best_of, print_table
+from tests.loopbackedtestcase import get_free_loop_dev, make_loop_dev, make_store, remove_loop_dev
+
+SIZES = [4, 16, 32]
+WORKERS = [1, 4, 8]
+
+
+def populate(storage, max_workers):
+    storage.devicetree.reset(conf=storage.config)
+    storage.devicetree.populate(max_workers=max_workers)
+
+
+def main():
+    if os.geteuid() != 0:
+        print("requires root privileges", file=sys.stderr)
+        return 1
+
+    rows = []
+    storage = Blivet()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        loops = []
+        try:
+            for n in SIZES:
+                while len(loops) < n:
+                    store = os.path.join(tmpdir, "store%d" % len(loops))
+                    make_store(store, num_blocks=10240)
+                    loop = get_free_loop_dev()
+                    make_loop_dev(loop, store)
+                    loops.append(loop)
+
+                storage.config.exclusive_disks = [os.path.basename(l) for l in loops]
+                rows.append([n] + [best_of(lambda: populate(storage, w), repeat=3)
+                                   for w in WORKERS])
+        finally:
+            for loop in loops:
+                remove_loop_dev(loop)
+
+    print_table(["devices"] + ["%d workers (s)" % w for w in WORKERS], rows)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
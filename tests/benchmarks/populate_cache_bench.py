@@ -0,0 +1,68 @@
+#!/usr/bin/python3
+""" Cold vs. warm device tree population with the populate cache.
+
+    Sets up loop devices with ext4 filesystems and populates the tree in
+    installer mode, where the filesystem size tools run for every device,
+    first with an empty populate cache and then with a saved one. Needs
+    root privileges.
+"""
+
+import os
+import sys
+import tempfile
+
+from blivet import Blivet
+from blivet import util
+from blivet.flags import flags
+from blivet.static_data import fs_info
+
+from tests.benchmarks.lib import best_of, print_table
+from tests.loopbackedtestcase import get_free_loop_dev, make_loop_dev, make_store, remove_loop_dev
+
+SIZES = [4, 16, 32]
+
+
+def populate(storage, cold):
+    storage.devicetree.reset(conf=storage.config)
+    if cold:
+        storage.devicetree.populate_cache.invalidate()
+        fs_info.drop_cache()
+
+    storage.devicetree.populate()
+
+
+def main():
+    if os.geteuid() != 0:
+        print("requires root privileges", file=sys.stderr)
+        return 1
+
+    flags.installer_mode = True
+    rows = []
+    storage = Blivet()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        storage.config.populate_cache = os.path.join(tmpdir, "populate-cache.json")
+        loops = []
+        try:
+            for n in SIZES:
+                while len(loops) < n:
+                    store = os.path.join(tmpdir, "store%d" % len(loops))
+                    make_store(store, num_blocks=10240)
+                    loop = get_free_loop_dev()
+                    make_loop_dev(loop, store)
+                    util.run_program(["mkfs.ext4", "-q", "-F", loop])
+                    loops.append(loop)
+
+                storage.config.exclusive_disks = [os.path.basename(l) for l in loops]
+                populate(storage, cold=True)
+                rows.append((n,
+                             best_of(lambda: populate(storage, cold=True), repeat=3),
+                             best_of(lambda: populate(storage, cold=False), repeat=3)))
+        finally:
+            for loop in loops:
+                remove_loop_dev(loop)
+
+    print_table(["devices", "cold (s)", "warm (s)"], rows)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,69 @@
+#!/usr/bin/python3
+""" Cost of estimating RAID array sizes over and over.
+
+    The first table reads the estimated size of a set of RAID arrays many
+    times, the way the size of MD arrays and RAID LVs is read during
+    allocation, with the size cache disabled and enabled. The second
+    compares estimating the space needed for many member counts one at a
+    time against get_spaces.
+"""
+
+import sys
+
+from blivet.devicelibs import raid
+from blivet.size import Size
+
+from tests.benchmarks.lib import best_of, print_table
+
+ARRAYS = [10, 100, 1000]
+READS = 20
+MEMBER_COUNTS = list(range(1, 65))
+
+
+def superblock_size(size):
+    # roughly what libblockdev estimates for md metadata 1.2
+    return Size(min(int(size) // 1000, 128 * 1024 * 1024)) + Size("1 MiB")
+
+
+def read_sizes(arrays):
+    for _i in range(READS):
+        for (level, member_sizes) in arrays:
+            level.get_size(member_sizes, len(member_sizes), Size("512 KiB"), superblock_size)
+            level.get_space(member_sizes[0], len(member_sizes), Size("512 KiB"), superblock_size)
+
+
+def main():
+    levels = [raid.RAID0, raid.RAID1, raid.RAID5, raid.RAID6, raid.RAID10]
+    rows = []
+    for n in ARRAYS:
+        arrays = [(levels[i % len(levels)], [Size("%d GiB" % (1 + i + j)) for j in range(4)])
+                  for i in range(n)]
+
+        raid.size_cache.drop_cache()
+        raid.size_cache.maxsize = 0
+        uncached = best_of(lambda: read_sizes(arrays), repeat=3)
+        raid.size_cache.maxsize = 2 * n
+        cached = best_of(lambda: read_sizes(arrays), repeat=3)
+        info = raid.size_cache.info()
+        rows.append((n, READS, uncached, cached, "%.1fx" % (uncached / cached),
+                     "%d/%d" % (info.hits, info.misses)))
+
+    print_table(["arrays", "reads", "uncached (s)", "cached (s)", "speedup", "hits/misses"], rows)
+    print()
+
+    raid.size_cache.maxsize = 0
+    rows = []
+    for level in levels:
+        one_by_one = best_of(lambda: [level.get_space(Size("1 TiB"), n, Size("512 KiB"), superblock_size)
+                                      for n in MEMBER_COUNTS if n >= level.min_members],
+                             number=10)
+        batch = best_of(lambda: level.get_spaces(Size("1 TiB"), MEMBER_COUNTS, Size("512 KiB"),
+                                                 superblock_size),
+                        number=10)
+        rows.append((level, len(MEMBER_COUNTS), one_by_one, batch, "%.1fx" % (one_by_one / batch)))
+
+    print_table(["level", "member counts", "get_space (s)", "get_spaces (s)", "speedup"], rows)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
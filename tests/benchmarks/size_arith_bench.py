@@ -0,0 +1,94 @@
+#!/usr/bin/python3
+""" Cost of size arithmetic in the allocation code.
+
+    The first table compares aligning a list of sizes to the extent size
+    and summing them up with Size arithmetic, which goes through
+    libbytesize and creates a new Size for every step, against doing the
+    same on byte counts with round_bytes.
+
+    The second table times do_partitioning and grow_lvm for a growing
+    number of growable partitions and LVs on sparse disk image files.
+"""
+
+import random
+import sys
+from contextlib import ExitStack
+
+from blivet import Blivet
+from blivet.devices import DiskFile
+from blivet.formats import get_format
+from blivet.partitioning import do_partitioning, grow_lvm
+from blivet.size import Size, ROUND_UP, round_bytes
+from blivet.util import sparsetmpfile
+
+from tests.benchmarks.lib import best_of, print_table
+
+COUNTS = [1000, 10000, 100000]
+PARTITIONS = [4, 16, 64]
+PE_SIZE = Size("4 MiB")
+
+
+def aligned_total(sizes):
+    return sum((s.round_to_nearest(PE_SIZE, rounding=ROUND_UP) for s in sizes), Size(0))
+
+
+def aligned_total_bytes(sizes):
+    pe_size = int(PE_SIZE)
+    return Size(sum(round_bytes(s, pe_size, ROUND_UP) for s in sizes))
+
+
+def build_storage(stack, n):
+    storage = Blivet()
+    disks = []
+    for i in range(2):
+        path = stack.enter_context(sparsetmpfile("sizebench", Size("%d GiB" % (n * 2))))
+        disk = DiskFile(path)
+        disk.format = get_format("disklabel", device=disk.path, label_type="gpt", exists=False)
+        storage.devicetree._add_device(disk)    # pylint: disable=protected-access
+        disks.append(disk)
+
+    pvs = []
+    for i in range(n):
+        part = storage.new_partition(size=Size("%d MiB" % (100 + i)), grow=True,
+                                     parents=[disks[i % 2]],
+                                     fmt_type="lvmpv" if i % 2 else "ext4")
+        storage.create_device(part)
+        if i % 2:
+            pvs.append(part)
+
+    vg = storage.new_vg(parents=pvs)
+    storage.create_device(vg)
+    for i in range(n):
+        lv = storage.new_lv(parents=[vg], size=Size("%d MiB" % (8 + 4 * (i % 5))), grow=True,
+                            maxsize=Size("1 GiB") if i % 4 == 0 else None, fmt_type="xfs")
+        storage.create_device(lv)
+
+    return storage
+
+
+def main():
+    rand = random.Random(0)
+    rows = []
+    for n in COUNTS:
+        sizes = [Size(rand.randrange(1, 1 << 40)) for _i in range(n)]
+        assert aligned_total(sizes) == aligned_total_bytes(sizes)
+        with_size = best_of(lambda: aligned_total(sizes), repeat=3)
+        with_bytes = best_of(lambda: aligned_total_bytes(sizes), repeat=3)
+        rows.append((n, with_size, with_bytes, "%.1fx" % (with_size / with_bytes)))
+
+    print_table(["sizes", "Size (s)", "byte counts (s)", "speedup"], rows)
+    print()
+
+    rows = []
+    for n in PARTITIONS:
+        with ExitStack() as stack:
+            storage = build_storage(stack, n)
+            partitioning = best_of(lambda: do_partitioning(storage), repeat=3)
+            growth = best_of(lambda: grow_lvm(storage), repeat=3)
+            rows.append((n, n, partitioning, growth))
+
+    print_table(["partitions", "LVs", "do_partitioning (s)", "grow_lvm (s)"], rows)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,66 @@
+#!/usr/bin/python3
+""" Device specification resolution cost vs. number of block devices.
+
+    Compares UdevSnapshot.resolve against the linear scan over the udev
+    devices resolve_devspec used to do for every specification.
+"""
+
+import sys
+
+from blivet import udev
+
+from tests.benchmarks.lib import best_of, print_table
+
+SIZES = [10, 100, 500, 1000]
+LOOKUPS = 100
+
+
+class FakeDevice(dict):
+    def __init__(self, sys_name, **properties):
+        super().__init__(**properties)
+        self.sys_name = sys_name
+
+
+def build_devices(n):
+    return [FakeDevice("sd%d" % i, DEVNAME="/dev/sd%d" % i, MAJOR="8", MINOR=str(i),
+                       ID_FS_UUID="uuid-%d" % i, ID_FS_LABEL="label%d" % i,
+                       DEVLINKS="/dev/disk/by-id/disk-%d /dev/disk/by-uuid/uuid-%d" % (i, i))
+            for i in range(n)]
+
+
+def linear_resolve(devices, devspec):
+    for dev in devices:
+        if devspec.startswith("UUID="):
+            if udev.device_get_uuid(dev) == devspec[5:]:
+                return dev
+        elif udev.device_get_name(dev) == devspec or dev.sys_name == devspec:
+            return dev
+        elif devspec in udev.device_get_symlinks(dev):
+            return dev
+
+
+def main():
+    rows = []
+    for n in SIZES:
+        devices = build_devices(n)
+        specs = []
+        for i in range(LOOKUPS):
+            j = i * n // LOOKUPS
+            specs += ["sd%d" % j, "UUID=uuid-%d" % j, "/dev/disk/by-id/disk-%d" % j]
+
+        def linear():
+            for spec in specs:
+                linear_resolve(devices, spec)
+
+        def snapshot():
+            snap = udev.UdevSnapshot(devices)
+            for spec in specs:
+                snap.resolve(spec)
+
+        rows.append((n, best_of(linear, repeat=3), best_of(snapshot, repeat=3)))
+
+    print_table(["devices", "linear (s)", "snapshot+index (s)"], rows)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
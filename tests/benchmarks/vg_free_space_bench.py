@@ -0,0 +1,57 @@
+#!/usr/bin/python3
+""" Cost of reading the free space of a VG while resizing its LVs.
+
+    Resizes one LV at a time and reads the VG's free space after each
+    change, the way the device factory and grow_lvm do. Compares the full
+    recomputation over all of the VG's LVs, which is what free_space used
+    to do, against the VG's space ledger.
+"""
+
+import sys
+
+import blivet
+from blivet.devices import LVMLogicalVolumeDevice, LVMVolumeGroupDevice, StorageDevice
+from blivet.size import Size
+
+from tests.benchmarks.lib import best_of, print_table
+
+SIZES = [100, 500, 2000]
+CHANGES = 100
+
+
+def build_vg(n):
+    pv = StorageDevice("pv1", fmt=blivet.formats.get_format("lvmpv"),
+                       size=Size("%d MiB" % (n * 16 + 1)))
+    vg = LVMVolumeGroupDevice("testvg", parents=[pv])
+    for i in range(n):
+        LVMLogicalVolumeDevice("lv%d" % i, parents=[vg], size=Size("8 MiB"))
+    return vg
+
+
+def recomputed_free_space(vg):
+    # pylint: disable=protected-access
+    used = sum((lv.vg_space_used for lv in vg.lvs), Size(0))
+    reserved = vg.align(vg._compute_pmspare_size(), roundup=True)
+    return vg._compute_size() - used - reserved
+
+
+def main():
+    rows = []
+    for n in SIZES:
+        vg = build_vg(n)
+        lvs = vg.lvs
+
+        def resize(free_space):
+            for i in range(CHANGES):
+                lvs[i % n].size = Size("%d MiB" % (8 + 4 * (i % 2)))
+                free_space(vg)
+
+        full = best_of(lambda: resize(recomputed_free_space), repeat=3)
+        ledger = best_of(lambda: resize(lambda vg: vg.free_space), repeat=3)
+        rows.append((n, CHANGES, full, ledger, "%.1fx" % (full / ledger)))
+
+    print_table(["LVs", "resizes", "recomputed (s)", "ledger (s)", "speedup"], rows)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+import asyncio
+import time
+import unittest
+
+from blivet import commands
+from blivet import util
+from blivet.errors import CommandTimeoutError
+
+
+class CommandsTest(unittest.TestCase):
+
+    def setUp(self):
+        commands.command_stats.reset()
+
+    def test_run_command(self):
+        result = commands.run_command(["sh", "-c", "echo out; echo err >&2; exit 3"])
+        self.assertEqual(result.returncode, 3)
+        self.assertEqual(result.out, "out\n")
+        self.assertEqual(result.err, "err\n")
+
+        result = commands.run_command(["sh", "-c", "echo out; echo err >&2"], stderr_to_stdout=True)
+        self.assertEqual(result.out, "out\nerr\n")
+        self.assertIsNone(result.err)
+
+        self.assertEqual(commands.run_command(["echo", "out"], binary_output=True).out, b"out\n")
+        self.assertEqual(commands.command_stats.programs["sh"][0], 2)
+        self.assertEqual(commands.command_stats.count, 3)
+
+        # the old interface is built on top of run_command
+        self.assertEqual(util.run_program_and_capture_output(["echo", "out"]), (0, "out\n"))
+
+    def test_invalid_stderr(self):
+        result = commands.run_command(["sh", "-c", "printf 'a\\377\\n' >&2"])
+        self.assertEqual(result.err, "a\ufffd\n")
+
+    def test_log(self):
+        with self.assertLogs("program", level="DEBUG") as logs:
+            commands.run_commands([["sh", "-c", "echo %d" % i] for i in range(2)])
+
+        # records for concurrent runs can be told apart
+        messages = [r.getMessage() for r in logs.records]
+        for i in range(2):
+            run = [m for m in messages if m.startswith("Running... sh -c echo %d (run " % i)]
+            self.assertEqual(len(run), 1)
+            run_id = run[0].rsplit(" ", 1)[1].rstrip(")")
+            self.assertIn("sh (run %s) stdout:\n%d" % (run_id, i), messages)
+            self.assertIn("Return code of sh (run %s): 0" % run_id, messages)
+
+    def test_line_callback(self):
+        lines = []
+        result = commands.run_command(["sh", "-c", "echo a; echo b >&2; printf c"],
+                                      line_callback=lambda name, line: lines.append((name, line)))
+        self.assertEqual(result.out, "a\nc")
+        self.assertEqual(sorted(lines), [("stderr", "b"), ("stdout", "a"), ("stdout", "c")])
+
+    def test_timeout(self):
+        with self.assertRaises(CommandTimeoutError):
+            commands.run_command(["sleep", "10"], timeout=0.1)
+
+        with self.assertRaises(CommandTimeoutError):
+            commands.run_command(["sleep", "10"], timeout=0.1, line_callback=lambda name, line: None)
+
+        self.assertEqual(commands.command_stats.timeouts, 2)
+
+    def test_run_commands(self):
+        start = time.time()
+        results = commands.run_commands([["sh", "-c", "sleep 0.5; echo %d" % i] for i in range(4)])
+        self.assertLess(time.time() - start, 2)
+        self.assertEqual([r.out for r in results], ["0\n", "1\n", "2\n", "3\n"])
+
+    def test_async_run_commands(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self.addCleanup(asyncio.set_event_loop, None)
+        self.addCleanup(loop.close)
+
+        argvs = [["sh", "-c", "sleep 0.5; echo %d" % i] for i in range(4)]
+        start = time.time()
+        results = loop.run_until_complete(commands.async_run_commands(argvs, max_concurrent=2))
+        self.assertLess(time.time() - start, 2)
+        self.assertEqual([r.out for r in results], ["0\n", "1\n", "2\n", "3\n"])
+
+        with self.assertRaises(CommandTimeoutError):
+            loop.run_until_complete(commands.async_run_command(["sleep", "10"], timeout=0.1))
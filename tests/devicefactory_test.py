@@ -2,6 +2,7 @@
 import unittest
 from decimal import Decimal
 import os
+from unittest.mock import patch
 
 import blivet
 
@@ -13,7 +14,7 @@ from blivet.devices import LUKSDevice
 from blivet.devices import LVMLogicalVolumeDevice
 from blivet.devices import MDRaidArrayDevice
 from blivet.devices import PartitionDevice
-from blivet.errors import RaidError
+from blivet.errors import RaidError, StorageError
 from blivet.formats import get_format
 from blivet.size import Size
 from blivet.util import create_sparse_tempfile
@@ -153,6 +154,42 @@ class DeviceFactoryTestCase(unittest.TestCase):
         device = self._factory_device(device_type, size, **kwargs)
         self._validate_factory_device(device, device_type, size, **kwargs)
 
+    def test_revert(self):
+        kwargs = {"disks": self.b.disks,
+                  "fstype": 'ext4',
+                  "mountpoint": '/factorytest'}
+        device = self._factory_device(self.device_type, Size('400 MiB'), **kwargs)
+
+        devices = list(self.b.devices)
+        actions = list(self.b.devicetree.actions)
+        names = list(self.b.devicetree.names)
+        size = device.size
+        fmt = device.format
+        partitions = [(p, p.parted_partition.geometry.length) for p in self.b.partitions]
+        vg_free_space = [(vg, vg.free_space) for vg in self.b.vgs]
+
+        # fail after the factory has modified the tree
+        kwargs.update(fstype="xfs", device=device)
+        factory = devicefactory.get_device_factory(self.b, self.device_type,
+                                                   Size('650 MiB'), **kwargs)
+        reconfigure = factory._reconfigure_device
+
+        def fail():
+            reconfigure()
+            raise StorageError("reconfigure failed")
+
+        with patch.object(factory, "_reconfigure_device", side_effect=fail):
+            self.assertRaises(StorageError, factory.configure)
+
+        self.assertEqual(list(self.b.devices), devices)
+        self.assertEqual(list(self.b.devicetree.actions), actions)
+        self.assertEqual(self.b.devicetree.names, names)
+        self.assertIs(device.format, fmt)
+        self.assertEqual(device.size, size)
+        self.assertEqual([(p, p.parted_partition.geometry.length) for p in self.b.partitions],
+                         partitions)
+        self.assertEqual([(vg, vg.free_space) for vg in self.b.vgs], vg_free_space)
+
     def _get_test_factory_args(self):
         """ Return kwarg dict of type-specific factory ctor args. """
         return dict()
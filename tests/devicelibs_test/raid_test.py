@@ -1,4 +1,6 @@
 import unittest
+from functools import partial
+from unittest.mock import Mock
 
 import blivet.devicelibs.raid as raid
 import blivet.errors as errors
@@ -159,3 +161,80 @@ class RaidTestCase(unittest.TestCase):
 
         with self.assertRaisesRegex(errors.RaidError, "invalid standard RAID level descriptor"):
             raid.RAIDLevels(["raid3.1415"])
+
+    def test_size_cache(self):
+        raid.size_cache.drop_cache()
+        self.addCleanup(raid.size_cache.drop_cache)
+
+        superblock = Mock(return_value=Size("1 MiB"))
+        sizes = [Size("32MiB"), Size("64MiB")]
+        self.assertEqual(raid.RAID1.get_size(sizes, 2, Size("1MiB"), superblock), Size("31MiB"))
+        self.assertEqual(raid.RAID1.get_size(sizes[::-1], 2, Size("1MiB"), superblock), Size("31MiB"))
+        self.assertEqual(raid.RAID0.get_size(sizes, 2, Size("1MiB"), superblock), Size("62MiB"))
+        self.assertEqual(superblock.call_count, 2)
+
+        self.assertEqual(raid.RAID5.get_space(Size("64MiB"), 3, None, superblock), Size("99MiB"))
+        self.assertEqual(raid.RAID5.get_space(Size("64MiB"), 3, None, superblock), Size("99MiB"))
+        self.assertEqual(superblock.call_count, 3)
+        self.assertEqual(raid.size_cache.info(), raid.SizeCacheInfo(2, 3, 0, 1024, 3))
+
+        # errors are not cached
+        with self.assertRaises(errors.RaidError):
+            raid.RAID5.get_space(Size("64MiB"), 2, None, superblock)
+        self.assertEqual(raid.size_cache.info().currsize, 3)
+
+        # lambdas without a closure get the same key each time they are created
+        for _i in range(2):
+            raid.RAID1.get_space(Size("64MiB"), 2, None, lambda x: Size(0))
+        self.assertEqual(raid.size_cache.info().hits, 3)
+
+        # functions with a closure bypass the cache
+        superblock_size = Size(0)
+        for _i in range(2):
+            raid.RAID1.get_space(Size("64MiB"), 2, None, lambda x: superblock_size)
+        self.assertEqual(raid.size_cache.info().bypassed, 2)
+
+        self.assertEqual(raid.superblock_key(partial(superblock, version="1.2")),
+                         raid.superblock_key(partial(superblock, version="1.2")))
+        self.assertNotEqual(raid.superblock_key(partial(superblock, version="1.2")),
+                            raid.superblock_key(partial(superblock, version="1.0")))
+
+        # least recently used estimates are dropped first
+        cache = raid.SizeCache(maxsize=2)
+        for key in ("a", "b", "a", "c"):
+            cache.get(key, lambda: Size(1))
+        self.assertEqual(list(cache._entries.keys()), ["a", "c"])
+        self.assertEqual(cache.info(), raid.SizeCacheInfo(1, 3, 0, 2, 2))
+
+    def test_batch(self):
+        raid.size_cache.drop_cache()
+        self.addCleanup(raid.size_cache.drop_cache)
+
+        superblock = Mock(return_value=Size("1 MiB"))
+        counts = [1, 3, 4, 6]
+        for r in (raid.RAID0, raid.RAID1, raid.RAID5, raid.RAID6, raid.RAID10):
+            spaces = r.get_spaces(Size("96MiB"), counts, Size("512KiB"), superblock)
+            self.assertEqual(spaces, [r.get_space(Size("96MiB"), n, Size("512KiB"), lambda x: Size("1 MiB"))
+                                      if n >= r.min_members else None for n in counts])
+
+            sets = [[], [Size("32MiB")], [Size("32MiB"), Size("64MiB"), Size("48MiB")],
+                    [Size("64MiB")] * 4]
+            sizes = r.get_sizes(sets, chunk_size=Size("512KiB"), superblock_size_func=superblock)
+            self.assertEqual(sizes, [r.get_size(s, None, Size("512KiB"), lambda x: Size("1 MiB"))
+                                     if len(s) >= r.min_members or not s else None for s in sets])
+
+        # one superblock estimate per get_spaces call and per distinct smallest member
+        self.assertEqual(superblock.call_count, 5 * (1 + 2))
+
+        # the estimates are kept in the size cache, only the set with too
+        # few members is estimated again
+        superblock.reset_mock()
+        raid.RAID5.get_spaces(Size("96MiB"), counts, Size("512KiB"), superblock)
+        raid.RAID5.get_sizes(sets, chunk_size=Size("512KiB"), superblock_size_func=superblock)
+        self.assertEqual(superblock.call_count, 1)
+        raid.RAID5.get_space(Size("96MiB"), 4, Size("512KiB"), superblock)
+        raid.RAID5.get_size(sets[3], None, Size("512KiB"), superblock)
+        self.assertEqual(superblock.call_count, 1)
+
+        with self.assertRaises(errors.RaidError):
+            raid.RAID5.get_sizes(sets, chunk_size=None, superblock_size_func=superblock)
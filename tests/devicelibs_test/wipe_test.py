@@ -0,0 +1,95 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+from unittest.mock import patch
+
+from blivet.devicelibs import wipe
+
+SIZE = 1024 * 1024
+
+
+class WipeTestCase(unittest.TestCase):
+
+    def setUp(self):
+        (fd, self.path) = tempfile.mkstemp(prefix="wipe")
+        self.addCleanup(os.unlink, self.path)
+        os.ftruncate(fd, SIZE)
+        os.close(fd)
+
+        patcher = patch("blivet.devicelibs.wipe.udev")
+        self.udev = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _write(self, offset, data):
+        with open(self.path, "r+b") as f:
+            f.seek(offset)
+            f.write(data)
+
+    def _read(self, offset, length):
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            return f.read(length)
+
+    def test_wipe_signatures(self):
+        # gpt disklabel with a stale md 1.0 superblock at the end
+        self._write(510, b"\x55\xaa")
+        self._write(512, b"EFI PART")
+        self._write(SIZE - 512, b"EFI PART")
+        self._write((SIZE - 8192) & ~4095, b"\xfc\x4e\x2b\xa9")
+        self._write(1024, b"not a signature")
+
+        with patch("blivet.devicelibs.wipe._udev_types", return_value={"gpt"}):
+            self.assertTrue(wipe.wipe_signatures(self.path))
+
+        fd = os.open(self.path, os.O_RDONLY)
+        self.addCleanup(os.close, fd)
+        self.assertEqual(wipe.find_signatures(fd, SIZE), {})
+        self.assertEqual(self._read(1024, 15), b"not a signature")
+        self.assertEqual(self._read(510, 10), bytes(10))
+
+    def test_wipefs_fallback(self):
+        with patch("blivet.devicelibs.wipe.util") as util:
+            util.run_program.return_value = 0
+            with patch("blivet.devicelibs.wipe._udev_types", return_value={"zfs_member"}):
+                self.assertFalse(wipe.wipe_signatures(self.path))
+            util.run_program.assert_called_with(["wipefs", "-f", "-a", self.path])
+
+            # no signatures known to udev does not mean there are none
+            util.run_program.reset_mock()
+            with patch("blivet.devicelibs.wipe._udev_types", return_value=set()):
+                self.assertFalse(wipe.wipe_signatures(self.path))
+            util.run_program.assert_called_with(["wipefs", "-f", "-a", self.path])
+
+            util.run_program.return_value = 1
+            with patch("blivet.devicelibs.wipe._udev_types", return_value=None):
+                self.assertRaises(wipe.WipeError, wipe.wipe_signatures, self.path)
+
+    def test_reread_partitions(self):
+        self._write(510, b"\x55\xaa")
+        with patch("blivet.devicelibs.wipe.fcntl") as fcntl:
+            with patch("blivet.devicelibs.wipe._is_whole_disk", return_value=True):
+                with patch("blivet.devicelibs.wipe._udev_types", return_value={"ext4"}):
+                    wipe.wipe_signatures(self.path)
+                self.assertFalse(fcntl.ioctl.called)
+
+                with patch("blivet.devicelibs.wipe._udev_types", return_value={"dos"}):
+                    wipe.wipe_signatures(self.path)
+                self.assertFalse(fcntl.ioctl.called)
+
+                self._write(510, b"\x55\xaa")
+                with patch("blivet.devicelibs.wipe._udev_types", return_value={"dos"}):
+                    wipe.wipe_signatures(self.path)
+                fcntl.ioctl.assert_called_once_with(mock.ANY, wipe._BLKRRPART)
+
+    def test_zero_range(self):
+        self._write(0, b"\xff" * 8192)
+        with wipe.batch():
+            wipe.zero_range(self.path, 512, 4096)
+            wipe.zero_range(self.path, 4608, 512)
+            self.assertFalse(self.udev.settle.called)
+
+        self.assertEqual(self.udev.settle.call_count, 1)
+        self.assertEqual(self._read(0, 512), b"\xff" * 512)
+        self.assertEqual(self._read(512, 4608), bytes(4608))
+        self.assertEqual(self._read(5120, 3072), b"\xff" * 3072)
@@ -1,6 +1,7 @@
 # vim:set fileencoding=utf-8
 
 import unittest
+from unittest.mock import patch
 
 import blivet
 
@@ -9,8 +10,11 @@ from blivet.devices import LVMLogicalVolumeDevice
 from blivet.devices import LVMVolumeGroupDevice
 from blivet.devices.lvm import LVMCacheRequest
 from blivet.devices.lvm import LVPVSpec
+from blivet.devices.lvm import LVMInternalLVtype
+from blivet.errors import DeviceError
 from blivet.size import Size
 from blivet.devicelibs import raid
+from blivet.flags import flags
 
 DEVICE_CLASSES = [
     LVMLogicalVolumeDevice,
@@ -345,6 +349,55 @@ class LVMDeviceTest(unittest.TestCase):
         self.assertEqual(lv.target_size, orig_size)
         self.assertEqual(lv.size, orig_size)
 
+    @patch.object(flags, "debug_lvm_space", True)
+    def test_vg_space_ledger(self):
+        pv = StorageDevice("pv1", fmt=blivet.formats.get_format("lvmpv"),
+                           size=Size("1025 MiB"))
+        pv2 = StorageDevice("pv2", fmt=blivet.formats.get_format("lvmpv"),
+                            size=Size("513 MiB"))
+        vg = LVMVolumeGroupDevice("testvg", parents=[pv])
+        self.assertEqual(vg.size, Size("1024 MiB"))
+
+        lv = LVMLogicalVolumeDevice("testlv", parents=[vg], size=Size("512 MiB"))
+        LVMLogicalVolumeDevice("testlv2", parents=[vg], size=Size("256 MiB"))
+        self.assertEqual(vg.free_space, Size("256 MiB"))
+
+        # only the LV that changed is recomputed
+        with patch.object(flags, "debug_lvm_space", False):
+            with patch.object(LVMLogicalVolumeDevice, "vg_space_used", Size("512 MiB")):
+                lv.size = Size("400 MiB")
+                self.assertEqual(vg.free_space, Size("256 MiB"))
+
+        lv.size = Size("400 MiB")
+        self.assertEqual(vg.free_space, Size("368 MiB"))
+
+        vg.parents.append(pv2)
+        self.assertEqual(vg.size, Size("1536 MiB"))
+        self.assertEqual(vg.free_extents, 220)
+        self.assertEqual([info.size for info in vg.pv_free_info], [Size("1024 MiB"), Size("512 MiB")])
+
+        pv2.size = Size("1025 MiB")
+        self.assertEqual(vg.size, Size("2048 MiB"))
+
+        vg._remove_log_vol(vg.lvs[1])
+        self.assertEqual(vg.free_space, Size("1648 MiB"))
+
+        # internal LVs are accounted to their parent LV
+        lv.exists = True
+        lv.update_size(Size("400 MiB"))
+        meta = LVMLogicalVolumeDevice("testlv_rmeta_0", parents=[vg], size=Size("4 MiB"),
+                                      exists=True, parent_lv=lv, int_type=LVMInternalLVtype.meta)
+        meta.update_size(Size("4 MiB"))
+        self.assertEqual(vg.free_space, Size("1640 MiB"))
+        meta.update_size(Size("8 MiB"))
+        self.assertEqual(vg.free_space, Size("1632 MiB"))
+
+        # changes the ledger missed are reported in debug mode
+        lv._space_ledger = None
+        lv.update_size(Size("256 MiB"))
+        with self.assertRaisesRegex(DeviceError, "space accounting out of date"):
+            vg.free_space  # pylint: disable=pointless-statement
+
 
 class TypeSpecificCallsTest(unittest.TestCase):
     def test_type_specific_calls(self):
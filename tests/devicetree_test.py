@@ -1,3 +1,4 @@
+import copy
 import unittest
 from unittest.mock import Mock, patch, sentinel
 
@@ -6,8 +7,10 @@ from tests.imagebackedtestcase import ImageBackedTestCase
 from blivet.size import Size
 from blivet import devicelibs
 from blivet import devicefactory
+from blivet import threads
 from blivet import util
 from blivet.actionlist import ActionList
+from blivet.deviceaction import ActionCreateDevice, ActionCreateFormat
 from blivet.errors import DeviceTreeError
 from blivet.udev import trigger
 from blivet.devicelibs import lvm
@@ -15,6 +18,7 @@ from blivet.devices import DiskDevice
 from blivet.devices import StorageDevice
 from blivet.devices.lvm import LVMLogicalVolumeDevice
 from blivet.devices import MultipathDevice
+from blivet import devicetree
 from blivet.devicetree import DeviceTree
 from blivet.formats import get_format
 
@@ -197,6 +201,113 @@ class DeviceTreeTestCase(unittest.TestCase):
         self.assertIsNone(dt.get_device_by_name("dev3"))
         self.assertEqual(dt.get_device_by_name("dev3", hidden=True), dev3)
 
+    def test_lookup_index(self):
+        dt = DeviceTree()
+
+        dev1 = StorageDevice("dev1", exists=False, parents=[])
+        dev2 = StorageDevice("dev2", exists=False, parents=[dev1], sysfs_path="/devices/dev2")
+        dt._add_device(dev1)
+        dt._add_device(dev2)
+
+        # renaming a device updates the name and path indexes
+        dev1.name = "dev4"
+        self.assertIsNone(dt.get_device_by_name("dev1"))
+        self.assertIsNone(dt.get_device_by_path("/dev/dev1"))
+        self.assertEqual(dt.get_device_by_name("dev4"), dev1)
+        self.assertEqual(dt.get_device_by_path("/dev/dev4"), dev1)
+
+        # so do changes to the sysfs path, uuid and format
+        self.assertEqual(dt.get_device_by_sysfs_path("/devices/dev2"), dev2)
+        dev2.sysfs_path = "/devices/dev5"
+        self.assertIsNone(dt.get_device_by_sysfs_path("/devices/dev2"))
+        self.assertEqual(dt.get_device_by_sysfs_path("/devices/dev5"), dev2)
+
+        dev1.uuid = "1234-5678"
+        self.assertEqual(dt.get_device_by_uuid("1234-5678"), dev1)
+
+        dev2.format = get_format("ext4", label="dev2_label", uuid="abcd-efgh")
+        self.assertEqual(dt.get_device_by_uuid("abcd-efgh"), dev2)
+        self.assertEqual(dt.get_device_by_label("dev2_label"), dev2)
+
+        dev2.format.label = "new_label"
+        self.assertIsNone(dt.get_device_by_label("dev2_label"))
+        self.assertEqual(dt.get_device_by_label("new_label"), dev2)
+
+        dev2.format.uuid = "ijkl-mnop"
+        self.assertIsNone(dt.get_device_by_uuid("abcd-efgh"))
+        self.assertEqual(dt.get_device_by_uuid("ijkl-mnop"), dev2)
+
+        self.assertEqual(dt.get_device_by_id(dev2.id), dev2)
+        dt._remove_device(dev2)
+        self.assertIsNone(dt.get_device_by_id(dev2.id))
+        self.assertIsNone(dt.get_device_by_name("dev2"))
+        self.assertIsNone(dt.get_device_by_uuid("ijkl-mnop"))
+
+        # devices added directly to the device list are still found
+        dev3 = StorageDevice("dev3", exists=False, parents=[])
+        dt._devices.append(dev3)
+        self.assertEqual(dt.get_device_by_name("dev3"), dev3)
+
+        # lookups in a copy of the tree return the copied devices
+        dt_copy = copy.deepcopy(dt)
+        self.assertIsNot(dt_copy.get_device_by_name("dev4"), dev1)
+        self.assertEqual(dt_copy.get_device_by_name("dev4").id, dev1.id)
+
+    def test_device_views(self):
+        dt = DeviceTree()
+
+        disk1 = DiskDevice("sdb", exists=False, size=Size("1 GiB"))
+        disk2 = DiskDevice("sda", exists=False, size=Size("1 GiB"))
+        dev1 = StorageDevice("dev1", exists=False, parents=[disk1])
+        for device in (disk1, disk2, dev1):
+            dt._add_device(device)
+
+        self.assertEqual(dt.devices, [disk1, disk2, dev1])
+        self.assertEqual(dt.disks, [disk1, disk2])
+        self.assertEqual(dt.get_devices("disks", sort=True), [disk2, disk1])
+        self.assertEqual(dt.get_devices(sort=True), [dev1, disk2, disk1])
+        self.assertEqual(dt.partitions, [])
+
+        # the returned lists are copies of the cached views
+        dt.devices.remove(disk1)
+        self.assertEqual(dt.devices, [disk1, disk2, dev1])
+
+        # views are updated when the tree changes
+        dt._remove_device(dev1)
+        self.assertEqual(dt.devices, [disk1, disk2])
+        disk1.name = "sdc"
+        self.assertEqual(dt.get_devices("disks", sort=True), [disk2, disk1])
+
+        # incomplete devices are never included
+        disk2.complete = False
+        self.assertEqual(dt.disks, [disk1])
+        del disk2.complete
+
+        # devices sharing a uuid are detected
+        disk1.uuid = "1234-5678"
+        self.assertEqual(dt.devices, [disk1, disk2])
+        disk2.uuid = "1234-5678"
+        self.assertRaisesRegex(DeviceTreeError, "duplicate uuids", getattr, dt, "devices")
+        disk2.uuid = None
+        self.assertEqual(dt.devices, [disk1, disk2])
+
+    def test_device_views_locking(self):
+        threads.enable_shared_locking()
+        self.addCleanup(threads.enable_shared_locking, False)
+
+        dt = DeviceTree()
+        dt._add_device(DiskDevice("sda", exists=False, size=Size("1 GiB")))
+
+        # get_devices only holds the global lock in shared mode, the cached
+        # views are built and stored holding the lock that protects them
+        held = []
+        view = lambda d: held.append((threads.blivet_lock._is_owned(), devicetree._views_lock.locked()))
+        with patch.dict("blivet.devicetree._DEVICE_VIEWS", {"test": view}):
+            dt.get_devices("test")
+            dt.get_devices("test", sort=True)
+
+        self.assertEqual(held, [(False, True)])
+
     def test_recursive_remove(self):
         dt = DeviceTree()
         dev1 = StorageDevice("dev1", exists=False, parents=[])
@@ -349,6 +460,44 @@ class DeviceTreeTestCase(unittest.TestCase):
         self.assertFalse(sdc in tree.devices)
         self.assertFalse(mpatha in tree.devices)
 
+    def test_rescan(self):
+        tree = DeviceTree()
+
+        disks = [DiskDevice(name, size=Size("10 GiB"), exists=True) for name in ("sda", "sdb", "sdc", "sdd")]
+        (sda, sdb, sdc, sdd) = disks
+        for disk in disks:
+            tree._add_device(disk)
+
+        sda1 = StorageDevice("sda1", size=Size("1 GiB"), exists=True, parents=[sda])
+        md0 = StorageDevice("md0", size=Size("1 GiB"), exists=True, parents=[sdb, sdc])
+        sdd1 = StorageDevice("sdd1", size=Size("1 GiB"), exists=True, parents=[sdd])
+        for device in (sda1, md0, sdd1):
+            tree._add_device(device)
+
+        new = StorageDevice("new", size=Size("1 GiB"), parents=[sda])
+        tree.actions.add(ActionCreateDevice(new))
+        tree.actions.add(ActionCreateFormat(md0, get_format("ext4")))
+        tree.hide(sdd)
+
+        # sdc shares md0 with sdb and sde is not in the tree yet
+        with patch.object(tree, "_scan_new_devices") as scan:
+            tree.rescan([sdb, "sde"])
+            scan.assert_called_once_with({"sdb", "sdc", "sde"})
+
+        self.assertEqual(tree.devices, [sda, sda1, new])
+        self.assertEqual([a.device for a in tree.actions], [new])
+        self.assertNotIn("md0", tree.names)
+        self.assertIsNone(tree.get_device_by_name("sdb", hidden=True))
+
+        # hidden disks are dropped along with the devices on them
+        with patch.object(tree, "_scan_new_devices") as scan:
+            tree.rescan(["sdd"])
+            scan.assert_called_once_with({"sdd"})
+
+        self.assertIsNone(tree.get_device_by_name("sdd1", hidden=True))
+        self.assertIsNone(tree.get_device_by_name("sdd", hidden=True))
+        self.assertEqual(tree.devices, [sda, sda1, new])
+
 
 def recursive_getattr(x, attr, default=None):
     """ Resolve a possibly-dot-containing attribute name. """
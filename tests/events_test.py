@@ -1,4 +1,6 @@
 
+import threading
+import time
 from unittest import TestCase
 from unittest.mock import Mock, patch
 
@@ -28,6 +30,7 @@ class EventManagerTest(TestCase):
         device = "sdc"
         action = "add"
         mgr.handle_event(action, device)
+        mgr.wait_for_events()
         self.assertEqual(handler_cb.call_count, 1)
         event = handler_cb.call_args[1]["event"]  # pylint: disable=unsubscriptable-object
         self.assertEqual(event.device, device)
@@ -37,6 +40,7 @@ class EventManagerTest(TestCase):
         handler_cb.reset_mock()
         mask = mgr.add_mask(device=device, action=action + 'x')
         mgr.handle_event(action, device)
+        mgr.wait_for_events()
         self.assertEqual(handler_cb.call_count, 1)
         event = handler_cb.call_args[1]["event"]  # pylint: disable=unsubscriptable-object
         self.assertEqual(event.device, device)
@@ -46,6 +50,7 @@ class EventManagerTest(TestCase):
         handler_cb.reset_mock()
         mask = mgr.add_mask(device=device + 'x', action=action)
         mgr.handle_event(action, device)
+        mgr.wait_for_events()
         self.assertEqual(handler_cb.call_count, 1)
         event = handler_cb.call_args[1]["event"]  # pylint: disable=unsubscriptable-object
         self.assertEqual(event.device, device)
@@ -56,6 +61,7 @@ class EventManagerTest(TestCase):
         mgr.remove_mask(mask)
         mask = mgr.add_mask(device=device, action=action)
         mgr.handle_event(action, device)
+        mgr.wait_for_events()
         self.assertEqual(handler_cb.call_count, 0)
 
         # device-only mask matches -> event is ignored
@@ -63,6 +69,7 @@ class EventManagerTest(TestCase):
         mgr.remove_mask(mask)
         mask = mgr.add_mask(device=device)
         mgr.handle_event(action, device)
+        mgr.wait_for_events()
         self.assertEqual(handler_cb.call_count, 0)
 
         # action-only mask matches -> event is ignored
@@ -70,5 +77,94 @@ class EventManagerTest(TestCase):
         mgr.remove_mask(mask)
         mask = mgr.add_mask(action=action)
         mgr.handle_event(action, device)
+        mgr.wait_for_events()
         self.assertEqual(handler_cb.call_count, 0)
         mgr.remove_mask(mask)
+
+
+# uevents recorded during 'udevadm trigger' on a host with two multipath
+# devices, followed by a path flap on sdc and a short-lived device
+RECORDED_BURST = [
+    ("change", "sda"), ("change", "sda1"), ("change", "sda2"),
+    ("change", "sdb"), ("change", "sdc"), ("change", "sdd"),
+    ("change", "dm-0"), ("change", "dm-1"), ("change", "dm-2"),
+    ("change", "sdb"), ("change", "dm-1"),
+    ("remove", "sdc"), ("add", "sdc"), ("change", "sdc"), ("change", "sdc"),
+    ("change", "dm-2"), ("remove", "sdc"), ("add", "sdc"), ("change", "sdc"),
+    ("add", "sde"), ("change", "sde"), ("remove", "sde"),
+    ("change", "dm-0"), ("change", "sda2"), ("change", "sda2"),
+]
+
+# what the handler should see for each device once the burst is coalesced
+EXPECTED_HANDLED = {
+    "sda": ["change"], "sda1": ["change"], "sda2": ["change"],
+    "sdb": ["change"], "sdd": ["change"],
+    "dm-0": ["change"], "dm-1": ["change"], "dm-2": ["change"],
+    "sdc": ["change", "remove", "add", "change"],
+}
+
+
+class EventQueueTest(TestCase):
+    def setUp(self):
+        self.handled = []
+        self.overlap = False
+        self.running = set()
+        self.max_running = 0
+        self.lock = threading.Lock()
+
+        with patch("blivet.events.manager.validate_cb", return_value=True):
+            self.mgr = FakeEventManager(handler_cb=self._handler, max_workers=2)
+
+    def _handler(self, event, notify_cb):  # pylint: disable=unused-argument
+        with self.lock:
+            self.overlap = self.overlap or event.device in self.running
+            self.running.add(event.device)
+            self.max_running = max(self.max_running, len(self.running))
+
+        time.sleep(0.01)
+        with self.lock:
+            self.running.remove(event.device)
+            self.handled.append((event.action, event.device, event.id))
+
+    def _replay(self, events):
+        # queue the whole burst before any worker gets going
+        with patch.object(self.mgr, "_start_worker"):
+            for (action, device) in events:
+                self.mgr.handle_event(action, device)
+
+        with self.mgr._queue_cond:
+            for _i in range(self.mgr.max_workers):
+                self.mgr._start_worker()
+
+        self.assertTrue(self.mgr.wait_for_events(timeout=10))
+
+    def test_replay_burst(self):
+        self._replay(RECORDED_BURST)
+
+        handled = {}
+        for (action, device, _id) in self.handled:
+            handled.setdefault(device, []).append(action)
+        self.assertEqual(handled, EXPECTED_HANDLED)
+
+        # events on each device are handled in order
+        for device in handled:
+            ids = [i for (_a, d, i) in self.handled if d == device]
+            self.assertEqual(ids, sorted(ids))
+
+        self.assertFalse(self.overlap)
+        self.assertLessEqual(self.max_running, 2)
+        self.assertEqual(self.mgr.queue_depth, 0)
+
+        stats = self.mgr.stats
+        self.assertEqual(stats.queued, len(RECORDED_BURST))
+        self.assertEqual(stats.handled, len(self.handled))
+        self.assertEqual(stats.coalesced, 7)
+        self.assertEqual(stats.cancelled, 6)
+        self.assertEqual(stats.handled + stats.coalesced + stats.cancelled, stats.queued)
+        self.assertGreater(stats.max_latency, 0)
+
+    def test_worker_limit(self):
+        events = [("change", "sd%d" % i) for i in range(50)]
+        self._replay(events)
+        self.assertEqual(len(self.handled), 50)
+        self.assertEqual(self.max_running, 2)
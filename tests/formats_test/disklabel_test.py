@@ -4,6 +4,7 @@ import unittest
 
 import blivet
 from blivet.size import Size
+from blivet.static_data import probe_data
 
 if six.PY2:
     import mock
@@ -15,6 +16,25 @@ patch = mock.patch
 
 class DiskLabelTestCase(unittest.TestCase):
 
+    @patch("blivet.formats.disklabel.udev")
+    @patch("blivet.formats.disklabel.DiskLabel.parted_device", mock.Mock())
+    def test_prefetched_parted_disk(self, *args):
+        # the populator reads disklabels ahead from its worker threads
+        parted_disk = mock.Mock(type="gpt")
+        parted_disk.isFlagAvailable.return_value = False
+        probe_data.put("parted_disk", "/dev/sdx", parted_disk)
+        self.addCleanup(probe_data.drop_cache)
+
+        with patch("blivet.formats.disklabel.parted.Disk") as disk_class:
+            dl = blivet.formats.disklabel.DiskLabel(device="/dev/sdx", exists=True)
+            self.assertFalse(disk_class.called)
+            self.assertIs(dl.parted_disk, parted_disk)
+            self.assertEqual(dl.label_type, "gpt")
+
+            # the disklabel is read again from then on
+            dl._parted_disk = None
+            self.assertIs(dl.parted_disk, disk_class.return_value)
+
     @patch("blivet.formats.disklabel.DiskLabel.fresh_parted_disk", None)
     def test_get_alignment(self):
         dl = blivet.formats.disklabel.DiskLabel()
@@ -62,12 +62,11 @@ class FormatMethodsTestCase(unittest.TestCase):
         pass
 
     def _test_destroy_backend(self):
-        with patch("blivet.formats.run_program") as run_program:
-            run_program.return_value = 0
+        with patch("blivet.formats.wipe.wipe_signatures") as wipe_signatures:
             self.format.exists = True
             self.format.destroy()
             self.assertFalse(self.format.exists)
-            run_program.assert_called_with(["wipefs", "-f", "-a", self.format.device])
+            wipe_signatures.assert_called_with(self.format.device)
 
     def _test_setup_backend(self):
         pass
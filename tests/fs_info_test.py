@@ -0,0 +1,79 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import Mock, patch
+
+from blivet.static_data.fs_info import FSInfo, superblock_fingerprint
+
+
+class FSInfoTestCase(unittest.TestCase):
+    def setUp(self):
+        (fd, self.path) = tempfile.mkstemp(prefix="fs_info")
+        self.addCleanup(os.unlink, self.path)
+        os.ftruncate(fd, 64 * 1024)
+        os.close(fd)
+
+        mounts_cache = patch("blivet.static_data.fs_info.mounts_cache")
+        self.mounts_cache = mounts_cache.start()
+        self.addCleanup(mounts_cache.stop)
+        self.mounts_cache.is_mounted.return_value = False
+
+        self.probe = Mock(return_value=(True, 65536, 32768, "info", None))
+        self.info = FSInfo()
+
+    def _write_superblock(self, data):
+        with open(self.path, "r+b") as f:
+            f.seek(1024)
+            f.write(data)
+
+    def test_fingerprint(self):
+        fingerprint = superblock_fingerprint(self.path, "ext4")
+        self.assertIsNotNone(fingerprint)
+        self.assertEqual(superblock_fingerprint(self.path, "ext4"), fingerprint)
+
+        # only the superblock counts
+        with open(self.path, "r+b") as f:
+            f.write(b"data")
+        self.assertEqual(superblock_fingerprint(self.path, "ext4"), fingerprint)
+
+        self._write_superblock(b"wtime")
+        self.assertNotEqual(superblock_fingerprint(self.path, "ext4"), fingerprint)
+
+        self.assertIsNone(superblock_fingerprint(self.path, "vfat"))
+        self.mounts_cache.is_mounted.return_value = True
+        self.assertIsNone(superblock_fingerprint(self.path, "ext4"))
+
+    def test_get(self):
+        self.assertEqual(self.info.get(self.path, "ext4", self.probe), (True, 65536, 32768, "info", None))
+        self.assertEqual(self.info.get(self.path, "ext4", self.probe), (True, 65536, 32768, "info", None))
+        self.assertEqual(self.probe.call_count, 1)
+        self.assertEqual((self.info.hits, self.info.misses), (1, 1))
+
+        # the filesystem changed
+        self._write_superblock(b"wtime")
+        self.info.get(self.path, "ext4", self.probe)
+        self.assertEqual(self.probe.call_count, 2)
+
+        self.info.drop(self.path)
+        self.info.get(self.path, "ext4", self.probe)
+        self.assertEqual(self.probe.call_count, 3)
+
+        # mounted filesystems are not cached
+        self.mounts_cache.is_mounted.return_value = True
+        self.info.get(self.path, "ext4", self.probe)
+        self.info.get(self.path, "ext4", self.probe)
+        self.assertEqual(self.probe.call_count, 5)
+
+    def test_symlink(self):
+        # the populator and the formats may name a device differently
+        link = self.path + ".link"
+        os.symlink(self.path, link)
+        self.addCleanup(os.unlink, link)
+
+        self.info.get(self.path, "ext4", self.probe)
+        self.info.get(link, "ext4", self.probe)
+        self.assertEqual(self.probe.call_count, 1)
+
+        self.info.drop(link)
+        self.info.get(self.path, "ext4", self.probe)
+        self.assertEqual(self.probe.call_count, 2)
@@ -0,0 +1,105 @@
+import unittest
+from unittest.mock import Mock, patch
+
+from blivet.static_data.lvm_info import LVMInfo, blockdev
+
+
+def lv_data(vg_name, lv_name):
+    return Mock(vg_name=vg_name, lv_name=lv_name)
+
+
+class LVMInfoTestCase(unittest.TestCase):
+    def setUp(self):
+        self.lvs = {"vg1": [lv_data("vg1", "lv%d" % i) for i in range(3)],
+                    "vg2": [lv_data("vg2", "root")]}
+        self.pvs = [Mock(pv_name="/dev/sda1", vg_name="vg1"), Mock(pv_name="/dev/sdb1", vg_name="vg1"),
+                    Mock(pv_name="/dev/sdc1", vg_name="vg2"), Mock(pv_name="/dev/sdd1", vg_name="")]
+
+        def lvs(vg_name=None):
+            if vg_name is None:
+                return [lv for vg_lvs in self.lvs.values() for lv in vg_lvs]
+            return list(self.lvs.get(vg_name, []))
+
+        lvm = patch("blivet.static_data.lvm_info.blockdev.lvm")
+        self.lvm = lvm.start()
+        self.addCleanup(lvm.stop)
+        self.lvm.lvs.side_effect = lvs
+        self.lvm.pvs.side_effect = lambda: list(self.pvs)
+
+        self.info = LVMInfo()
+
+    def test_pvs(self):
+        self.assertEqual(self.info.pvs["/dev/sdc1"].vg_name, "vg2")
+        self.assertEqual([pv.pv_name for pv in self.info.vg_pvs("vg1")], ["/dev/sda1", "/dev/sdb1"])
+        self.assertEqual(self.info.vg_pvs("vg3"), [])
+        self.assertEqual(self.lvm.pvs.call_count, 1)
+
+        self.info.drop_pvs()
+        self.pvs.pop()
+        self.assertNotIn("/dev/sdd1", self.info.pvs)
+        self.assertEqual(self.lvm.pvs.call_count, 2)
+
+    def test_lvs(self):
+        # all the LVs are listed once
+        self.assertEqual(sorted(self.info.lvs), ["vg1-lv0", "vg1-lv1", "vg1-lv2", "vg2-root"])
+        self.assertEqual(sorted(self.info.vg_lvs("vg1")), ["vg1-lv0", "vg1-lv1", "vg1-lv2"])
+        self.assertEqual(self.info.vg_lvs("vg3"), {})
+        self.lvm.lvs.assert_called_once_with()
+
+        # a dropped VG is listed again on its own
+        self.lvs["vg1"].append(lv_data("vg1", "new"))
+        del self.lvs["vg1"][0]
+        self.info.drop_vg("vg1")
+        self.assertEqual(sorted(self.info.vg_lvs("vg1")), ["vg1-lv1", "vg1-lv2", "vg1-new"])
+        self.assertEqual(sorted(self.info.lvs), ["vg1-lv1", "vg1-lv2", "vg1-new", "vg2-root"])
+        self.lvm.lvs.assert_called_with("vg1")
+        self.assertEqual(self.lvm.lvs.call_count, 2)
+
+        self.info.drop_vg("vg2")
+        del self.lvs["vg2"]
+        self.assertEqual(sorted(self.info.lvs), ["vg1-lv1", "vg1-lv2", "vg1-new"])
+        self.lvm.lvs.assert_called_with("vg2")
+
+        self.info.drop_lvs()
+        self.assertEqual(sorted(self.info.lvs), ["vg1-lv1", "vg1-lv2", "vg1-new"])
+        self.assertEqual(self.lvm.lvs.call_count, 4)
+
+    def test_single_vg(self):
+        # the first VG asked for loads the full listing
+        self.assertEqual(sorted(self.info.vg_lvs("vg2")), ["vg2-root"])
+        self.assertEqual(self.info.vg_lvs("vg2"), {"vg2-root": self.lvs["vg2"][0]})
+        self.assertEqual(sorted(self.info.vg_lvs("vg1")), ["vg1-lv0", "vg1-lv1", "vg1-lv2"])
+        self.lvm.lvs.assert_called_once_with()
+
+        # only VGs that were dropped are listed on their own
+        self.info.drop_vg("vg2")
+        self.assertEqual(sorted(self.info.vg_lvs("vg1")), ["vg1-lv0", "vg1-lv1", "vg1-lv2"])
+        self.assertEqual(self.lvm.lvs.call_count, 1)
+        self.assertEqual(sorted(self.info.vg_lvs("vg2")), ["vg2-root"])
+        self.lvm.lvs.assert_called_with("vg2")
+        self.assertEqual(self.lvm.lvs.call_count, 2)
+
+    def test_failed_report(self):
+        lvs = self.lvm.lvs.side_effect
+        self.assertEqual(sorted(self.info.vg_lvs("vg1")), ["vg1-lv0", "vg1-lv1", "vg1-lv2"])
+
+        def failing_lvs(vg_name=None):
+            if vg_name is not None or fail_full:
+                raise blockdev.LVMError("lvs failed")
+            return lvs()
+
+        # a failed report of a dropped VG falls back to the full report
+        self.lvm.lvs.side_effect = failing_lvs
+        fail_full = False
+        self.info.drop_vg("vg1")
+        self.assertEqual(sorted(self.info.vg_lvs("vg1")), ["vg1-lv0", "vg1-lv1", "vg1-lv2"])
+        self.lvm.lvs.assert_called_with()
+
+        # if that fails too the error propagates and the VG stays stale
+        fail_full = True
+        self.info.drop_vg("vg1")
+        self.assertRaises(blockdev.LVMError, self.info.vg_lvs, "vg1")
+        fail_full = False
+        self.lvm.lvs.reset_mock()
+        self.assertEqual(sorted(self.info.vg_lvs("vg1")), ["vg1-lv0", "vg1-lv1", "vg1-lv2"])
+        self.assertEqual(self.lvm.lvs.call_count, 2)
@@ -0,0 +1,61 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from blivet.mounts import MountsCache
+
+MOUNTINFO = """\
+20 1 0:20 / /proc rw,relatime - proc proc rw
+21 1 0:21 / /tmp rw shared:2 - tmpfs tmpfs rw
+22 1 0:22 / /mnt/data rw,relatime shared:3 master:1 - btrfs /dev/nonexistent rw
+23 1 0:22 /home /home rw,relatime - btrfs /dev/nonexistent rw
+24 21 0:23 / /tmp rw - tmpfs other rw
+bogus line
+"""
+
+
+class MountsCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(prefix="mountinfo")
+        with os.fdopen(fd, "w") as mountinfo:
+            mountinfo.write(MOUNTINFO)
+        self.addCleanup(os.unlink, self.path)
+
+        self.cache = MountsCache(mountinfo=self.path)
+
+    @patch("blivet.mounts.resolve_devspec", return_value="sdz1")
+    def test_lookups(self, resolve):
+        self.assertEqual(self.cache.get_mountpoints("/dev/nonexistent", subvolspec=5), ["/mnt/data"])
+        self.assertEqual(self.cache.get_mountpoints("/dev/nonexistent", subvolspec="home"), ["/home"])
+        self.assertEqual(self.cache.get_mountpoints("/dev/nonexistent"), [])
+        self.assertTrue(self.cache.is_mounted("/dev/nonexistent"))
+        self.assertTrue(self.cache.is_mountpoint("/tmp"))
+        self.assertFalse(self.cache.is_mountpoint("/mnt"))
+
+        # the first of the stacked mounts
+        self.assertEqual(self.cache.get_mount_device("/tmp"), "tmpfs")
+        self.assertIsNone(self.cache.get_mount_device("/mnt"))
+
+        # each device specification is resolved once
+        self.assertEqual(resolve.call_count, 1)
+
+    def test_change(self):
+        self.assertTrue(self.cache.is_mountpoint("/proc"))
+        with open(self.path, "w") as mountinfo:
+            mountinfo.write(MOUNTINFO.replace("/proc", "/newproc"))
+
+        # only the kernel's mount tables report changes
+        self.assertTrue(self.cache.is_mountpoint("/proc"))
+        with patch.object(self.cache._watcher, "changed", return_value=True):
+            self.assertFalse(self.cache.is_mountpoint("/proc"))
+            self.assertTrue(self.cache.is_mountpoint("/newproc"))
+
+    def test_proc(self):
+        cache = MountsCache()
+        self.assertTrue(cache.is_mountpoint("/proc"))
+
+        # nothing changes as long as nobody mounts anything
+        with patch.object(cache, "_get_active_mounts") as refresh:
+            cache.is_mountpoint("/proc")
+            self.assertFalse(refresh.called)
@@ -1,20 +1,26 @@
 
 import unittest
+from contextlib import ExitStack
 from mock import Mock, patch
 
 import parted
 
+from blivet import partitioning
 from blivet.partitioning import add_partition
 from blivet.partitioning import get_next_partition_type
 from blivet.partitioning import do_partitioning
 from blivet.partitioning import allocate_partitions
 from blivet.partitioning import get_free_regions
+from blivet.partitioning import grow_partitions
+from blivet.partitioning import remove_new_partitions
 from blivet.partitioning import Request
 from blivet.partitioning import Chunk
+from blivet.partitioning import grow_units
 from blivet.partitioning import LVRequest
 from blivet.partitioning import VGChunk
 from blivet.partitioning import DiskChunk
 from blivet.partitioning import PartitionRequest
+from blivet.partitioning import SectorAlignment
 
 from blivet.devices import StorageDevice
 from blivet.devices import LVMVolumeGroupDevice
@@ -316,6 +322,36 @@ class PartitioningTestCase(unittest.TestCase):
         self.assertEqual(req2.growth, 0)
         self.assertEqual(req3.growth, 35)
 
+    def test_grow_units(self):
+        # the requests from test_chunk
+        self.assertEqual(grow_units([10, 20, 20], [0, 0, 0], [0, 0, 35], [False, True, False], 60, 30),
+                         ([25, 0, 35], [False, True, True], 0, 10))
+
+        # the same growth as growing the requests one at a time, to the unit
+        for uniform in (False, True):
+            for (length, bases, max_growths) in ((1000, [3, 3, 3], [0, 0, 0]),
+                                                 (100003, [7, 1000, 13, 1000, 250], [0, 20000, 5, 0, 1]),
+                                                 (50, [10, 0, 10], [0, 0, 0])):
+                requests = []
+                for (i, (base, max_growth)) in enumerate(zip(bases, max_growths)):
+                    request = Request(Mock(req_grow=True, id=i))
+                    request.base = base
+                    request.max_growth = max_growth
+                    requests.append(request)
+
+                chunk = Chunk(length, requests=requests)
+                chunk._grow_requests_iteratively(uniform=uniform)
+                expected = ([r.growth for r in requests], [r.done for r in requests], chunk.pool, chunk.base)
+
+                for request in requests:
+                    (request.growth, request.done) = (0, False)
+                chunk = Chunk(length, requests=requests)
+                self.assertEqual(grow_units(bases, [0] * len(bases), max_growths, [False] * len(bases),
+                                            chunk.pool, chunk.base, uniform=uniform),
+                                 expected)
+
+        self.assertRaises(ValueError, grow_units, [10], [0], [0], [False], -1, 10)
+
     def test_disk_chunk1(self):
         disk_size = Size("100 MiB")
         with sparsetmpfile("chunktest", disk_size) as disk_file:
@@ -641,6 +677,115 @@ class PartitioningTestCase(unittest.TestCase):
         self.assertEqual(free[1].length, 2048)
 
 
+class AllocationPlanTestCase(unittest.TestCase):
+
+    def test_sector_alignment(self):
+        alignment = SectorAlignment(0, 2048)
+        self.assertTrue(alignment.is_aligned(0, 10000, 4096))
+        self.assertFalse(alignment.is_aligned(0, 10000, 4097))
+        self.assertFalse(alignment.is_aligned(5000, 10000, 4096))
+
+        self.assertEqual(alignment.align_up(34, 10000, 34), 2048)
+        self.assertEqual(alignment.align_down(34, 10000, 5000), 4096)
+        self.assertEqual(alignment.align_nearest(34, 10000, 3000), 2048)
+        self.assertEqual(alignment.align_nearest(34, 10000, 3100), 4096)
+
+        # like parted, align in the other direction if needed
+        self.assertEqual(alignment.align_up(34, 5000, 4100), 4096)
+        self.assertRaises(ArithmeticError, alignment.align_up, 34, 2047, 34)
+        self.assertRaises(ArithmeticError, alignment.align_nearest, 34, 2047, 34)
+
+        end_alignment = SectorAlignment(-1, 2048)
+        self.assertEqual(end_alignment.align_down(34, 10000, 10000), 8191)
+        self.assertEqual(end_alignment.align_up(34, 10000, 5000), 6143)
+
+    def _allocate(self, disks, partitions, plan):
+        storage = Mock(boot_disk=None, compare_disks_key=lambda d: d.name)
+        free = get_free_regions(disks)
+        with patch("blivet.partitioning._allocate_partitions",
+                   wraps=partitioning._allocate_partitions) as fallback:
+            allocate_partitions(storage, disks, partitions, free, plan=plan)
+
+        allocated = [(p.disk.path, p.parted_partition.geometry.start, p.parted_partition.geometry.end)
+                     for p in partitions]
+        grow_partitions(disks, partitions, free)
+        grown = [(p.disk.path, p.parted_partition.geometry.start, p.parted_partition.geometry.end)
+                 for p in partitions]
+
+        remove_new_partitions(disks, partitions, partitions)
+        return (allocated, grown, fallback.called)
+
+    def _check_parity(self, disk_specs, make_partitions, planned=True):
+        """ Allocate partitions with and without planning and compare the results.
+
+            :param disk_specs: size and disklabel type of each disk
+            :param make_partitions: function returning the partitions given the disks
+            :param bool planned: whether the allocation is expected to be planned
+        """
+        with ExitStack() as stack:
+            disks = []
+            for (size, label_type) in disk_specs:
+                path = stack.enter_context(sparsetmpfile("plantest", size))
+                disk = DiskFile(path)
+                disk.format = get_format("disklabel", device=disk.path, label_type=label_type,
+                                         exists=False)
+                disks.append(disk)
+
+            partitions = make_partitions(disks)
+            (allocated, grown, fallback) = self._allocate(disks, partitions, plan=False)
+            self.assertTrue(fallback)
+
+            (planned_allocated, planned_grown, fallback) = self._allocate(disks, partitions, plan=True)
+            self.assertEqual(fallback, not planned)
+            self.assertEqual(planned_allocated, allocated)
+            self.assertEqual(planned_grown, grown)
+
+    def test_disk_chunk_parity(self):
+        def make_partitions(disks):
+            fmt = get_format("dummy")
+            fmt._max_size = Size("12 MiB")
+            return [PartitionDevice("p1", size=Size("10 MiB"), grow=True),
+                    PartitionDevice("p2", size=Size("30 MiB"), grow=True),
+                    PartitionDevice("p3", size=Size("10 MiB"), grow=True, fmt=fmt),
+                    PartitionDevice("p4", size=Size("7 MiB")),
+                    PartitionDevice("p5", size=Size("5 MiB"), grow=True, maxsize=Size("6 MiB"))]
+
+        self._check_parity([(Size("100 MiB"), "gpt")], make_partitions)
+
+        # an extended partition is needed, which only parted can allocate
+        self._check_parity([(Size("100 MiB"), "msdos")], make_partitions, planned=False)
+
+    def test_multiple_disks_parity(self):
+        def make_partitions(disks):
+            return [PartitionDevice("boot", size=Size("10 MiB"), weight=2000),
+                    PartitionDevice("p1", size=Size("20 MiB"), grow=True),
+                    PartitionDevice("p2", size=Size("40 MiB"), grow=True, maxsize=Size("60 MiB")),
+                    PartitionDevice("p3", size=Size("50 MiB")),
+                    PartitionDevice("p4", size=Size("5 MiB"), grow=True, parents=[disks[2]]),
+                    PartitionDevice("p5", size=Size("15 MiB"), primary=True),
+                    PartitionDevice("p6", size=Size("30 MiB"), grow=True)]
+
+        self._check_parity([(Size("100 MiB"), "gpt"),
+                            (Size("200 MiB"), "gpt"),
+                            (Size("150 MiB"), "gpt")], make_partitions)
+
+    def test_msdos_parity(self):
+        def make_partitions(disks):
+            return [PartitionDevice("boot", size=Size("10 MiB"), weight=2000),
+                    PartitionDevice("p1", size=Size("20 MiB"), grow=True),
+                    PartitionDevice("p2", size=Size("10 MiB"), grow=True, maxsize=Size("30 MiB"))]
+
+        self._check_parity([(Size("100 MiB"), "msdos")], make_partitions)
+
+    def test_fixed_size_parity(self):
+        def make_partitions(disks):
+            return [PartitionDevice("p%d" % i, size=Size("%d MiB" % (i * 5 + 1)))
+                    for i in range(12)]
+
+        self._check_parity([(Size("200 MiB"), "gpt"),
+                            (Size("300 MiB"), "gpt")], make_partitions)
+
+
 class ExtendedPartitionTestCase(ImageBackedTestCase):
 
     disks = {"disk1": Size("2 GiB")}
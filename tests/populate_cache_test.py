@@ -0,0 +1,102 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import Mock, patch
+
+from blivet.populator import cache
+from blivet.populator.cache import PopulateCache
+from blivet.static_data import probe_data
+
+
+class FakeDevice(dict):
+    def __init__(self, sys_path, **properties):
+        super().__init__(**properties)
+        self.sys_path = sys_path
+        self.sys_name = os.path.basename(sys_path)
+
+
+@patch.object(cache, "mounts_cache", Mock(**{"is_mounted.return_value": False}))
+class PopulateCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.addCleanup(probe_data.drop_cache)
+
+        # a file standing in for the device node and its sysfs directory
+        self.devname = os.path.join(tmpdir.name, "sda")
+        with open(self.devname, "wb") as node:
+            node.write(b"\0" * 4096)
+
+        sys_path = os.path.join(tmpdir.name, "sys", "sda")
+        os.makedirs(sys_path)
+        with open(os.path.join(sys_path, "size"), "w") as size:
+            size.write("8\n")
+
+        self.device = FakeDevice(sys_path, DEVNAME=self.devname, MAJOR="8", MINOR="0",
+                                 USEC_INITIALIZED="1234", DEVLINKS="/dev/disk/by-id/disk")
+        self.path = os.path.join(tmpdir.name, "cache.json")
+
+    def populate(self, probes):
+        """ Run the queries for one populate pass, return the queries run. """
+        populate_cache = PopulateCache(self.path)
+        probe_data.record(cache.CACHED_PROBES)
+        restored = populate_cache.restore([self.device])
+
+        run = []
+        for (probe, key, value) in probes:
+            func = Mock(return_value=value)
+            self.assertEqual(probe_data.get(probe, key, func), value)
+            if func.called:
+                run.append(probe)
+
+        populate_cache.save()
+        probe_data.drop_cache()
+        return (restored, run)
+
+    def test_restore(self):
+        probes = [("fs_size_info", "/dev/disk/by-id/disk", [True, 4096, 1024, None, None]),
+                  ("mpath_member", self.devname, False),
+                  ("md_examine", self.devname, "not saved")]
+
+        self.assertEqual(self.populate(probes), (set(), ["fs_size_info", "mpath_member", "md_examine"]))
+        self.assertEqual(self.populate(probes), ({"sda"}, ["mpath_member", "md_examine"]))
+
+        # results are kept until the device changes
+        self.assertEqual(self.populate(probes[2:]), ({"sda"}, ["md_examine"]))
+        self.assertEqual(self.populate(probes), ({"sda"}, ["mpath_member", "md_examine"]))
+
+        with open(self.devname, "r+b") as node:
+            node.write(b"new disklabel")
+        self.assertEqual(self.populate(probes), (set(), ["fs_size_info", "mpath_member", "md_examine"]))
+
+        self.device["USEC_INITIALIZED"] = "5678"
+        self.assertEqual(self.populate(probes), (set(), ["fs_size_info", "mpath_member", "md_examine"]))
+
+    def test_invalidation(self):
+        probes = [("fs_size_info", self.devname, [True, 4096, 1024, None, None])]
+        self.populate(probes)
+
+        # files with another version are ignored
+        with open(self.path) as cache_file:
+            data = json.load(cache_file)
+        data["version"] = cache.CACHE_VERSION + 1
+        with open(self.path, "w") as cache_file:
+            json.dump(data, cache_file)
+        self.assertEqual(self.populate(probes), (set(), ["fs_size_info"]))
+        self.assertEqual(self.populate(probes), ({"sda"}, []))
+
+        PopulateCache(self.path).invalidate()
+        self.assertFalse(os.path.exists(self.path))
+        self.assertEqual(self.populate(probes), (set(), ["fs_size_info"]))
+
+        # so are broken files
+        with open(self.path, "w") as cache_file:
+            cache_file.write("{")
+        self.assertEqual(self.populate(probes), (set(), ["fs_size_info"]))
+        self.assertEqual(self.populate(probes), ({"sda"}, []))
+
+        # devices that can't be fingerprinted are not saved
+        del self.device["USEC_INITIALIZED"]
+        self.assertEqual(self.populate(probes), (set(), ["fs_size_info"]))
+        self.assertEqual(self.populate(probes), (set(), ["fs_size_info"]))
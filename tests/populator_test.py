@@ -1,7 +1,9 @@
 import gi
 import os
+import tempfile
+import threading
 import unittest
-from unittest.mock import call, patch, sentinel, Mock, PropertyMock
+from unittest.mock import call, patch, sentinel, Mock
 
 gi.require_version("BlockDev", "1.0")
 from gi.repository import BlockDev as blockdev
@@ -15,6 +17,7 @@ from blivet.devicetree import DeviceTree
 from blivet.flags import flags
 from blivet.formats import get_device_format_class, get_format, DeviceFormat
 from blivet.formats.disklabel import DiskLabel
+from blivet.formats.fs import Ext4FS, FSProbe
 from blivet.osinstall import storage_initialize
 from blivet.populator.helpers import DiskDevicePopulator, DMDevicePopulator, LoopDevicePopulator
 from blivet.populator.helpers import LVMDevicePopulator, MDDevicePopulator, MultipathDevicePopulator
@@ -24,7 +27,11 @@ from blivet.populator.helpers import get_format_helper, get_device_helper
 from blivet.populator.helpers.boot import AppleBootFormatPopulator, EFIFormatPopulator, MacEFIFormatPopulator
 from blivet.populator.helpers.formatpopulator import FormatPopulator
 from blivet.populator.helpers.disklabel import DiskLabelFormatPopulator
+from blivet.populator.populator import device_levels, stacked_devices, _device_probes
+from blivet.populator.populator import _fs_probe, _probe_fs_info, _read_disklabel
 from blivet.size import Size
+from blivet.static_data import lvm_info
+from blivet.threads import blivet_lock
 try:
     from pyanaconda import kickstart
     pyanaconda_present = True
@@ -859,6 +866,7 @@ class LVMFormatPopulatorTestCase(FormatPopulatorTestCase):
         blockdev.lvm.pvs = self._pvs
         blockdev.lvm.vgs = self._vgs
         blockdev.lvm.lvs = self._lvs
+        lvm_info.drop_cache()
 
     @patch("blivet.udev.device_get_name")
     @patch.object(DeviceFormat, "_device_check", return_value=None)
@@ -882,6 +890,7 @@ class LVMFormatPopulatorTestCase(FormatPopulatorTestCase):
         blockdev.lvm.vgs = Mock(return_value=[])
         blockdev.lvm.lvs = Mock(return_value=[])
         self.addCleanup(self._clean_up)
+        lvm_info.drop_cache()
 
         # base case: pv format with no vg
         with patch("blivet.udev.device_get_format", return_value=self.udev_type):
@@ -898,6 +907,7 @@ class LVMFormatPopulatorTestCase(FormatPopulatorTestCase):
         pv_info.vg_uuid = sentinel.vg_uuid
         pv_info.pe_start = 0
         pv_info.pv_free = 0
+        pv_info.pv_name = sentinel.pv_path
 
         device.path = sentinel.pv_path
 
@@ -906,19 +916,19 @@ class LVMFormatPopulatorTestCase(FormatPopulatorTestCase):
         vg_device.lvs = []
         get_device_by_uuid.return_value = vg_device
 
-        with patch("blivet.static_data.lvm_info.PVsInfo.cache", new_callable=PropertyMock) as mock_pvs_cache:
-            mock_pvs_cache.return_value = {sentinel.pv_path: pv_info}
-            with patch("blivet.udev.device_get_format", return_value=self.udev_type):
-                helper = self.helper_class(devicetree, data, device)
-                self.assertFalse(device in vg_device.parents)
-                helper.run()
-                self.assertEqual(device.format.type,
-                                 self.blivet_type,
-                                 msg="Wrong format type after FormatPopulator.run on %s" % self.udev_type)
+        blockdev.lvm.pvs.return_value = [pv_info]
+        lvm_info.drop_cache()
+        with patch("blivet.udev.device_get_format", return_value=self.udev_type):
+            helper = self.helper_class(devicetree, data, device)
+            self.assertFalse(device in vg_device.parents)
+            helper.run()
+            self.assertEqual(device.format.type,
+                             self.blivet_type,
+                             msg="Wrong format type after FormatPopulator.run on %s" % self.udev_type)
 
-                self.assertEqual(get_device_by_uuid.call_count, 3)
-                get_device_by_uuid.assert_called_with(pv_info.vg_uuid, incomplete=True)
-                self.assertTrue(device in vg_device.parents)
+            self.assertEqual(get_device_by_uuid.call_count, 3)
+            get_device_by_uuid.assert_called_with(pv_info.vg_uuid, incomplete=True)
+            self.assertTrue(device in vg_device.parents)
 
         get_device_by_uuid.reset_mock()
         get_device_by_uuid.return_value = None
@@ -931,20 +941,20 @@ class LVMFormatPopulatorTestCase(FormatPopulatorTestCase):
         pv_info.vg_free_count = 0
         pv_info.vg_pv_count = 1
 
-        with patch("blivet.static_data.lvm_info.PVsInfo.cache", new_callable=PropertyMock) as mock_pvs_cache:
-            mock_pvs_cache.return_value = {sentinel.pv_path: pv_info}
-            with patch("blivet.udev.device_get_format", return_value=self.udev_type):
-                helper = self.helper_class(devicetree, data, device)
-                helper.run()
-                self.assertEqual(device.format.type,
-                                 self.blivet_type,
-                                 msg="Wrong format type after FormatPopulator.run on %s" % self.udev_type)
-
-                self.assertEqual(get_device_by_uuid.call_count, 2)
-                get_device_by_uuid.assert_called_with(pv_info.vg_uuid, incomplete=True)
-                vg_device = devicetree.get_device_by_name(pv_info.vg_name)
-                self.assertTrue(vg_device is not None)
-                devicetree._remove_device(vg_device)
+        blockdev.lvm.pvs.return_value = [pv_info]
+        lvm_info.drop_cache()
+        with patch("blivet.udev.device_get_format", return_value=self.udev_type):
+            helper = self.helper_class(devicetree, data, device)
+            helper.run()
+            self.assertEqual(device.format.type,
+                             self.blivet_type,
+                             msg="Wrong format type after FormatPopulator.run on %s" % self.udev_type)
+
+            self.assertEqual(get_device_by_uuid.call_count, 2)
+            get_device_by_uuid.assert_called_with(pv_info.vg_uuid, incomplete=True)
+            vg_device = devicetree.get_device_by_name(pv_info.vg_name)
+            self.assertTrue(vg_device is not None)
+            devicetree._remove_device(vg_device)
 
         get_device_by_uuid.reset_mock()
 
@@ -967,9 +977,6 @@ class LVMFormatPopulatorTestCase(FormatPopulatorTestCase):
         lv2.segtype = "linear"
         lv2_name = "%s-%s" % (pv_info.vg_name, lv2.lv_name)
 
-        lv_info = {lv1_name: lv1,
-                   lv2_name: lv2}
-
         device.format.container_uuid = pv_info.vg_uuid
 
         def gdbu(uuid, **kwargs):  # pylint: disable=unused-argument
@@ -977,31 +984,30 @@ class LVMFormatPopulatorTestCase(FormatPopulatorTestCase):
             return next((d for d in devicetree.devices if d.uuid == uuid), None)
         get_device_by_uuid.side_effect = gdbu
 
-        with patch("blivet.static_data.lvm_info.PVsInfo.cache", new_callable=PropertyMock) as mock_pvs_cache:
-            mock_pvs_cache.return_value = {sentinel.pv_path: pv_info}
-            with patch("blivet.static_data.lvm_info.LVsInfo.cache", new_callable=PropertyMock) as mock_lvs_cache:
-                mock_lvs_cache.return_value = lv_info
-                with patch("blivet.udev.device_get_format", return_value=self.udev_type):
-                    self.assertEqual(devicetree.get_device_by_name(pv_info.vg_name, incomplete=True), None)
-                    helper = self.helper_class(devicetree, data, device)
-                    helper.run()
-                    self.assertEqual(device.format.type,
-                                     self.blivet_type,
-                                     msg="Wrong format type after FormatPopulator.run on %s" % self.udev_type)
-
-                    self.assertEqual(get_device_by_uuid.call_count, 4,
-                                     get_device_by_uuid.mock_calls)  # two for vg and one for each lv
-                    get_device_by_uuid.assert_has_calls([call(pv_info.vg_uuid, incomplete=True),
-                                                        call(lv1.uuid),
-                                                        call(lv2.uuid)],
-                                                        any_order=True)
-                    vg_device = devicetree.get_device_by_name(pv_info.vg_name)
-                    self.assertTrue(vg_device is not None)
-
-                    lv1_device = devicetree.get_device_by_name(lv1_name)
-                    self.assertEqual(lv1_device.uuid, lv1.uuid)
-                    lv2_device = devicetree.get_device_by_name(lv2_name)
-                    self.assertEqual(lv2_device.uuid, lv2.uuid)
+        blockdev.lvm.pvs.return_value = [pv_info]
+        blockdev.lvm.lvs.return_value = [lv1, lv2]
+        lvm_info.drop_cache()
+        with patch("blivet.udev.device_get_format", return_value=self.udev_type):
+            self.assertEqual(devicetree.get_device_by_name(pv_info.vg_name, incomplete=True), None)
+            helper = self.helper_class(devicetree, data, device)
+            helper.run()
+            self.assertEqual(device.format.type,
+                             self.blivet_type,
+                             msg="Wrong format type after FormatPopulator.run on %s" % self.udev_type)
+
+            self.assertEqual(get_device_by_uuid.call_count, 4,
+                             get_device_by_uuid.mock_calls)  # two for vg and one for each lv
+            get_device_by_uuid.assert_has_calls([call(pv_info.vg_uuid, incomplete=True),
+                                                call(lv1.uuid),
+                                                call(lv2.uuid)],
+                                                any_order=True)
+            vg_device = devicetree.get_device_by_name(pv_info.vg_name)
+            self.assertTrue(vg_device is not None)
+
+            lv1_device = devicetree.get_device_by_name(lv1_name)
+            self.assertEqual(lv1_device.uuid, lv1.uuid)
+            lv2_device = devicetree.get_device_by_name(lv2_name)
+            self.assertEqual(lv2_device.uuid, lv2.uuid)
 
 
 class MDFormatPopulatorTestCase(FormatPopulatorTestCase):
@@ -1190,5 +1196,124 @@ class AppleBootFormatPopulatorTestCase(BootFormatPopulatorTestCase):
     helper_class = AppleBootFormatPopulator
 
 
+class DeviceGraphTestCase(unittest.TestCase):
+    class FakeDevice(dict):
+        def __init__(self, sys_path, **properties):
+            super().__init__(**properties)
+            self.sys_path = sys_path
+            self.sys_name = os.path.basename(sys_path)
+
+    def setUp(self):
+        self.sysfs = tempfile.TemporaryDirectory()
+        self.addCleanup(self.sysfs.cleanup)
+
+    def add(self, path, slaves=None, **properties):
+        sys_path = os.path.join(self.sysfs.name, path)
+        os.makedirs(os.path.join(sys_path, "slaves"))
+        for slave in slaves or []:
+            open(os.path.join(sys_path, "slaves", slave), "w").close()
+        return self.FakeDevice(sys_path, **properties)
+
+    def test_levels(self):
+        sda = self.add("sda")
+        sda1 = self.add("sda/sda1", DEVTYPE="partition")
+        sdb = self.add("sdb")
+        md0 = self.add("md0", slaves=["sda1", "sdb"])
+        dm0 = self.add("dm-0", slaves=["md0", "sdz"])
+        loop0 = self.add("loop0")
+
+        self.assertEqual(device_levels([dm0, md0, sda1, sdb, sda, loop0]),
+                         [[sdb, sda, loop0], [sda1], [md0], [dm0]])
+        self.assertEqual(device_levels([dm0, md0]), [[md0], [dm0]])
+        self.assertEqual(device_levels([]), [])
+
+    def test_stacked(self):
+        dm0 = self.add("dm-0", slaves=["md0"], DM_NAME="vg-lv")
+        sda = self.add("sda")
+        sda1 = self.add("sda/sda1", DEVTYPE="partition")
+        sdb = self.add("sdb")
+        md0 = self.add("md0", slaves=["sda1", "sdb"])
+        sdc = self.add("sdc")
+
+        devices = [dm0, sda, sda1, sdb, md0, sdc]
+        self.assertEqual(stacked_devices(devices, {"sdb"}), [dm0, sdb, md0])
+        self.assertEqual(stacked_devices(devices, {"sda", "sdx"}), [dm0, sda, sda1, md0])
+        self.assertEqual(stacked_devices(devices, {"vg-lv"}), [dm0])
+        self.assertEqual(stacked_devices(devices, set()), [])
+
+    @patch("blivet.udev.device_class")
+    def test_probes(self, device_class):
+        device_class.return_value = Mock(is_disk=True, is_biosraid_member=False)
+        sda = self.add("sda", DEVNAME="/dev/sda", ID_PART_TABLE_TYPE="gpt")
+        self.assertEqual([p[:2] for p in _device_probes(sda)],
+                         [("mpath_member", "/dev/sda"), ("parted_disk", "/dev/sda")])
+        self.assertEqual(_device_probes(sda)[1][2:], (_read_disklabel, ("/dev/sda",)))
+
+        device_class.return_value = Mock(is_disk=False, is_biosraid_member=True)
+        self.assertEqual(_device_probes(sda), [])
+
+        md0 = self.add("md0", DEVNAME="/dev/md0", ID_FS_TYPE="linux_raid_member")
+        self.assertEqual([p[:2] for p in _device_probes(md0)], [("md_examine", "/dev/md0")])
+        self.assertEqual(_device_probes(self.add("sdb", ID_PART_TABLE_TYPE="gpt")), [])
+
+
+class FSProbeTestCase(unittest.TestCase):
+    def setUp(self):
+        patcher = patch.object(flags, "installer_mode", True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        patcher = patch("blivet.tasks.fsresize.Ext2FSResize.available", True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_fs_probe(self):
+        info = {"ID_FS_TYPE": "ext4", "DEVNAME": "/dev/sda1"}
+        first_id = DeviceFormat().id
+        probe = _fs_probe(info)
+        # no format was created for it
+        self.assertEqual(DeviceFormat().id, first_id + 1)
+        self.assertIsInstance(probe, FSProbe)
+        self.assertEqual((probe.device, probe.type), ("/dev/sda1", "ext4"))
+
+        # the same conditions as for probing from FS.__init__
+        with patch.object(flags, "installer_mode", False):
+            self.assertIsNone(_fs_probe(info))
+        with patch("blivet.tasks.fsresize.Ext2FSResize.available", False):
+            self.assertIsNone(_fs_probe(info))
+
+        # only filesystems whose size info is cached by fs_info
+        self.assertIsNone(_fs_probe({"ID_FS_TYPE": "vfat", "DEVNAME": "/dev/sda1"}))
+        self.assertIsNone(_fs_probe({"ID_FS_TYPE": "ext4"}))
+
+    def test_probe_without_lock(self):
+        probe = _fs_probe({"ID_FS_TYPE": "ext4", "DEVNAME": "/dev/null"})
+        for task in ("_fsck", "_info", "_size_info", "_minsize"):
+            setattr(probe, task, Mock())
+        probe._size_info.do_task.return_value = Size("1 GiB")
+        probe._minsize.do_task.return_value = Size("100 MiB")
+
+        # the populating thread holds the global lock while the probes run
+        results = []
+        with blivet_lock:
+            thread = threading.Thread(target=lambda: results.append(probe.probe_size_info()))
+            thread.start()
+            thread.join(10)
+
+        self.assertFalse(thread.is_alive(), "probe waited for the global lock")
+        self.assertEqual(results[0][:3], (True, Size("1 GiB"), Size("110 MiB")))
+        probe._fsck.do_task.assert_called_once_with()
+
+    def test_probe_fs_info(self):
+        probe = _fs_probe({"ID_FS_TYPE": "ext4", "DEVNAME": "/dev/sda1"})
+        with patch("blivet.populator.populator.fs_info") as fs_info:
+            _probe_fs_info(probe)
+        fs_info.get.assert_called_once_with("/dev/sda1", "ext4", probe.probe_size_info)
+
+        with patch("blivet.formats.fs._probe_size_info") as probe_size_info:
+            probe.probe_size_info()
+        probe_size_info.assert_called_once_with(probe, Ext4FS._resizable)
+
+
 if __name__ == "__main__":
     unittest.main()
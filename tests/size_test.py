@@ -325,6 +325,21 @@ class TranslationTestCase(unittest.TestCase):
         with self.assertRaises(ValueError):
             s.round_to_nearest(Size("-1 B"))
 
+    def test_round_bytes(self):
+        for value in (Size("10.3 GiB"), Size("10.51 GiB"), Size("513 GiB"), Size(0), Size(1)):
+            for unit in (Size("4 MiB"), Size("1 GiB"), Size("13 GiB"), Size("1 TiB"), Size(0)):
+                for rounding in (size.ROUND_UP, size.ROUND_DOWN, size.ROUND_DEFAULT):
+                    rounded = size.round_bytes(value, unit, rounding)
+                    self.assertIsInstance(rounded, int)
+                    self.assertEqual(Size(rounded), value.round_to_nearest(unit, rounding=rounding))
+
+        self.assertEqual(size.round_bytes(6, 4, size.ROUND_DEFAULT), 8)
+        self.assertEqual(size.round_bytes(5, 4, size.ROUND_DEFAULT), 4)
+        with self.assertRaises(ValueError):
+            size.round_bytes(5, -1)
+        with self.assertRaises(ValueError):
+            size.round_bytes(5, 4, rounding='abc')
+
 
 class UtilityMethodsTestCase(unittest.TestCase):
 
@@ -0,0 +1,78 @@
+import unittest
+
+from blivet.devices import DiskDevice
+from blivet.devices import LVMLogicalVolumeDevice
+from blivet.devices import LVMVolumeGroupDevice
+from blivet.devices import StorageDevice
+from blivet.devicetree import DeviceTree
+from blivet.deviceaction import ActionCreateDevice, ActionCreateFormat
+from blivet.formats import get_format
+from blivet.osinstall import Root
+from blivet.size import Size
+from blivet.snapshot import DeviceTreeSnapshot
+
+
+class DeviceTreeSnapshotTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tree = DeviceTree()
+        self.disk = DiskDevice("disk", size=Size("10 GiB"), exists=True)
+        self.tree._add_device(self.disk)
+        self.device = StorageDevice("dev", size=Size("1 GiB"), parents=[self.disk])
+        self.tree.actions.add(ActionCreateDevice(self.device))
+        self.roots = [Root(mounts={"/": self.device}, name="root")]
+
+    def test_restore(self):
+        fmt = self.device.format
+        snapshot = DeviceTreeSnapshot(self.tree, roots=self.roots)
+
+        # modify the tree, the devices and the roots
+        other = StorageDevice("other", size=Size("1 GiB"), parents=[self.disk])
+        self.tree.actions.add(ActionCreateDevice(other))
+        self.tree.actions.add(ActionCreateFormat(self.device, get_format("ext4")))
+        self.device.size = Size("2 GiB")
+        self.device.format.mountpoint = "/var"
+        self.roots[0].mounts["/var"] = self.device
+        self.roots.append(Root(name="other"))
+
+        snapshot.restore()
+        self.assertEqual(self.tree.devices, [self.disk, self.device])
+        self.assertEqual([a.device for a in self.tree.actions], [self.device])
+        self.assertEqual(self.tree.names, ["disk", "dev"])
+        self.assertEqual(self.disk.children, [self.device])
+        self.assertEqual(self.device.size, Size("1 GiB"))
+        self.assertIs(self.device.format, fmt)
+        self.assertEqual(self.roots[0].mounts, {"/": self.device})
+        self.assertEqual(len(self.roots), 1)
+
+        # lookups use the rebuilt index
+        self.assertIsNone(self.tree.get_device_by_name("other"))
+        self.assertEqual(self.tree.actions.find(device=other), [])
+
+        # a snapshot can be restored more than once
+        self.tree.actions.remove(self.tree.actions.find(device=self.device)[0])
+        snapshot.restore()
+        self.assertEqual([a.device for a in self.tree.actions], [self.device])
+
+    def test_restore_vg_space(self):
+        pv = StorageDevice("pv", size=Size("1025 MiB"), fmt=get_format("lvmpv"),
+                           parents=[self.disk])
+        vg = LVMVolumeGroupDevice("vg", parents=[pv])
+        lv = LVMLogicalVolumeDevice("lv", parents=[vg], size=Size("256 MiB"))
+        for device in (pv, vg, lv):
+            self.tree._add_device(device)
+        free_space = vg.free_space
+
+        snapshot = DeviceTreeSnapshot(self.tree)
+        lv.size = Size("512 MiB")
+        other = LVMLogicalVolumeDevice("other", parents=[vg], size=Size("128 MiB"))
+        self.tree._add_device(other)
+        self.assertEqual(vg.free_space, free_space - Size("384 MiB"))
+
+        snapshot.restore()
+        self.assertEqual(vg.lvs, [lv])
+        self.assertEqual(vg.free_space, free_space)
+        self.assertEqual(vg.free_extents, 192)
+
+        # the restored ledger still follows changes
+        lv.size = Size("128 MiB")
+        self.assertEqual(vg.free_space, free_space + Size("128 MiB"))
@@ -0,0 +1,46 @@
+import logging
+import unittest
+from unittest.mock import patch
+
+from blivet.flags import flags
+from blivet.storage_log import function_name_and_depth, log_method_call, log_method_return
+
+
+class Traced(object):
+    def traced_method(self, arg, secret_password=None):
+        log_method_call(self, arg, secret_password=secret_password)
+        log_method_return(self, arg)
+        return function_name_and_depth()
+
+
+class StorageLogTestCase(unittest.TestCase):
+    def test_function_name_and_depth(self):
+        (name, depth) = Traced().traced_method("x")
+        self.assertEqual(name, "traced_method")
+        self.assertEqual(depth, function_name_and_depth()[1] + 1)
+
+    def test_log_method_call(self):
+        obj = Traced()
+        with self.assertLogs("blivet", level="DEBUG") as cm:
+            obj.traced_method("arg1", secret_password="hunter2")
+
+        self.assertEqual(len(cm.output), 2)
+        self.assertIn("Traced.traced_method: arg1 ; secret_password: Skipped ;", cm.output[0])
+        self.assertIn("Traced.traced_method returned arg1", cm.output[1])
+
+    def test_tracing_disabled(self):
+        obj = Traced()
+        logger = logging.getLogger("blivet")
+        with patch.object(flags, "trace_method_calls", new=False):
+            with patch.object(logger, "isEnabledFor", return_value=True):
+                with patch.object(logger, "debug") as debug:
+                    obj.traced_method("arg1")
+
+        self.assertFalse(debug.called)
+
+        # nothing is logged if the logger is not enabled for debug messages
+        with patch.object(logger, "isEnabledFor", return_value=False):
+            with patch.object(logger, "debug") as debug:
+                obj.traced_method("arg1")
+
+        self.assertFalse(debug.called)
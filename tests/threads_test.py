@@ -0,0 +1,176 @@
+import threading
+import time
+import unittest
+
+from blivet.errors import ThreadError
+from blivet.threads import SharedLock, SynchronizedMeta
+from blivet import threads
+
+
+class SharedLockTestCase(unittest.TestCase):
+    def setUp(self):
+        self.lock = SharedLock()
+        self.lock.set_shared_mode(True)
+
+    def _run(self, target, *args):
+        thread = threading.Thread(target=target, args=args)
+        thread.start()
+        return thread
+
+    def test_default_mode(self):
+        lock = SharedLock()
+        self.assertFalse(lock.shared_mode)
+        lock.acquire_shared()
+        acquired = []
+        thread = self._run(lambda: acquired.append(lock._lock.acquire(blocking=False)))
+        thread.join()
+        lock.release_shared()
+
+        # without shared mode readers exclude each other
+        self.assertEqual(acquired, [False])
+
+    def test_concurrent_readers(self):
+        inside = threading.Barrier(3, timeout=5)
+
+        def reader():
+            self.lock.acquire_shared()
+            try:
+                inside.wait()
+            finally:
+                self.lock.release_shared()
+
+        threads_ = [self._run(reader) for _i in range(2)]
+        inside.wait()
+        for thread in threads_:
+            thread.join()
+
+        self.assertFalse(inside.broken)
+
+    def test_writer_excludes_readers(self):
+        events = []
+        self.lock.acquire()
+
+        def reader():
+            self.lock.acquire_shared()
+            events.append("read")
+            self.lock.release_shared()
+
+        thread = self._run(reader)
+        time.sleep(0.1)
+        events.append("write done")
+        self.lock.release()
+        thread.join()
+        self.assertEqual(events, ["write done", "read"])
+
+        # and readers exclude writers
+        events = []
+        self.lock.acquire_shared()
+
+        def writer():
+            with self.lock:
+                events.append("write")
+
+        thread = self._run(writer)
+        time.sleep(0.1)
+        events.append("read done")
+        self.lock.release_shared()
+        thread.join()
+        self.assertEqual(events, ["read done", "write"])
+
+    def test_reentrancy(self):
+        with self.lock:
+            self.lock.acquire_shared()
+            with self.lock:
+                pass
+            self.lock.release_shared()
+
+        self.lock.acquire_shared()
+        self.lock.acquire_shared()
+        self.lock.release_shared()
+        self.lock.release_shared()
+        self.assertEqual(self.lock._readers, 0)
+
+    def test_upgrade(self):
+        # two readers requesting exclusive access at the same time
+        inside = threading.Barrier(2, timeout=5)
+        done = []
+
+        def upgrader():
+            self.lock.acquire_shared()
+            inside.wait()
+            with self.lock:
+                pass
+            # the shared hold is back after the exclusive hold is released
+            done.append(self.lock._state().shared)
+            self.lock.release_shared()
+
+        threads_ = [self._run(upgrader) for _i in range(2)]
+        for thread in threads_:
+            thread.join(5)
+
+        self.assertEqual(done, [1, 1])
+        self.assertEqual(self.lock._readers, 0)
+        self.assertFalse(self.lock._writing)
+
+    def test_set_shared_mode(self):
+        with self.lock:
+            self.assertRaises(RuntimeError, self.lock.set_shared_mode, False)
+
+        self.lock.set_shared_mode(False)
+        self.assertFalse(self.lock.shared_mode)
+
+
+class SynchronizedMetaTestCase(unittest.TestCase):
+    def setUp(self):
+        threads.enable_shared_locking()
+        self.addCleanup(threads.enable_shared_locking, False)
+
+        class Synchronized(object, metaclass=SynchronizedMeta):
+            _shared_methods = ["query"]
+            _exclusive_methods = ["cached"]
+
+            def query(self):
+                return threads.blivet_lock._state().shared
+
+            def get_value(self):
+                return threads.blivet_lock._state().shared
+
+            def update(self):
+                return threads.blivet_lock._state().exclusive
+
+            @property
+            def prop(self):
+                return threads.blivet_lock._state().shared
+
+            @property
+            def cached(self):
+                return threads.blivet_lock._state().exclusive
+
+        self.obj = Synchronized()
+
+    def test_classification(self):
+        self.assertEqual(self.obj.query(), 1)
+        self.assertEqual(self.obj.get_value(), 1)
+        self.assertEqual(self.obj.prop, 1)
+        self.assertEqual(self.obj.update(), 1)
+        self.assertEqual(self.obj.cached, 1)
+
+    def test_inherited_classification(self):
+        class Subclass(type(self.obj)):
+            def query(self):
+                return threads.blivet_lock._state().shared
+
+            @property
+            def cached(self):
+                return threads.blivet_lock._state().exclusive
+
+        obj = Subclass()
+        self.assertEqual(obj.query(), 1)
+        self.assertEqual(obj.cached, 1)
+
+    def test_queued_exception(self):
+        threads._exception_thread = threading.current_thread()
+        threads._thread_exception = RuntimeError("queued")
+        self.addCleanup(threads.clear_thread_exception)
+        self.assertRaises(ThreadError, self.obj.query)
+        self.assertEqual(threads.get_thread_exception(), (None, None))
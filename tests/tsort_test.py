@@ -30,6 +30,29 @@ class TopologicalSortTestCase(unittest.TestCase):
         graph = blivet.tsort.create_graph(items, edges)
         self._tsort_test(graph)
 
+    def test_deterministic_order(self):
+        # with no constraints the items come out in reverse order
+        items = [5, 2, 3, 4, 1]
+        graph = blivet.tsort.create_graph(items, [])
+        self.assertEqual(blivet.tsort.tsort(graph), [1, 4, 3, 2, 5])
+
+        # whenever there is a choice, the item listed last comes first
+        edges = [(1, 2), (2, 4), (4, 5), (3, 2)]
+        graph = blivet.tsort.create_graph(items, edges)
+        self.assertEqual(blivet.tsort.tsort(graph), [1, 3, 2, 4, 5])
+
+        # the graph is left intact
+        self.assertEqual(graph['edges'], edges)
+        self.assertEqual(graph['incoming'], {5: 1, 2: 2, 3: 0, 4: 1, 1: 0})
+
+    def test_hidden(self):
+        # 'x' is left out, and the items it frees are pushed in item order
+        # together with those freed at the same time
+        items = ['a', 'b', 'c', 'd', 'x']
+        edges = [('a', 'x'), ('a', 'd'), ('x', 'b'), ('x', 'c')]
+        graph = blivet.tsort.create_graph(items, edges)
+        self.assertEqual(blivet.tsort.tsort(graph, hidden=['x']), ['a', 'd', 'c', 'b'])
+
     def _tsort_test(self, graph):
         def check_order(order, graph):
             # since multiple solutions can potentially exist, just verify
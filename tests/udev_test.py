@@ -1,4 +1,10 @@
 
+import os
+import shutil
+import socket
+import struct
+import tempfile
+import threading
 import unittest
 import mock
 
@@ -35,3 +41,208 @@ class UdevTest(unittest.TestCase):
         import blivet.udev
         blivet.udev.trigger()
         self.assertTrue(blivet.udev.util.run_program.called)
+
+
+class FakeDevice(dict):
+    def __init__(self, sys_name, **properties):
+        super().__init__(**properties)
+        self.sys_name = sys_name
+        self.sys_path = "/sys/devices/virtual/block/%s" % sys_name
+
+
+class UdevSnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        import blivet.udev
+        self.devices = [FakeDevice("sda", DEVNAME="/dev/sda", MAJOR="8", MINOR="0",
+                                   DEVLINKS="/dev/disk/by-id/ata-disk /dev/disk/by-path/pci-0"),
+                        FakeDevice("sda1", DEVNAME="/dev/sda1", MAJOR="8", MINOR="1",
+                                   ID_FS_UUID="1234", ID_FS_LABEL="root", ID_PART_ENTRY_UUID="abcd",
+                                   DEVLINKS="/dev/disk/by-id/ata-disk-part1 /dev/disk/by-uuid/1234"),
+                        FakeDevice("dm-0", DEVNAME="/dev/dm-0", MAJOR="253", MINOR="0",
+                                   DM_NAME="fedora-root", ID_FS_LABEL="root",
+                                   DEVLINKS="/dev/mapper/fedora-root /dev/fedora/root")]
+        self.snapshot = blivet.udev.UdevSnapshot(self.devices)
+
+    def test_resolve(self):
+        (sda, sda1, dm0) = self.devices
+        self.assertIs(self.snapshot.resolve("sda"), sda)
+        self.assertIs(self.snapshot.resolve("/dev/sda1"), sda1)
+        self.assertIs(self.snapshot.resolve("UUID=1234"), sda1)
+        self.assertIs(self.snapshot.resolve("PARTUUID=abcd"), sda1)
+        self.assertIs(self.snapshot.resolve("/dev/disk/by-uuid/1234"), sda1)
+        self.assertIs(self.snapshot.resolve("/dev/mapper/fedora-root"), dm0)
+        self.assertIs(self.snapshot.resolve("dm-0"), dm0)
+        self.assertIs(self.snapshot.resolve("fedora/root"), dm0)
+        self.assertIsNone(self.snapshot.resolve("sdb"))
+
+        # the first device wins
+        self.assertIs(self.snapshot.resolve("LABEL=root"), sda1)
+        self.assertIs(self.snapshot.get("devno", (253, 0)), dm0)
+
+    def test_glob(self):
+        self.assertEqual(self.snapshot.glob("sda*"), ["sda", "sda1"])
+        self.assertEqual(self.snapshot.glob("/dev/disk/by-id/ata-disk*"), ["sda", "sda1"])
+        self.assertEqual(self.snapshot.glob("fedora-root"), ["fedora-root"])
+        self.assertEqual(self.snapshot.glob("/dev/sda1"), ["sda1"])
+        self.assertEqual(self.snapshot.glob("sdb"), [])
+
+    def test_invalidate(self):
+        import blivet.udev
+        with mock.patch("blivet.udev._list_devices", return_value=self.devices) as list_devices:
+            with mock.patch("blivet.udev.settle"):
+                blivet.udev.invalidate_snapshot()
+                first = blivet.udev.get_snapshot()
+                self.assertIs(blivet.udev.get_snapshot(), first)
+                self.assertEqual(list_devices.call_count, 1)
+
+                blivet.udev.invalidate_snapshot()
+                self.assertIsNot(blivet.udev.get_snapshot(), first)
+                self.assertEqual(list_devices.call_count, 2)
+
+    def test_device_class(self):
+        import blivet.udev
+        (sda, sda1, dm0) = self.devices
+        blivet.udev.invalidate_snapshot()
+        with mock.patch("blivet.udev.device_is_md", return_value=False) as device_is_md:
+            classification = blivet.udev.device_class(sda)
+            self.assertFalse(classification.is_md)
+            self.assertFalse(blivet.udev.device_class(sda).is_md)
+            self.assertIs(blivet.udev.device_class(sda), classification)
+            self.assertEqual(device_is_md.call_count, 1)
+
+            # the classifications are dropped with the snapshot
+            blivet.udev.invalidate_snapshot()
+            self.assertIsNot(blivet.udev.device_class(sda), classification)
+            self.assertFalse(blivet.udev.device_class(sda).is_md)
+            self.assertEqual(device_is_md.call_count, 2)
+
+        with mock.patch("blivet.udev.device_get_dm_subsystem", return_value="lvm"):
+            self.assertEqual(blivet.udev.device_class(dm0).dm_subsystem, "lvm")
+
+
+class UdevSettleTest(unittest.TestCase):
+
+    def setUp(self):
+        import blivet.udev
+        self.tmpdir = tempfile.mkdtemp(prefix="udev")
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+
+        self.seqnum_file = os.path.join(self.tmpdir, "uevent_seqnum")
+        self.queue = os.path.join(self.tmpdir, "udev", "queue")
+        os.mkdir(os.path.dirname(self.queue))
+        self._set_seqnum(1)
+
+        # a udevd control socket answering pings
+        self.control = os.path.join(self.tmpdir, "control")
+        self.pings = 0
+        self.on_ping = None
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        self.addCleanup(server.close)
+        server.bind(self.control)
+        server.listen(1)
+        thread = threading.Thread(target=self._udevd, args=(server,), daemon=True)
+        thread.start()
+
+        for (name, value) in (("UEVENT_SEQNUM", self.seqnum_file), ("UDEV_QUEUE", self.queue),
+                              ("UDEV_CONTROL", self.control), ("_settled_seqnum", None)):
+            patcher = mock.patch.object(blivet.udev, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        patcher = mock.patch.object(blivet.udev.util, "run_program")
+        self.run_program = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        blivet.udev.settle_stats.reset()
+
+    def _udevd(self, server):
+        import blivet.udev
+        while True:
+            try:
+                (conn, _addr) = server.accept()
+            except OSError:
+                return
+
+            with conn:
+                (_version, magic, msg_type, _value) = struct.unpack(blivet.udev._CTRL_MSG, conn.recv(1024))
+                if (magic, msg_type) == (blivet.udev._CTRL_MAGIC, blivet.udev._CTRL_PING):
+                    self.pings += 1
+                    if self.on_ping:
+                        self.on_ping()
+
+    def _set_seqnum(self, seqnum):
+        with open(self.seqnum_file, "w") as f:
+            f.write("%d\n" % seqnum)
+
+    def test_settle(self):
+        import blivet.udev
+        blivet.udev.settle()
+        self.assertEqual(blivet.udev.settle_stats.outcomes["waited"][0], 1)
+
+        # no new uevents
+        blivet.udev.settle()
+        self.assertEqual(blivet.udev.settle_stats.outcomes["skipped"][0], 1)
+
+        # new uevents, wait until udevd removes its queue file
+        self._set_seqnum(5)
+        open(self.queue, "w").close()
+        threading.Timer(0.1, os.unlink, [self.queue]).start()
+        blivet.udev.settle()
+        self.assertFalse(os.path.exists(self.queue))
+        self.assertEqual(blivet.udev.settle_stats.outcomes["waited"][0], 2)
+
+        # the operation did not generate any uevents
+        self._set_seqnum(6)
+        blivet.udev.settle(seqnum=6)
+        self.assertEqual(blivet.udev.settle_stats.outcomes["skipped"][0], 2)
+        self.assertFalse(self.run_program.called)
+        self.assertEqual(blivet.udev.settle_stats.count, 4)
+        self.assertEqual(self.pings, 6)
+        self.assertIn("udev_test.py:test_settle", blivet.udev.settle_stats.callers)
+
+    def test_watch_event(self):
+        import blivet.udev
+        blivet.udev.settle()
+
+        # a device was closed after being written to; udevd synthesizes a
+        # change uevent when it handles the inotify event, which it does
+        # before answering the ping
+        def synthesize_change():
+            self.on_ping = None
+            self._set_seqnum(2)
+            open(self.queue, "w").close()
+            threading.Timer(0.1, os.unlink, [self.queue]).start()
+
+        self.on_ping = synthesize_change
+        blivet.udev.settle(seqnum=1)
+        self.assertFalse(os.path.exists(self.queue))
+        self.assertEqual(blivet.udev.settle_stats.outcomes, {"waited": [2, mock.ANY]})
+
+    def test_fallback(self):
+        import blivet.udev
+        os.rmdir(os.path.dirname(self.queue))
+        blivet.udev.settle()
+        self.assertTrue(self.run_program.called)
+        self.assertEqual(blivet.udev.settle_stats.outcomes, {"spawned": [1, mock.ANY]})
+
+    def test_no_udevd(self):
+        import blivet.udev
+        # without an answer from udevd a missing queue file means nothing
+        os.unlink(self.control)
+        self.run_program.return_value = 0
+        blivet.udev.settle()
+        self.assertEqual(blivet.udev.settle_stats.outcomes, {"spawned": [1, mock.ANY]})
+
+        # udevd may still have to handle its inotify events
+        blivet.udev.settle()
+        self.assertEqual(blivet.udev.settle_stats.outcomes, {"spawned": [2, mock.ANY]})
+
+    def test_failed_settle(self):
+        import blivet.udev
+        os.unlink(self.control)
+        self.run_program.return_value = 1
+        blivet.udev.settle()
+        blivet.udev.settle()
+        # udevadm settle timed out, so the uevents are not known to be processed
+        self.assertEqual(blivet.udev.settle_stats.outcomes, {"spawned": [2, mock.ANY]})